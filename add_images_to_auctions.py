@@ -1,12 +1,21 @@
 """
 Skript för att lägga till image-kolumn och uppdatera auktioner med bilder
+
+Finns originalbilden i static/images/ skickas den genom bildpipelinen
+(services/images.py): thumb/medium/full-varianter skapas i en processpool och
+auktionen pekar sedan på bildens innehållshash istället för filnamnet.
 """
 import sqlite3
 import os
 
+from services.images import BildPipeline, hasha_fil
+
 # Sökväg till databasen
 DB_PATH = 'instance/blgeestates.db'
 
+# Sökväg till static-mappen (där originalbilderna ligger under images/)
+STATIC_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static')
+
 # Bildnamn för varje auktion (id: bildnamn)
 AUKTION_BILDER = {
     1: 'vintage_klocka.jpg',
@@ -45,16 +54,37 @@ def add_image_column():
     conn.close()
 
 def update_auction_images():
-    """Uppdaterar alla auktioner med bildnamn"""
+    """
+    Uppdaterar alla auktioner med bilder.
+    Bilder som finns på disk bearbetas till varianter och sparas som innehållshash,
+    övriga sparas med filnamnet som tidigare.
+    """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     print("\n🖼️  Uppdaterar auktioner med bilder...")
     print("-" * 50)
     
+    pipeline = BildPipeline(STATIC_PATH)
+    jobb = {}
     for auction_id, image_name in AUKTION_BILDER.items():
-        cursor.execute("UPDATE auctions SET image = ? WHERE id = ?", (image_name, auction_id))
-        print(f"  ✅ Auktion {auction_id}: {image_name}")
+        original = os.path.join(STATIC_PATH, 'images', image_name)
+        if os.path.isfile(original):
+            jobb[auction_id] = (image_name, pipeline.skicka(original, hasha_fil(original)))
+        else:
+            cursor.execute("UPDATE auctions SET image = ? WHERE id = ?", (image_name, auction_id))
+            print(f"  ⚠️  Auktion {auction_id}: {image_name} (filen saknas - inga varianter)")
+    
+    # Vänta in processpoolen och peka auktionerna på bildens hash
+    for auction_id, (image_name, future) in jobb.items():
+        try:
+            bild_hash = future.result()
+        except Exception as e:
+            print(f"  ❌ Auktion {auction_id}: {image_name} kunde inte bearbetas ({e})")
+            continue
+        cursor.execute("UPDATE auctions SET image = ? WHERE id = ?", (bild_hash, auction_id))
+        print(f"  ✅ Auktion {auction_id}: {image_name} -> {bild_hash[:12]}…")
+    pipeline.stang()
     
     conn.commit()
     conn.close()
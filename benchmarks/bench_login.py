@@ -0,0 +1,86 @@
+"""
+Benchmark: inloggningar per sekund (och per kärna) genom hashpoolen.
+
+Kör hela /auth/login-flödet (spärr, hashpool, omhashningskontroll, session)
+mot en SQLite-databas i minnet från flera klienttrådar samtidigt.
+
+Kör:
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --sekunder 20 --klienter 32 --metod pbkdf2:sha256:600000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+PROJEKT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJEKT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mät inloggningar per sekund')
+    parser.add_argument('--sekunder', type=float, default=10.0, help='Mättid')
+    parser.add_argument('--klienter', type=int, default=16, help='Samtidiga klienttrådar')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Trådar i hashpoolen')
+    parser.add_argument('--metod', default=None, help='PASSWORD_HASH_METHOD (standard: appens)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ['PASSWORD_HASH_WORKERS'] = str(args.workers)
+    os.environ['PASSWORD_HASH_QUEUE'] = str(args.klienter)
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ['CHANGE_FEED_POLL_INTERVAL'] = '0'
+    if args.metod:
+        os.environ['PASSWORD_HASH_METHOD'] = args.metod
+
+    import tempfile
+    os.environ.setdefault('EVENT_LOG_DIR', tempfile.mkdtemp(prefix='bench-events-'))
+    from flask_app import skapa_app
+
+    app = skapa_app()
+    # Spärren skulle annars slå till när alla klienter kommer från samma IP
+    app.extensions['login_throttle'].granser = {'email': 10 ** 9, 'ip': 10 ** 9}
+    metod = app.extensions['password_pool'].metod
+
+    # Lösenordet hashas om till appens metod vid första inloggningen - gör det före mätningen
+    app.test_client().post('/auth/login', data={'email': 'user@example.com', 'password': 'user123'})
+
+    stopp = time.perf_counter() + args.sekunder
+    lyckade = [0] * args.klienter
+    avvisade = [0] * args.klienter
+
+    def klient(i):
+        c = app.test_client()
+        while time.perf_counter() < stopp:
+            svar = c.post('/auth/login', data={'email': 'user@example.com', 'password': 'user123'})
+            if svar.status_code == 302:
+                lyckade[i] += 1
+            else:
+                avvisade[i] += 1
+
+    start = time.perf_counter()
+    tradar = [threading.Thread(target=klient, args=(i,)) for i in range(args.klienter)]
+    for t in tradar:
+        t.start()
+    for t in tradar:
+        t.join()
+    tid = time.perf_counter() - start
+
+    karnor = min(args.workers, os.cpu_count() or 1)
+    per_sekund = sum(lyckade) / tid
+    print("\n" + "=" * 50)
+    print("🔑 INLOGGNINGAR PER SEKUND")
+    print("=" * 50)
+    print(f"Metod:          {metod}")
+    print(f"Hashtrådar:     {args.workers} (kärnor i mätningen: {karnor})")
+    print(f"Klienter:       {args.klienter}")
+    print(f"Lyckade:        {sum(lyckade)} på {tid:.1f} s")
+    print(f"Avvisade (503): {sum(avvisade)}")
+    print("-" * 50)
+    print(f"✅ {per_sekund:.1f} inloggningar/s, {per_sekund / karnor:.1f} per kärna")
+    print("=" * 50 + "\n")
+
+
+if __name__ == '__main__':
+    main()
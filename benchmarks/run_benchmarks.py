@@ -0,0 +1,280 @@
+"""
+Benchmark-svit för de kritiska routerna.
+
+Startar appen mot en genererad databas (generate_data.py) och kör varje
+scenario med flera klienttrådar via Flask test client:
+
+- browse_auctions (alla kombinationer av status och sortering)
+- auction_detail, search_auctions, place_bid, my_bids
+- admin dashboard
+
+Per scenario rapporteras requests/s, p50/p95/p99-latens, antal SQL-frågor
+per request och processens högsta RSS. Resultatet jämförs med en sparad
+baslinje (benchmarks/baseline.json) och körningen misslyckas (exit 1) om
+något scenario har blivit sämre än toleransen tillåter eller ger fel.
+
+Baslinjen gäller maskinen den sparades på - spara om den (--spara-baslinje)
+när benchmarks körs på en ny maskin.
+
+Kör:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --profil small --klienter 16 --sekunder 10
+    python benchmarks/run_benchmarks.py --scenario browse --scenario detail
+    python benchmarks/run_benchmarks.py --spara-baslinje
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+PROJEKT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJEKT)
+
+BASLINJE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+STATUSAR = ('all', 'active', 'upcoming', 'ended')
+SORTERINGAR = ('end_time', 'created_at', 'current_bid')
+
+
+def percentil(sorterade, p):
+    """Percentil (0-100) ur en sorterad lista, närmaste rang"""
+    if not sorterade:
+        return 0.0
+    index = min(len(sorterade) - 1, max(0, round(p / 100 * len(sorterade)) - 1))
+    return sorterade[index]
+
+
+def forbered_databas(profil, seed, katalog):
+    """
+    Genererar (eller återanvänder) datasetet och kopierar det till katalog,
+    så att benchmarkens skrivningar inte ändrar det sparade datasetet.
+    """
+    from generate_data import generera
+
+    instans = os.path.join(PROJEKT, 'instance')
+    os.makedirs(instans, exist_ok=True)
+    # Datumet ingår i namnet: tidsstämplarna räknas från dagens datum
+    datum = datetime.utcnow().strftime('%Y%m%d')
+    sparad = os.path.join(instans, f'bench-{profil}-{seed}-{datum}.db')
+    if not os.path.exists(sparad):
+        print(f"🧪 Genererar dataset ({profil}, seed {seed})...")
+        tmp = sparad + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        generera(f'sqlite:///{tmp}', profil, seed=seed, utskrift=lambda *_: None)
+        os.replace(tmp, sparad)
+    kopia = os.path.join(katalog, 'bench.db')
+    shutil.copyfile(sparad, kopia)
+    return kopia
+
+
+class Fragraknare:
+    """Räknar SQL-frågor per tråd (before_cursor_execute)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._lokal = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._rakna)
+
+    def _rakna(self, *_):
+        self._lokal.antal = getattr(self._lokal, 'antal', 0) + 1
+
+    def nollstall(self):
+        antal = getattr(self._lokal, 'antal', 0)
+        self._lokal.antal = 0
+        return antal
+
+
+def skapa_scenarier(app):
+    """Namn -> (user_id, funktion(klient, i) som gör ett anrop)"""
+    from sqlalchemy import func, select
+
+    from database import db
+    from models.auction import Auction
+    from models.bid import Bid
+
+    with app.app_context():
+        nu = datetime.utcnow()
+        aktiva = db.session.execute(
+            select(Auction.id).where(Auction.start_time <= nu, Auction.end_time > nu, Auction.is_active == True)
+            .order_by(Auction.id).limit(200)
+        ).scalars().all()
+        populara = db.session.execute(
+            select(Bid.auction_id).group_by(Bid.auction_id).order_by(func.count().desc()).limit(50)
+        ).scalars().all()
+        flitigast = db.session.execute(
+            select(Bid.user_id).group_by(Bid.user_id).order_by(func.count().desc()).limit(1)
+        ).scalar() or 2
+
+    belopp = itertools.count(10_000_000, 10)
+    sokord = ('vas', 'klocka', 'lampa', 'gustavsberg', 'bok', 'stol', '1950', 'ring')
+
+    scenarier = {}
+    for status in STATUSAR:
+        for sortering in SORTERINGAR:
+            url = f'/auctions/?status={status}&sort={sortering}'
+            scenarier[f'browse[{status},{sortering}]'] = (2, lambda k, i, url=url: k.get(url))
+    scenarier['detail'] = (2, lambda k, i: k.get(f'/auctions/{populara[i % len(populara)]}'))
+    scenarier['search'] = (2, lambda k, i: k.get(f'/auctions/search?q={sokord[i % len(sokord)]}'))
+    if aktiva:
+        scenarier['place_bid'] = (None, lambda k, i: k.post(
+            f'/bidding/place/{aktiva[i % len(aktiva)]}', json={'amount': next(belopp)}))
+    scenarier['my_bids'] = (flitigast, lambda k, i: k.get('/bidding/my-bids'))
+    scenarier['admin_dashboard'] = (1, lambda k, i: k.get('/admin/dashboard'))
+    return scenarier
+
+
+def kor_scenario(app, raknare, user_id, anrop, klienter, sekunder, max_anrop):
+    """Kör ett scenario med klienter trådar. Returnerar resultatet som dict."""
+    latenser = [[] for _ in range(klienter)]
+    fragor = [0] * klienter
+    fel = [0] * klienter
+    start_barriar = threading.Barrier(klienter + 1)
+    stopp = [0.0]
+
+    def klient(nummer):
+        k = app.test_client()
+        with k.session_transaction() as session:
+            # Egen användare per tråd för bud (annars "redan högst"), annars den givna
+            session['_user_id'] = str(user_id if user_id is not None else 2 + nummer)
+            session['_fresh'] = True
+        raknare.nollstall()
+        start_barriar.wait()
+        i = nummer
+        while time.perf_counter() < stopp[0] and len(latenser[nummer]) < max_anrop:
+            t0 = time.perf_counter()
+            svar = anrop(k, i)
+            latenser[nummer].append(time.perf_counter() - t0)
+            fragor[nummer] += raknare.nollstall()
+            if svar.status_code >= 400:
+                fel[nummer] += 1
+            i += klienter
+
+    tradar = [threading.Thread(target=klient, args=(n,)) for n in range(klienter)]
+    for t in tradar:
+        t.start()
+    stopp[0] = time.perf_counter() + sekunder
+    start_barriar.wait()
+    start = time.perf_counter()
+    for t in tradar:
+        t.join()
+    tid = time.perf_counter() - start
+
+    alla = sorted(l for lista in latenser for l in lista)
+    antal = len(alla)
+    return {
+        'requests': antal,
+        'rps': round(antal / tid, 1) if tid else 0.0,
+        'p50_ms': round(percentil(alla, 50) * 1000, 2),
+        'p95_ms': round(percentil(alla, 95) * 1000, 2),
+        'p99_ms': round(percentil(alla, 99) * 1000, 2),
+        'queries': round(sum(fragor) / antal, 2) if antal else 0.0,
+        'errors': sum(fel),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def jamfor(resultat, baslinje, tolerans):
+    """Returnerar en lista med regressioner (text) jämfört med baslinjen"""
+    regressioner = []
+    for namn, r in resultat.items():
+        if r['errors']:
+            regressioner.append(f'{namn}: {r["errors"]} fel')
+        b = baslinje.get(namn)
+        if b is None:
+            continue
+        if r['p95_ms'] > b['p95_ms'] * (1 + tolerans):
+            regressioner.append(f'{namn}: p95 {r["p95_ms"]} ms > {b["p95_ms"]} ms')
+        if r['rps'] < b['rps'] * (1 - tolerans):
+            regressioner.append(f'{namn}: {r["rps"]} req/s < {b["rps"]} req/s')
+        # Antal frågor varierar lite (t.ex. sessionens användare), men N+1-fel mångdubblar det
+        if r['queries'] > b['queries'] * (1 + tolerans) + 0.5:
+            regressioner.append(f'{namn}: {r["queries"]} frågor/request > {b["queries"]}')
+    return regressioner
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks för de kritiska routerna')
+    parser.add_argument('--profil', default='tiny', help='Dataset från generate_data.py')
+    parser.add_argument('--seed', type=int, default=42, help='Datasetets slumpfrö')
+    parser.add_argument('--klienter', type=int, default=8, help='Samtidiga klienttrådar')
+    parser.add_argument('--sekunder', type=float, default=3.0, help='Mättid per scenario')
+    parser.add_argument('--max-anrop', type=int, default=10_000, help='Max anrop per klient och scenario')
+    parser.add_argument('--scenario', action='append', help='Kör bara scenarier som börjar med detta (kan upprepas)')
+    parser.add_argument('--baslinje', default=BASLINJE, help='Baslinjefil (JSON)')
+    parser.add_argument('--tolerans', type=float, default=0.25, help='Tillåten försämring, t.ex. 0.25 = 25 %%')
+    parser.add_argument('--spara-baslinje', action='store_true', help='Spara resultatet som ny baslinje')
+    args = parser.parse_args()
+
+    katalog = tempfile.mkdtemp(prefix='bench-')
+    try:
+        databas = forbered_databas(args.profil, args.seed, katalog)
+        os.environ['DATABASE_URL'] = f'sqlite:///{databas}'
+        os.environ['EVENT_LOG_DIR'] = os.path.join(katalog, 'events')
+        os.environ['RATE_LIMIT_ENABLED'] = '0'
+        os.environ['CHANGE_FEED_POLL_INTERVAL'] = '0'
+
+        from database import db
+        from flask_app import skapa_app
+
+        app = skapa_app()
+        with app.app_context():
+            raknare = Fragraknare(db.engine)
+        scenarier = skapa_scenarier(app)
+        if args.scenario:
+            scenarier = {n: s for n, s in scenarier.items() if any(n.startswith(p) for p in args.scenario)}
+
+        print("\n" + "=" * 96)
+        print(f"⏱️ BENCHMARKS - profil {args.profil}, {args.klienter} klienter, {args.sekunder:g} s per scenario")
+        print("=" * 96)
+        print(f"{'scenario':<30}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'frågor':>9}{'fel':>6}{'RSS MB':>10}")
+        print("-" * 96)
+        resultat = {}
+        for namn, (user_id, anrop) in scenarier.items():
+            r = kor_scenario(app, raknare, user_id, anrop, args.klienter, args.sekunder, args.max_anrop)
+            resultat[namn] = r
+            print(f"{namn:<30}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+                  f"{r['queries']:>9}{r['errors']:>6}{r['peak_rss_mb']:>10}")
+        print("-" * 96)
+
+        sparad = {}
+        if os.path.exists(args.baslinje):
+            with open(args.baslinje, encoding='utf-8') as f:
+                sparad = json.load(f)
+        profiler = sparad.setdefault('profiles', {})
+
+        if args.spara_baslinje:
+            profiler.setdefault(args.profil, {}).update(resultat)
+            with open(args.baslinje, 'w', encoding='utf-8') as f:
+                json.dump(sparad, f, indent=2, sort_keys=True, ensure_ascii=False)
+                f.write('\n')
+            print(f"💾 Baslinje sparad i {args.baslinje}")
+            regressioner = jamfor(resultat, {}, args.tolerans)
+        else:
+            baslinje = profiler.get(args.profil, {})
+            if not baslinje:
+                print(f"⚠️ Ingen baslinje för profil {args.profil} - kör med --spara-baslinje")
+            regressioner = jamfor(resultat, baslinje, args.tolerans)
+
+        if regressioner:
+            print("❌ REGRESSIONER:")
+            for rad in regressioner:
+                print(f"   {rad}")
+        else:
+            print("✅ Inga regressioner")
+        print("=" * 96 + "\n")
+        return 1 if regressioner else 0
+    finally:
+        shutil.rmtree(katalog, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Skript som förkomprimerar statiska filer inför deploy.
+
+Skapar .gz (och .br om paketet 'brotli' finns) bredvid varje css/js-fil i
+static/. Flask-appen skickar sedan syskonfilen direkt till klienter som
+accepterar kodningen (se services/assets.py).
+
+Kör: python build_assets.py
+"""
+import os
+
+from services.assets import bygg_assets
+from services.compression import brotli
+
+
+def main():
+    static_mapp = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static')
+
+    print("\n" + "=" * 50)
+    print("📦 FÖRKOMPRIMERAR STATISKA FILER")
+    print("=" * 50)
+    if brotli is None:
+        print("ℹ️  'brotli' är inte installerat - skapar endast .gz")
+
+    hashar = bygg_assets(static_mapp)
+    for filnamn, hash_ in sorted(hashar.items()):
+        print(f"  ✅ {filnamn:<30} v={hash_}")
+
+    print("-" * 50)
+    print(f"✅ Klart! {len(hashar)} filer förkomprimerade.")
+    print("=" * 50 + "\n")
+
+
+if __name__ == '__main__':
+    main()
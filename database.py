@@ -6,6 +6,7 @@ SINGLE RESPONSIBILITY: Denna fil har ENDAST ansvar för:
 2. Initiera databasen och koppla den till Flask-appen (init_db).
 3. Skapa alla tabeller baserat på modellerna (db.create_all).
 4. Köra alla startdatafunktioner (seeding).
+5. Välja dialektberoende SQL (dialekt_insert) åt tjänsterna.
 
 Denna fil känner INTE till affärslogik eller routing – den är bara databasens centrala nav!
 """
@@ -16,6 +17,20 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 
+def dialekt_insert(dialekt):
+    """
+    INSERT med ON CONFLICT-stöd för databasen som används.
+
+    Args:
+        dialekt: conn.dialect.name ('sqlite' eller 'postgresql')
+    """
+    if dialekt == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
 def init_db(app):
     """
     Initierar databasen för Flask-applikationen.
@@ -40,12 +55,20 @@ def init_db(app):
         from models.auction import Auction
         from models.bid import Bid
         from models.like import Like
+        from models.change import Change, ChangeConsumer
+        from models.saved_search import SavedSearch, SavedSearchMatch
 
         # --- B. Skapa alla Tabeller ---
         # db.create_all(): Går igenom alla importerade modeller och skapar motsvarande
         # tabeller i databasen om de INTE redan existerar.
         db.create_all()
 
+        # create_all() skapar bara index för NYA tabeller. Index som lagts till
+        # i en modell efteråt skapas här (checkfirst hoppar över befintliga).
+        for tabell in db.metadata.sorted_tables:
+            for index in tabell.indexes:
+                index.create(db.engine, checkfirst=True)
+
         # --- C. Fyll Tabellerna med Startdata (Seeding) ---
         # Importera alla funktioner som lägger till startdata i databasen.
 
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from typing import List, Optional, Any
 import sqlite3
+import time
 from contextlib import contextmanager
+from services.slow_queries import registrera_sats
 
 class BaseRepository(ABC):
     """Base repository class implementing common database operations"""
@@ -23,16 +25,26 @@ class BaseRepository(ABC):
         """Execute a SELECT query and return results"""
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
+            start = time.perf_counter()
             cursor.execute(query, params)
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            self._report_slow(conn, query, params, time.perf_counter() - start)
+            return rows
     
     def execute_non_query(self, query: str, params: tuple = ()) -> int:
         """Execute INSERT, UPDATE, DELETE and return affected rows or lastrowid"""
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
+            start = time.perf_counter()
             cursor.execute(query, params)
             conn.commit()
+            self._report_slow(conn, query, params, time.perf_counter() - start)
             return cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+
+    def _report_slow(self, conn, query: str, params: tuple, seconds: float) -> None:
+        """Report the statement to the slow-query log (EXPLAIN runs on the same connection)"""
+        registrera_sats(query, params, seconds,
+                        lambda: conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall())
     
     @abstractmethod
     def get_all(self) -> List[Any]:
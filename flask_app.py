@@ -16,11 +16,33 @@ SINGLE RESPONSIBILITY:
 5. Definiera routes för huvudnivån (t.ex. startsidan).
 6. Starta applikationen.
 """
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify, request, abort
+import time
 from flask_login import LoginManager
 import os  # Importera os-modulen för att använda os.environ.get
 # Importera init_db-funktionen som sätter upp SQLAlchemy (databasen)
 from database import init_db
+from services.page_cache import init_page_cache, cachad_sida, TAGG_LISTA
+from services.compression import init_compression
+from services.assets import init_assets
+from services.images import init_images
+from services.uploads import init_uploads
+from services.reactions import init_reactions
+from services.bid_engine import init_bid_engine
+from services.event_log import init_event_log
+from services.change_feed import init_change_feed
+from services.auction_index import init_auction_index, hamta_auktionsindex
+from services.saved_searches import init_saved_searches
+from services.idempotency import init_idempotency
+from services.rate_limit import init_rate_limit
+from services.passwords import init_passwords
+from services.bid_history import init_bid_history
+from services.traffic_recorder import init_traffic_recorder
+from services.metrics import init_metrics, exportera
+from services.slow_queries import init_slow_queries
+from services.profiler import init_profiler
+from services.memory import init_memory
+from services.tracing import init_tracing
 
 def skapa_app():
     """
@@ -50,12 +72,169 @@ def skapa_app():
     # SQLALCHEMY_TRACK_MODIFICATIONS: Stängs av för att spara resurser (bäst praxis).
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # PAGE_CACHE: Helsidescache för anonyma besökare (sekunder).
+    # TTL = hur länge en sida är färsk, STALE_TTL = hur länge en inaktuell sida
+    # får serveras medan den renderas om i bakgrunden.
+    app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    app.config['PAGE_CACHE_TTL'] = float(os.environ.get('PAGE_CACHE_TTL', 5))
+    app.config['PAGE_CACHE_STALE_TTL'] = float(os.environ.get('PAGE_CACHE_STALE_TTL', 30))
+    app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 2000))
+
+    # COMPRESS: gzip/brotli-komprimering av svar. Svar mindre än MIN_SIZE byte
+    # komprimeras inte (det lönar sig inte).
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+
+    # IMAGE_WORKERS: Antal processer som skapar bildvarianter (thumb/medium/full).
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+
+    # UPLOAD_MAX_BYTES: Maxstorlek per uppladdad bild. MAX_CONTENT_LENGTH begränsar
+    # hela requesten (bulkuppladdning av många bilder på en gång).
+    app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 15 * 1024 * 1024))
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 256 * 1024 * 1024))
+
+    # REACTIONS: Likes/dislikes buffras i minnet och skrivs i batchar var
+    # FLUSH_INTERVAL sekund. STATE_TTL = hur länge tillståndet i minnet används
+    # innan det läses om från databasen. JOURNAL = fil där osparade reaktioner
+    # hamnar om databasen inte går att skriva till vid avstängning.
+    app.config['REACTIONS_FLUSH_INTERVAL'] = float(os.environ.get('REACTIONS_FLUSH_INTERVAL', 0.5))
+    app.config['REACTIONS_STATE_TTL'] = float(os.environ.get('REACTIONS_STATE_TTL', 30))
+    app.config['REACTIONS_JOURNAL'] = os.environ.get('REACTIONS_JOURNAL')
+
+    # BID_ENGINE: Antal trådar (shards) som auktionerna fördelas på, max antal
+    # bud per gemensam commit, hur länge en request väntar på budmotorn (sekunder)
+    # och hur ofta avslutade auktioner släpps ur minnet (sekunder).
+    app.config['BID_ENGINE_SHARDS'] = int(os.environ.get('BID_ENGINE_SHARDS', 4))
+    app.config['BID_ENGINE_MAX_BATCH'] = int(os.environ.get('BID_ENGINE_MAX_BATCH', 100))
+    app.config['BID_ENGINE_TIMEOUT'] = float(os.environ.get('BID_ENGINE_TIMEOUT', 5))
+    app.config['BID_ENGINE_PRUNE_INTERVAL'] = float(os.environ.get('BID_ENGINE_PRUNE_INTERVAL', 60))
+
+    # EVENT_LOG: Katalog för händelseloggen (standard instance/events), hur ofta
+    # en auktion får en snapshot (antal händelser) och om varje skrivning ska fsync:as.
+    app.config['EVENT_LOG_DIR'] = os.environ.get('EVENT_LOG_DIR')
+    app.config['EVENT_SNAPSHOT_EVERY'] = int(os.environ.get('EVENT_SNAPSHOT_EVERY', 100))
+    app.config['EVENT_LOG_FSYNC'] = os.environ.get('EVENT_LOG_FSYNC', '0') == '1'
+
+    # CHANGE_FEED: Hur ofta varje worker läser ändringsflödet (sekunder, 0 = ingen
+    # läsartråd) och hur länge ändringsrader sparas innan de rensas.
+    app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 0.5))
+    app.config['CHANGE_FEED_RETENTION'] = float(os.environ.get('CHANGE_FEED_RETENTION', 24 * 60 * 60))
+    # Hur länge (sekunder) läsarna väntar på en saknad seq innan den räknas som
+    # tillbakarullad - ska vara längre än den längsta skrivtransaktionen (PostgreSQL)
+    app.config['CHANGE_FEED_GAP_WAIT'] = float(os.environ.get('CHANGE_FEED_GAP_WAIT', 5.0))
+
+    # IDEMPOTENCY: Hur länge (sekunder) och hur många idempotensnycklar för bud
+    # som sparas, så att dubbelklick och omsändningar inte lägger budet två gånger.
+    app.config['IDEMPOTENCY_TTL'] = float(os.environ.get('IDEMPOTENCY_TTL', 600))
+    app.config['IDEMPOTENCY_MAX_KEYS'] = int(os.environ.get('IDEMPOTENCY_MAX_KEYS', 10000))
+
+    # BID_HISTORY: Standard- och maxstorlek på en sida i /bidding/history/<id>
+    # (klienter pollar med ?after_id= och bläddrar bakåt med ?before_id=).
+    app.config['BID_HISTORY_PAGE_SIZE'] = int(os.environ.get('BID_HISTORY_PAGE_SIZE', 20))
+    app.config['BID_HISTORY_MAX_PAGE'] = int(os.environ.get('BID_HISTORY_MAX_PAGE', 100))
+
+    # AUCTION_SUMMARY: Max antal auktioner per anrop till /auctions/summary?ids=...
+    app.config['AUCTION_SUMMARY_MAX_IDS'] = int(os.environ.get('AUCTION_SUMMARY_MAX_IDS', 200))
+
+    # AUCTION_INDEX: Halveringstid (sekunder) för trendpoängen, vikt per bud och
+    # per like, antal auktioner i startsidans widgetar och max antal auktioner
+    # på /auctions/?sort=ending_soon|trending.
+    app.config['AUCTION_INDEX_HALF_LIFE'] = float(os.environ.get('AUCTION_INDEX_HALF_LIFE', 3600))
+    app.config['AUCTION_INDEX_BID_WEIGHT'] = float(os.environ.get('AUCTION_INDEX_BID_WEIGHT', 3))
+    app.config['AUCTION_INDEX_LIKE_WEIGHT'] = float(os.environ.get('AUCTION_INDEX_LIKE_WEIGHT', 1))
+    app.config['AUCTION_INDEX_WIDGET_SIZE'] = int(os.environ.get('AUCTION_INDEX_WIDGET_SIZE', 5))
+    app.config['AUCTION_INDEX_PAGE_SIZE'] = int(os.environ.get('AUCTION_INDEX_PAGE_SIZE', 48))
+
+    # SAVED_SEARCHES: Max antal sparade sökningar per användare
+    # (nya auktioner matchas mot dem och träffarna köas för notifiering).
+    app.config['SAVED_SEARCHES_MAX_PER_USER'] = int(os.environ.get('SAVED_SEARCHES_MAX_PER_USER', 20))
+
+    # EXPORT_BATCH_SIZE: Rader per batch i admins strömmande CSV/JSONL-export
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # TRAFFIC_RECORD: Sätt TRAFFIC_RECORD_DIR för att spela in trafiken som JSONL
+    # (en fil per process, roteras vid MAX_BYTES). Spelas upp med replay_traffic.py.
+    app.config['TRAFFIC_RECORD_DIR'] = os.environ.get('TRAFFIC_RECORD_DIR')
+    app.config['TRAFFIC_RECORD_MAX_BYTES'] = int(os.environ.get('TRAFFIC_RECORD_MAX_BYTES', 50 * 1024 * 1024))
+    app.config['TRAFFIC_RECORD_BACKUPS'] = int(os.environ.get('TRAFFIC_RECORD_BACKUPS', 5))
+    app.config['TRAFFIC_RECORD_MAX_BODY'] = int(os.environ.get('TRAFFIC_RECORD_MAX_BODY', 4096))
+
+    # METRICS: /metrics i Prometheus-format. METRICS_ALLOWED_IPS begränsar vilka
+    # adresser som får skrapa (kommaseparerat, tomt = alla). METRICS_BUCKETS är
+    # latenshistogrammens hinkar i sekunder.
+    app.config['METRICS_ALLOWED_IPS'] = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+    app.config['METRICS_BUCKETS'] = [float(b) for b in os.environ.get('METRICS_BUCKETS', '').split(',') if b.strip()]
+
+    # SLOW_QUERY: SQL-satser som tar minst THRESHOLD_MS loggas med maskerade
+    # parametrar och route, och EXPLAIN QUERY PLAN sparas en gång per satsform.
+    # Topplistan (högst MAX_SHAPES former) visas på /admin/slow-queries.
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    app.config['SLOW_QUERY_MAX_SHAPES'] = int(os.environ.get('SLOW_QUERY_MAX_SHAPES', 500))
+    app.config['SLOW_QUERY_EXPLAIN'] = os.environ.get('SLOW_QUERY_EXPLAIN', '1') == '1'
+
+    # PROFILER: Av som standard (då kostar den ingenting). När den är på kan en
+    # admin profilera en request med headern X-Profile: cprofile|sample, och
+    # SAMPLE_RATE (0-1) profilerar en slumpvis andel av all trafik i RATE_MODE.
+    # Profilerna sparas i PROFILER_DIR (standard instance/profiles) och visas
+    # på /admin/profiles.
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', '0') == '1'
+    app.config['PROFILER_DIR'] = os.environ.get('PROFILER_DIR')
+    app.config['PROFILER_SAMPLE_RATE'] = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+    app.config['PROFILER_RATE_MODE'] = os.environ.get('PROFILER_RATE_MODE', 'sample')
+    app.config['PROFILER_SAMPLE_INTERVAL'] = float(os.environ.get('PROFILER_SAMPLE_INTERVAL', 5))
+    app.config['PROFILER_KEEP'] = int(os.environ.get('PROFILER_KEEP', 200))
+
+    # MEMORY: tracemalloc-snapshots tas av admin på /admin/memory. Med
+    # MEMORY_TRACKING=1 körs tracemalloc hela tiden (TRACE_FRAMES ramar per
+    # allokering) och varje request mäter sin minnestopp; requests över
+    # THRESHOLD_KB loggas med de rader som allokerade mest.
+    app.config['MEMORY_TRACKING'] = os.environ.get('MEMORY_TRACKING', '0') == '1'
+    app.config['MEMORY_TRACE_FRAMES'] = int(os.environ.get('MEMORY_TRACE_FRAMES', 10))
+    app.config['MEMORY_REQUEST_THRESHOLD_KB'] = float(os.environ.get('MEMORY_REQUEST_THRESHOLD_KB', 1024))
+    app.config['MEMORY_MAX_SNAPSHOTS'] = int(os.environ.get('MEMORY_MAX_SNAPSHOTS', 3))
+
+    # TRACING: Spans per request (routing, hooks, vy, SQL, mallar, JSON) med
+    # W3C-kompatibla id:n. SAMPLE_RATE (0-1) väljer requests; en inkommande
+    # traceparent med sampled-flagga följs alltid. Färdiga traces hamnar i en
+    # ringbuffert (BUFFER senaste) och, om TRACING_FILE är satt, i en JSONL-fil.
+    # Svaret har headern X-Trace-Id; vattenfallet visas på /admin/traces/<id>.
+    app.config['TRACING_ENABLED'] = os.environ.get('TRACING_ENABLED', '0') == '1'
+    app.config['TRACING_SAMPLE_RATE'] = float(os.environ.get('TRACING_SAMPLE_RATE', 1.0))
+    app.config['TRACING_BUFFER'] = int(os.environ.get('TRACING_BUFFER', 1000))
+    app.config['TRACING_FILE'] = os.environ.get('TRACING_FILE')
+    app.config['TRACING_MAX_SPANS'] = int(os.environ.get('TRACING_MAX_SPANS', 500))
+
+    # RATE_LIMIT: Token buckets för bud, validering och sök (reglerna finns i
+    # services/rate_limit.py). MAX_INFLIGHT = antal samtidiga requests per worker
+    # innan lågprioriterad trafik (bläddring/sök) börjar avvisas.
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    app.config['RATE_LIMIT_MAX_INFLIGHT'] = int(os.environ.get('RATE_LIMIT_MAX_INFLIGHT', 64))
+
+    # PASSWORD_HASH: Metod och kostnad för nya lösenordshashar (ändras den hashas
+    # lösenord om vid nästa inloggning), antal hashtrådar (standard: antal kärnor)
+    # och hur många jobb som får vänta innan login svarar 503.
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 4 * app.config['PASSWORD_HASH_WORKERS']))
+
+    # LOGIN_*: Max antal misslyckade inloggningar per e-post och per IP inom
+    # LOGIN_THROTTLE_WINDOW sekunder (glidande fönster) innan försök spärras.
+    app.config['LOGIN_MAX_FAILURES_EMAIL'] = int(os.environ.get('LOGIN_MAX_FAILURES_EMAIL', 5))
+    app.config['LOGIN_MAX_FAILURES_IP'] = int(os.environ.get('LOGIN_MAX_FAILURES_IP', 20))
+    app.config['LOGIN_THROTTLE_WINDOW'] = float(os.environ.get('LOGIN_THROTTLE_WINDOW', 15 * 60))
+
     # ============================================================
     # 3. INITIERA DATABASEN
     # ============================================================
     # init_db: Anropar funktionen som kopplar SQLAlchemy till appen och skapar tabellerna.
     init_db(app)
 
+    # Mätvärden först, så att latensen omfattar övriga tjänsters before_request
+    init_metrics(app)
+    init_slow_queries(app)
+    init_profiler(app)
+    init_memory(app)
+
     # ============================================================
     # 3.5. INITIERA FLASK-LOGIN
     # ============================================================
@@ -71,6 +250,43 @@ def skapa_app():
         user_repo = UserRepository()
         return user_repo.get_by_id(int(user_id))
 
+    # Lösenordshashning i en begränsad trådpool + spärr mot upprepade försök
+    init_passwords(app)
+
+    # ============================================================
+    # 3.6. INITIERA SIDCACHEN OCH BEGRÄNSAREN
+    # ============================================================
+    init_rate_limit(app)
+    init_page_cache(app)
+
+    # ============================================================
+    # 3.7. KOMPRIMERING OCH STATISKA FILER
+    # ============================================================
+    init_compression(app)
+    init_assets(app)
+    init_images(app)
+    init_uploads(app)
+
+    # ============================================================
+    # 3.8. BUFFRADE LIKES/DISLIKES
+    # ============================================================
+    init_reactions(app)
+
+    # ============================================================
+    # 3.9. HÄNDELSELOGG OCH BUDMOTOR (läget för pågående auktioner i minnet)
+    # ============================================================
+    init_event_log(app)
+    init_bid_engine(app)
+    init_idempotency(app)
+    init_bid_history(app)
+
+    # ============================================================
+    # 3.10. ÄNDRINGSFLÖDE (invalidering mellan workers), AUKTIONSINDEX OCH SPARADE SÖKNINGAR
+    # ============================================================
+    init_change_feed(app)
+    init_auction_index(app)
+    init_saved_searches(app)
+
     # ============================================================
     # 4. REGISTRERA BLUEPRINTS
     # ============================================================
@@ -83,6 +299,12 @@ def skapa_app():
     # Anropar hjälpfunktionen som definierar startsidor och huvud-rutter.
     create_routes(app)
 
+    # ============================================================
+    # 6. SPÅRNING OCH TRAFIKINSPELNING (valfria WSGI-lager, när alla vyer finns)
+    # ============================================================
+    init_tracing(app)
+    init_traffic_recorder(app)
+
     return app
 
 
@@ -124,10 +346,35 @@ def create_routes(app):
         return "<p>Hej Världen! Min första Flask-app!</p>"
 
     @app.route('/')
+    @cachad_sida(lambda: [TAGG_LISTA])
     def index():
         """Startsidan."""
         # render_template: Letar efter home.html i mappen 'templates' i roten
-        return render_template('home.html', titel='Välkommen')
+        index = hamta_auktionsindex()
+        antal = app.config['AUCTION_INDEX_WIDGET_SIZE']
+        return render_template('home.html', titel='Välkommen',
+                               slutar_snart=index.slutar_snart(antal),
+                               trendar=index.trendar(antal))
+
+    @app.route('/api/time')
+    def server_time():
+        """
+        Serverns aktuella tid i millisekunder (UTC, epoch).
+        Används av nedräkningarna i script.js för att korrigera klientens klocka.
+        """
+        svar = jsonify({'now': int(time.time() * 1000)})
+        svar.headers['Cache-Control'] = 'no-store'
+        return svar
+
+    @app.route('/metrics')
+    def metrics():
+        """Mätvärden i Prometheus textformat (för skrapning)."""
+        tillatna = app.config['METRICS_ALLOWED_IPS']
+        if tillatna and request.remote_addr not in tillatna:
+            abort(404)
+        svar = app.response_class(exportera(app), mimetype='text/plain; version=0.0.4')
+        svar.headers['Cache-Control'] = 'no-store'
+        return svar
 
 
 # ============================================================
@@ -0,0 +1,368 @@
+"""
+Skript som genererar en syntetisk databas i produktionsstorlek för lasttester.
+
+Startdatan i models/*.py är fyra auktioner och två användare, så prestanda
+med riktiga datamängder gick inte att återskapa lokalt. Detta skript fyller
+en SEPARAT databas med realistiskt skev data:
+
+- ZIPF-POPULÄRITET: Några få auktioner får de flesta buden och reaktionerna,
+  och några få användare lägger de flesta buden.
+- BUDRUSNING VID AVSLUT: Avslutade auktioner får sina bud koncentrerade
+  till slutet av budtiden.
+- SVENSKA titlar, beskrivningar, kategorier och namn.
+
+Samma --seed ger samma databas. Tidsstämplarna räknas från --nu (standard:
+dagens datum kl 00:00 UTC, så att det finns pågående auktioner). Ange --nu
+för en databas som är identisk oavsett dag.
+
+Datan skrivs med bulk-inserts i batchar och indexen skapas först när alla
+rader finns, vilket är mycket snabbare än att uppdatera dem rad för rad.
+
+Alla användare har lösenordet load123, utom admin@auction.com (admin123).
+(Lösenordshasharna är saltade och är därför det enda som skiljer mellan körningar.)
+
+Kör:
+    python generate_data.py --profil small
+    python generate_data.py --profil large --databas sqlite:///instance/large.db --ny
+    DATABASE_URL=sqlite:///instance/small.db python flask_app.py
+"""
+import argparse
+import bisect
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+# Profil -> antal rader per tabell
+PROFILER = {
+    'tiny': {'users': 200, 'auctions': 1_000, 'bids': 10_000, 'likes': 2_000},
+    'small': {'users': 5_000, 'auctions': 20_000, 'bids': 300_000, 'likes': 50_000},
+    'medium': {'users': 50_000, 'auctions': 200_000, 'bids': 4_000_000, 'likes': 1_000_000},
+    'large': {'users': 500_000, 'auctions': 1_000_000, 'bids': 20_000_000, 'likes': 5_000_000},
+}
+
+# Zipf-exponent för auktionernas och budgivarnas popularitet
+ZIPF_AUKTIONER = 0.9
+ZIPF_BUDGIVARE = 1.0
+
+# Kategori -> (vikt, typiskt utropspris, föremål)
+KATEGORIER = {
+    'Antikviteter': (14, 900, ['Klocka', 'Spegel', 'Byrå', 'Ljusstake', 'Kista', 'Pendyl']),
+    'Konst': (12, 2500, ['Oljemålning', 'Litografi', 'Akvarell', 'Skulptur', 'Etsning', 'Tavla']),
+    'Böcker': (8, 300, ['Bok', 'Atlas', 'Psalmbok', 'Uppslagsverk', 'Diktsamling', 'Karta']),
+    'Keramik': (9, 400, ['Vas', 'Skål', 'Fat', 'Kanna', 'Kopp', 'Urna']),
+    'Glas': (8, 500, ['Skål', 'Vas', 'Karaff', 'Glasfigur', 'Ljuslykta', 'Snapsglas']),
+    'Möbler': (12, 1800, ['Fåtölj', 'Matbord', 'Skänk', 'Bokhylla', 'Pinnstol', 'Sekretär']),
+    'Smycken': (10, 1200, ['Ring', 'Halsband', 'Brosch', 'Armband', 'Örhängen', 'Manschettknappar']),
+    'Design': (10, 1500, ['Lampa', 'Taklampa', 'Stol', 'Pall', 'Golvlampa', 'Matta']),
+    'Textil': (5, 350, ['Bonad', 'Duk', 'Rya', 'Gardin', 'Kudde', 'Löpare']),
+    'Leksaker': (5, 250, ['Docka', 'Plåtbil', 'Tågbana', 'Nalle', 'Dockskåp', 'Spel']),
+    'Frimärken & Mynt': (4, 200, ['Myntsamling', 'Frimärksalbum', 'Riksdaler', 'Minnesmynt', 'Sedel', 'Brev']),
+    'Teknik': (3, 600, ['Radio', 'Kamera', 'Skrivmaskin', 'Grammofon', 'Telefon', 'Projektor']),
+}
+
+ADJEKTIV = ['Vacker', 'Sällsynt', 'Äldre', 'Handgjord', 'Signerad', 'Välbevarad', 'Unik', 'Charmig',
+            'Elegant', 'Rustik', 'Originell', 'Praktfull', 'Liten', 'Stor', 'Gustaviansk', 'Nordisk']
+URSPRUNG = ['från 1800-talet', 'från 1920-talet', 'från 1950-talet', 'från 1960-talet', 'från 1970-talet',
+            '- Gustavsberg', '- Orrefors', '- Kosta', '- Rörstrand', '- Svenskt Tenn', '- Dalarna',
+            '- Skåne', '- Göteborg', '- Stockholm', '- Norrland', '- Gotland']
+SKICK = ['Mycket gott skick.', 'Gott skick med mindre bruksspår.', 'Nyskick.',
+         'Normalt slitage för åldern.', 'Renoverad.', 'Säljes i befintligt skick.']
+KALLA = ['Från ett dödsbo i', 'Inropad på auktion i', 'Har tillhört en samlare i', 'Funnen på en vind i',
+         'Släktklenod från']
+ORTER = ['Uppsala', 'Lund', 'Västerås', 'Örebro', 'Linköping', 'Umeå', 'Visby', 'Kalmar', 'Falun',
+         'Sundsvall', 'Jönköping', 'Karlstad', 'Växjö', 'Luleå', 'Malmö', 'Norrköping']
+
+FORNAMN = ['Anna', 'Erik', 'Maria', 'Lars', 'Karin', 'Johan', 'Sara', 'Anders', 'Emma', 'Per', 'Elin',
+           'Nils', 'Ingrid', 'Karl', 'Linnea', 'Oskar', 'Astrid', 'Gustav', 'Maja', 'Olof', 'Frida', 'Axel']
+EFTERNAMN = ['Andersson', 'Johansson', 'Karlsson', 'Nilsson', 'Eriksson', 'Larsson', 'Olsson', 'Persson',
+             'Svensson', 'Gustafsson', 'Pettersson', 'Jonsson', 'Lindberg', 'Lindqvist', 'Berg', 'Holm',
+             'Sandberg', 'Lundgren', 'Ekström', 'Wallin']
+
+
+def _zipf_kumulativ(antal, s):
+    """Kumulativa vikter 1/r^s för rang 1..antal (för bisect och random.choices)"""
+    kumulativ = []
+    summa = 0.0
+    for r in range(1, antal + 1):
+        summa += 1.0 / r ** s
+        kumulativ.append(summa)
+    return kumulativ
+
+
+def _fordela(rng, antal, vikter):
+    """Fördelar antal på vikterna med stokastisk avrundning (summan blir ungefär antal)"""
+    total = sum(vikter)
+    if not total:
+        return [0] * len(vikter)
+    resultat = []
+    for vikt in vikter:
+        forvantat = antal * vikt / total
+        heltal = int(forvantat)
+        resultat.append(heltal + (rng.random() < forvantat - heltal))
+    return resultat
+
+
+class _Skrivare:
+    """Buffrar rader per tabell och skriver dem med executemany i batchar"""
+
+    def __init__(self, conn, tabeller, batch):
+        self.conn = conn
+        self.tabeller = tabeller
+        self.batch = batch
+        self.buffertar = {namn: [] for namn in tabeller}
+        self.antal = {namn: 0 for namn in tabeller}
+
+    def lagg_till(self, tabell, rad, fore=()):
+        """Lägger till en rad. Tabellerna i fore skrivs först (främmande nycklar)."""
+        buffert = self.buffertar[tabell]
+        buffert.append(rad)
+        if len(buffert) >= self.batch:
+            for annan in fore:
+                self.skriv(annan)
+            self.skriv(tabell)
+
+    def skriv(self, tabell):
+        buffert = self.buffertar[tabell]
+        if buffert:
+            self.conn.execute(self.tabeller[tabell].insert(), buffert)
+            self.antal[tabell] += len(buffert)
+            buffert.clear()
+
+
+def _skapa_tabeller_utan_index(conn, metadata):
+    from sqlalchemy.schema import CreateTable
+    for tabell in metadata.sorted_tables:
+        conn.execute(CreateTable(tabell))
+
+
+def _skapa_index(conn, metadata):
+    for tabell in metadata.sorted_tables:
+        for index in tabell.indexes:
+            index.create(conn)
+
+
+def generera(databas, profil='small', seed=42, nu=None, batch=5000, ny=False, utskrift=print):
+    """
+    Genererar en syntetisk databas.
+
+    Args:
+        databas: SQLAlchemy-URL till måldatabasen
+        profil: Namn i PROFILER eller dict med antal per tabell
+        seed: Slumpfrö - samma seed (och nu) ger samma databas
+        nu: Tidpunkt som tidsstämplarna räknas från (standard: dagens datum 00:00 UTC)
+        batch: Rader per insert
+        ny: Ta bort befintliga tabeller först
+
+    Returns:
+        dict: Antal skrivna rader per tabell
+    """
+    from sqlalchemy import create_engine, event, inspect
+    from werkzeug.security import generate_password_hash
+
+    from database import db
+    # Modellerna måste vara importerade för att finnas i db.metadata
+    from models.user import User  # noqa: F401
+    from models.auction import Auction  # noqa: F401
+    from models.bid import Bid  # noqa: F401
+    from models.like import Like  # noqa: F401
+    from models.change import Change, ChangeConsumer  # noqa: F401
+
+    antal = PROFILER[profil] if isinstance(profil, str) else profil
+    rng = random.Random(seed)
+    if nu is None:
+        nu = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    engine = create_engine(databas)
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def _snabb_inlasning(dbapi_conn, _):
+            # Bara under genereringen - en krasch mitt i ger ändå en ofullständig databas
+            dbapi_conn.execute('PRAGMA journal_mode=MEMORY')
+            dbapi_conn.execute('PRAGMA synchronous=OFF')
+            dbapi_conn.execute('PRAGMA cache_size=-200000')
+
+    metadata = db.metadata
+    befintliga = inspect(engine).get_table_names()
+    if befintliga:
+        if not ny:
+            raise SystemExit(f'Databasen har redan tabeller ({", ".join(befintliga)}). Använd --ny för att ersätta dem.')
+        metadata.drop_all(engine)
+
+    tabeller = {t.name: t for t in metadata.sorted_tables}
+    start = time.perf_counter()
+
+    with engine.begin() as conn:
+        _skapa_tabeller_utan_index(conn, metadata)
+        skrivare = _Skrivare(conn, tabeller, batch)
+
+        # --- Användare ---
+        gemensam_hash = generate_password_hash('load123')
+        skrivare.lagg_till('users', {
+            'id': 1, 'email': 'admin@auction.com', 'password_hash': generate_password_hash('admin123'),
+            'first_name': 'Admin', 'last_name': 'Användare', 'is_admin': True, 'is_active': True,
+            'created_at': nu - timedelta(days=400), 'last_login': None,
+        })
+        for user_id in range(2, antal['users'] + 1):
+            fornamn = rng.choice(FORNAMN)
+            efternamn = rng.choice(EFTERNAMN)
+            skrivare.lagg_till('users', {
+                'id': user_id,
+                'email': f'{fornamn.lower()}.{efternamn.lower()}{user_id}@example.se'
+                         .replace('å', 'a').replace('ä', 'a').replace('ö', 'o'),
+                'password_hash': gemensam_hash,
+                'first_name': fornamn,
+                'last_name': efternamn,
+                'is_admin': False,
+                'is_active': True,
+                'created_at': nu - timedelta(seconds=rng.randrange(365 * 86400)),
+                'last_login': None,
+            })
+        skrivare.skriv('users')
+        utskrift(f"  👤 {skrivare.antal['users']:,} användare")
+
+        # --- Auktionernas tider och popularitet ---
+        namn = list(KATEGORIER)
+        kategorivikter = [KATEGORIER[k][0] for k in namn]
+        tider = []
+        for _ in range(antal['auctions']):
+            # 80 % har startat (de flesta redan avslutade), 20 % är kommande
+            start_tid = nu - timedelta(seconds=rng.randrange(-7 * 86400, 60 * 86400))
+            if rng.random() < 0.2:
+                start_tid = nu + timedelta(seconds=rng.randrange(1, 7 * 86400))
+            tider.append((start_tid, start_tid + timedelta(days=rng.choice((3, 5, 7, 7, 10, 14)))))
+
+        rang = list(range(antal['auctions']))
+        rng.shuffle(rang)
+        vikter = [0.0] * antal['auctions']
+        for r, index in enumerate(rang, start=1):
+            if tider[index][0] < nu:
+                vikter[index] = 1.0 / r ** ZIPF_AUKTIONER
+        antal_bud = _fordela(rng, antal['bids'], vikter)
+        antal_likes = _fordela(rng, antal['likes'], vikter)
+        del rang, vikter
+
+        budgivare = _zipf_kumulativ(antal['users'] - 1, ZIPF_BUDGIVARE)
+        budgivare_rang = list(range(2, antal['users'] + 1))
+        rng.shuffle(budgivare_rang)
+
+        # --- Auktioner, bud och reaktioner (auktion för auktion) ---
+        bid_id = 0
+        like_id = 0
+        steg = max(1, antal['auctions'] // 10)
+        for index, (start_tid, slut_tid) in enumerate(tider):
+            auction_id = index + 1
+            kategori = rng.choices(namn, weights=kategorivikter)[0]
+            _, typpris, foremal = KATEGORIER[kategori]
+            utrop = max(50, round(typpris * math.exp(rng.gauss(0, 0.7)), -1))
+
+            # Bud: stigande belopp, rusning mot slutet för avslutade auktioner
+            pris = None
+            senaste_budgivare = None
+            bud = []
+            budtid_slut = min(slut_tid, nu)
+            langd = (budtid_slut - start_tid).total_seconds()
+            if antal_bud[index] and langd > 0:
+                avslutad = slut_tid <= nu
+                offsets = sorted(
+                    langd * (1 - rng.random() ** 3) if avslutad else langd * rng.random()
+                    for _ in range(antal_bud[index])
+                )
+                pris = utrop
+                for offset in offsets:
+                    # Höjningar i storleksordning med utropet (inte med priset, som då växer exponentiellt)
+                    pris += max(10, round(utrop * rng.uniform(0.01, 0.05), -1))
+                    while True:
+                        user_id = budgivare_rang[bisect.bisect(budgivare, rng.random() * budgivare[-1])]
+                        if user_id != senaste_budgivare or antal['users'] < 3:
+                            break
+                    senaste_budgivare = user_id
+                    bid_id += 1
+                    bud.append({
+                        'id': bid_id, 'amount': pris, 'auction_id': auction_id, 'user_id': user_id,
+                        'created_at': start_tid + timedelta(seconds=offset),
+                    })
+
+            skrivare.lagg_till('auctions', {
+                'id': auction_id,
+                'title': f'{rng.choice(ADJEKTIV)} {rng.choice(foremal).lower()} {rng.choice(URSPRUNG)}',
+                'description': f'{rng.choice(SKICK)} {rng.choice(KALLA)} {rng.choice(ORTER)}. '
+                               f'Kategori: {kategori.lower()}.',
+                'category': kategori,
+                'starting_bid': utrop,
+                'current_bid': pris,
+                'start_time': start_tid,
+                'end_time': slut_tid,
+                'created_at': start_tid - timedelta(seconds=rng.randrange(3 * 86400)),
+                'is_active': True,
+                'image': 'default_auction.jpg',
+            })
+            # Auktionsraden läggs före sina bud, så att främmande nycklar alltid pekar på en skriven rad
+            for rad in bud:
+                skrivare.lagg_till('bids', rad, fore=('auctions',))
+
+            # Reaktioner: högst en per användare och auktion, mest likes
+            if antal_likes[index]:
+                for user_id in rng.sample(range(2, antal['users'] + 1), min(antal_likes[index], antal['users'] - 1)):
+                    like_id += 1
+                    skrivare.lagg_till('likes', {
+                        'id': like_id, 'is_like': rng.random() < 0.85, 'auction_id': auction_id,
+                        'user_id': user_id,
+                        'created_at': start_tid + timedelta(seconds=rng.randrange(max(1, int(langd)))),
+                    }, fore=('auctions',))
+
+            if auction_id % steg == 0:
+                utskrift(f"  🏛️ {auction_id:,}/{antal['auctions']:,} auktioner, {bid_id:,} bud, "
+                         f"{like_id:,} reaktioner ({time.perf_counter() - start:.0f} s)")
+
+        for tabell in ('auctions', 'bids', 'likes'):
+            skrivare.skriv(tabell)
+
+        # --- Index sist ---
+        index_start = time.perf_counter()
+        _skapa_index(conn, metadata)
+        utskrift(f"  🗂️ Index skapade på {time.perf_counter() - index_start:.0f} s")
+
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            conn.exec_driver_sql('ANALYZE')
+    engine.dispose()
+    return skrivare.antal
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generera en syntetisk databas för lasttester')
+    parser.add_argument('--profil', choices=PROFILER, default='small', help='Datamängd')
+    parser.add_argument('--databas', default=None,
+                        help='SQLAlchemy-URL (standard: sqlite:///instance/<profil>.db)')
+    parser.add_argument('--seed', type=int, default=42, help='Slumpfrö')
+    parser.add_argument('--nu', type=datetime.fromisoformat, default=None,
+                        help='Tidpunkt att räkna från, t.ex. 2025-01-01 (standard: idag 00:00 UTC)')
+    parser.add_argument('--batch', type=int, default=5000, help='Rader per insert')
+    parser.add_argument('--ny', action='store_true', help='Ersätt befintliga tabeller')
+    args = parser.parse_args()
+
+    databas = args.databas
+    if databas is None:
+        instans = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+        os.makedirs(instans, exist_ok=True)
+        databas = f"sqlite:///{os.path.join(instans, args.profil + '.db')}"
+
+    print("\n" + "=" * 50)
+    print(f"🧪 GENERERAR DATA - profil {args.profil} (seed {args.seed})")
+    print("=" * 50)
+    print(f"Databas: {databas}")
+    start = time.perf_counter()
+    antal = generera(databas, args.profil, seed=args.seed, nu=args.nu, batch=args.batch, ny=args.ny)
+    print("-" * 50)
+    for tabell, n in antal.items():
+        if n:
+            print(f"  {tabell:<10} {n:>12,}")
+    print(f"✅ Klart på {time.perf_counter() - start:.0f} s")
+    print(f"   Starta appen med DATABASE_URL={databas}")
+    print("=" * 50 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ from .user import User, skapa_start_users
 from .auction import Auction, skapa_start_auctions
 from .bid import Bid, skapa_start_bids
 from .like import Like, skapa_start_likes
+from .change import Change, ChangeConsumer
+from .saved_search import SavedSearch, SavedSearchMatch
 # from .bostad import Bostad, skapa_start_bostader  # Removed - not needed for auction site
 
 __all__ = [
@@ -14,6 +16,10 @@ __all__ = [
     'Auction',
     'Bid',
     'Like',
+    'Change',
+    'ChangeConsumer',
+    'SavedSearch',
+    'SavedSearchMatch',
     # 'Bostad',  # Removed
     'skapa_start_users',
     'skapa_start_auctions',
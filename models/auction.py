@@ -84,11 +84,19 @@ class Auction(db.Model):
     
     @property
     def image_url(self):
-        """Returnerar URL till auktionens bild"""
-        from flask import url_for
-        if self.image:
-            return url_for('static', filename=f'images/{self.image}')
-        return url_for('static', filename='images/default_auction.jpg')
+        """Returnerar URL till auktionens bild (full storlek)"""
+        return self.image_url_for('full')
+    
+    def image_url_for(self, size='full'):
+        """Returnerar URL till auktionens bild i vald storlek ('thumb', 'medium' eller 'full')"""
+        from services.images import bild_url
+        return bild_url(self.image, size)
+    
+    @property
+    def image_srcset(self):
+        """Returnerar srcset med alla bildstorlekar ('' för gamla bilder utan varianter)"""
+        from services.images import bild_srcset
+        return bild_srcset(self.image)
     
     @classmethod
     def from_dict(cls, data):
@@ -28,6 +28,8 @@ class Bid(db.Model):
     __table_args__ = (
         db.Index('idx_auction_amount', 'auction_id', 'amount'),
         db.Index('idx_auction_created', 'auction_id', 'created_at'),
+        # Markörbaserad budhistorik (after_id/before_id)
+        db.Index('idx_auction_bid_id', 'auction_id', 'id'),
     )
     
     def __repr__(self):
@@ -0,0 +1,48 @@
+# models/change.py
+"""
+🔔 CHANGE MODEL - Ändringsflöde (change data capture) mellan processer
+"""
+from database import db
+from datetime import datetime
+
+
+class Change(db.Model):
+    """
+    En rad per ändrad rad i auctions/bids/likes/users/saved_searches.
+    Skrivs i samma transaktion som själva ändringen (se services/change_feed.py).
+    """
+    __tablename__ = 'changes'
+
+    # Löpnummer - AUTOINCREMENT så att ett nummer aldrig återanvänds
+    seq = db.Column(db.Integer, primary_key=True)
+
+    # Vad som ändrades
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=True)      # None om id:t inte är känt (t.ex. upsert)
+    operation = db.Column(db.String(10), nullable=False)  # 'insert', 'update' eller 'delete'
+    auction_id = db.Column(db.Integer, nullable=True)  # Berörd auktion, för invalidering
+
+    # Vilken process som skrev ändringen (så att den kan hoppa över sina egna)
+    origin = db.Column(db.String(32), nullable=False)
+
+    # Tidsstämpel
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<Change {self.seq} {self.operation} {self.table_name}:{self.row_id}>'
+
+
+class ChangeConsumer(db.Model):
+    """Senast bearbetade seq för en varaktig konsument (fortsätter där den slutade)"""
+    __tablename__ = 'change_consumers'
+
+    name = db.Column(db.String(100), primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ChangeConsumer {self.name} @ {self.last_seq}>'
@@ -0,0 +1,68 @@
+# models/saved_search.py
+"""
+🔎 SAVED SEARCH MODEL - Sparade sökningar och deras träffar
+"""
+from database import db
+from datetime import datetime
+
+
+class SavedSearch(db.Model):
+    """
+    En användares sparade sökning: nyckelord, kategori och prisintervall.
+    Nya auktioner matchas mot alla sparade sökningar (se services/saved_searches.py).
+    """
+    __tablename__ = 'saved_searches'
+
+    # Primärnyckel
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Villkor (tomma villkor gäller alla auktioner, men minst ett måste finnas)
+    keywords = db.Column(db.String(200), nullable=False, default='')  # Alla ord måste finnas i titel eller beskrivning
+    category = db.Column(db.String(100), nullable=True)
+    min_price = db.Column(db.Float, nullable=True)
+    max_price = db.Column(db.Float, nullable=True)
+
+    # Tidsstämpel
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Främmande nyckel
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+
+    # Relationer
+    matches = db.relationship('SavedSearchMatch', backref='saved_search', lazy=True, cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<SavedSearch {self.id} "{self.keywords}" av user {self.user_id}>'
+
+
+class SavedSearchMatch(db.Model):
+    """
+    En ny auktion som matchade en sparad sökning. Rader utan notified_at är
+    kön av notifieringar som inte har skickats än.
+    """
+    __tablename__ = 'saved_search_matches'
+
+    # Primärnyckel
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Främmande nycklar (user_id dubbleras för att kön ska kunna läsas per användare)
+    saved_search_id = db.Column(db.Integer, db.ForeignKey('saved_searches.id'), nullable=False)
+    auction_id = db.Column(db.Integer, db.ForeignKey('auctions.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    # Tidsstämplar
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    notified_at = db.Column(db.DateTime, nullable=True)  # None = väntar på notifiering
+
+    # Relationer
+    auction = db.relationship('Auction')
+
+    __table_args__ = (
+        # En auktion matchar en sökning högst en gång, även om den bearbetas igen
+        db.UniqueConstraint('saved_search_id', 'auction_id', name='unique_saved_search_auction'),
+        db.Index('idx_saved_search_match_queue', 'notified_at', 'id'),
+        db.Index('idx_saved_search_match_user', 'user_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<SavedSearchMatch sökning {self.saved_search_id} auction {self.auction_id}>'
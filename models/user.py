@@ -35,8 +35,9 @@ class User(UserMixin, db.Model):
     likes = db.relationship('Like', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hashar och sparar lösenord"""
-        self.password_hash = generate_password_hash(password)
+        """Hashar och sparar lösenord (i hashpoolen med appens metod, se services/passwords.py)"""
+        from services.passwords import hasha_losenord
+        self.password_hash = hasha_losenord(password)
     
     def check_password(self, password):
         """Kontrollerar lösenord mot hash"""
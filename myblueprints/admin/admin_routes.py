@@ -1,12 +1,25 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, abort, current_app, stream_with_context, send_file
 from flask_login import login_required, current_user
 from . import admin_bp
 from myblueprints.auth import admin_required
 from models.auction import Auction
 from models.bid import Bid
 from models.user import User  # Importera User-modellen
+from models.saved_search import SavedSearchMatch
 from database import db
-from datetime import datetime
+from datetime import datetime, timedelta
+from services.page_cache import invalidera_auktion
+from services.bid_engine import glom_auktion
+from services.event_log import AUKTION_FORLANGD, AUKTION_STANGD, BUD_TILLBAKA, hamta_logg, logga_handelse
+from services.uploads import UppladdningsFel, ta_emot_bild
+from services.exports import ExportFel, FORMAT, strom, tolka_datum
+from services.slow_queries import hamta_langsamma
+from services.profiler import hamta_profiler
+from services.memory import hamta_minne, rss_mb
+from services.tracing import hamta_insamlare, vattenfall
+import os
+import re
+import tracemalloc
 
 @admin_bp.route('/dashboard')
 @login_required
@@ -19,7 +32,7 @@ def dashboard():
     total_users = User.query.count()  # Använd modellen för att räkna användare
     
     recent_auctions = Auction.query.order_by(Auction.created_at.desc()).limit(5).all()
-    recent_bids = Bid.query.order_by(Bid.bid_time.desc()).limit(5).all()
+    recent_bids = Bid.query.order_by(Bid.created_at.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html',
                          total_auctions=total_auctions,
@@ -28,3 +41,420 @@ def dashboard():
                          total_users=total_users,
                          recent_auctions=recent_auctions,
                          recent_bids=recent_bids)
+
+
+def _categories():
+    """Existing auction categories, for the category suggestions in the forms"""
+    return sorted(c for (c,) in db.session.query(Auction.category).distinct() if c)
+
+
+def _starting_bid(value):
+    """Starting bid from the form, or None if it is not a positive finite number"""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return amount if 0 < amount < float('inf') else None
+
+
+def _uploaded_image():
+    """
+    The uploaded image ('image' field) streamed to disk, or None if no file was chosen.
+    Raises UppladdningsFel for files that are not images.
+    """
+    image_file = request.files.get('image')
+    if image_file is None or not image_file.filename:
+        return None
+    return ta_emot_bild(image_file)
+
+
+@admin_bp.route('/auctions')
+@login_required
+@admin_required
+def manage_auctions():
+    """List all auctions with edit and delete actions"""
+    auctions = Auction.query.order_by(Auction.created_at.desc()).all()
+    return render_template('admin/manage_auctions.html', auctions=auctions)
+
+
+@admin_bp.route('/auctions/new', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def create_auction():
+    """Create a new auction (starts immediately), optionally with an image"""
+    if request.method == 'POST':
+        title = request.form.get('title', '').strip()
+        description = request.form.get('description', '').strip()
+        category = request.form.get('category', '').strip()
+        starting_bid = _starting_bid(request.form.get('starting_bid'))
+        duration_hours = request.form.get('duration_hours', 24, type=int)
+
+        if not all([title, description, category]):
+            flash('All fields are required.', 'error')
+        elif starting_bid is None:
+            flash('Starting bid must be greater than 0.', 'error')
+        elif not duration_hours or not 0 < duration_hours <= 24 * 30:
+            flash('Duration must be between 1 hour and 30 days.', 'error')
+        else:
+            try:
+                image = _uploaded_image()
+            except UppladdningsFel as e:
+                flash(str(e), 'error')
+            else:
+                auction = Auction(
+                    title=title,
+                    description=description,
+                    category=category,
+                    starting_bid=starting_bid,
+                    end_time=datetime.utcnow() + timedelta(hours=duration_hours),
+                )
+                if image:
+                    auction.image = image
+                db.session.add(auction)
+                db.session.commit()
+                invalidera_auktion(auction.id)
+                flash(f'Auction "{title}" created successfully!', 'success')
+                return redirect(url_for('admin.manage_auctions'))
+
+    return render_template('admin/create_auction.html', categories=_categories())
+
+
+@admin_bp.route('/auctions/<int:auction_id>/edit', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def edit_auction(auction_id):
+    """
+    Edit title, description, category, image and (before the first bid) the starting bid.
+    The admin can also close the auction or extend it by extend_hours; both are logged as events.
+    """
+    auction = db.session.get(Auction, auction_id)
+    if auction is None:
+        flash('Auction not found.', 'error')
+        return redirect(url_for('admin.manage_auctions'))
+
+    if request.method == 'POST':
+        title = request.form.get('title', '').strip()
+        description = request.form.get('description', '').strip()
+        category = request.form.get('category', '').strip()
+        if not all([title, description, category]):
+            flash('All fields are required.', 'error')
+            return render_template('admin/edit_auction.html', auction=auction, categories=_categories())
+
+        # The starting bid can only change before the first bid
+        starting_bid = None
+        has_bids = db.session.query(Bid.id).filter_by(auction_id=auction_id).first() is not None
+        if not has_bids and 'starting_bid' in request.form:
+            starting_bid = _starting_bid(request.form.get('starting_bid'))
+            if starting_bid is None:
+                flash('Starting bid must be greater than 0.', 'error')
+                return render_template('admin/edit_auction.html', auction=auction, categories=_categories())
+
+        extend_hours = request.form.get('extend_hours', 0, type=int) or 0
+        if not 0 <= extend_hours <= 24 * 30:
+            flash('An auction can be extended by at most 30 days at a time.', 'error')
+            return render_template('admin/edit_auction.html', auction=auction, categories=_categories())
+        close = request.form.get('close') == '1' and auction.is_active
+
+        try:
+            image = _uploaded_image()
+        except UppladdningsFel as e:
+            flash(str(e), 'error')
+            return render_template('admin/edit_auction.html', auction=auction, categories=_categories())
+        if image:
+            auction.image = image
+        if starting_bid is not None:
+            auction.starting_bid = starting_bid
+
+        auction.title = title
+        auction.description = description
+        auction.category = category
+        if extend_hours:
+            # Ended auctions are extended from now, running ones from their current end time
+            auction.end_time = max(auction.end_time, datetime.utcnow()) + timedelta(hours=extend_hours)
+        if close:
+            auction.is_active = False
+        db.session.commit()
+
+        if extend_hours:
+            logga_handelse(AUKTION_FORLANGD, auction.id, varde=(auction.end_time - datetime(1970, 1, 1)).total_seconds())
+        if close:
+            logga_handelse(AUKTION_STANGD, auction.id)
+        invalidera_auktion(auction.id)
+        if extend_hours or close:
+            glom_auktion(auction.id)
+        flash(f'Auction "{auction.title}" updated successfully!', 'success')
+        return redirect(url_for('admin.manage_auctions'))
+
+    return render_template('admin/edit_auction.html', auction=auction, categories=_categories())
+
+
+@admin_bp.route('/auctions/<int:auction_id>/delete', methods=['POST'])
+@login_required
+@admin_required
+def delete_auction(auction_id):
+    """Delete an auction with its bids, likes and saved-search matches; logged as a close"""
+    auction = db.session.get(Auction, auction_id)
+    if auction is None:
+        flash('Auction not found.', 'error')
+        return redirect(url_for('admin.manage_auctions'))
+
+    title = auction.title
+    SavedSearchMatch.query.filter_by(auction_id=auction_id).delete()
+    db.session.delete(auction)  # bids and likes follow via cascade
+    db.session.commit()
+    logga_handelse(AUKTION_STANGD, auction_id)
+    invalidera_auktion(auction_id)
+    glom_auktion(auction_id)
+    flash(f'Auction "{title}" and all its bids deleted successfully!', 'success')
+    return redirect(url_for('admin.manage_auctions'))
+
+
+@admin_bp.route('/bids')
+@login_required
+@admin_required
+def manage_bids():
+    """List all bids, newest first, with a delete action"""
+    bids = Bid.query.order_by(Bid.created_at.desc()).all()
+    return render_template('admin/manage_bids.html', bids=bids)
+
+
+@admin_bp.route('/bids/<int:bid_id>/delete', methods=['POST'])
+@login_required
+@admin_required
+def delete_bid(bid_id):
+    """Retract a bid and recompute the auction's current bid from the event log"""
+    bid = db.session.get(Bid, bid_id)
+    if bid is None:
+        flash('Bid not found.', 'error')
+        return redirect(url_for('admin.manage_bids'))
+
+    auction = bid.auction
+    db.session.delete(bid)
+    db.session.commit()
+    logga_handelse(BUD_TILLBAKA, auction.id, bid_id=bid_id)
+
+    event_log = hamta_logg()
+    if event_log is not None:
+        auction.current_bid = event_log.projektion(auction.id).current_bid or auction.starting_bid
+    else:
+        highest = db.session.query(db.func.max(Bid.amount)).filter_by(auction_id=auction.id).scalar()
+        auction.current_bid = highest or auction.starting_bid
+    db.session.commit()
+    invalidera_auktion(auction.id)
+    glom_auktion(auction.id)
+    flash('Bid deleted successfully and auction updated!', 'success')
+    return redirect(url_for('admin.manage_bids'))
+
+
+@admin_bp.route('/auctions/images', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_upload_images():
+    """
+    Bulk upload of auction images for catalogue days.
+    Each file name starts with the auction id (e.g. 12.jpg or 12_front.jpg),
+    the same id mapping that add_images_to_auctions.py uses.
+    """
+    if request.method == 'POST':
+        files = [f for f in request.files.getlist('images') if f.filename]
+        if not files:
+            flash('Choose at least one image.', 'error')
+            return redirect(url_for('admin.bulk_upload_images'))
+
+        updated = []
+        errors = []
+        for image_file in files:
+            filename = os.path.basename(image_file.filename)
+            match = re.match(r'(\d+)', filename)
+            if not match:
+                errors.append(f'{filename}: file name must start with the auction id.')
+                continue
+            auction = db.session.get(Auction, int(match.group(1)))
+            if auction is None:
+                errors.append(f'{filename}: auction {match.group(1)} not found.')
+                continue
+            try:
+                auction.image = ta_emot_bild(image_file)
+            except UppladdningsFel as e:
+                errors.append(str(e))
+                continue
+            updated.append(auction.id)
+
+        db.session.commit()
+        for auction_id in updated:
+            invalidera_auktion(auction_id)
+
+        if updated:
+            flash(f'Uploaded images for {len(updated)} auction(s). Thumbnails are being generated.', 'success')
+        for error in errors:
+            flash(error, 'error')
+        return redirect(url_for('admin.bulk_upload_images'))
+
+    return render_template('admin/upload_images.html')
+
+
+@admin_bp.route('/export/<kind>.<fmt>')
+@login_required
+@admin_required
+def export(kind, fmt):
+    """
+    Stream auctions, bids or users as CSV or JSONL (e.g. /admin/export/bids.csv).
+    Filters: ?from=2024-01-01&to=2024-02-01 (created_at, 'to' exclusive),
+    ?category=... and ?auction_id=... (not for users).
+    """
+    try:
+        chunks = strom(
+            kind,
+            fmt,
+            fran=tolka_datum(request.args.get('from')),
+            till=tolka_datum(request.args.get('to')),
+            kategori=request.args.get('category') or None,
+            auction_id=request.args.get('auction_id', type=int),
+            batch=current_app.config.get('EXPORT_BATCH_SIZE', 1000),
+        )
+    except ExportFel as e:
+        abort(400, description=str(e))
+
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    response = current_app.response_class(stream_with_context(chunks), mimetype=FORMAT[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@admin_bp.route('/slow-queries', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def slow_queries():
+    """Slowest SQL statement shapes by total time, with their query plans. POST resets the list."""
+    log = hamta_langsamma()
+    if request.method == 'POST':
+        log.nollstall()
+        flash('Slow-query statistics reset.', 'success')
+        return redirect(url_for('admin.slow_queries'))
+    return render_template('admin/slow_queries.html',
+                           shapes=log.topplista(request.args.get('limit', 50, type=int)),
+                           total=log.antal,
+                           threshold_ms=log.troskel * 1000)
+
+
+def _profiler_or_404():
+    profiler = hamta_profiler()
+    if profiler is None:
+        abort(404, description='The profiler is disabled (PROFILER_ENABLED=0).')
+    return profiler
+
+
+@admin_bp.route('/profiles')
+@login_required
+@admin_required
+def profiles():
+    """Recent request profiles grouped by endpoint (?route=<endpoint> shows one endpoint)"""
+    profiler = _profiler_or_404()
+    by_endpoint = {}
+    for meta in profiler.lista(endpoint=request.args.get('route') or None):
+        by_endpoint.setdefault(meta['endpoint'], []).append(meta)
+    return render_template('admin/profiles.html',
+                           by_endpoint=by_endpoint,
+                           sample_rate=profiler.sample_rate)
+
+
+@admin_bp.route('/profiles/<profile_id>')
+@login_required
+@admin_required
+def profile_detail(profile_id):
+    """Top functions (cProfile) and hottest sampled stacks for one profile"""
+    summary = _profiler_or_404().sammanfattning(profile_id)
+    if summary is None:
+        abort(404)
+    return render_template('admin/profile_detail.html', **summary)
+
+
+@admin_bp.route('/profiles/<profile_id>.<fmt>')
+@login_required
+@admin_required
+def profile_download(profile_id, fmt):
+    """Download the raw profile: .pstats (cProfile) or .folded (collapsed stacks for flame graphs)"""
+    if fmt not in ('pstats', 'folded'):
+        abort(404)
+    path = _profiler_or_404().sokvag(profile_id, fmt)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=f'{profile_id}.{fmt}',
+                     mimetype='text/plain' if fmt == 'folded' else 'application/octet-stream')
+
+
+@admin_bp.route('/memory')
+@login_required
+@admin_required
+def memory():
+    """tracemalloc status, per-route allocation peaks and a diff of two snapshots (?from=&to=, default the last two)"""
+    diagnostics = hamta_minne()
+    rss, peak_rss = rss_mb()
+    traced = tracemalloc.get_traced_memory() if diagnostics.aktiv else None
+    return render_template('admin/memory.html',
+                           tracing=diagnostics.aktiv,
+                           traced_kb=[round(v / 1024, 1) for v in traced] if traced else None,
+                           rss_mb=rss,
+                           peak_rss_mb=peak_rss,
+                           tracking=current_app.config.get('MEMORY_TRACKING', False),
+                           threshold_kb=diagnostics.troskel / 1024,
+                           over_threshold=diagnostics.over_troskel,
+                           routes=diagnostics.routes(),
+                           snapshots=diagnostics.snapshots(),
+                           diff=diagnostics.jamfor(request.args.get('from', type=int),
+                                                   request.args.get('to', type=int)))
+
+
+@admin_bp.route('/memory/<action>', methods=['POST'])
+@login_required
+@admin_required
+def memory_action(action):
+    """snapshot: take a tracemalloc snapshot, start/stop: toggle tracing, reset: clear route statistics"""
+    diagnostics = hamta_minne()
+    if action == 'snapshot':
+        snapshot_id = diagnostics.ta_snapshot()
+        flash(f'Snapshot #{snapshot_id} taken.', 'success')
+    elif action == 'start':
+        diagnostics.starta()
+        flash('tracemalloc started.', 'success')
+    elif action == 'stop':
+        if current_app.config.get('MEMORY_TRACKING'):
+            flash('MEMORY_TRACKING is on - tracemalloc keeps running.', 'warning')
+        else:
+            diagnostics.stoppa()
+            flash('tracemalloc stopped.', 'success')
+    elif action == 'reset':
+        diagnostics.nollstall()
+        flash('Route statistics reset.', 'success')
+    else:
+        abort(404)
+    return redirect(url_for('admin.memory'))
+
+
+@admin_bp.route('/traces')
+@login_required
+@admin_required
+def traces():
+    """Recent traces; ?trace_id=... (e.g. from the X-Trace-Id header) jumps to its waterfall"""
+    collector = hamta_insamlare()
+    if collector is None:
+        abort(404, description='Tracing is disabled (TRACING_ENABLED=0).')
+    trace_id = (request.args.get('trace_id') or '').strip().lower()
+    if trace_id:
+        return redirect(url_for('admin.trace_detail', trace_id=trace_id))
+    return render_template('admin/traces.html', traces=collector.senaste())
+
+
+@admin_bp.route('/traces/<trace_id>')
+@login_required
+@admin_required
+def trace_detail(trace_id):
+    """Waterfall view of all spans in one trace"""
+    collector = hamta_insamlare()
+    if collector is None or not re.fullmatch(r'[0-9a-f]{32}', trace_id):
+        abort(404)
+    spans = vattenfall(collector.hamta(trace_id))
+    if not spans:
+        abort(404, description='Trace not found (it may have left the buffer).')
+    return render_template('admin/trace_detail.html', trace_id=trace_id, spans=spans)
@@ -1,91 +1,121 @@
-from flask import render_template, request, jsonify, flash, redirect, url_for
+from flask import render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from models.auction import Auction
 from models.bid import Bid
-from models.like import Like
 from models.user import User
+from models.saved_search import SavedSearch, SavedSearchMatch
 from database import db
 from datetime import datetime
+from services.page_cache import cachad_sida, invalidera_auktion, tagg_auktion, TAGG_LISTA
+from services.reactions import hamta_reaktioner
+from services.auction_index import hamta_auktionsindex, registrera_like
+from services.saved_searches import hamta_sparade_sokningar
+from services.auction_summary import hamta_sammanfattningar, tolka_ids, versionstoken
 from . import auctions_bp
 
+# Sorts served from services/auction_index.py
+INDEX_SORTS = ('ending_soon', 'trending')
+
+
+def _auctions_from_index(sort_by, category):
+    """The first AUCTION_INDEX_PAGE_SIZE ongoing auctions in index order"""
+    index = hamta_auktionsindex()
+    lista = index.slutar_snart if sort_by == 'ending_soon' else index.trendar
+    ids = [post.id for post in lista(current_app.config['AUCTION_INDEX_PAGE_SIZE'], category=category or None)]
+    if not ids:
+        return []
+    per_id = {auction.id: auction for auction in Auction.query.filter(Auction.id.in_(ids))}
+    return [per_id[auction_id] for auction_id in ids if auction_id in per_id]
+
 @auctions_bp.route('/')
+@cachad_sida(lambda: [TAGG_LISTA])
 def browse_auctions():
     """Browse all auctions with filtering and search"""
     # Get query parameters
     search_query = request.args.get('search', '').strip()
     category = request.args.get('category', '')
     status = request.args.get('status', 'all')  # all, active, upcoming, ended
-    sort_by = request.args.get('sort', 'end_time')  # end_time, created_at, current_bid
+    sort_by = request.args.get('sort', 'end_time')  # end_time, created_at, current_bid, ending_soon, trending
+    
+    # Ending soon and trending only list ongoing auctions
+    if sort_by in INDEX_SORTS:
+        status = 'active'
     
-    # Start with base query
-    query = Auction.query
+    if sort_by in INDEX_SORTS and not search_query:
+        # Fast path: order from the in-memory auction index, load only the shown auctions
+        auctions = _auctions_from_index(sort_by, category)
+    else:
+        # Start with base query
+        query = Auction.query
     
-    # Apply search filter
-    if search_query:
-        query = query.filter(
-            db.or_(
-                Auction.title.ilike(f'%{search_query}%'),
-                Auction.description.ilike(f'%{search_query}%')
+        # Apply search filter
+        if search_query:
+            query = query.filter(
+                db.or_(
+                    Auction.title.ilike(f'%{search_query}%'),
+                    Auction.description.ilike(f'%{search_query}%')
+                )
             )
-        )
     
-    # Apply category filter
-    if category:
-        query = query.filter(Auction.category == category)
-    
-    # Apply status filter
-    now = datetime.utcnow()
-    if status == 'active':
-        query = query.filter(
-            Auction.start_time <= now,
-            Auction.end_time > now,
-            Auction.is_active == True
-        )
-    elif status == 'upcoming':
-        query = query.filter(
-            Auction.start_time > now,
-            Auction.is_active == True
-        )
-    elif status == 'ended':
-        query = query.filter(
-            db.or_(
-                Auction.end_time <= now,
-                Auction.is_active == False
+        # Apply category filter
+        if category:
+            query = query.filter(Auction.category == category)
+    
+        # Apply status filter
+        now = datetime.utcnow()
+        if status == 'active':
+            query = query.filter(
+                Auction.start_time <= now,
+                Auction.end_time > now,
+                Auction.is_active == True
+            )
+        elif status == 'upcoming':
+            query = query.filter(
+                Auction.start_time > now,
+                Auction.is_active == True
+            )
+        elif status == 'ended':
+            query = query.filter(
+                db.or_(
+                    Auction.end_time <= now,
+                    Auction.is_active == False
+                )
             )
-        )
     
-    # Apply sorting
-    if sort_by == 'end_time':
-        query = query.order_by(Auction.end_time.asc())
-    elif sort_by == 'created_at':
-        query = query.order_by(Auction.created_at.desc())
-    elif sort_by == 'current_bid':
-        query = query.order_by(Auction.current_bid.desc().nullslast())
+        # Apply sorting
+        if sort_by == 'end_time':
+            query = query.order_by(Auction.end_time.asc())
+        elif sort_by == 'created_at':
+            query = query.order_by(Auction.created_at.desc())
+        elif sort_by == 'current_bid':
+            query = query.order_by(Auction.current_bid.desc().nullslast())
+        elif sort_by in INDEX_SORTS:
+            query = query.order_by(Auction.end_time.asc())
     
-    auctions = query.all()
+        auctions = query.all()
+        if sort_by == 'trending':
+            index = hamta_auktionsindex()
+            auctions.sort(key=lambda a: -index.poang(a.id))
     
     # Get all categories for filter dropdown
     categories = db.session.query(Auction.category).distinct().all()
     categories = [cat[0] for cat in categories if cat[0]]
     
-    # Add like/dislike counts and user reactions
+    # Add like/dislike counts and user reactions (buffered reactions included)
+    reactions = hamta_reaktioner()
     auction_data = []
     for auction in auctions:
+        like_count, dislike_count = reactions.antal(auction)
         auction_info = {
             'auction': auction,
-            'like_count': auction.like_count,
-            'dislike_count': auction.dislike_count,
+            'like_count': like_count,
+            'dislike_count': dislike_count,
             'user_reaction': None
         }
         
         # Get user's reaction if logged in
         if current_user.is_authenticated:
-            user_like = Like.query.filter_by(
-                user_id=current_user.id,
-                auction_id=auction.id
-            ).first()
-            if user_like:
-                auction_info['user_reaction'] = 'like' if user_like.is_like else 'dislike'
+            auction_info['user_reaction'] = reactions.anvandarreaktion(current_user.id, auction.id)
         
         auction_data.append(auction_info)
     
@@ -98,6 +128,7 @@ def browse_auctions():
                          current_sort=sort_by)
 
 @auctions_bp.route('/<int:auction_id>')
+@cachad_sida(lambda auction_id: [tagg_auktion(auction_id)])
 def auction_detail(auction_id):
     """View detailed information about a specific auction"""
     auction = Auction.query.get_or_404(auction_id)
@@ -116,19 +147,14 @@ def auction_detail(auction_id):
         order_by(Bid.created_at.desc()).\
         limit(10).all()
     
-    # Get like/dislike counts
-    like_count = auction.like_count
-    dislike_count = auction.dislike_count
+    # Get like/dislike counts (buffered reactions included)
+    reactions = hamta_reaktioner()
+    like_count, dislike_count = reactions.antal(auction)
     
     # Get user's reaction if logged in
     user_reaction = None
     if current_user.is_authenticated:
-        user_like = Like.query.filter_by(
-            user_id=current_user.id,
-            auction_id=auction_id
-        ).first()
-        if user_like:
-            user_reaction = 'like' if user_like.is_like else 'dislike'
+        user_reaction = reactions.anvandarreaktion(current_user.id, auction_id)
     
     return render_template('auctions/detail.html',
                          auction=auction,
@@ -144,11 +170,11 @@ def toggle_like(auction_id):
     """Toggle like for an auction"""
     auction = Auction.query.get_or_404(auction_id)
     
-    like_obj, action = Like.toggle_like(current_user.id, auction_id, True)
-    
-    # Get updated counts
-    like_count = auction.like_count
-    dislike_count = auction.dislike_count
+    # Toggled in memory and written to the database in the background
+    action, like_count, dislike_count = hamta_reaktioner().vaxla(current_user.id, auction_id, True)
+    invalidera_auktion(auction_id)
+    if action != 'deleted':
+        registrera_like(auction_id)
     
     if request.headers.get('Content-Type') == 'application/json':
         return jsonify({
@@ -168,11 +194,9 @@ def toggle_dislike(auction_id):
     """Toggle dislike for an auction"""
     auction = Auction.query.get_or_404(auction_id)
     
-    like_obj, action = Like.toggle_like(current_user.id, auction_id, False)
-    
-    # Get updated counts
-    like_count = auction.like_count
-    dislike_count = auction.dislike_count
+    # Toggled in memory and written to the database in the background
+    action, like_count, dislike_count = hamta_reaktioner().vaxla(current_user.id, auction_id, False)
+    invalidera_auktion(auction_id)
     
     if request.headers.get('Content-Type') == 'application/json':
         return jsonify({
@@ -186,6 +210,33 @@ def toggle_dislike(auction_id):
     flash(f"{'Disliked' if action != 'deleted' else 'Removed dislike from'} {auction.title}", 'success')
     return redirect(url_for('auctions_bp.auction_detail', auction_id=auction_id))
 
+@auctions_bp.route('/summary')
+def auction_summary():
+    """
+    API endpoint for refreshing many auction cards in one request.
+    ?ids=1,2,3 returns price, bid count, reactions, status and end time per auction.
+    Supports If-None-Match with the returned ETag.
+    """
+    try:
+        ids = tolka_ids(request.args.get('ids', ''))
+    except ValueError:
+        max_ids = current_app.config.get('AUCTION_SUMMARY_MAX_IDS', 200)
+        return jsonify({'error': f'ids must be at most {max_ids} comma-separated integers'}), 400
+
+    summaries = hamta_sammanfattningar(ids)
+    token = versionstoken(summaries)
+    # Compression appends "-<encoding>" to the ETag, so match on the token part
+    for etag in request.if_none_match.as_set(include_weak=True):
+        if etag.split('-', 1)[0] == token:
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+    response = jsonify({'auctions': summaries})
+    response.set_etag(token, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @auctions_bp.route('/categories')
 def get_categories():
     """API endpoint to get all auction categories"""
@@ -219,3 +270,63 @@ def search_auctions():
         })
     
     return jsonify({'auctions': results})
+
+def _price_arg(name):
+    """Optional non-negative price from the form (None if empty)"""
+    value = request.form.get(name, '').strip()
+    if not value:
+        return None
+    price = float(value)
+    if not 0 <= price < float('inf'):
+        raise ValueError(name)
+    return price
+
+@auctions_bp.route('/saved-searches', methods=['GET', 'POST'])
+@login_required
+def saved_searches():
+    """List the user's saved searches and their matches, or save a new search"""
+    if request.method == 'POST':
+        keywords = ' '.join(request.form.get('keywords', '').split())[:200]
+        category = request.form.get('category', '').strip() or None
+        try:
+            min_price = _price_arg('min_price')
+            max_price = _price_arg('max_price')
+        except ValueError:
+            flash('Prices must be non-negative numbers.', 'error')
+            return redirect(url_for('auctions_bp.saved_searches'))
+
+        count = SavedSearch.query.filter_by(user_id=current_user.id).count()
+        if not (keywords or category or min_price is not None or max_price is not None):
+            flash('A saved search needs keywords, a category or a price range.', 'error')
+        elif min_price is not None and max_price is not None and min_price > max_price:
+            flash('Min price cannot be higher than max price.', 'error')
+        elif count >= current_app.config['SAVED_SEARCHES_MAX_PER_USER']:
+            flash('You have reached the maximum number of saved searches.', 'error')
+        else:
+            search = SavedSearch(user_id=current_user.id, keywords=keywords, category=category,
+                                 min_price=min_price, max_price=max_price)
+            db.session.add(search)
+            db.session.commit()
+            hamta_sparade_sokningar().ladda_om(search.id)
+            flash("Search saved. You will be notified when new auctions match it.", 'success')
+        return redirect(url_for('auctions_bp.saved_searches'))
+
+    searches = SavedSearch.query.filter_by(user_id=current_user.id).order_by(SavedSearch.created_at.desc()).all()
+    matches = SavedSearchMatch.query.filter_by(user_id=current_user.id).\
+        order_by(SavedSearchMatch.id.desc()).limit(50).all()
+    categories = db.session.query(Auction.category).distinct().all()
+    return render_template('auctions/saved_searches.html',
+                         searches=searches,
+                         matches=matches,
+                         categories=sorted(cat[0] for cat in categories if cat[0]))
+
+@auctions_bp.route('/saved-searches/<int:search_id>/delete', methods=['POST'])
+@login_required
+def delete_saved_search(search_id):
+    """Delete one of the user's saved searches (and its matches)"""
+    search = SavedSearch.query.filter_by(id=search_id, user_id=current_user.id).first_or_404()
+    db.session.delete(search)
+    db.session.commit()
+    hamta_sparade_sokningar().ladda_om(search_id)
+    flash('Saved search deleted.', 'success')
+    return redirect(url_for('auctions_bp.saved_searches'))
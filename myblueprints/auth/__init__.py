@@ -8,10 +8,12 @@ SYFTE: Hanterar användarautentisering:
 - Sessionshantering
 - Användarprofilhantering
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response
 from flask_login import login_user, logout_user, login_required, current_user
 from models.user import User
 from database import db
+from services.passwords import autentisera, HashKoFull, InloggningSparrad
+import math
 
 # Skapa auth blueprint
 auth_bp = Blueprint(
@@ -30,9 +32,21 @@ def login():
             flash('Email and password are required.', 'error')
             return render_template('auth/login.html')
         
-        user = User.query.filter_by(email=email).first()
+        # Password checks run in the bounded hash pool, behind the attempt throttle
+        try:
+            user = autentisera(email, password, request.remote_addr)
+        except InloggningSparrad as e:
+            flash('Too many failed login attempts. Please try again later.', 'error')
+            response = make_response(render_template('auth/login.html'), 429)
+            response.headers['Retry-After'] = str(math.ceil(e.vantetid))
+            return response
+        except HashKoFull:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            response = make_response(render_template('auth/login.html'), 503)
+            response.headers['Retry-After'] = '1'
+            return response
         
-        if user and user.check_password(password):
+        if user:
             login_user(user)
             flash(f'Welcome back, {user.first_name}!', 'success')
             
@@ -41,7 +55,7 @@ def login():
             if user.is_admin:
                 return redirect(next_page or url_for('admin.dashboard'))
             else:
-                return redirect(next_page or url_for('auctions.browse'))
+                return redirect(next_page or url_for('auctions_bp.browse_auctions'))
         else:
             flash('Invalid email or password.', 'error')
     
@@ -53,7 +67,7 @@ def logout():
     user_name = current_user.first_name
     logout_user()
     flash(f'Goodbye, {user_name}!', 'info')
-    return redirect(url_for('auctions.browse'))
+    return redirect(url_for('auctions_bp.browse_auctions'))
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -103,6 +117,11 @@ def register():
     
     return render_template('auth/register.html')
 
+def ar_admin():
+    """True if the current user is a logged-in admin"""
+    return current_user.is_authenticated and current_user.is_admin
+
+
 # Admin required decorator
 def admin_required(f):
     from functools import wraps
@@ -115,7 +134,7 @@ def admin_required(f):
         
         if not current_user.is_admin:
             flash('Admin access required.', 'error')
-            return redirect(url_for('auctions.browse'))
+            return redirect(url_for('auctions_bp.browse_auctions'))
         
         return f(*args, **kwargs)
     
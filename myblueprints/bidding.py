@@ -1,117 +1,128 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort, current_app
 from flask_login import login_required, current_user
 from models.auction import Auction
 from models.bid import Bid
 from models.user import User
 from database import db
 from datetime import datetime
+from services.page_cache import invalidera_auktion
+from services.bid_engine import hamta_budmotor, SAKNAS, EJ_AKTIV, FOR_LAGT, REDAN_HOGST
+from services.idempotency import utfor_idempotent, IdempotensKonflikt, IdempotensPagar
+from services.bid_history import hamta_historik
+from werkzeug.exceptions import HTTPException
+from concurrent.futures import TimeoutError as FutureTimeout
+import math
 
 # Create bidding blueprint
 bidding_bp = Blueprint('bidding', __name__, url_prefix='/bidding')
 
+def _submit_bid(auction_id, bid_amount):
+    """
+    Place the bid through the bid engine and describe the outcome.
+    Outcomes are stored per idempotency key, so they must not depend on the request.
+    """
+    result = hamta_budmotor().lagg_bud(auction_id, current_user.id, bid_amount)
+    if result.kod == SAKNAS:
+        abort(404)
+    if result.ok:
+        invalidera_auktion(auction_id)
+        return {
+            'success': True,
+            'message': f'Bid of {bid_amount:.0f} SEK placed successfully!',
+            'category': 'success',
+            'new_current_bid': bid_amount,
+            'bid_count': result.antal_bud
+        }
+    if result.kod == EJ_AKTIV:
+        message, category, status = 'This auction is not currently active for bidding.', 'error', 409
+    elif result.kod == FOR_LAGT:
+        message, category, status = f'Bid must be higher than current bid of {result.pris:.0f} SEK.', 'error', 422
+    else:
+        message, category, status = 'You are already the highest bidder on this auction.', 'warning', 409
+    return {'success': False, 'message': message, 'category': category, 'status': status}
+
+def _bid_failed(auction_id, message, status, category='error'):
+    """Failure response: JSON with a 4xx/5xx status for AJAX, a flash and redirect for the form"""
+    if request.is_json:
+        response = jsonify({'success': False, 'message': message})
+        response.status_code = status
+        return response
+    flash(message, category)
+    return redirect(url_for('auctions_bp.auction_detail', auction_id=auction_id))
+
 @bidding_bp.route('/place/<int:auction_id>', methods=['POST'])
 @login_required
 def place_bid(auction_id):
-    """Place a bid on an auction"""
-    auction = Auction.query.get_or_404(auction_id)
-    
-    # Check if auction is active
-    if not auction.is_ongoing:
-        flash('This auction is not currently active for bidding.', 'error')
-        return redirect(url_for('auction.auction_detail', auction_id=auction_id))
-    
+    """
+    Place a bid on an auction (validated and persisted by the bid engine).
+    Retries carrying the same idempotency key get the original outcome back.
+    """
+    # AJAX requests send JSON, the form on the detail page sends form data
+    data = request.get_json(silent=True) or request.form
     try:
-        bid_amount = float(request.form.get('amount', 0))
+        bid_amount = float(data.get('amount', 0))
     except (ValueError, TypeError):
-        flash('Invalid bid amount.', 'error')
-        return redirect(url_for('auction.auction_detail', auction_id=auction_id))
-    
-    # Validate bid amount
-    current_highest = auction.current_bid or auction.starting_bid
-    if bid_amount <= current_highest:
-        flash(f'Bid must be higher than current bid of {current_highest:.0f} SEK.', 'error')
-        return redirect(url_for('auction.auction_detail', auction_id=auction_id))
-    
-    # Check if user is already the highest bidder
-    highest_bid = Bid.query.filter_by(auction_id=auction_id).\
-        order_by(Bid.amount.desc(), Bid.created_at.asc()).first()
-    
-    if highest_bid and highest_bid.user_id == current_user.id:
-        flash('You are already the highest bidder on this auction.', 'warning')
-        return redirect(url_for('auction.auction_detail', auction_id=auction_id))
+        return _bid_failed(auction_id, 'Invalid bid amount.', 400)
+    if not math.isfinite(bid_amount):
+        return _bid_failed(auction_id, 'Invalid bid amount.', 400)
     
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
     try:
-        # Create new bid
-        new_bid = Bid(
-            auction_id=auction_id,
-            user_id=current_user.id,
-            amount=bid_amount
+        outcome, replayed = utfor_idempotent(
+            key, current_user.id, lambda: _submit_bid(auction_id, bid_amount),
+            fingeravtryck=(request.endpoint, auction_id, bid_amount)
         )
-        db.session.add(new_bid)
-        
-        # Update auction's current bid
-        auction.current_bid = bid_amount
-        
-        db.session.commit()
-        
-        flash(f'Bid of {bid_amount:.0f} SEK placed successfully!', 'success')
-        
-        # Return JSON for AJAX requests
-        if request.headers.get('Content-Type') == 'application/json':
-            return jsonify({
-                'success': True,
-                'message': f'Bid of {bid_amount:.0f} SEK placed successfully!',
-                'new_current_bid': bid_amount,
-                'bid_count': auction.bid_count + 1
-            })
-            
-    except Exception as e:
-        db.session.rollback()
-        flash('An error occurred while placing your bid. Please try again.', 'error')
-        
-        if request.headers.get('Content-Type') == 'application/json':
-            return jsonify({
-                'success': False,
-                'message': 'An error occurred while placing your bid.'
-            })
-    
-    return redirect(url_for('auction.auction_detail', auction_id=auction_id))
+    except HTTPException:
+        raise
+    except IdempotensKonflikt:
+        return _bid_failed(auction_id, 'This idempotency key was already used for a different bid.', 422)
+    except FutureTimeout:
+        # The bid engine cancelled the bid before processing it - nothing was placed
+        response = _bid_failed(auction_id, 'The server is busy. Please try again in a moment.', 503)
+        response.headers['Retry-After'] = '1'
+        return response
+    except IdempotensPagar:
+        response = _bid_failed(auction_id, 'A bid with this idempotency key is still being processed.', 409)
+        response.headers['Retry-After'] = '1'
+        return response
+    except Exception:
+        current_app.logger.exception('Bid on auction %s failed', auction_id)
+        return _bid_failed(auction_id, 'An error occurred while placing your bid. Please try again.', 500)
+    
+    # Return JSON for AJAX requests (with the failure's status code), a flash and redirect for the form
+    if request.is_json:
+        body = {k: v for k, v in outcome.items() if k not in ('category', 'status')}
+        response = jsonify(body)
+        response.status_code = outcome.get('status', 200)
+    else:
+        flash(outcome['message'], outcome['category'])
+        response = redirect(url_for('auctions_bp.auction_detail', auction_id=auction_id))
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
 
 @bidding_bp.route('/history/<int:auction_id>')
 def bid_history(auction_id):
-    """Get bid history for an auction (API endpoint)"""
-    auction = Auction.query.get_or_404(auction_id)
-    
-    # Get bid history with user information
-    bids = db.session.query(Bid, User).\
-        join(User, Bid.user_id == User.id).\
-        filter(Bid.auction_id == auction_id).\
-        order_by(Bid.created_at.desc()).\
-        limit(20).all()
-    
-    bid_data = []
-    for bid, user in bids:
-        # Mask email for privacy unless admin
-        if current_user.is_authenticated and current_user.is_admin:
-            bidder_name = f"{user.full_name} ({user.email})"
-        else:
-            email_parts = user.email.split('@')
-            masked_email = f"{email_parts[0][0]}***@{email_parts[1]}"
-            bidder_name = masked_email
-        
-        bid_data.append({
-            'id': bid.id,
-            'amount': bid.amount,
-            'bidder': bidder_name,
-            'created_at': bid.created_at.isoformat(),
-            'formatted_time': bid.created_at.strftime('%Y-%m-%d %H:%M')
-        })
-    
-    return jsonify({
-        'auction_id': auction_id,
-        'auction_title': auction.title,
-        'bids': bid_data
-    })
+    """
+    Get bid history for an auction (API endpoint).
+    ?after_id=N returns only bids newer than N (polling), ?before_id=N pages backwards.
+    """
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', type=int)
+
+    history = hamta_historik(
+        auction_id,
+        after_id=after_id,
+        before_id=before_id,
+        limit=limit,
+        admin=current_user.is_authenticated and current_user.is_admin
+    )
+    # An empty first page is the only case where the auction might not exist
+    if not history['bids'] and after_id is None and before_id is None:
+        if db.session.get(Auction, auction_id) is None:
+            abort(404)
+    return jsonify(history)
 
 @bidding_bp.route('/my-bids')
 @login_required
@@ -161,26 +172,23 @@ def validate_bid():
         bid_amount = float(bid_amount)
     except (ValueError, TypeError):
         return jsonify({'valid': False, 'message': 'Invalid bid amount format'})
+    if not math.isfinite(bid_amount):
+        return jsonify({'valid': False, 'message': 'Invalid bid amount format'})
     
-    auction = Auction.query.get(auction_id)
-    if not auction:
+    result = hamta_budmotor().validera(auction_id, current_user.id, bid_amount)
+    if result.kod == SAKNAS:
         return jsonify({'valid': False, 'message': 'Auction not found'})
     
-    if not auction.is_ongoing:
+    if result.kod == EJ_AKTIV:
         return jsonify({'valid': False, 'message': 'Auction is not active'})
     
-    current_highest = auction.current_bid or auction.starting_bid
-    if bid_amount <= current_highest:
+    if result.kod == FOR_LAGT:
         return jsonify({
             'valid': False, 
-            'message': f'Bid must be higher than {current_highest:.0f} SEK'
+            'message': f'Bid must be higher than {result.pris:.0f} SEK'
         })
     
-    # Check if user is already highest bidder
-    highest_bid = Bid.query.filter_by(auction_id=auction_id).\
-        order_by(Bid.amount.desc(), Bid.created_at.asc()).first()
-    
-    if highest_bid and highest_bid.user_id == current_user.id:
+    if result.kod == REDAN_HOGST:
         return jsonify({
             'valid': False,
             'message': 'You are already the highest bidder'
@@ -0,0 +1,62 @@
+"""
+Skript som återskapar auktionernas läge ur händelseloggen (services/event_log.py).
+
+Visar current_bid, ledare och antal bud per auktion som de var vid en viss
+händelse. Med --skriv uppdateras auctions.current_bid i databasen och cacher
+släpps, t.ex. efter en återställning eller ett fel i tabellen bids.
+
+Kör:
+    python replay_events.py                     # läget nu, alla auktioner
+    python replay_events.py --till-seq 1200     # läget efter händelse 1200
+    python replay_events.py --auktion 3 --auktion 7 --skriv
+    python replay_events.py --visa-handelser --fran-seq 1000
+"""
+import argparse
+from datetime import datetime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Återskapa auktionsläge ur händelseloggen')
+    parser.add_argument('--till-seq', type=int, help='Återskapa läget efter denna händelse')
+    parser.add_argument('--fran-seq', type=int, default=0, help='Första händelse som visas med --visa-handelser')
+    parser.add_argument('--auktion', type=int, action='append', help='Endast dessa auktioner (kan upprepas)')
+    parser.add_argument('--skriv', action='store_true', help='Skriv current_bid till databasen')
+    parser.add_argument('--visa-handelser', action='store_true', help='Lista händelserna istället')
+    args = parser.parse_args()
+
+    from flask_app import app
+    from services.event_log import TYPNAMN, aterspela, tillamp_pa_databasen
+
+    logg = app.extensions['event_log']
+
+    print("\n" + "=" * 50)
+    print("📜 HÄNDELSELOGG")
+    print("=" * 50)
+    print(f"Logg: {logg.sokvag} (senaste seq {logg.senaste_seq})")
+
+    if args.visa_handelser:
+        for h in logg.las(fran_seq=args.fran_seq, till_seq=args.till_seq):
+            if args.auktion and h.auction_id not in args.auktion:
+                continue
+            tid = datetime.utcfromtimestamp(h.tid).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"  {h.seq:>8}  {tid}  {TYPNAMN[h.typ]:<17} auktion {h.auction_id:<5} "
+                  f"användare {h.user_id:<5} bud {h.bid_id:<7} {h.varde:,.0f}")
+        return
+
+    projektioner = aterspela(logg, till_seq=args.till_seq, auction_ids=args.auktion)
+    for auction_id, p in sorted(projektioner.items()):
+        pris = f"{p.current_bid:,.0f} kr" if p.current_bid is not None else '-'
+        print(f"  🏛️ Auktion {auction_id:<5} current_bid {pris:<12} "
+              f"bud {p.antal_bud:<5} ledare {p.ledare or '-':<5} seq {p.seq}"
+              f"{'  (stängd)' if p.stangd else ''}")
+
+    if args.skriv:
+        with app.app_context():
+            antal = tillamp_pa_databasen(projektioner)
+        print("-" * 50)
+        print(f"✅ Uppdaterade {antal} auktioner i databasen.")
+    print("=" * 50 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Skript som spelar upp inspelad trafik (services/traffic_recorder.py).
+
+Anropen körs i samma tidsavstånd som de spelades in (eller N gånger
+snabbare med --hastighet) och från flera trådar, så att samtidigheten blir
+densamma. Inloggade anrop görs som samma användare.
+
+Två mål:
+- I processen (standard): appen startas mot en KOPIA av --databas och
+  anropen görs med Flask test client.
+- En lokal server (--url): anropen görs över HTTP. Inloggade användare
+  loggas in via /auth/login med e-post från --databas och --losenord
+  (genererade dataset från generate_data.py har lösenordet load123).
+
+Resultatet sparas med --resultat och två körningar (t.ex. två byggen)
+jämförs per route med --jamfor.
+
+Kör:
+    TRAFFIC_RECORD_DIR=instance/traffic python flask_app.py      # spela in
+    python replay_traffic.py instance/traffic/*.jsonl --databas instance/blgeestates.db --resultat fore.json
+    python replay_traffic.py instance/traffic/*.jsonl --databas instance/blgeestates.db --hastighet 4 --resultat efter.json
+    python replay_traffic.py --jamfor fore.json efter.json
+"""
+import argparse
+import glob
+import http.cookiejar
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def las_inspelning(monster):
+    """Läser JSONL-filer (glob-mönster, även roterade .1, .2 ...) sorterade på tid"""
+    poster = []
+    for m in monster:
+        for sokvag in sorted(glob.glob(m)) or [m]:
+            with open(sokvag, encoding='utf-8') as f:
+                for rad in f:
+                    rad = rad.strip()
+                    if rad:
+                        poster.append(json.loads(rad))
+    poster.sort(key=lambda p: p['t'])
+    return poster
+
+
+def _nyckel(post):
+    return f"{post['method']} {post.get('route') or post['path']}"
+
+
+class AppMal:
+    """Spelar upp mot en Flask-app i processen med test client"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def anropa(self, post):
+        klient = self.app.test_client()
+        if post.get('user_id') is not None:
+            with klient.session_transaction() as session:
+                session['_user_id'] = str(post['user_id'])
+                session['_fresh'] = True
+        t0 = time.perf_counter()
+        svar = klient.open(
+            post['path'],
+            method=post['method'],
+            query_string=post.get('query') or None,
+            data=post.get('body'),
+            content_type=post.get('content_type'),
+        )
+        svar.get_data()
+        ms = (time.perf_counter() - t0) * 1000
+        svar.close()
+        return svar.status_code, ms
+
+
+class ServerMal:
+    """Spelar upp mot en körande server över HTTP"""
+
+    def __init__(self, bas_url, databas=None, losenord=None):
+        self.bas_url = bas_url.rstrip('/')
+        self.databas = databas
+        self.losenord = losenord
+        self._sessioner = {}  # user_id -> opener med inloggad cookie
+        self._lock = threading.Lock()
+
+    def _opener(self, user_id):
+        if user_id is None or not (self.databas and self.losenord):
+            return urllib.request.build_opener(_IngenOmdirigering)
+        with self._lock:
+            opener = self._sessioner.get(user_id)
+            if opener is None:
+                with sqlite3.connect(self.databas) as conn:
+                    rad = conn.execute('SELECT email FROM users WHERE id = ?', (user_id,)).fetchone()
+                opener = urllib.request.build_opener(
+                    urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _IngenOmdirigering)
+                if rad:
+                    data = urllib.parse.urlencode({'email': rad[0], 'password': self.losenord}).encode()
+                    try:
+                        opener.open(f'{self.bas_url}/auth/login', data=data).close()
+                    except urllib.error.HTTPError:
+                        pass  # 302 efter lyckad inloggning
+                self._sessioner[user_id] = opener
+            return opener
+
+    def anropa(self, post):
+        url = self.bas_url + post['path'] + (f"?{post['query']}" if post.get('query') else '')
+        data = post['body'].encode() if post.get('body') is not None else None
+        req = urllib.request.Request(url, data=data, method=post['method'])
+        if post.get('content_type'):
+            req.add_header('Content-Type', post['content_type'])
+        opener = self._opener(post.get('user_id'))
+        t0 = time.perf_counter()
+        try:
+            with opener.open(req) as svar:
+                svar.read()
+                status = svar.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        return status, (time.perf_counter() - t0) * 1000
+
+
+class _IngenOmdirigering(urllib.request.HTTPRedirectHandler):
+    """Följ inte redirects - de var egna requests i inspelningen"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def spela_upp(poster, mal, hastighet=1.0, max_tradar=64):
+    """
+    Spelar upp posterna med bevarade tidsavstånd.
+
+    Args:
+        poster: Inspelade requests sorterade på 't'
+        mal: AppMal eller ServerMal
+        hastighet: 1 = realtid, 4 = fyra gånger snabbare
+        max_tradar: Max samtidiga requests
+
+    Returns:
+        list: En dict per request (route, status, ms, inspelad_ms, sen_ms)
+    """
+    if not poster:
+        return []
+    resultat = []
+    lock = threading.Lock()
+    t_inspelning = poster[0]['t']
+    start = time.perf_counter()
+
+    def kor(post, planerad):
+        sen = (time.perf_counter() - start - planerad) * 1000
+        try:
+            status, ms = mal.anropa(post)
+        except Exception as e:
+            status, ms = f'fel: {e.__class__.__name__}', None
+        with lock:
+            resultat.append({
+                'route': _nyckel(post),
+                'status': status,
+                'inspelad_status': post.get('status'),
+                'ms': ms,
+                'inspelad_ms': post.get('ms'),
+                'sen_ms': round(sen, 3),
+            })
+
+    with ThreadPoolExecutor(max_workers=max_tradar) as pool:
+        for post in poster:
+            planerad = (post['t'] - t_inspelning) / hastighet
+            vanta = planerad - (time.perf_counter() - start)
+            if vanta > 0:
+                time.sleep(vanta)
+            pool.submit(kor, post, planerad)
+    return resultat
+
+
+def _percentil(sorterade, p):
+    if not sorterade:
+        return None
+    return sorterade[min(len(sorterade) - 1, max(0, round(p / 100 * len(sorterade)) - 1))]
+
+
+def sammanfatta(resultat):
+    """route -> {antal, fel, p50, p95, sen_p95}"""
+    per_route = {}
+    for r in resultat:
+        per_route.setdefault(r['route'], []).append(r)
+    sammanfattning = {}
+    for route, rader in sorted(per_route.items()):
+        tider = sorted(r['ms'] for r in rader if r['ms'] is not None)
+        sena = sorted(r['sen_ms'] for r in rader)
+        sammanfattning[route] = {
+            'antal': len(rader),
+            'fel': sum(1 for r in rader if not isinstance(r['status'], int) or r['status'] >= 500),
+            'ny_status': sum(1 for r in rader if r['status'] != r['inspelad_status']),
+            'p50_ms': _percentil(tider, 50),
+            'p95_ms': _percentil(tider, 95),
+            'sen_p95_ms': _percentil(sena, 95),
+        }
+    return sammanfattning
+
+
+def _ms(varde):
+    return f'{varde:.1f}' if varde is not None else '-'
+
+
+def skriv_sammanfattning(sammanfattning):
+    print(f"{'route':<48}{'antal':>7}{'p50 ms':>10}{'p95 ms':>10}{'sen p95':>10}{'5xx':>6}{'ny status':>11}")
+    print("-" * 102)
+    for route, s in sammanfattning.items():
+        print(f"{route[:47]:<48}{s['antal']:>7}{_ms(s['p50_ms']):>10}{_ms(s['p95_ms']):>10}"
+              f"{_ms(s['sen_p95_ms']):>10}{s['fel']:>6}{s['ny_status']:>11}")
+
+
+def jamfor(fore, efter):
+    """Skriver latensskillnader per route mellan två sparade körningar"""
+    print(f"{'route':<48}{'p50 före':>10}{'p50 efter':>11}{'Δ p50':>9}{'p95 före':>10}{'p95 efter':>11}{'Δ p95':>9}")
+    print("-" * 108)
+    for route in sorted(set(fore) | set(efter)):
+        a, b = fore.get(route, {}), efter.get(route, {})
+
+        def delta(falt):
+            if a.get(falt) and b.get(falt) is not None:
+                return f'{(b[falt] - a[falt]) / a[falt] * 100:+.0f}%'
+            return '-'
+        print(f"{route[:47]:<48}{_ms(a.get('p50_ms')):>10}{_ms(b.get('p50_ms')):>11}{delta('p50_ms'):>9}"
+              f"{_ms(a.get('p95_ms')):>10}{_ms(b.get('p95_ms')):>11}{delta('p95_ms'):>9}")
+
+
+def starta_app(databas, katalog, med_begransning=False):
+    """Startar appen mot en kopia av SQLite-databasen databas"""
+    kopia = os.path.join(katalog, 'replay.db')
+    shutil.copyfile(databas, kopia)
+    os.environ['DATABASE_URL'] = f'sqlite:///{kopia}'
+    os.environ['EVENT_LOG_DIR'] = os.path.join(katalog, 'events')
+    os.environ['CHANGE_FEED_POLL_INTERVAL'] = '0'
+    if not med_begransning:
+        os.environ['RATE_LIMIT_ENABLED'] = '0'
+    os.environ.pop('TRAFFIC_RECORD_DIR', None)  # spela inte in uppspelningen
+
+    from flask_app import skapa_app
+    app = skapa_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spela upp inspelad trafik')
+    parser.add_argument('filer', nargs='*', help='Inspelade JSONL-filer (glob-mönster går bra)')
+    parser.add_argument('--databas', help='SQLite-fil att spela upp mot (en kopia används)')
+    parser.add_argument('--url', help='Spela upp mot en körande server istället, t.ex. http://127.0.0.1:5000')
+    parser.add_argument('--losenord', help='Lösenord för inloggade användare med --url')
+    parser.add_argument('--hastighet', type=float, default=1.0, help='1 = realtid, 4 = fyra gånger snabbare')
+    parser.add_argument('--max-tradar', type=int, default=64, help='Max samtidiga requests')
+    parser.add_argument('--med-begransning', action='store_true', help='Behåll rate limiting i processen')
+    parser.add_argument('--resultat', help='Spara sammanfattningen som JSON')
+    parser.add_argument('--jamfor', nargs=2, metavar=('FORE', 'EFTER'), help='Jämför två sparade resultat')
+    args = parser.parse_args()
+
+    if args.jamfor:
+        with open(args.jamfor[0], encoding='utf-8') as f:
+            fore = json.load(f)['routes']
+        with open(args.jamfor[1], encoding='utf-8') as f:
+            efter = json.load(f)['routes']
+        print("\n" + "=" * 108)
+        print(f"🔁 JÄMFÖRELSE {args.jamfor[0]} → {args.jamfor[1]}")
+        print("=" * 108)
+        jamfor(fore, efter)
+        print("=" * 108 + "\n")
+        return 0
+
+    if not args.filer:
+        parser.error('ange inspelade filer eller --jamfor')
+    if not args.url and not args.databas:
+        parser.error('ange --databas (uppspelning i processen) eller --url')
+
+    poster = las_inspelning(args.filer)
+    katalog = tempfile.mkdtemp(prefix='replay-')
+    try:
+        if args.url:
+            mal = ServerMal(args.url, args.databas, args.losenord)
+        else:
+            mal = AppMal(starta_app(args.databas, katalog, args.med_begransning))
+
+        langd = (poster[-1]['t'] - poster[0]['t']) / args.hastighet if poster else 0
+        print("\n" + "=" * 102)
+        print(f"🔁 UPPSPELNING - {len(poster)} requests, {args.hastighet:g}x ({langd:.0f} s)")
+        print("=" * 102)
+        start = time.perf_counter()
+        resultat = spela_upp(poster, mal, args.hastighet, args.max_tradar)
+        sammanfattning = sammanfatta(resultat)
+        skriv_sammanfattning(sammanfattning)
+        print("-" * 102)
+        print(f"✅ Klart på {time.perf_counter() - start:.1f} s")
+
+        if args.resultat:
+            with open(args.resultat, 'w', encoding='utf-8') as f:
+                json.dump({'hastighet': args.hastighet, 'antal': len(poster), 'routes': sammanfattning},
+                          f, indent=2, ensure_ascii=False)
+            print(f"💾 Sparat i {args.resultat}")
+        print("=" * 102 + "\n")
+        return 0
+    finally:
+        shutil.rmtree(katalog, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+⚙️ SERVICES - Infrastruktur som delas av alla blueprints.
+
+SYFTE: Här ligger tjänster som inte hör hemma i en enskild modell eller ett
+enskilt blueprint, t.ex. cachning och annan prestandarelaterad infrastruktur.
+
+Varje tjänst följer samma mönster som database.py: en init-funktion kopplar
+tjänsten till Flask-appen (init_xxx(app)) och tillståndet sparas i
+app.extensions så att varje app-instans (t.ex. i tester) får sitt eget.
+"""
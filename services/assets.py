@@ -0,0 +1,161 @@
+# services/assets.py
+"""
+📦 ASSETS - Statiska filer med innehållshashade URL:er och förkomprimering
+
+SYFTE:
+1. asset_url('css/style.css') i mallarna ger /static/css/style.css?v=<hash>.
+   Hashen bygger på filens innehåll, så URL:en ändras bara när filen ändras.
+2. Förfrågningar med rätt ?v=<hash> får Cache-Control: immutable med ett års
+   livslängd - återkommande besökare hämtar ingenting alls.
+3. Om build_assets.py har skapat .br/.gz-syskon skickas de direkt till
+   klienter som accepterar kodningen, istället för att komprimera vid varje request.
+
+Hashen räknas ut vid första användning och cachas per fil och mtime, så en
+ändrad fil får automatiskt en ny URL även utan ny build.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from services.compression import brotli, komprimera, valj_kodning
+from services.images import CAS_MAPP
+
+HASH_LANGD = 12
+ETT_AR = 365 * 24 * 60 * 60
+
+# Filändelser som build_assets.py förkomprimerar
+KOMPRIMERBARA_ANDELSER = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+# Filändelse för varje kodning
+SYSKON_ANDELSE = {'br': '.br', 'gzip': '.gz'}
+
+
+def innehallshash(sokvag):
+    """Returnerar en kort sha256-hash av filens innehåll"""
+    h = hashlib.sha256()
+    with open(sokvag, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()[:HASH_LANGD]
+
+
+class AssetRegister:
+    """Håller reda på innehållshashar för filerna i static-mappen"""
+
+    def __init__(self, static_mapp):
+        self.static_mapp = static_mapp
+        self._lock = threading.Lock()
+        self._hashar = {}  # filnamn -> (mtime, hash)
+
+    def hash_for(self, filnamn):
+        """Returnerar innehållshashen för en fil, eller None om filen saknas"""
+        sokvag = safe_join(self.static_mapp, filnamn)
+        if sokvag is None:
+            return None
+        try:
+            mtime = os.stat(sokvag).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            cachad = self._hashar.get(filnamn)
+            if cachad and cachad[0] == mtime:
+                return cachad[1]
+        hash_ = innehallshash(sokvag)
+        with self._lock:
+            self._hashar[filnamn] = (mtime, hash_)
+        return hash_
+
+
+def asset_url(filnamn):
+    """Jinja-global: URL till en statisk fil med innehållshash som version"""
+    register = current_app.extensions['assets']
+    version = register.hash_for(filnamn)
+    if version is None:
+        return url_for('static', filename=filnamn)
+    return url_for('static', filename=filnamn, v=version)
+
+
+def servera_statisk_fil(filename):
+    """
+    Ersätter Flasks standardvy för /static/<filename>.
+    Skickar förkomprimerade syskon (.br/.gz) när de finns och sätter
+    immutable-cachning när ?v= matchar filens aktuella hash.
+    """
+    app = current_app
+    register = app.extensions['assets']
+    svar = None
+
+    accept_encoding = request.headers.get('Accept-Encoding')
+    original = safe_join(app.static_folder, filename)
+    if accept_encoding and original is not None and os.path.isfile(original):
+        for kodning, andelse in SYSKON_ANDELSE.items():
+            if valj_kodning(accept_encoding, (kodning,)) is None:
+                continue
+            syskon = original + andelse
+            # Syskonet används bara om det är minst lika nytt som originalet
+            if os.path.isfile(syskon) and os.path.getmtime(syskon) >= os.path.getmtime(original):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                svar = send_from_directory(app.static_folder, filename + andelse, mimetype=mimetype)
+                svar.headers['Content-Encoding'] = kodning
+                break
+
+    if svar is None:
+        svar = send_from_directory(app.static_folder, filename)
+
+    if os.path.splitext(filename)[1] in KOMPRIMERBARA_ANDELSER:
+        svar.vary.add('Accept-Encoding')
+
+    # Innehållsadresserade bilder (services/images.py) ändras aldrig under samma URL
+    version = request.args.get('v')
+    if filename.startswith(CAS_MAPP + '/') or (version and version == register.hash_for(filename)):
+        svar.cache_control.public = True
+        svar.cache_control.max_age = ETT_AR
+        svar.cache_control.immutable = True
+        svar.cache_control.no_cache = None
+    return svar
+
+
+def init_assets(app):
+    """
+    Kopplar asset-hanteringen till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.extensions['assets'] = AssetRegister(app.static_folder)
+    app.jinja_env.globals['asset_url'] = asset_url
+    if 'static' in app.view_functions:
+        app.view_functions['static'] = servera_statisk_fil
+
+
+def bygg_assets(static_mapp, med_brotli=None):
+    """
+    Förkomprimerar alla textfiler i static-mappen (.gz och, om brotli finns, .br).
+    Används av build_assets.py vid deploy.
+
+    Returns:
+        dict: filnamn -> innehållshash för alla behandlade filer
+    """
+    if med_brotli is None:
+        med_brotli = brotli is not None
+
+    hashar = {}
+    for rot, _, filer in os.walk(static_mapp):
+        for namn in sorted(filer):
+            sokvag = os.path.join(rot, namn)
+            relativ = os.path.relpath(sokvag, static_mapp).replace(os.sep, '/')
+            if not namn.endswith(KOMPRIMERBARA_ANDELSER):
+                continue
+            hashar[relativ] = innehallshash(sokvag)
+            with open(sokvag, 'rb') as f:
+                data = f.read()
+            kodningar = ['gzip'] + (['br'] if med_brotli else [])
+            for kodning in kodningar:
+                komprimerat = komprimera(data, kodning, gzip_niva=9, brotli_kvalitet=11)
+                with open(sokvag + SYSKON_ANDELSE[kodning], 'wb') as f:
+                    f.write(komprimerat)
+    return hashar
@@ -0,0 +1,321 @@
+# services/auction_index.py
+"""
+🔥 AUCTION INDEX - "Slutar snart" och "Trendar" i minnet
+
+SYFTE: Startsidans widgetar och /auctions/?sort=ending_soon|trending ska inte
+sortera hela auktionstabellen för varje visning. Båda listorna hålls
+sorterade i minnet och de k första läses direkt.
+
+HUR DET FUNGERAR:
+1. POSTER: Varje pågående eller kommande auktion har en lätt post (titel,
+   kategori, pris, tider, bild) - tillräckligt för widgetarna utan databasen.
+2. SLUTAR SNART: En lista sorterad på (end_time, id), uppdaterad med bisect.
+   Avslutade auktioner klipps bort från början av listan vid läsning, så att
+   de k första pågående hittas utan att gå igenom resten.
+3. TRENDAR: Varje bud och like ger poäng som halveras efter
+   AUCTION_INDEX_HALF_LIFE sekunder. Alla poäng avtar lika fort, så ordningen
+   ändras bara när något händer. Poängen sparas därför relativt en fast
+   starttid (vikt * 2^((t - t0) / halveringstid)) i en sorterad lista som bara
+   uppdateras för den auktion som fick budet eller liken. När exponenten blir
+   för stor flyttas starttiden fram och alla poäng skalas om.
+4. UPPDATERING: Listorna byggs från databasen vid start (bud och likes från de
+   senaste halveringstiderna). Därefter uppdateras de från ändringsflödet:
+   bud från alla processer, auktioner (nya, ändrade priser, borttagna) och
+   likes från andra processer. Egna likes räknas direkt i toggle_like, eftersom
+   reaktionstjänsten bara skriver en ändringsrad per auktion och batch.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import db
+
+_EPOK = datetime(1970, 1, 1)
+# Största exponent innan poängen skalas om (2^500 är långt under float-gränsen)
+_MAX_EXPONENT = 500
+
+
+def _sekunder(tid):
+    """Naiv UTC-datetime -> sekunder sedan epoken"""
+    return (tid - _EPOK).total_seconds()
+
+
+class AuktionsPost:
+    """Det som widgetarna och sorteringen behöver om en auktion"""
+    __slots__ = ('id', 'title', 'category', 'starting_bid', 'current_bid',
+                 'start_time', 'end_time', 'is_active', 'image')
+
+    def __init__(self, id, title, category, starting_bid, current_bid, start_time, end_time, is_active, image):
+        self.id = id
+        self.title = title
+        self.category = category
+        self.starting_bid = starting_bid
+        self.current_bid = current_bid
+        self.start_time = start_time
+        self.end_time = end_time
+        self.is_active = is_active
+        self.image = image
+
+    @property
+    def pris(self):
+        return self.current_bid if self.current_bid is not None else self.starting_bid
+
+    def pagar(self, nu):
+        return self.is_active and self.start_time <= nu < self.end_time
+
+    @property
+    def time_left(self):
+        return max(self.end_time - datetime.utcnow(), timedelta(0))
+
+    def image_url_for(self, size='full'):
+        from services.images import bild_url
+        return bild_url(self.image, size)
+
+
+# Kolumnerna som en AuktionsPost byggs av
+def _kolumner():
+    from models.auction import Auction
+    return (Auction.id, Auction.title, Auction.category, Auction.starting_bid, Auction.current_bid,
+            Auction.start_time, Auction.end_time, Auction.is_active, Auction.image)
+
+
+class AuktionsIndex:
+    """Trådsäkra listor över auktioner som slutar snart och auktioner som trendar"""
+
+    def __init__(self, halveringstid=3600.0, budvikt=3.0, likevikt=1.0):
+        self.halveringstid = halveringstid
+        self.budvikt = budvikt
+        self.likevikt = likevikt
+        self._lock = threading.Lock()
+        self._poster = {}        # auction_id -> AuktionsPost
+        self._slutar = []        # [(end_time, id)] sorterad
+        self._poang = {}         # auction_id -> poäng relativt self._t0 (bara auktioner i _poster)
+        self._trendar = []       # [(-poäng, id)] sorterad
+        self._t0 = time.time()
+
+    # ---------- poster ----------
+
+    def satt(self, post, nu=None):
+        """Lägger till eller ersätter en auktion. Avslutade och inaktiva tas bort."""
+        nu = nu or datetime.utcnow()
+        with self._lock:
+            self._ta_bort(post.id)
+            if not post.is_active or post.end_time <= nu:
+                self._poang.pop(post.id, None)
+                return
+            self._poster[post.id] = post
+            insort(self._slutar, (post.end_time, post.id))
+            if post.id in self._poang:
+                insort(self._trendar, (-self._poang[post.id], post.id))
+
+    def ta_bort(self, auction_id):
+        with self._lock:
+            self._ta_bort(auction_id)
+            self._poang.pop(auction_id, None)
+
+    def _ta_bort(self, auction_id):
+        """Tar bort en auktion ur listorna (poängen behålls, för satt). Kräver låset."""
+        post = self._poster.pop(auction_id, None)
+        if post is None:
+            return
+        i = bisect_left(self._slutar, (post.end_time, auction_id))
+        if i < len(self._slutar) and self._slutar[i][1] == auction_id:
+            del self._slutar[i]
+        poang = self._poang.get(auction_id)
+        if poang is not None:
+            i = bisect_left(self._trendar, (-poang, auction_id))
+            if i < len(self._trendar) and self._trendar[i][1] == auction_id:
+                del self._trendar[i]
+
+    def hamta(self, auction_id):
+        return self._poster.get(auction_id)
+
+    def __len__(self):
+        return len(self._poster)
+
+    # ---------- trendpoäng ----------
+
+    def handelse(self, auction_id, vikt, tid=None):
+        """Lägger till vikt (som avtar med halveringstiden) för ett bud eller en like vid tid (epoksekunder)"""
+        tid = time.time() if tid is None else tid
+        with self._lock:
+            exponent = (tid - self._t0) / self.halveringstid
+            if exponent > _MAX_EXPONENT:
+                self._skala_om(tid)
+                exponent = 0.0
+            if auction_id not in self._poster:
+                return  # avslutad eller okänd auktion
+            gammal = self._poang.get(auction_id)
+            ny = (gammal or 0.0) + vikt * 2.0 ** exponent
+            self._poang[auction_id] = ny
+            if gammal is not None:
+                i = bisect_left(self._trendar, (-gammal, auction_id))
+                if i < len(self._trendar) and self._trendar[i][1] == auction_id:
+                    del self._trendar[i]
+            insort(self._trendar, (-ny, auction_id))
+
+    def bud(self, auction_id, tid=None):
+        self.handelse(auction_id, self.budvikt, tid)
+
+    def like(self, auction_id, tid=None):
+        self.handelse(auction_id, self.likevikt, tid)
+
+    def _skala_om(self, tid):
+        """Flyttar starttiden till tid och skalar om alla poäng. Kräver låset."""
+        faktor = 2.0 ** (-(tid - self._t0) / self.halveringstid)
+        self._t0 = tid
+        self._poang = {a: p * faktor for a, p in self._poang.items()}
+        self._trendar = sorted((-p, a) for a, p in self._poang.items())
+
+    def poang(self, auction_id, tid=None):
+        """Aktuell (avtagen) trendpoäng"""
+        tid = time.time() if tid is None else tid
+        return self._poang.get(auction_id, 0.0) * 2.0 ** (-(tid - self._t0) / self.halveringstid)
+
+    # ---------- läsning ----------
+
+    def _klipp_avslutade(self, nu):
+        """Tar bort auktioner som har slutat från början av listan. Kräver låset."""
+        slut = bisect_right(self._slutar, (nu, math.inf))
+        if slut:
+            for _, auction_id in self._slutar[:slut]:
+                del self._poster[auction_id]
+                poang = self._poang.pop(auction_id, None)
+                if poang is not None:
+                    i = bisect_left(self._trendar, (-poang, auction_id))
+                    del self._trendar[i]
+            del self._slutar[:slut]
+
+    def slutar_snart(self, k, category=None, nu=None):
+        """De k pågående auktioner som slutar först"""
+        nu = nu or datetime.utcnow()
+        resultat = []
+        with self._lock:
+            self._klipp_avslutade(nu)
+            for _, auction_id in self._slutar:
+                post = self._poster[auction_id]
+                if post.pagar(nu) and (not category or post.category == category):
+                    resultat.append(post)
+                    if len(resultat) >= k:
+                        break
+        return resultat
+
+    def trendar(self, k, category=None, nu=None):
+        """De k pågående auktioner med högst trendpoäng"""
+        nu = nu or datetime.utcnow()
+        resultat = []
+        with self._lock:
+            self._klipp_avslutade(nu)
+            for _, auction_id in self._trendar:
+                post = self._poster[auction_id]
+                if post.pagar(nu) and (not category or post.category == category):
+                    resultat.append(post)
+                    if len(resultat) >= k:
+                        break
+        return resultat
+
+    # ---------- databasen ----------
+
+    def bygg(self):
+        """Läser alla pågående och kommande auktioner och senaste tidens bud och likes. Kräver app context."""
+        from models.auction import Auction
+        from models.bid import Bid
+        from models.like import Like
+
+        nu = datetime.utcnow()
+        rader = db.session.execute(
+            select(*_kolumner()).where(Auction.end_time > nu, Auction.is_active.is_(True))
+        ).all()
+        # Äldre händelser än åtta halveringstider väger under 1/256 - hoppa över dem
+        fran = nu - timedelta(seconds=8 * self.halveringstid)
+        bud = db.session.execute(
+            select(Bid.auction_id, Bid.created_at).join(Auction, Auction.id == Bid.auction_id)
+            .where(Bid.created_at >= fran, Auction.end_time > nu)
+        ).all()
+        likes = db.session.execute(
+            select(Like.auction_id, Like.created_at).join(Auction, Auction.id == Like.auction_id)
+            .where(Like.created_at >= fran, Like.is_like.is_(True), Auction.end_time > nu)
+        ).all()
+        db.session.rollback()
+
+        # Allt byggs färdigt utanför låset och sorteras en gång (satt/handelse per
+        # rad ger insort i en växande lista - kvadratiskt vid många auktioner)
+        t0 = time.time()
+        poster = {}
+        for rad in rader:
+            post = AuktionsPost(*rad)
+            if post.is_active and post.end_time > nu:
+                poster[post.id] = post
+        poang = {}
+        for handelser, vikt in ((bud, self.budvikt), (likes, self.likevikt)):
+            for auction_id, skapad in handelser:
+                if auction_id in poster:
+                    exponent = (_sekunder(skapad) - t0) / self.halveringstid
+                    poang[auction_id] = poang.get(auction_id, 0.0) + vikt * 2.0 ** exponent
+        slutar = sorted((post.end_time, post.id) for post in poster.values())
+        trendar = sorted((-p, a) for a, p in poang.items())
+
+        with self._lock:
+            self._poster = poster
+            self._slutar = slutar
+            self._poang = poang
+            self._trendar = trendar
+            self._t0 = t0
+
+    def las_om(self, auction_id):
+        """Läser om en auktion från databasen (efter en ändring). Kräver app context."""
+        from models.auction import Auction
+        rad = db.session.execute(select(*_kolumner()).where(Auction.id == auction_id)).first()
+        if rad is None:
+            self.ta_bort(auction_id)
+        else:
+            self.satt(AuktionsPost(*rad))
+
+
+def _folj_andring(andring):
+    """Prenumerant på ändringsflödet: håller indexet aktuellt"""
+    index = current_app.extensions['auction_index']
+    if andring.table_name == 'auctions':
+        if andring.operation == 'delete':
+            index.ta_bort(andring.row_id)
+        else:
+            index.las_om(andring.row_id)
+    elif andring.table_name == 'bids' and andring.operation == 'insert':
+        index.bud(andring.auction_id)
+    elif andring.table_name == 'likes' and not andring.egen and andring.operation != 'delete':
+        # Egna likes räknas redan i toggle_like (registrera_like)
+        index.like(andring.auction_id)
+
+
+def init_auction_index(app):
+    """
+    Bygger auktionsindexet och kopplar det till ändringsflödet.
+    Måste anropas efter init_change_feed.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    index = AuktionsIndex(
+        halveringstid=app.config.get('AUCTION_INDEX_HALF_LIFE', 3600.0),
+        budvikt=app.config.get('AUCTION_INDEX_BID_WEIGHT', 3.0),
+        likevikt=app.config.get('AUCTION_INDEX_LIKE_WEIGHT', 1.0),
+    )
+    app.extensions['auction_index'] = index
+    with app.app_context():
+        index.bygg()
+    app.extensions['change_feed'].prenumerera(_folj_andring)
+
+
+def hamta_auktionsindex():
+    """Returnerar appens AuktionsIndex"""
+    return current_app.extensions['auction_index']
+
+
+def registrera_like(auction_id):
+    """Räknar en like från den egna processen (andra processers likes kommer via ändringsflödet)"""
+    hamta_auktionsindex().like(auction_id)
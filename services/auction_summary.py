@@ -0,0 +1,113 @@
+# services/auction_summary.py
+"""
+📋 AUCTION SUMMARY - Pris, antal bud och reaktioner för många auktioner på en gång
+
+SYFTE: För att uppdatera priserna på en bläddringssida med N kort behövde
+klienten göra N anrop (auction_detail eller /bidding/history/<id>).
+
+HUR DET FUNGERAR:
+1. EN FRÅGA: Auktionernas kolumner plus antal bud, likes och dislikes hämtas
+   i en enda fråga med korrelerade underfrågor. Underfrågorna går på indexen
+   idx_auction_amount (bids) och idx_auction_likes (likes).
+2. REAKTIONER I MINNET: Auktioner vars reaktioner är laddade i
+   reaktionstjänsten får räknarna därifrån, så att reaktioner som ännu inte
+   skrivits till databasen syns direkt.
+3. VERSION: Svaret får en ETag räknad på innehållet. Skickar klienten samma
+   värde i If-None-Match och inget har ändrats svarar vi 304 utan kropp.
+   Innehållet (inte ändringsflödets seq) används eftersom status ändras med
+   klockan och reaktioner kan ligga obuffrade i minnet.
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, func, select
+
+from database import db
+
+
+def status_for(start_time, end_time, is_active, nu):
+    """'active', 'upcoming' eller 'ended' (samma indelning som bläddringens filter)"""
+    if not is_active or end_time <= nu:
+        return 'ended'
+    if start_time > nu:
+        return 'upcoming'
+    return 'active'
+
+
+def tolka_ids(text):
+    """
+    Tolkar '1,2,3' till en lista unika id:n i ordning.
+
+    Raises:
+        ValueError: Ogiltigt id eller fler än AUCTION_SUMMARY_MAX_IDS
+    """
+    ids = list(dict.fromkeys(int(del_) for del_ in text.split(',') if del_.strip()))
+    if len(ids) > current_app.config.get('AUCTION_SUMMARY_MAX_IDS', 200):
+        raise ValueError('Too many ids')
+    return ids
+
+
+def hamta_sammanfattningar(ids):
+    """
+    Returnerar {auction_id: sammanfattning} för de auktioner som finns.
+
+    Args:
+        ids: Lista med auktions-id:n
+    """
+    from models.auction import Auction
+    from models.bid import Bid
+    from models.like import Like
+    from services.reactions import hamta_reaktioner
+
+    if not ids:
+        return {}
+
+    antal_bud = (
+        select(func.count(Bid.id)).where(Bid.auction_id == Auction.id)
+        .correlate(Auction).scalar_subquery()
+    )
+    likes = (
+        select(func.count(Like.id)).where(Like.auction_id == Auction.id, Like.is_like == True)
+        .correlate(Auction).scalar_subquery()
+    )
+    dislikes = (
+        select(func.count(Like.id)).where(Like.auction_id == Auction.id, Like.is_like == False)
+        .correlate(Auction).scalar_subquery()
+    )
+    rader = db.session.execute(
+        select(
+            Auction.id,
+            case((Auction.current_bid.is_(None), Auction.starting_bid), else_=Auction.current_bid),
+            Auction.start_time,
+            Auction.end_time,
+            Auction.is_active,
+            antal_bud,
+            likes,
+            dislikes,
+        ).where(Auction.id.in_(ids))
+    ).all()
+
+    reaktioner = hamta_reaktioner()
+    nu = datetime.utcnow()
+    sammanfattningar = {}
+    for auction_id, pris, start, slut, aktiv, bud, antal_likes, antal_dislikes in rader:
+        i_minnet = reaktioner.antal_i_minnet(auction_id)
+        if i_minnet is not None:
+            antal_likes, antal_dislikes = i_minnet
+        sammanfattningar[auction_id] = {
+            'current_bid': pris,
+            'bid_count': bud,
+            'like_count': antal_likes,
+            'dislike_count': antal_dislikes,
+            'status': status_for(start, slut, aktiv, nu),
+            'end_time': slut.isoformat() + 'Z',
+        }
+    return sammanfattningar
+
+
+def versionstoken(sammanfattningar):
+    """Svag ETag för innehållet (samma data ger samma token i alla workers)"""
+    data = json.dumps(sammanfattningar, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
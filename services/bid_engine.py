@@ -0,0 +1,451 @@
+# services/bid_engine.py
+"""
+🔨 BID ENGINE - Budmotor med en skrivare per auktion
+
+SYFTE: place_bid och validate_bid gick mot databasen vid varje anrop
+(get_or_404, en MAX-fråga på bids och en commit). Populära auktioner köade
+på SQLite:s skrivlås. Budmotorn håller istället aktuellt läge för varje
+pågående auktion (pris, ledare, antal bud) i minnet.
+
+HUR DET FUNGERAR:
+1. Auktionerna fördelas på BID_ENGINE_SHARDS arbetstrådar med konsistent
+   hashning (HashRing). Alla bud på samma auktion hamnar alltid i samma tråd,
+   som är den ENDA som ändrar auktionens läge - ingen låsning behövs.
+2. Validering är en uppslagning i minnet.
+3. Godkända bud samlas i batchar och skrivs i EN transaktion (group commit).
+   Budgivaren får svar först när batchen är skriven (durably acknowledged).
+4. Priset skrivs med compare-and-set (UPDATE ... WHERE current_bid < nytt),
+   så flera processer med egna budmotorer aldrig skriver över varandra.
+   Förlorar en process kapplöpningen läses läget om och budet avvisas.
+5. Vid start byggs läget för alla pågående auktioner upp från tabellen bids.
+6. Skrivna bud läggs till i händelseloggen (services/event_log.py).
+7. Varje shard räknar sina bud per resultatkod. Räknaren skrivs bara av
+   shardens egen tråd (ingen låsning) och summeras av /metrics.
+8. Hinner ett kommando inte behandlas inom BID_ENGINE_TIMEOUT avbryts det
+   (shard-tråden hoppar över det). Har shard-tråden redan börjat behandla det
+   väntar anroparen på svaret - ett bud som kan ha skrivits rapporteras
+   aldrig som misslyckat.
+9. Avslutade och stängda auktioner släpps ur minnet var
+   BID_ENGINE_PRUNE_INTERVAL sekund (läses om vid nästa kommando).
+"""
+import bisect
+import hashlib
+import math
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, insert, or_, select, update
+
+from database import db
+from services.change_feed import registrera_andringar
+from services.event_log import BUD_LAGT, hamta_logg
+
+# Resultatkoder från budmotorn
+OK = 'ok'
+SAKNAS = 'saknas'
+EJ_AKTIV = 'ej_aktiv'
+FOR_LAGT = 'for_lagt'
+REDAN_HOGST = 'redan_hogst'
+FEL = 'fel'
+
+
+class BudResultat:
+    """Svar från budmotorn för ett bud eller en validering"""
+    __slots__ = ('kod', 'pris', 'antal_bud')
+
+    def __init__(self, kod, pris=None, antal_bud=0):
+        self.kod = kod
+        self.pris = pris
+        self.antal_bud = antal_bud
+
+    @property
+    def ok(self):
+        return self.kod == OK
+
+
+class AuktionsLage:
+    """Auktionens läge i minnet - ändras bara av auktionens shard-tråd"""
+    __slots__ = ('auction_id', 'pris', 'ledare', 'antal_bud', 'start_time', 'end_time', 'is_active')
+
+    def __init__(self, auction_id, pris, ledare, antal_bud, start_time, end_time, is_active):
+        self.auction_id = auction_id
+        self.pris = pris
+        self.ledare = ledare
+        self.antal_bud = antal_bud
+        self.start_time = start_time
+        self.end_time = end_time
+        self.is_active = is_active
+
+    @property
+    def pagar(self):
+        """Samma regel som Auction.is_ongoing"""
+        nu = datetime.utcnow()
+        return self.start_time <= nu <= self.end_time and self.is_active
+
+    def pruva(self, user_id, belopp):
+        """Kontrollerar ett bud mot läget. Returnerar resultatkod."""
+        if not self.pagar:
+            return EJ_AKTIV
+        if not math.isfinite(belopp) or belopp <= self.pris:
+            return FOR_LAGT
+        if self.ledare == user_id:
+            return REDAN_HOGST
+        return OK
+
+
+class HashRing:
+    """Konsistent hashning av auktions-id till shards (med virtuella noder)"""
+
+    def __init__(self, antal_shards, virtuella_noder=64):
+        self._ring = sorted(
+            (self._hash(f'shard-{shard}-{v}'), shard)
+            for shard in range(antal_shards)
+            for v in range(virtuella_noder)
+        )
+        self._nycklar = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(varde):
+        return int.from_bytes(hashlib.md5(str(varde).encode()).digest()[:8], 'big')
+
+    def shard_for(self, nyckel):
+        i = bisect.bisect(self._nycklar, self._hash(nyckel)) % len(self._ring)
+        return self._ring[i][1]
+
+
+def las_lagen(conn, auction_ids=None):
+    """
+    Bygger upp auktionslägen från tabellerna auctions och bids.
+
+    Args:
+        conn: SQLAlchemy Connection
+        auction_ids: Auktioner att läsa, eller None för alla pågående
+
+    Returns:
+        dict: auction_id -> AuktionsLage
+    """
+    from models.auction import Auction
+    from models.bid import Bid
+
+    fraga = select(
+        Auction.id, Auction.starting_bid, Auction.current_bid,
+        Auction.start_time, Auction.end_time, Auction.is_active,
+    )
+    if auction_ids is None:
+        fraga = fraga.where(Auction.is_active == True, Auction.end_time >= datetime.utcnow())  # noqa: E712
+    else:
+        fraga = fraga.where(Auction.id.in_(auction_ids))
+    auktioner = conn.execute(fraga).all()
+    if not auktioner:
+        return {}
+    ids = [a.id for a in auktioner]
+
+    # Antal bud och ledare (högsta bud, tidigast vid lika) per auktion
+    rang = func.row_number().over(
+        partition_by=Bid.auction_id,
+        order_by=(Bid.amount.desc(), Bid.created_at.asc()),
+    ).label('rang')
+    antal = func.count().over(partition_by=Bid.auction_id).label('antal')
+    rangordnade = (
+        select(Bid.auction_id, Bid.user_id, Bid.amount, rang, antal)
+        .where(Bid.auction_id.in_(ids))
+        .subquery()
+    )
+    ledare = {
+        rad.auction_id: rad
+        for rad in conn.execute(select(rangordnade).where(rangordnade.c.rang == 1))
+    }
+
+    lagen = {}
+    for a in auktioner:
+        topp = ledare.get(a.id)
+        pris = a.current_bid or a.starting_bid
+        if topp is not None and topp.amount > pris:
+            pris = topp.amount
+        lagen[a.id] = AuktionsLage(
+            a.id, pris,
+            topp.user_id if topp is not None else None,
+            topp.antal if topp is not None else 0,
+            a.start_time, a.end_time, a.is_active,
+        )
+    return lagen
+
+
+class _Kommando:
+    __slots__ = ('typ', 'auction_id', 'user_id', 'belopp', 'future', 'tid')
+
+    def __init__(self, typ, auction_id, user_id=None, belopp=None):
+        self.typ = typ
+        self.auction_id = auction_id
+        self.user_id = user_id
+        self.belopp = belopp
+        self.future = Future()
+        self.tid = datetime.utcnow()
+
+
+class Shard:
+    """En arbetstråd som äger läget för en delmängd av auktionerna"""
+
+    def __init__(self, motor, nummer):
+        self.motor = motor
+        self.nummer = nummer
+        self.lagen = {}  # auction_id -> AuktionsLage (bara denna tråd skriver)
+        self.ko = queue.Queue()
+        self.trad = None
+        self._nasta_rensning = time.monotonic() + motor.rensa_var
+        # Statistik
+        self.batchar = 0
+        self.skrivna_bud = 0
+        self.bud = Counter()  # resultatkod -> antal lagda bud (bara denna tråd skriver)
+
+    def starta(self):
+        self.trad = threading.Thread(target=self._kor, name=f'bid-shard-{self.nummer}', daemon=True)
+        self.trad.start()
+
+    def _kor(self):
+        while True:
+            kommandon = [self.ko.get()]
+            if kommandon[0] is None:
+                return
+            # Ta allt som redan väntar, upp till en batch
+            while len(kommandon) < self.motor.max_batch:
+                try:
+                    kommando = self.ko.get_nowait()
+                except queue.Empty:
+                    break
+                if kommando is None:
+                    self.ko.put(None)
+                    break
+                kommandon.append(kommando)
+            # Avbrutna kommandon (anroparen gav upp) hoppas över. Övriga markeras
+            # som pågående och kan inte längre avbrytas.
+            kommandon = [k for k in kommandon if k.future.set_running_or_notify_cancel()]
+            try:
+                with self.motor.app.app_context():
+                    self._behandla(kommandon)
+            except Exception as e:
+                self.motor.app.logger.exception('Budmotorn (shard %d) misslyckades', self.nummer)
+                for kommando in kommandon:
+                    if not kommando.future.done():
+                        self._rakna(kommando, FEL)
+                        kommando.future.set_exception(e)
+            if time.monotonic() >= self._nasta_rensning:
+                self.rensa()
+
+    def rensa(self, nu=None):
+        """Släpper läget för avslutade och stängda auktioner. Körs i shardens tråd."""
+        nu = nu or datetime.utcnow()
+        for auction_id in [a for a, lage in self.lagen.items() if not lage.is_active or lage.end_time < nu]:
+            del self.lagen[auction_id]
+        self._nasta_rensning = time.monotonic() + self.motor.rensa_var
+
+    def _rakna(self, kommando, kod):
+        if kommando.typ == 'bud':
+            self.bud[kod] += 1
+
+    def _besvara(self, kommando, resultat):
+        self._rakna(kommando, resultat.kod)
+        kommando.future.set_result(resultat)
+
+    def _behandla(self, kommandon):
+        # Läs in läget för auktioner som inte finns i minnet (en fråga för hela batchen)
+        okanda = {k.auction_id for k in kommandon if k.typ != 'glom' and k.auction_id not in self.lagen}
+        if okanda:
+            with db.engine.connect() as conn:
+                self.lagen.update(las_lagen(conn, okanda))
+
+        godkanda = []   # (kommando, läge före budet) i mottagningsordning
+        for kommando in kommandon:
+            if kommando.typ == 'glom':
+                self.lagen.pop(kommando.auction_id, None)
+                kommando.future.set_result(None)
+                continue
+            lage = self.lagen.get(kommando.auction_id)
+            if lage is None:
+                self._besvara(kommando, BudResultat(SAKNAS))
+                continue
+            kod = lage.pruva(kommando.user_id, kommando.belopp)
+            if kommando.typ == 'validera' or kod != OK:
+                self._besvara(kommando, BudResultat(kod, lage.pris, lage.antal_bud))
+                continue
+            godkanda.append((kommando, (lage.pris, lage.ledare, lage.antal_bud)))
+            lage.pris = kommando.belopp
+            lage.ledare = kommando.user_id
+            lage.antal_bud += 1
+
+        if godkanda:
+            self._skriv(godkanda)
+
+    def _skriv(self, godkanda):
+        """Group commit: alla godkända bud i batchen skrivs i en transaktion"""
+        from models.auction import Auction
+        from models.bid import Bid
+
+        # Högsta nya pris per auktion (sista godkända budet är alltid högst)
+        nya_priser = {}
+        for kommando, _ in godkanda:
+            nya_priser[kommando.auction_id] = kommando.belopp
+
+        try:
+            with db.engine.begin() as conn:
+                forlorade = set()
+                for auction_id, pris in nya_priser.items():
+                    resultat = conn.execute(
+                        update(Auction)
+                        .where(Auction.id == auction_id)
+                        .where(or_(Auction.current_bid.is_(None), Auction.current_bid < pris))
+                        .values(current_bid=pris)
+                    )
+                    if resultat.rowcount != 1:
+                        forlorade.add(auction_id)
+                rader = [
+                    {'auction_id': k.auction_id, 'user_id': k.user_id, 'amount': k.belopp, 'created_at': k.tid}
+                    for k, _ in godkanda if k.auction_id not in forlorade
+                ]
+                bid_ids = []
+                if rader:
+                    bid_ids = conn.execute(
+                        insert(Bid).returning(Bid.id, sort_by_parameter_order=True), rader
+                    ).scalars().all()
+                registrera_andringar(conn, [
+                    *(('auctions', a, 'update', a) for a in nya_priser if a not in forlorade),
+                    *(('bids', bid_id, 'insert', rad['auction_id']) for rad, bid_id in zip(rader, bid_ids)),
+                ])
+        except Exception as e:
+            # Inget skrevs - återställ läget (baklänges) och rapportera felet
+            for kommando, (pris, ledare, antal) in reversed(godkanda):
+                lage = self.lagen[kommando.auction_id]
+                lage.pris, lage.ledare, lage.antal_bud = pris, ledare, antal
+                self._rakna(kommando, FEL)
+                kommando.future.set_exception(e)
+            return
+
+        self.batchar += 1
+        self.skrivna_bud += len(rader)
+        logg = hamta_logg()
+        if logg is not None and rader:
+            logg.lagg_till_manga([
+                (BUD_LAGT, rad['auction_id'], rad['user_id'], bid_id, rad['amount'])
+                for rad, bid_id in zip(rader, bid_ids)
+            ])
+        if forlorade:
+            # En annan process hann höja priset - läs om läget från databasen
+            with db.engine.connect() as conn:
+                for auction_id in forlorade:
+                    self.lagen.pop(auction_id, None)
+                self.lagen.update(las_lagen(conn, forlorade))
+
+        for kommando, _ in godkanda:
+            lage = self.lagen.get(kommando.auction_id)
+            if kommando.auction_id in forlorade:
+                pris = lage.pris if lage else None
+                self._besvara(kommando, BudResultat(FOR_LAGT, pris, lage.antal_bud if lage else 0))
+            else:
+                self._besvara(kommando, BudResultat(OK, kommando.belopp, lage.antal_bud))
+
+
+class BudMotor:
+    """Fördelar kommandon på shards och väntar på svaren"""
+
+    def __init__(self, app, antal_shards=4, max_batch=100, timeout=5.0, rensa_var=60.0):
+        self.app = app
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.rensa_var = rensa_var
+        self.ring = HashRing(antal_shards)
+        self.shards = [Shard(self, i) for i in range(antal_shards)]
+        self._lock = threading.Lock()
+        self._startad = False
+
+    def shard_for(self, auction_id):
+        return self.shards[self.ring.shard_for(auction_id)]
+
+    def bygg_om(self):
+        """Läser in läget för alla pågående auktioner från databasen (vid start)"""
+        with self.app.app_context(), db.engine.connect() as conn:
+            lagen = las_lagen(conn)
+        for auction_id, lage in lagen.items():
+            self.shard_for(auction_id).lagen[auction_id] = lage
+        return len(lagen)
+
+    def _skicka(self, kommando):
+        if not self._startad:
+            with self._lock:
+                if not self._startad:
+                    for shard in self.shards:
+                        shard.starta()
+                    self._startad = True
+        self.shard_for(kommando.auction_id).ko.put(kommando)
+        try:
+            return kommando.future.result(self.timeout)
+        except FutureTimeout:
+            if kommando.future.cancel():
+                raise  # shard-tråden hoppar över kommandot - inget skrevs
+        # Behandlingen har börjat: vänta på det skrivna (eller avvisade) resultatet
+        return kommando.future.result()
+
+    def lagg_bud(self, auction_id, user_id, belopp):
+        """
+        Lägger ett bud. Returnerar när budet är skrivet till databasen (eller avvisat).
+
+        Returns:
+            BudResultat
+        """
+        return self._skicka(_Kommando('bud', auction_id, user_id, belopp))
+
+    def validera(self, auction_id, user_id, belopp):
+        """Kontrollerar ett bud utan att lägga det"""
+        lage = self.shard_for(auction_id).lagen.get(auction_id)
+        if lage is not None:
+            return BudResultat(lage.pruva(user_id, belopp), lage.pris, lage.antal_bud)
+        return self._skicka(_Kommando('validera', auction_id, user_id, belopp))
+
+    def glom(self, auction_id):
+        """Släpper läget för en auktion så att det läses om (efter admin-ändringar)"""
+        if not self._startad:
+            self.shard_for(auction_id).lagen.pop(auction_id, None)
+            return
+        self._skicka(_Kommando('glom', auction_id))
+
+    def stang(self):
+        """Stoppar shard-trådarna när köerna är tomma"""
+        if self._startad:
+            for shard in self.shards:
+                shard.ko.put(None)
+            for shard in self.shards:
+                shard.trad.join(self.timeout)
+
+
+def init_bid_engine(app):
+    """
+    Kopplar budmotorn till Flask-appen och bygger upp läget från databasen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    motor = BudMotor(
+        app,
+        antal_shards=app.config.get('BID_ENGINE_SHARDS', 4),
+        max_batch=app.config.get('BID_ENGINE_MAX_BATCH', 100),
+        timeout=app.config.get('BID_ENGINE_TIMEOUT', 5.0),
+        rensa_var=app.config.get('BID_ENGINE_PRUNE_INTERVAL', 60.0),
+    )
+    app.extensions['bid_engine'] = motor
+    motor.bygg_om()
+
+
+def hamta_budmotor():
+    """Returnerar appens BudMotor"""
+    return current_app.extensions['bid_engine']
+
+
+def glom_auktion(auction_id):
+    """Släpper budmotorns läge för en auktion. Anropas efter admin-ändringar."""
+    motor = current_app.extensions.get('bid_engine')
+    if motor is not None:
+        motor.glom(auction_id)
@@ -0,0 +1,161 @@
+# services/bid_history.py
+"""
+📜 BID HISTORY - Inkrementell budhistorik med markörer
+
+SYFTE: /bidding/history/<id> returnerade alltid de senaste 20 buden och
+maskerade budgivarens e-post rad för rad vid varje anrop. En klient som
+pollar fick samma bud om och om igen, och långa historiker gick inte att
+bläddra bakåt i.
+
+HUR DET FUNGERAR:
+1. MARKÖRER: after_id ger bud NYARE än ett id (för polling - bara det nya),
+   before_id ger bud ÄLDRE än ett id (bläddra bakåt). Utan markör ges de
+   senaste buden. Frågan går på indexet (auction_id, id), så kostnaden beror
+   på sidans storlek och inte på historikens längd.
+2. ETIKETTER: Budgivarens maskerade etikett (a***@example.com) och
+   admin-etiketten (namn + e-post) räknas ut en gång per användare och sparas
+   i en LRU-cache. Okända användare på en sida hämtas i EN fråga.
+   Ändras en användare släpps etiketten via ändringsflödet.
+3. KUVERT: Svaret har alltid samma nycklar (auction_id, bids, latest_id,
+   oldest_id, has_more) och högst BID_HISTORY_MAX_PAGE bud.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import select
+
+from database import db
+
+
+def maskera_epost(epost):
+    """a.person@example.com -> a***@example.com"""
+    lokal, _, doman = epost.partition('@')
+    return f'{lokal[:1]}***@{doman}'
+
+
+class BudgivarEtiketter:
+    """LRU-cache user_id -> (maskerad etikett, admin-etikett)"""
+
+    def __init__(self, max_poster=10000, ttl=3600.0):
+        self.max_poster = max_poster
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._poster = OrderedDict()  # user_id -> (maskerad, full, skapad)
+        # Statistik
+        self.hits = 0
+        self.misses = 0
+
+    def hamta(self, user_ids):
+        """
+        Returnerar {user_id: (maskerad, full)} för alla user_ids.
+        Saknade användare hämtas från databasen i en enda fråga.
+        """
+        resultat = {}
+        saknas = set()
+        grans = time.monotonic() - self.ttl
+        with self._lock:
+            for user_id in set(user_ids):
+                post = self._poster.get(user_id)
+                if post is None or post[2] < grans:
+                    saknas.add(user_id)
+                else:
+                    self._poster.move_to_end(user_id)
+                    resultat[user_id] = post[:2]
+            self.hits += len(resultat)
+            self.misses += len(saknas)
+
+        if saknas:
+            from models.user import User
+            rader = db.session.execute(
+                select(User.id, User.email, User.first_name, User.last_name).where(User.id.in_(saknas))
+            ).all()
+            nu = time.monotonic()
+            with self._lock:
+                for rad in rader:
+                    etiketter = (maskera_epost(rad.email), f'{rad.first_name} {rad.last_name} ({rad.email})')
+                    self._poster[rad.id] = (*etiketter, nu)
+                    self._poster.move_to_end(rad.id)
+                    resultat[rad.id] = etiketter
+                while len(self._poster) > self.max_poster:
+                    self._poster.popitem(last=False)
+        return resultat
+
+    def glom(self, user_id):
+        with self._lock:
+            self._poster.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._poster)
+
+
+def hamta_historik(auction_id, after_id=None, before_id=None, limit=None, admin=False):
+    """
+    Hämtar en sida budhistorik.
+
+    Args:
+        auction_id: Auktionen
+        after_id: Bara bud med id > after_id (äldst först, för polling)
+        before_id: Bara bud med id < before_id (nyast först, för bakåtbläddring)
+        limit: Max antal bud (begränsas till BID_HISTORY_MAX_PAGE)
+        admin: Visa namn och e-post istället för maskerad e-post
+
+    Returns:
+        dict: Kuvertet som /bidding/history/<id> svarar med
+    """
+    from models.bid import Bid
+
+    standard = current_app.config.get('BID_HISTORY_PAGE_SIZE', 20)
+    limit = max(1, min(limit or standard, current_app.config.get('BID_HISTORY_MAX_PAGE', 100)))
+
+    fraga = select(Bid.id, Bid.amount, Bid.created_at, Bid.user_id).where(Bid.auction_id == auction_id)
+    if after_id is not None:
+        fraga = fraga.where(Bid.id > after_id).order_by(Bid.id.asc())
+    else:
+        if before_id is not None:
+            fraga = fraga.where(Bid.id < before_id)
+        fraga = fraga.order_by(Bid.id.desc())
+    # En rad extra avgör om det finns fler
+    rader = db.session.execute(fraga.limit(limit + 1)).all()
+    has_more = len(rader) > limit
+    rader = rader[:limit]
+    if after_id is not None:
+        rader.reverse()  # svaret är alltid nyast först
+
+    etiketter = hamta_etiketter().hamta(rad.user_id for rad in rader)
+    bids = []
+    for rad in rader:
+        maskerad, full = etiketter.get(rad.user_id, ('Okänd', 'Okänd'))
+        bids.append({
+            'id': rad.id,
+            'amount': rad.amount,
+            'bidder': full if admin else maskerad,
+            'created_at': rad.created_at.isoformat(),
+            'formatted_time': rad.created_at.strftime('%Y-%m-%d %H:%M'),
+        })
+
+    return {
+        'auction_id': auction_id,
+        'bids': bids,
+        'latest_id': bids[0]['id'] if bids else after_id,
+        'oldest_id': bids[-1]['id'] if bids else before_id,
+        'has_more': has_more,
+    }
+
+
+def init_bid_history(app):
+    """
+    Kopplar etikettcachen till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.extensions['bidder_labels'] = BudgivarEtiketter(
+        max_poster=app.config.get('BID_HISTORY_LABEL_CACHE', 10000),
+    )
+
+
+def hamta_etiketter():
+    """Returnerar appens BudgivarEtiketter"""
+    return current_app.extensions['bidder_labels']
@@ -0,0 +1,283 @@
+# services/change_feed.py
+"""
+🔔 CHANGE FEED - Ändringsflöde för invalidering mellan processer
+
+SYFTE: Cacherna i minnet (sidcachen, budmotorn, reaktionerna) gäller bara den
+egna processen. Med flera workers blir de inaktuella så fort en annan worker
+skriver. Ändringsflödet sprider alla skrivningar till alla processer.
+
+HUR DET FUNGERAR:
+1. En SQLAlchemy-lyssnare (after_flush) skriver en rad i tabellen changes för
+   varje insert/update/delete på Auction, Bid, Like, User och SavedSearch - i SAMMA
+   transaktion som ändringen. Rullas ändringen tillbaka försvinner raden också.
+2. Skrivningar som går förbi ORM:en (budmotorns och reaktionernas batchar)
+   registreras med registrera_andringar() i sin egen transaktion.
+3. En läsartråd i varje worker (AndringsLasare) hämtar nya rader var
+   CHANGE_FEED_POLL_INTERVAL sekund och anropar prenumeranterna. Ändringar
+   från den egna processen hoppas över av standardprenumeranten, eftersom
+   de redan är invaliderade lokalt.
+4. Varaktiga konsumenter (t.ex. ett sökindex) sparar sin position i tabellen
+   change_consumers och fortsätter från den efter en omstart.
+5. Gamla rader rensas efter CHANGE_FEED_RETENTION sekunder, men aldrig rader
+   som en varaktig konsument inte har läst än.
+6. LUCKOR: seq delas ut vid insert men raden syns först vid commit. På
+   PostgreSQL kan seq 11 alltså bli synlig före seq 10, och en läsare som
+   flyttar fram till 11 skulle aldrig se 10. las_andringar stannar därför före
+   en lucka så länge raden efter den är yngre än CHANGE_FEED_GAP_WAIT sekunder.
+   Äldre luckor är tillbakarullade (eller rensade) rader och hoppas över.
+   På SQLite serialiseras skrivningarna och luckor uppstår inte.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, insert, select
+
+from database import db
+
+# Tabeller som spåras -> funktion som ger berörd auktion
+_SPARADE = {
+    'auctions': lambda obj: obj.id,
+    'bids': lambda obj: obj.auction_id,
+    'likes': lambda obj: obj.auction_id,
+    'users': lambda obj: None,
+    'saved_searches': lambda obj: None,
+}
+
+
+class Andring:
+    """En rad ur ändringsflödet"""
+    __slots__ = ('seq', 'table_name', 'row_id', 'operation', 'auction_id', 'origin', 'egen')
+
+    def __init__(self, seq, table_name, row_id, operation, auction_id, origin, egen=False):
+        self.seq = seq
+        self.table_name = table_name
+        self.row_id = row_id
+        self.operation = operation
+        self.auction_id = auction_id
+        self.origin = origin
+        self.egen = egen
+
+    def __repr__(self):
+        return f'<Andring {self.seq} {self.operation} {self.table_name}:{self.row_id}>'
+
+
+def registrera_andringar(conn, andringar, origin=None):
+    """
+    Skriver ändringsrader i en pågående transaktion.
+
+    Args:
+        conn: Connection i samma transaktion som ändringen
+        andringar: lista med (table_name, row_id, operation, auction_id)
+        origin: Processens id (standard: appens ändringsflöde)
+    """
+    if not andringar:
+        return
+    if origin is None:
+        flode = current_app.extensions.get('change_feed')
+        if flode is None:
+            return
+        origin = flode.origin
+    from models.change import Change
+
+    nu = datetime.utcnow()
+    conn.execute(insert(Change.__table__), [
+        {'table_name': t, 'row_id': r, 'operation': o, 'auction_id': a, 'origin': origin, 'created_at': nu}
+        for t, r, o, a in andringar
+    ])
+
+
+def _efter_flush(session, flush_context):
+    """after_flush-lyssnare: samlar ändrade objekt och skriver ändringsrader"""
+    try:
+        flode = current_app.extensions.get('change_feed')
+    except RuntimeError:  # utanför app context
+        return
+    if flode is None:
+        return
+
+    andringar = []
+    for objekt, operation in (
+        *((o, 'insert') for o in session.new),
+        *((o, 'update') for o in session.dirty if session.is_modified(o, include_collections=False)),
+        *((o, 'delete') for o in session.deleted),
+    ):
+        tabell = getattr(objekt, '__tablename__', None)
+        auktion_for = _SPARADE.get(tabell)
+        if auktion_for is None:
+            continue
+        andringar.append((tabell, objekt.id, operation, auktion_for(objekt)))
+    if andringar:
+        registrera_andringar(session.connection(), andringar, flode.origin)
+
+
+class AndringsLasare:
+    """Läser nya ändringar och skickar dem till prenumeranterna (en per process)"""
+
+    def __init__(self, app, intervall=0.5, retention=86400.0, batch=500):
+        self.app = app
+        self.intervall = intervall
+        self.retention = retention
+        self.batch = batch
+        self.origin = uuid.uuid4().hex
+        self.senaste_seq = 0
+        self._prenumeranter = []
+        self._lock = threading.Lock()
+        self._stopp = threading.Event()
+        self._trad = None
+        self._senast_rensad = time.monotonic()
+
+    def prenumerera(self, funktion):
+        """Registrerar en funktion som anropas med varje Andring (i läsartråden)"""
+        self._prenumeranter.append(funktion)
+        return funktion
+
+    def borja_vid_slutet(self):
+        """Nya processer behöver inte gamla ändringar - börja efter den senaste"""
+        from models.change import Change
+        with self.app.app_context():
+            self.senaste_seq = db.session.execute(select(func.max(Change.seq))).scalar() or 0
+
+    def las_nya(self):
+        """Hämtar och skickar vidare nya ändringar. Returnerar antal."""
+        with self._lock, self.app.app_context():
+            andringar = las_andringar(self.senaste_seq, self.batch, self.origin)
+            for andring in andringar:
+                for funktion in self._prenumeranter:
+                    try:
+                        funktion(andring)
+                    except Exception:
+                        self.app.logger.exception('Prenumerant på ändringsflödet misslyckades (%r)', andring)
+                self.senaste_seq = andring.seq
+            if self.retention and time.monotonic() - self._senast_rensad > 60:
+                self._senast_rensad = time.monotonic()
+                rensa_gamla(self.retention)
+            return len(andringar)
+
+    def starta(self):
+        if self.intervall and self._trad is None:
+            self._trad = threading.Thread(target=self._kor, name='change-feed', daemon=True)
+            self._trad.start()
+
+    def _kor(self):
+        while not self._stopp.wait(self.intervall):
+            try:
+                # Töm kön direkt om det finns fler än en batch
+                while self.las_nya() >= self.batch:
+                    pass
+            except Exception:
+                self.app.logger.exception('Kunde inte läsa ändringsflödet')
+
+    def stang(self):
+        self._stopp.set()
+
+
+def las_andringar(efter_seq, max_antal=500, origin=None, lucktid=None):
+    """
+    Returnerar ändringar med seq > efter_seq i ordning, fram till första
+    färska luckan (se LUCKOR ovan). Kräver app context.
+
+    Args:
+        efter_seq: Senast bearbetade seq
+        max_antal: Max antal rader
+        origin: Den egna processens id (sätter Andring.egen)
+        lucktid: Sekunder att vänta på en saknad seq (standard: CHANGE_FEED_GAP_WAIT)
+    """
+    from models.change import Change
+    if lucktid is None:
+        lucktid = current_app.config.get('CHANGE_FEED_GAP_WAIT', 5.0)
+    rader = db.session.execute(
+        select(Change.seq, Change.table_name, Change.row_id, Change.operation, Change.auction_id, Change.origin,
+               Change.created_at)
+        .where(Change.seq > efter_seq)
+        .order_by(Change.seq)
+        .limit(max_antal)
+    ).all()
+    db.session.rollback()  # avsluta lästransaktionen så att nästa läsning ser nya rader
+
+    grans = datetime.utcnow() - timedelta(seconds=lucktid)
+    forra = efter_seq
+    for i, rad in enumerate(rader):
+        if rad.seq != forra + 1 and rad.created_at > grans:
+            # En transaktion med lägre seq kan fortfarande committa - läs om härifrån nästa gång
+            rader = rader[:i]
+            break
+        forra = rad.seq
+    return [Andring(*rad[:6], egen=(rad.origin == origin)) for rad in rader]
+
+
+def hamta_position(namn):
+    """Senast bearbetade seq för en varaktig konsument (0 om den är ny)"""
+    from models.change import ChangeConsumer
+    konsument = db.session.get(ChangeConsumer, namn)
+    return konsument.last_seq if konsument else 0
+
+
+def spara_position(namn, seq):
+    """Sparar en varaktig konsuments position"""
+    from models.change import ChangeConsumer
+    konsument = db.session.get(ChangeConsumer, namn)
+    if konsument is None:
+        db.session.add(ChangeConsumer(name=namn, last_seq=seq))
+    else:
+        konsument.last_seq = seq
+    db.session.commit()
+
+
+def rensa_gamla(retention):
+    """Tar bort ändringar äldre än retention sekunder som alla varaktiga konsumenter har läst"""
+    from models.change import Change, ChangeConsumer
+    villkor = [Change.created_at < datetime.utcnow() - timedelta(seconds=retention)]
+    lagsta = db.session.execute(select(func.min(ChangeConsumer.last_seq))).scalar()
+    if lagsta is not None:
+        villkor.append(Change.seq <= lagsta)
+    db.session.execute(Change.__table__.delete().where(*villkor))
+    db.session.commit()
+
+
+def _invalidera_lokalt(andring):
+    """Standardprenumerant: släpper cacher för ändringar från andra processer"""
+    if andring.table_name == 'users':
+        # Budhistorikens etiketter släpps även för egna ändringar (de invalideras inte vid skrivningen)
+        etiketter = current_app.extensions.get('bidder_labels')
+        if etiketter is not None:
+            etiketter.glom(andring.row_id)
+    if andring.egen or andring.auction_id is None:
+        return
+    from services.bid_engine import glom_auktion
+    from services.page_cache import invalidera_auktion
+
+    invalidera_auktion(andring.auction_id)
+    if andring.table_name in ('auctions', 'bids'):
+        glom_auktion(andring.auction_id)
+    if andring.table_name == 'likes':
+        reaktioner = current_app.extensions.get('reactions')
+        if reaktioner is not None:
+            reaktioner.glom(andring.auction_id)
+
+
+def init_change_feed(app):
+    """
+    Kopplar ändringsflödet till Flask-appen och startar läsartråden.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    lasare = AndringsLasare(
+        app,
+        intervall=app.config.get('CHANGE_FEED_POLL_INTERVAL', 0.5),
+        retention=app.config.get('CHANGE_FEED_RETENTION', 86400.0),
+    )
+    app.extensions['change_feed'] = lasare
+    if not event.contains(db.session, 'after_flush', _efter_flush):
+        event.listen(db.session, 'after_flush', _efter_flush)
+    lasare.prenumerera(_invalidera_lokalt)
+    lasare.borja_vid_slutet()
+    lasare.starta()
+
+
+def hamta_andringsflode():
+    """Returnerar appens AndringsLasare"""
+    return current_app.extensions['change_feed']
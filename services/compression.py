@@ -0,0 +1,132 @@
+# services/compression.py
+"""
+🗜️ COMPRESSION - Komprimering av svar (gzip, plus brotli om det finns)
+
+SYFTE: HTML från browse/detail och JSON från /bidding/history/<id> skickades
+okomprimerat. Efter varje request komprimeras svaret om:
+- klienten accepterar gzip eller br (Accept-Encoding),
+- content-typen finns i COMPRESS_MIMETYPES,
+- svaret är minst COMPRESS_MIN_SIZE byte,
+- svaret inte redan är komprimerat, streamat eller en fil (send_file).
+
+Brotli är valfritt: finns paketet 'brotli' installerat används det, annars gzip.
+Statiska filer komprimeras i förväg av build_assets.py (se services/assets.py).
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - beror på miljön
+    brotli = None
+
+STANDARD_MIMETYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+)
+
+
+def valj_kodning(accept_encoding, tillgangliga):
+    """
+    Väljer bästa kodning utifrån Accept-Encoding-headern.
+
+    Args:
+        accept_encoding: Klientens Accept-Encoding-värde
+        tillgangliga: Kodningar i prioritetsordning, t.ex. ('br', 'gzip')
+
+    Returns:
+        str eller None: Vald kodning, eller None om ingen passar
+    """
+    accepterade = {}
+    for del_ in (accept_encoding or '').split(','):
+        namn, _, parametrar = del_.strip().partition(';')
+        namn = namn.strip().lower()
+        if not namn:
+            continue
+        q = 1.0
+        parametrar = parametrar.strip()
+        if parametrar.startswith('q='):
+            try:
+                q = float(parametrar[2:])
+            except ValueError:
+                q = 0.0
+        accepterade[namn] = q
+
+    for kodning in tillgangliga:
+        q = accepterade.get(kodning, accepterade.get('*', 0.0))
+        if q > 0:
+            return kodning
+    return None
+
+
+def komprimera(data, kodning, gzip_niva=6, brotli_kvalitet=5):
+    """Komprimerar bytes med vald kodning"""
+    if kodning == 'br':
+        return brotli.compress(data, quality=brotli_kvalitet)
+    # mtime=0 ger samma bytes för samma indata (stabila ETags)
+    return gzip.compress(data, compresslevel=gzip_niva, mtime=0)
+
+
+def tillgangliga_kodningar():
+    """Returnerar kodningarna som servern kan producera, bäst först"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def init_compression(app):
+    """
+    Registrerar komprimeringen som en after_request-hook.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    min_storlek = app.config.get('COMPRESS_MIN_SIZE', 500)
+    mimetypes = frozenset(app.config.get('COMPRESS_MIMETYPES', STANDARD_MIMETYPES))
+    gzip_niva = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+    brotli_kvalitet = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+    kodningar = tillgangliga_kodningar()
+
+    @app.after_request
+    def komprimera_svar(svar):
+        from flask import request
+
+        if (
+            svar.direct_passthrough
+            or svar.is_streamed
+            or svar.status_code < 200
+            or svar.status_code in (204, 206, 304)
+            or 'Content-Encoding' in svar.headers
+            or svar.mimetype not in mimetypes
+        ):
+            return svar
+
+        svar.vary.add('Accept-Encoding')
+        kodning = valj_kodning(request.headers.get('Accept-Encoding'), kodningar)
+        if kodning is None:
+            return svar
+
+        # Cachade sidor (services/page_cache.py) delar en dict med redan
+        # komprimerade varianter, så samma HTML komprimeras bara en gång.
+        varianter = getattr(svar, 'komprimerade_varianter', None)
+        data = varianter.get(kodning) if varianter is not None else None
+        if data is None:
+            okomprimerat = svar.get_data()
+            if len(okomprimerat) < min_storlek:
+                return svar
+            data = komprimera(okomprimerat, kodning, gzip_niva, brotli_kvalitet)
+            if varianter is not None:
+                varianter[kodning] = data
+
+        svar.set_data(data)
+        svar.headers['Content-Encoding'] = kodning
+        if svar.headers.get('ETag'):
+            # Ett starkt ETag får inte delas mellan olika kodningar
+            etag, _ = svar.get_etag()
+            svar.set_etag(f'{etag}-{kodning}', weak=True)
+        return svar
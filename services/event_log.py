@@ -0,0 +1,498 @@
+# services/event_log.py
+"""
+📜 EVENT LOG - Append-only logg över budhändelser med snapshots och replay
+
+SYFTE: Tabellen bids går att ändra och auctions.current_bid räknades om för
+hand när admin tog bort ett bud. Händelseloggen är den oföränderliga historiken:
+varje händelse får ett löpnummer (seq) och skrivs till slutet av en binärfil.
+Ur loggen kan current_bid, antal bud och cacher byggas upp från valfri punkt.
+
+HÄNDELSER:
+- BUD_LAGT         (bid placed)      auction_id, user_id, bid_id, belopp
+- BUD_TILLBAKA     (bid retracted)   auction_id, bid_id
+- AUKTION_FORLANGD (auction extended) auction_id, nytt sluttid (epoch)
+- AUKTION_STANGD   (auction closed)  auction_id
+
+FILFORMAT (events.log): en post är 45 byte, little-endian:
+    seq (Q) | tid (d) | typ (B) | auction_id (I) | user_id (I) | bid_id (Q) | värde (d) | crc32 (I)
+En halvskriven post i slutet (t.ex. efter strömavbrott) känns igen på CRC:n
+och klipps bort när loggen öppnas.
+
+SNAPSHOTS: Var EVENT_SNAPSHOT_EVERY:e händelse för en auktion sparas dess
+läge i snapshots/<auction_id>.json tillsammans med seq och filposition.
+Replay för en auktion börjar då vid snapshoten istället för vid loggens början.
+
+INDEX: Posterna har fast storlek och seq saknar luckor, så en seq är en
+filposition. Loggen håller i minnet seq för varje auktions händelser sedan
+dess senaste snapshot, och projektion() läser bara de posterna - inte hela
+loggen. Auktioner som redan hade en snapshot när loggen öppnades indexeras
+första gången de återspelas.
+"""
+import json
+import os
+import struct
+from array import array
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Händelsetyper
+BUD_LAGT = 1
+BUD_TILLBAKA = 2
+AUKTION_FORLANGD = 3
+AUKTION_STANGD = 4
+
+TYPNAMN = {
+    BUD_LAGT: 'bid_placed',
+    BUD_TILLBAKA: 'bid_retracted',
+    AUKTION_FORLANGD: 'auction_extended',
+    AUKTION_STANGD: 'auction_closed',
+}
+
+_POST = struct.Struct('<QdBIIQd')
+_CRC = struct.Struct('<I')
+POSTSTORLEK = _POST.size + _CRC.size
+
+
+class Handelse:
+    """En händelse i loggen"""
+    __slots__ = ('seq', 'tid', 'typ', 'auction_id', 'user_id', 'bid_id', 'varde', 'position')
+
+    def __init__(self, seq, tid, typ, auction_id, user_id, bid_id, varde, position=None):
+        self.seq = seq
+        self.tid = tid
+        self.typ = typ
+        self.auction_id = auction_id
+        self.user_id = user_id
+        self.bid_id = bid_id
+        self.varde = varde
+        self.position = position  # filposition för posten efter denna
+
+    def som_dict(self):
+        return {
+            'seq': self.seq,
+            'time': self.tid,
+            'type': TYPNAMN.get(self.typ, self.typ),
+            'auction_id': self.auction_id,
+            'user_id': self.user_id,
+            'bid_id': self.bid_id,
+            'value': self.varde,
+        }
+
+
+def _koda(seq, tid, typ, auction_id, user_id, bid_id, varde):
+    data = _POST.pack(seq, tid, typ, auction_id, user_id, bid_id, varde)
+    return data + _CRC.pack(zlib.crc32(data))
+
+
+def _avkoda(post):
+    data, crc = post[:_POST.size], post[_POST.size:]
+    if len(post) != POSTSTORLEK or _CRC.unpack(crc)[0] != zlib.crc32(data):
+        return None
+    return _POST.unpack(data)
+
+
+class AuktionsProjektion:
+    """Auktionens läge byggt ur händelser (current_bid, ledare, antal bud)"""
+
+    def __init__(self, auction_id):
+        self.auction_id = auction_id
+        self.bud = {}          # bid_id -> (user_id, belopp, seq)
+        self.sluttid = None    # epoch, satt av AUKTION_FORLANGD
+        self.stangd = False
+        self.seq = 0           # senast tillämpade händelse
+
+    def tillamp(self, h):
+        if h.typ == BUD_LAGT:
+            self.bud[h.bid_id] = (h.user_id, h.varde, h.seq)
+        elif h.typ == BUD_TILLBAKA:
+            self.bud.pop(h.bid_id, None)
+        elif h.typ == AUKTION_FORLANGD:
+            self.sluttid = h.varde
+        elif h.typ == AUKTION_STANGD:
+            self.stangd = True
+        self.seq = h.seq
+
+    def _hogsta(self):
+        if not self.bud:
+            return None
+        # Högsta belopp, tidigast vid lika - samma regel som i bidding.py
+        return min(self.bud.values(), key=lambda b: (-b[1], b[2]))
+
+    @property
+    def current_bid(self):
+        hogsta = self._hogsta()
+        return hogsta[1] if hogsta else None
+
+    @property
+    def ledare(self):
+        hogsta = self._hogsta()
+        return hogsta[0] if hogsta else None
+
+    @property
+    def antal_bud(self):
+        return len(self.bud)
+
+    def som_dict(self):
+        return {
+            'auction_id': self.auction_id,
+            'seq': self.seq,
+            'bud': [[bid_id, u, b, s] for bid_id, (u, b, s) in self.bud.items()],
+            'sluttid': self.sluttid,
+            'stangd': self.stangd,
+        }
+
+    @classmethod
+    def fran_dict(cls, data):
+        projektion = cls(data['auction_id'])
+        projektion.bud = {bid_id: (u, b, s) for bid_id, u, b, s in data['bud']}
+        projektion.sluttid = data['sluttid']
+        projektion.stangd = data['stangd']
+        projektion.seq = data['seq']
+        return projektion
+
+
+class HandelseLogg:
+    """
+    Append-only händelselogg på disk. Trådsäker, och flera processer kan
+    skriva till samma fil (seq tilldelas under ett fillås).
+    """
+
+    def __init__(self, katalog, snapshot_var=100, fsync=False):
+        self.katalog = katalog
+        self.sokvag = os.path.join(katalog, 'events.log')
+        self.snapshot_katalog = os.path.join(katalog, 'snapshots')
+        self.snapshot_var = snapshot_var
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._sedan_snapshot = {}  # auction_id -> händelser sedan senaste snapshot
+        # auction_id -> (fran_seq, array med seq för ALLA auktionens händelser efter fran_seq)
+        self._index = {}
+        os.makedirs(self.snapshot_katalog, exist_ok=True)
+        # Auktioner med snapshot indexeras först när de återspelas (se projektion)
+        self._oindexerade = {
+            int(namn[:-5]) for namn in os.listdir(self.snapshot_katalog)
+            if namn.endswith('.json') and namn[:-5].isdigit()
+        }
+        self._fil = open(self.sokvag, 'a+b')
+        self.senaste_seq, self._storlek = self._las_slut(0, 0)
+        self._klipp_trasig_svans()
+
+    # ------------------------------------------------------------
+    # Skrivning
+    # ------------------------------------------------------------
+    def lagg_till(self, typ, auction_id, user_id=0, bid_id=0, varde=0.0):
+        """Lägger till en händelse. Returnerar dess seq."""
+        return self.lagg_till_manga([(typ, auction_id, user_id, bid_id, varde)])[-1]
+
+    def lagg_till_manga(self, handelser, snapshots=True):
+        """
+        Lägger till flera händelser med en skrivning.
+
+        Args:
+            handelser: lista med (typ, auction_id, user_id, bid_id, värde)
+            snapshots: Skriv snapshots var snapshot_var:e händelse per auktion
+                (False vid massinläsning - skriv dem efteråt med en enda återspelning)
+
+        Returns:
+            list: seq för varje händelse
+        """
+        if not handelser:
+            return []
+        tid = time.time()
+        with self._lock:
+            self._las_las()
+            try:
+                # En annan process kan ha skrivit sedan vi senast läste
+                self.senaste_seq, self._storlek = self._las_slut(self.senaste_seq, self._storlek)
+                data = bytearray()
+                seqs = []
+                for typ, auction_id, user_id, bid_id, varde in handelser:
+                    self.senaste_seq += 1
+                    seqs.append(self.senaste_seq)
+                    self._indexera(auction_id, self.senaste_seq)
+                    data += _koda(self.senaste_seq, tid, typ, auction_id, user_id or 0, bid_id or 0, float(varde or 0))
+                self._fil.write(data)
+                self._fil.flush()
+                if self.fsync:
+                    os.fsync(self._fil.fileno())
+                self._storlek += len(data)
+            finally:
+                self._las_upp()
+
+            att_snapshota = []
+            for _, auction_id, *_ in (handelser if snapshots else ()):
+                antal = self._sedan_snapshot.get(auction_id, 0) + 1
+                if antal >= self.snapshot_var:
+                    antal = 0
+                    att_snapshota.append(auction_id)
+                self._sedan_snapshot[auction_id] = antal
+
+        for auction_id in set(att_snapshota):
+            self.skriv_snapshot(self.projektion(auction_id))
+        return seqs
+
+    def _las_las(self):
+        if fcntl is not None:
+            fcntl.flock(self._fil.fileno(), fcntl.LOCK_EX)
+
+    def _las_upp(self):
+        if fcntl is not None:
+            fcntl.flock(self._fil.fileno(), fcntl.LOCK_UN)
+
+    def _las_slut(self, seq, position):
+        """
+        Läser hela poster från position till filens slut och indexerar dem.
+        Returnerar (seq, position). Kräver låset (eller konstruktorn).
+        """
+        for h in self.las(position=position):
+            seq, position = h.seq, h.position
+            self._indexera(h.auction_id, h.seq)
+        return seq, position
+
+    def _indexera(self, auction_id, seq):
+        """Kräver låset (eller konstruktorn)"""
+        post = self._index.get(auction_id)
+        if post is not None:
+            post[1].append(seq)
+        elif auction_id not in self._oindexerade:
+            self._index[auction_id] = (0, array('Q', [seq]))
+
+    def _klipp_trasig_svans(self):
+        if os.path.getsize(self.sokvag) <= self._storlek:
+            return
+        with self._lock:
+            self._las_las()
+            try:
+                # Slutet lästes utan fillåset - en annan process kan ha varit mitt
+                # i en skrivning som nu är klar. Läs om innan något klipps bort.
+                self.senaste_seq, self._storlek = self._las_slut(self.senaste_seq, self._storlek)
+                if os.path.getsize(self.sokvag) > self._storlek:
+                    self._fil.truncate(self._storlek)
+            finally:
+                self._las_upp()
+
+    # ------------------------------------------------------------
+    # Läsning
+    # ------------------------------------------------------------
+    def las(self, fran_seq=0, till_seq=None, position=0):
+        """
+        Läser händelser i ordning.
+
+        Args:
+            fran_seq: Första seq som ska returneras
+            till_seq: Sista seq (inklusive), eller None för loggens slut
+            position: Filposition att börja läsa vid (t.ex. från en snapshot)
+        """
+        with open(self.sokvag, 'rb') as f:
+            f.seek(position)
+            while True:
+                post = f.read(POSTSTORLEK)
+                falt = _avkoda(post) if post else None
+                if falt is None:
+                    return
+                position += POSTSTORLEK
+                if till_seq is not None and falt[0] > till_seq:
+                    return
+                if falt[0] >= fran_seq:
+                    yield Handelse(*falt, position=position)
+
+    # ------------------------------------------------------------
+    # Snapshots och replay
+    # ------------------------------------------------------------
+    def _snapshot_sokvag(self, auction_id):
+        return os.path.join(self.snapshot_katalog, f'{auction_id}.json')
+
+    def las_snapshot(self, auction_id):
+        """Returnerar (projektion, filposition) från senaste snapshot, eller (None, 0)"""
+        try:
+            with open(self._snapshot_sokvag(auction_id), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None, 0
+        return AuktionsProjektion.fran_dict(data), data['position']
+
+    def skriv_snapshot(self, projektion, position=None):
+        """Sparar en auktions läge atomiskt (skriv till tempfil + byt namn)"""
+        data = projektion.som_dict()
+        data['position'] = position if position is not None else self._position_efter(projektion.seq)
+        sokvag = self._snapshot_sokvag(projektion.auction_id)
+        tmp = f'{sokvag}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, sokvag)
+        with self._lock:
+            self._klipp_index(projektion.auction_id, projektion.seq)
+
+    def _klipp_index(self, auction_id, seq):
+        """Släpper indexerade händelser till och med seq (de finns i en snapshot). Kräver låset."""
+        post = self._index.get(auction_id)
+        if post is not None and post[0] < seq:
+            self._index[auction_id] = (seq, array('Q', (s for s in post[1] if s > seq)))
+
+    def _position_efter(self, seq):
+        # Posterna har fast storlek och seq börjar på 1 utan luckor
+        return seq * POSTSTORLEK
+
+    def projektion(self, auction_id, till_seq=None):
+        """Bygger en auktions läge från senaste användbara snapshot + auktionens senare händelser"""
+        projektion, position = self.las_snapshot(auction_id)
+        if projektion is None or (till_seq is not None and projektion.seq > till_seq):
+            projektion, position = AuktionsProjektion(auction_id), 0
+
+        with self._lock:
+            # Ikapp med det som andra processer har skrivit
+            self.senaste_seq, self._storlek = self._las_slut(self.senaste_seq, self._storlek)
+            post = self._index.get(auction_id)
+            seqs = None
+            if post is None and auction_id not in self._oindexerade:
+                seqs = []  # Inga händelser alls för auktionen
+            elif post is not None and post[0] <= projektion.seq:
+                seqs = [s for s in post[1] if s > projektion.seq and (till_seq is None or s <= till_seq)]
+                if till_seq is None:
+                    self._klipp_index(auction_id, projektion.seq)
+
+        if seqs is not None:
+            with open(self.sokvag, 'rb') as f:
+                for seq in seqs:
+                    f.seek((seq - 1) * POSTSTORLEK)
+                    projektion.tillamp(Handelse(*_avkoda(f.read(POSTSTORLEK)), position=seq * POSTSTORLEK))
+            return projektion
+
+        # Inget index (auktionen hade en snapshot när loggen öppnades): läs loggen
+        # från snapshoten och bygg indexet på vägen, så att detta bara sker en gång
+        fran_seq = projektion.seq
+        funna = array('Q')
+        slut = position
+        for h in self.las(fran_seq=projektion.seq + 1, position=position):
+            slut = h.position
+            if h.auction_id == auction_id:
+                funna.append(h.seq)
+                if till_seq is None or h.seq <= till_seq:
+                    projektion.tillamp(h)
+        if till_seq is None and auction_id in self._oindexerade:
+            with self._lock:
+                # Det som skrevs under läsningen indexerades inte - läs ikapp det
+                for h in self.las(fran_seq=(funna[-1] if funna else fran_seq) + 1, position=slut):
+                    if h.position > self._storlek:
+                        break
+                    if h.auction_id == auction_id:
+                        funna.append(h.seq)
+                if auction_id in self._oindexerade:
+                    self._oindexerade.discard(auction_id)
+                    self._index[auction_id] = (fran_seq, funna)
+        return projektion
+
+
+def aterspela(logg, till_seq=None, auction_ids=None):
+    """
+    Bygger upp läget för auktioner ur loggen.
+
+    Args:
+        logg: HandelseLogg
+        till_seq: Återskapa läget som det var vid denna seq (None = nu)
+        auction_ids: Auktioner att bygga, eller None för alla i loggen
+
+    Returns:
+        dict: auction_id -> AuktionsProjektion
+    """
+    if auction_ids is not None:
+        return {a: logg.projektion(a, till_seq) for a in auction_ids}
+    projektioner = {}
+    for h in logg.las(till_seq=till_seq):
+        projektion = projektioner.get(h.auction_id)
+        if projektion is None:
+            projektion = projektioner[h.auction_id] = AuktionsProjektion(h.auction_id)
+        projektion.tillamp(h)
+    return projektioner
+
+
+def tillamp_pa_databasen(projektioner):
+    """
+    Skriver återskapat läge till auctions.current_bid och släpper cacher och
+    budmotorns läge för berörda auktioner. Kräver app context.
+
+    Returns:
+        int: antal uppdaterade auktioner
+    """
+    from database import db
+    from models.auction import Auction
+    from services.bid_engine import glom_auktion
+    from services.page_cache import invalidera_auktion
+
+    antal = 0
+    for auction_id, projektion in projektioner.items():
+        auction = db.session.get(Auction, auction_id)
+        if auction is None:
+            continue
+        auction.current_bid = projektion.current_bid or auction.starting_bid
+        if projektion.sluttid is not None:
+            auction.end_time = datetime.utcfromtimestamp(projektion.sluttid)
+        if projektion.stangd:
+            auction.is_active = False
+        antal += 1
+    db.session.commit()
+    for auction_id in projektioner:
+        invalidera_auktion(auction_id)
+        glom_auktion(auction_id)
+    return antal
+
+
+def _seeda_fran_bids(logg):
+    """Första start: för in befintliga bud i en tom logg så att historiken är komplett"""
+    from database import db
+    from models.bid import Bid
+
+    # I batchar, så att en stor databas (t.ex. från generate_data.py) inte läses in i minnet på en gång
+    resultat = db.session.execute(
+        db.select(Bid.id, Bid.auction_id, Bid.user_id, Bid.amount)
+        .order_by(Bid.created_at, Bid.id)
+        .execution_options(yield_per=10000)
+    )
+    for bud in resultat.partitions():
+        logg.lagg_till_manga([(BUD_LAGT, b.auction_id, b.user_id, b.id, b.amount) for b in bud], snapshots=False)
+    db.session.rollback()
+    # Snapshots för alla auktioner med en läsning av loggen (att bygga dem under
+    # inläsningen skulle läsa om loggen från början för varje auktion)
+    for projektion in aterspela(logg).values():
+        logg.skriv_snapshot(projektion)
+
+
+def init_event_log(app):
+    """
+    Kopplar händelseloggen till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    katalog = app.config.get('EVENT_LOG_DIR') or os.path.join(app.instance_path, 'events')
+    logg = HandelseLogg(
+        katalog,
+        snapshot_var=app.config.get('EVENT_SNAPSHOT_EVERY', 100),
+        fsync=app.config.get('EVENT_LOG_FSYNC', False),
+    )
+    app.extensions['event_log'] = logg
+    if logg.senaste_seq == 0:
+        with app.app_context():
+            _seeda_fran_bids(logg)
+
+
+def hamta_logg():
+    """Returnerar appens HandelseLogg, eller None om loggen inte är aktiv"""
+    return current_app.extensions.get('event_log')
+
+
+def logga_handelse(typ, auction_id, user_id=0, bid_id=0, varde=0.0):
+    """Lägger till en händelse i appens logg (om den är aktiv)"""
+    logg = hamta_logg()
+    if logg is not None:
+        return logg.lagg_till(typ, auction_id, user_id, bid_id, varde)
+    return None
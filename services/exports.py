@@ -0,0 +1,202 @@
+# services/exports.py
+"""
+📤 EXPORTS - Strömmande CSV/JSONL-export av auktioner, bud och användare
+
+SYFTE: Adminsidorna renderade allt till HTML med get_all(), så den som
+behövde data till bokföringen fick skrapa sidorna. Med många rader blev
+sidorna dessutom långsamma och minneskrävande.
+
+HUR DET FUNGERAR:
+1. KEYSET-ITERATION: Tabellen läses i batchar om EXPORT_BATCH_SIZE rader med
+   WHERE id > senaste id ORDER BY id LIMIT n. Varje batch går på primärnyckeln
+   oavsett hur långt in i tabellen vi kommit (ingen OFFSET), och bara råa
+   rader hämtas - inga ORM-objekt i sessionen.
+2. STRÖMNING: Varje batch formateras till en CSV- eller JSONL-bit och
+   skickas direkt med en generator, så minnet är konstant även för
+   miljontals rader.
+3. FILTER: Datumintervall (created_at), kategori och auktion. Filtren
+   läggs i samma fråga som keyset-villkoret.
+4. FORMLER: Textceller i CSV som börjar med = + - @ (eller tab/CR) får ett
+   inledande ' så att kalkylprogram inte tolkar användarnas titlar och namn
+   som formler.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from database import db
+
+FORMAT = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class ExportFel(ValueError):
+    """Ogiltig exporttyp eller ogiltigt filter"""
+
+
+def _exporter():
+    """Exporttyp -> (id-kolumn, kolumner, funktion som lägger till filter)"""
+    from models.auction import Auction
+    from models.bid import Bid
+    from models.user import User
+
+    def auktionsfilter(fraga, fran, till, kategori, auction_id):
+        if fran:
+            fraga = fraga.where(Auction.created_at >= fran)
+        if till:
+            fraga = fraga.where(Auction.created_at < till)
+        if kategori:
+            fraga = fraga.where(Auction.category == kategori)
+        if auction_id:
+            fraga = fraga.where(Auction.id == auction_id)
+        return fraga
+
+    def budfilter(fraga, fran, till, kategori, auction_id):
+        if fran:
+            fraga = fraga.where(Bid.created_at >= fran)
+        if till:
+            fraga = fraga.where(Bid.created_at < till)
+        if kategori:
+            fraga = fraga.where(Auction.category == kategori)
+        if auction_id:
+            fraga = fraga.where(Bid.auction_id == auction_id)
+        return fraga
+
+    def anvandarfilter(fraga, fran, till, kategori, auction_id):
+        if kategori or auction_id:
+            raise ExportFel('Users can only be filtered by date.')
+        if fran:
+            fraga = fraga.where(User.created_at >= fran)
+        if till:
+            fraga = fraga.where(User.created_at < till)
+        return fraga
+
+    return {
+        'auctions': (
+            Auction.id,
+            [Auction.id, Auction.title, Auction.category, Auction.starting_bid, Auction.current_bid,
+             Auction.start_time, Auction.end_time, Auction.is_active, Auction.created_at],
+            auktionsfilter,
+        ),
+        'bids': (
+            Bid.id,
+            [Bid.id, Bid.auction_id, Auction.title.label('auction_title'), Auction.category,
+             Bid.user_id, User.email.label('bidder_email'), Bid.amount, Bid.created_at],
+            budfilter,
+        ),
+        # Aldrig password_hash
+        'users': (
+            User.id,
+            [User.id, User.email, User.first_name, User.last_name, User.is_admin, User.is_active,
+             User.created_at, User.last_login],
+            anvandarfilter,
+        ),
+    }
+
+
+def tolka_datum(text):
+    """'2024-01-31' eller '2024-01-31T12:00' -> datetime (None för tom sträng)"""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ExportFel(f'Invalid date: {text}')
+
+
+def _fraga(typ, fran, till, kategori, auction_id, batch):
+    """Bygger exportens fråga (utan keyset-villkoret). Raises ExportFel."""
+    exporter = _exporter()
+    if typ not in exporter:
+        raise ExportFel(f'Unknown export: {typ}')
+    id_kolumn, kolumner, filtrera = exporter[typ]
+
+    fraga = select(*kolumner)
+    if typ == 'bids':
+        from models.auction import Auction
+        from models.bid import Bid
+        from models.user import User
+        fraga = fraga.join(Auction, Bid.auction_id == Auction.id).join(User, Bid.user_id == User.id)
+    return id_kolumn, filtrera(fraga, fran, till, kategori, auction_id).order_by(id_kolumn).limit(batch)
+
+
+def _batcher(id_kolumn, fraga, batch):
+    """Generator som ger raderna batch för batch (keyset på id_kolumn)"""
+    senaste_id = None
+    while True:
+        aktuell = fraga if senaste_id is None else fraga.where(id_kolumn > senaste_id)
+        batchrader = db.session.execute(aktuell).all()
+        # Avsluta lästransaktionen mellan batcharna så att inga lås hålls under strömningen
+        db.session.rollback()
+        if not batchrader:
+            return
+        yield batchrader
+        if len(batchrader) < batch:
+            return
+        senaste_id = batchrader[-1][0]
+
+
+def _varde(varde):
+    if isinstance(varde, (datetime, date)):
+        return varde.isoformat()
+    return varde
+
+
+# Tecken som får kalkylprogram att tolka en cell som formel
+_FORMELTECKEN = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_varde(varde):
+    varde = _varde(varde)
+    if isinstance(varde, str) and varde.startswith(_FORMELTECKEN):
+        return "'" + varde
+    return varde
+
+
+def _csv(namn, batcher):
+    buffert = io.StringIO()
+    skrivare = csv.writer(buffert)
+    skrivare.writerow(namn)
+    for batchrader in batcher:
+        skrivare.writerows([_csv_varde(v) for v in rad] for rad in batchrader)
+        yield buffert.getvalue()
+        buffert.seek(0)
+        buffert.truncate()
+    if buffert.tell():
+        yield buffert.getvalue()  # bara rubriken (inga rader)
+
+
+def _jsonl(namn, batcher):
+    for batchrader in batcher:
+        yield ''.join(
+            json.dumps(dict(zip(namn, map(_varde, rad))), ensure_ascii=False) + '\n'
+            for rad in batchrader
+        )
+
+
+def strom(typ, format_='csv', fran=None, till=None, kategori=None, auction_id=None, batch=1000):
+    """
+    Validerar exporten och returnerar en generator med texten i bitar (en per batch).
+
+    Args:
+        typ: 'auctions', 'bids' eller 'users'
+        format_: 'csv' eller 'jsonl'
+        fran, till: Datumintervall för created_at (till är exklusivt)
+        kategori: Auktionskategori
+        auction_id: En enskild auktion
+        batch: Rader per batch
+
+    Raises:
+        ExportFel: Ogiltig typ, format eller filterkombination
+    """
+    if format_ not in FORMAT:
+        raise ExportFel(f'Unknown format: {format_}')
+    id_kolumn, fraga = _fraga(typ, fran, till, kategori, auction_id, batch)
+    namn = list(fraga.selected_columns.keys())
+    batcher = _batcher(id_kolumn, fraga, batch)
+    return _csv(namn, batcher) if format_ == 'csv' else _jsonl(namn, batcher)
@@ -0,0 +1,150 @@
+# services/idempotency.py
+"""
+🔁 IDEMPOTENCY - Dubbletter av samma bud behandlas bara en gång
+
+SYFTE: När place_bid är långsam dubbelklickar användare eller så skickar
+webbläsaren om POST-anropet. Varje försök lades tidigare som ett nytt bud.
+
+HUR DET FUNGERAR:
+1. Budformuläret skickar med en idempotensnyckel (fältet idempotency_key eller
+   headern Idempotency-Key) som skapas en gång per laddat formulär.
+2. Första anropet med en nyckel utför budet och sparar utfallet.
+3. Senare anrop med samma nyckel (från samma användare) får det sparade
+   utfallet direkt - utan att röra budmotorn. Kommer dubbletten MEDAN det
+   första anropet pågår väntar den på samma utfall.
+4. Varje nyckel sparas med ett fingeravtryck av anropet (endpoint, auktion,
+   belopp). Återanvänds nyckeln för ett annat anrop avvisas det
+   (IdempotensKonflikt -> 422) i stället för att få fel utfall tillbaka.
+5. Misslyckas det första anropet tar EN av de väntande över och försöker
+   igen - de övriga väntar på den. Blir ett anrop inte klart inom vantetid
+   svarar dubbletterna IdempotensPagar (409) i stället för att köra själva.
+6. Nycklarna sparas i minnet i IDEMPOTENCY_TTL sekunder, högst
+   IDEMPOTENCY_MAX_KEYS stycken (de äldsta tas bort först).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+# Längsta nyckel som accepteras (UUID är 36 tecken)
+MAX_NYCKELLANGD = 100
+
+
+class IdempotensKonflikt(Exception):
+    """Nyckeln har redan använts för ett annat anrop"""
+
+
+class IdempotensPagar(Exception):
+    """Ett anrop med samma nyckel pågår fortfarande - försök igen senare"""
+
+
+class _Post:
+    __slots__ = ('utfall', 'klar', 'skapad', 'fingeravtryck')
+
+    def __init__(self, fingeravtryck):
+        self.utfall = None
+        self.klar = threading.Event()
+        self.skapad = time.monotonic()
+        self.fingeravtryck = fingeravtryck
+
+
+class IdempotensLager:
+    """Trådsäkert, utgående lager för nycklar och deras utfall"""
+
+    def __init__(self, ttl=600.0, max_poster=10000, vantetid=30.0):
+        self.ttl = ttl
+        self.max_poster = max_poster
+        self.vantetid = vantetid
+        self._lock = threading.Lock()
+        self._poster = OrderedDict()  # nyckel -> _Post (äldst först)
+        # Statistik
+        self.upprepningar = 0
+
+    def utfor(self, nyckel, funktion, fingeravtryck=None):
+        """
+        Kör funktion() en gång per nyckel och returnerar (utfall, upprepad).
+        Misslyckas funktionen sparas ingenting, så ett nytt försök körs på nytt.
+
+        Raises:
+            IdempotensKonflikt: Nyckeln användes för ett anrop med annat fingeravtryck
+            IdempotensPagar: Anropet med nyckeln blev inte klart inom vantetid
+        """
+        while True:
+            with self._lock:
+                self._rensa()
+                post = self._poster.get(nyckel)
+                ledare = post is None
+                if ledare:
+                    post = self._poster[nyckel] = _Post(fingeravtryck)
+                elif post.fingeravtryck != fingeravtryck:
+                    raise IdempotensKonflikt()
+
+            if ledare:
+                break
+            if not post.klar.wait(self.vantetid):
+                raise IdempotensPagar()
+            if post.utfall is not None:
+                self.upprepningar += 1
+                return post.utfall, True
+            # Ledaren misslyckades och posten är borttagen. Den väntande som
+            # först tar låset blir ny ledare, de övriga väntar på den.
+
+        try:
+            post.utfall = funktion()
+            return post.utfall, False
+        except BaseException:
+            with self._lock:
+                if self._poster.get(nyckel) is post:
+                    del self._poster[nyckel]
+            raise
+        finally:
+            post.klar.set()
+
+    def _rensa(self):
+        """Tar bort utgångna och överskjutande poster (anropas med låset taget)"""
+        grans = time.monotonic() - self.ttl
+        while self._poster:
+            nyckel, post = next(iter(self._poster.items()))
+            if post.skapad >= grans and len(self._poster) < self.max_poster:
+                break
+            if not post.klar.is_set() and post.skapad >= grans:
+                break  # pågående anrop tas inte bort
+            del self._poster[nyckel]
+
+    def __len__(self):
+        return len(self._poster)
+
+
+def init_idempotency(app):
+    """
+    Kopplar idempotenslagret till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.extensions['idempotency'] = IdempotensLager(
+        ttl=app.config.get('IDEMPOTENCY_TTL', 600.0),
+        max_poster=app.config.get('IDEMPOTENCY_MAX_KEYS', 10000),
+    )
+
+
+def utfor_idempotent(nyckel, anvandare, funktion, fingeravtryck=None):
+    """
+    Kör funktion() högst en gång per (användare, nyckel).
+    Utan nyckel körs funktionen alltid.
+
+    Args:
+        fingeravtryck: Det som identifierar anropet, t.ex. (endpoint, auction_id, belopp)
+
+    Returns:
+        tuple: (utfall, upprepad)
+
+    Raises:
+        IdempotensKonflikt: Nyckeln användes för ett annat anrop (svara 422)
+        IdempotensPagar: Ett anrop med nyckeln pågår fortfarande (svara 409)
+    """
+    if not nyckel or len(nyckel) > MAX_NYCKELLANGD:
+        return funktion(), False
+    lager = current_app.extensions['idempotency']
+    return lager.utfor(f'{anvandare}:{nyckel}', funktion, fingeravtryck)
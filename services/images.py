@@ -0,0 +1,227 @@
+# services/images.py
+"""
+🖼️ IMAGES - Bildpipeline med miniatyrer, responsiva storlekar och innehållsadresserad lagring
+
+SYFTE: Bläddringssidan laddade ner fullstora foton för varje kort. Vid uppladdning
+eller import skapas nu tre varianter i WebP-format:
+- thumb  (320 px)  - korten på bläddringssidan
+- medium (800 px)  - detaljsidan på mindre skärmar
+- full   (1600 px) - detaljsidan på stora skärmar
+
+LAGRING: Varianterna sparas under static/images/cas/<ab>/<sha256>/<storlek>.webp
+där <sha256> är hashen av originalfilen. Samma bild lagras därför bara en gång
+(dedup) och en URL ändrar aldrig innehåll, så den kan cachas för alltid.
+Auction.image innehåller då hashen istället för ett filnamn.
+
+BAKGRUND: Skalningen körs i en processpool (BildPipeline) så att ingen
+request behöver vänta på att bilder räknas om.
+"""
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, url_for
+
+# Storlek -> maxbredd/maxhöjd i pixlar
+STORLEKAR = {
+    'thumb': 320,
+    'medium': 800,
+    'full': 1600,
+}
+FORMAT = 'webp'
+KVALITET = 80
+
+# Mapp (relativt static/) där innehållsadresserade bilder sparas
+CAS_MAPP = 'images/cas'
+STANDARDBILD = 'images/default_auction.jpg'
+
+_HASH_MONSTER = re.compile(r'^[0-9a-f]{64}$')
+
+
+def ar_innehallshash(varde):
+    """Kontrollerar om Auction.image är en innehållshash (och inte ett filnamn)"""
+    return bool(varde) and bool(_HASH_MONSTER.match(varde))
+
+
+def hasha_fil(sokvag):
+    """Returnerar sha256-hashen (hex) av en fils innehåll"""
+    h = hashlib.sha256()
+    with open(sokvag, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cas_katalog(hash_):
+    """Relativ katalog (under static/) för en bild med given hash"""
+    return f'{CAS_MAPP}/{hash_[:2]}/{hash_}'
+
+
+def variant_filnamn(hash_, storlek):
+    """Relativt filnamn (under static/) för en variant"""
+    return f'{cas_katalog(hash_)}/{storlek}.{FORMAT}'
+
+
+def generera_varianter(kallfil, static_mapp, hash_=None):
+    """
+    Skapar alla varianter av en bild. Körs i en arbetsprocess.
+
+    Funktionen är idempotent: varianter som redan finns skapas inte igen,
+    så samma bild som laddas upp två gånger kostar bara en hashning.
+
+    Args:
+        kallfil: Sökväg till originalbilden
+        static_mapp: Sökväg till appens static-mapp
+        hash_: Originalets sha256 om den redan är uträknad
+
+    Returns:
+        str: Bildens hash (värdet som sparas i Auction.image)
+    """
+    from PIL import Image, ImageOps
+
+    if hash_ is None:
+        hash_ = hasha_fil(kallfil)
+    katalog = os.path.join(static_mapp, *cas_katalog(hash_).split('/'))
+    saknas = [
+        storlek for storlek in STORLEKAR
+        if not os.path.exists(os.path.join(katalog, f'{storlek}.{FORMAT}'))
+    ]
+    if not saknas:
+        return hash_
+
+    os.makedirs(katalog, exist_ok=True)
+    with Image.open(kallfil) as bild:
+        bild = ImageOps.exif_transpose(bild)
+        if bild.mode not in ('RGB', 'RGBA'):
+            bild = bild.convert('RGBA' if 'transparency' in bild.info else 'RGB')
+        # Största först, så att varje mindre variant skalas från en redan förminskad bild
+        for storlek in sorted(saknas, key=STORLEKAR.get, reverse=True):
+            kopia = bild.copy()
+            kopia.thumbnail((STORLEKAR[storlek], STORLEKAR[storlek]), Image.LANCZOS)
+            mal = os.path.join(katalog, f'{storlek}.{FORMAT}')
+            # Skriv till temporär fil och byt namn, så att ingen läser en halvskriven bild
+            tmp = f'{mal}.{os.getpid()}.tmp'
+            kopia.save(tmp, FORMAT.upper(), quality=KVALITET, method=4)
+            os.replace(tmp, mal)
+    return hash_
+
+
+class BildPipeline:
+    """
+    Kör generera_varianter i en processpool.
+    Samma hash som redan bearbetas ger tillbaka samma Future (ingen dubbelkörning).
+    """
+
+    def __init__(self, static_mapp, max_workers=2):
+        self.static_mapp = static_mapp
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pagaende = {}   # hash -> Future
+        self._klara = set()   # hashar vars varianter finns på disk
+
+    def _hamta_pool(self):
+        if self._pool is None:
+            # 'spawn' eftersom webbservern är flertrådad (fork + trådar är osäkert)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._pool
+
+    def skicka(self, kallfil, hash_):
+        """
+        Lägger en bild i kön för bearbetning och returnerar direkt.
+
+        Returns:
+            Future som ger bildens hash när varianterna är klara
+        """
+        with self._lock:
+            future = self._pagaende.get(hash_)
+            if future is not None:
+                return future
+            future = self._hamta_pool().submit(generera_varianter, kallfil, self.static_mapp, hash_)
+            self._pagaende[hash_] = future
+
+        def klar(f, hash_=hash_):
+            with self._lock:
+                self._pagaende.pop(hash_, None)
+                if f.exception() is None:
+                    self._klara.add(hash_)
+        future.add_done_callback(klar)
+        return future
+
+    def ar_klar(self, hash_):
+        """Finns alla varianter på disk? Positiva svar cachas."""
+        if hash_ in self._klara:
+            return True
+        katalog = os.path.join(self.static_mapp, *cas_katalog(hash_).split('/'))
+        if all(os.path.exists(os.path.join(katalog, f'{s}.{FORMAT}')) for s in STORLEKAR):
+            self._klara.add(hash_)
+            return True
+        return False
+
+    def hitta_original(self, hash_):
+        """Returnerar relativt filnamn för en uppladdad originalfil, eller None"""
+        katalog = os.path.join(self.static_mapp, *cas_katalog(hash_).split('/'))
+        try:
+            for namn in os.listdir(katalog):
+                if namn.startswith('original.'):
+                    return f'{cas_katalog(hash_)}/{namn}'
+        except OSError:
+            pass
+        return None
+
+    def stang(self, vanta=True):
+        """Stänger processpoolen"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=vanta)
+            self._pool = None
+
+
+def init_images(app):
+    """
+    Kopplar bildpipelinen till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.extensions['images'] = BildPipeline(
+        app.static_folder,
+        max_workers=app.config.get('IMAGE_WORKERS', 2),
+    )
+
+
+def bild_url(bild, storlek='full'):
+    """
+    Returnerar URL:en till en bild i vald storlek.
+
+    Args:
+        bild: Värdet i Auction.image (innehållshash, gammalt filnamn eller None)
+        storlek: 'thumb', 'medium' eller 'full'
+    """
+    if not bild:
+        return url_for('static', filename=STANDARDBILD)
+    if not ar_innehallshash(bild):
+        # Gamla, handkopierade filer under static/images/ finns bara i en storlek
+        return url_for('static', filename=f'images/{bild}')
+
+    pipeline = current_app.extensions['images']
+    if pipeline.ar_klar(bild):
+        return url_for('static', filename=variant_filnamn(bild, storlek))
+    # Varianterna är inte klara än - visa originalet så länge
+    original = pipeline.hitta_original(bild)
+    return url_for('static', filename=original or STANDARDBILD)
+
+
+def bild_srcset(bild):
+    """Returnerar ett srcset-värde med alla varianter, eller '' om det inte finns några"""
+    if not ar_innehallshash(bild) or not current_app.extensions['images'].ar_klar(bild):
+        return ''
+    return ', '.join(
+        f"{url_for('static', filename=variant_filnamn(bild, storlek))} {bredd}w"
+        for storlek, bredd in sorted(STORLEKAR.items(), key=lambda s: s[1])
+    )
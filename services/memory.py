@@ -0,0 +1,231 @@
+# services/memory.py
+"""
+🧠 MEMORY - tracemalloc-snapshots och minnestoppar per request
+
+SYFTE: Sidor som manage_bids och browse_auctions laddar hela tabeller i
+SQLAlchemys identity map, och workerns RSS kryper uppåt. Vi behöver se VAR
+minnet allokeras och HUR MYCKET varje route behöver.
+
+HUR DET FUNGERAR:
+1. SNAPSHOTS: Admin startar tracemalloc (om det inte redan körs) och tar
+   snapshots på /admin/memory. Två snapshots jämförs per kodrad, så att det
+   syns vilka rader som har fått mest nytt minne mellan dem. Bara de
+   MEMORY_MAX_SNAPSHOTS senaste sparas (de är stora).
+2. TOPPAR PER REQUEST (MEMORY_TRACKING=1): tracemalloc startas vid start och
+   varje request mäter sin högsta allokering (reset_peak/get_traced_memory).
+   tracemalloc är gemensamt för processen, så bara EN request i taget mäts
+   (övriga hoppas över) och samtidiga trådars allokeringar räknas med -
+   värdet är en övre gräns. Per endpoint sparas antal, medel och max, som
+   underlag för en minnesbudget per route.
+3. ÖVER TRÖSKELN: En request som allokerar mer än
+   MEMORY_REQUEST_THRESHOLD_KB loggas (logger 'memory'). Endpointen markeras,
+   och nästa mätta request till den tar snapshots före och efter, så att
+   loggen visar de kodrader som allokerade mest.
+4. AV SOM STANDARD: Utan MEMORY_TRACKING registreras inga hooks och
+   tracemalloc körs bara när admin har startat det.
+"""
+import linecache
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, g, request
+
+logger = logging.getLogger('memory')
+
+# Ramar som aldrig är intressanta i en snapshot
+_FILTER = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_mb():
+    """(aktuell RSS, högsta RSS) för processen i MB"""
+    hogsta = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            aktuell = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        aktuell = None
+    return aktuell, hogsta
+
+
+def _plats(statistik):
+    """'fil.py:rad  kod' för den översta ramen"""
+    ram = statistik.traceback[0]
+    kod = linecache.getline(ram.filename, ram.lineno).strip()
+    return f'{os.path.relpath(ram.filename) if not ram.filename.startswith("<") else ram.filename}:{ram.lineno}  {kod}'
+
+
+def jamfor_snapshots(fore, efter, antal=30):
+    """De kodrader som har fått mest nytt minne mellan två snapshots"""
+    rader = []
+    for s in efter.compare_to(fore, 'lineno')[:antal]:
+        rader.append({
+            'site': _plats(s),
+            'size_diff_kb': round(s.size_diff / 1024, 1),
+            'size_kb': round(s.size / 1024, 1),
+            'count_diff': s.count_diff,
+        })
+    return rader
+
+
+class MinnesDiagnostik:
+    """Snapshots på begäran och minnestoppar per endpoint"""
+
+    def __init__(self, ramar=10, troskel_kb=1024, max_snapshots=3):
+        self.ramar = ramar
+        self.troskel = troskel_kb * 1024
+        self._snapshots = deque(maxlen=max_snapshots)  # (id, tid, snapshot, spårat minne)
+        self._nasta_id = 1
+        self._lock = threading.Lock()
+        self._matning = threading.Lock()  # en mätt request i taget
+        self._routes = {}       # endpoint -> [antal, summa, max]
+        self._misstankta = set()  # endpoints som ska få snapshots före/efter
+        self.over_troskel = 0
+
+    # ---------- tracemalloc ----------
+
+    @property
+    def aktiv(self):
+        return tracemalloc.is_tracing()
+
+    def starta(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.ramar)
+
+    def stoppa(self):
+        tracemalloc.stop()
+
+    def ta_snapshot(self):
+        """Tar en snapshot (startar tracemalloc om det behövs). Returnerar dess id."""
+        self.starta()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTER)
+        with self._lock:
+            snapshot_id = self._nasta_id
+            self._nasta_id += 1
+            self._snapshots.append((snapshot_id, datetime.utcnow(), snapshot, tracemalloc.get_traced_memory()[0]))
+        return snapshot_id
+
+    def snapshots(self):
+        """[(id, tid, spårat minne i KB)] äldst först"""
+        with self._lock:
+            return [(s_id, tid, round(storlek / 1024, 1)) for s_id, tid, _, storlek in self._snapshots]
+
+    def jamfor(self, fore_id=None, efter_id=None, antal=30):
+        """Jämför två sparade snapshots (standard: de två senaste). None om de saknas."""
+        with self._lock:
+            sparade = {s_id: s for s_id, _, s, _ in self._snapshots}
+            ids = [s_id for s_id, _, _, _ in self._snapshots]
+        if fore_id is None or efter_id is None:
+            if len(ids) < 2:
+                return None
+            fore_id, efter_id = ids[-2], ids[-1]
+        if fore_id not in sparade or efter_id not in sparade:
+            return None
+        return jamfor_snapshots(sparade[fore_id], sparade[efter_id], antal)
+
+    # ---------- per request ----------
+
+    def routes(self):
+        """Minnestoppar per endpoint, störst max först"""
+        with self._lock:
+            rader = [{
+                'endpoint': endpoint,
+                'requests': antal,
+                'avg_kb': round(summa / antal / 1024, 1),
+                'max_kb': round(hogsta / 1024, 1),
+                'sites': endpoint in self._misstankta,
+            } for endpoint, (antal, summa, hogsta) in self._routes.items()]
+        return sorted(rader, key=lambda r: r['max_kb'], reverse=True)
+
+    def nollstall(self):
+        with self._lock:
+            self._routes.clear()
+            self._misstankta.clear()
+            self.over_troskel = 0
+
+    def borja(self, endpoint):
+        """Börjar mäta en request. Returnerar mätningens tillstånd, eller None om den hoppas över."""
+        if not tracemalloc.is_tracing() or not self._matning.acquire(blocking=False):
+            return None
+        fore = None
+        if endpoint in self._misstankta:
+            fore = tracemalloc.take_snapshot().filter_traces(_FILTER)
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0], fore, time.perf_counter()
+
+    def avsluta(self, matning, endpoint, sokvag):
+        """Avslutar mätningen, uppdaterar statistiken och loggar requests över tröskeln"""
+        start, fore, t0 = matning
+        try:
+            if not tracemalloc.is_tracing():
+                return
+            topp = max(0, tracemalloc.get_traced_memory()[1] - start)
+            platser = None
+            if fore is not None and topp > self.troskel:
+                platser = jamfor_snapshots(fore, tracemalloc.take_snapshot().filter_traces(_FILTER), 5)
+        finally:
+            self._matning.release()
+
+        with self._lock:
+            rad = self._routes.setdefault(endpoint, [0, 0, 0])
+            rad[0] += 1
+            rad[1] += topp
+            rad[2] = max(rad[2], topp)
+            if topp > self.troskel:
+                self.over_troskel += 1
+                self._misstankta.add(endpoint)
+        if topp > self.troskel:
+            if platser:
+                detaljer = '; '.join(f"{p['site']} (+{p['size_diff_kb']} KB)" for p in platser)
+            else:
+                detaljer = 'allokeringsplatser visas vid nästa request till samma endpoint'
+            logger.warning('Request %s (%s) allokerade %.0f KB på %.0f ms: %s',
+                           sokvag, endpoint, topp / 1024, (time.perf_counter() - t0) * 1000, detaljer)
+        return topp
+
+
+def _fore_request():
+    matning = current_app.extensions['memory'].borja(request.endpoint or 'unmatched')
+    if matning is not None:
+        g.minnesmatning = matning
+
+
+def _efter_teardown(exc=None):
+    matning = g.pop('minnesmatning', None)
+    if matning is not None:
+        current_app.extensions['memory'].avsluta(matning, request.endpoint or 'unmatched', request.path)
+
+
+def init_memory(app):
+    """
+    Kopplar minnesdiagnostiken till Flask-appen. Med MEMORY_TRACKING startas
+    tracemalloc direkt och varje request mäts.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    diagnostik = MinnesDiagnostik(
+        ramar=app.config.get('MEMORY_TRACE_FRAMES', 10),
+        troskel_kb=app.config.get('MEMORY_REQUEST_THRESHOLD_KB', 1024),
+        max_snapshots=app.config.get('MEMORY_MAX_SNAPSHOTS', 3),
+    )
+    app.extensions['memory'] = diagnostik
+    if app.config.get('MEMORY_TRACKING'):
+        diagnostik.starta()
+        app.before_request(_fore_request)
+        app.teardown_request(_efter_teardown)
+
+
+def hamta_minne():
+    """Returnerar appens MinnesDiagnostik"""
+    return current_app.extensions['memory']
@@ -0,0 +1,292 @@
+# services/metrics.py
+"""
+📈 METRICS - /metrics i Prometheus textformat
+
+SYFTE: Vi hade inga mätvärden alls under drift. Ingen kunde se hur många
+requests varje endpoint fick, hur lång tid de tog, hur mycket tid som gick
+åt i databasen eller hur ofta cacharna träffade.
+
+HUR DET FUNGERAR:
+1. RÄKNARE PER TRÅD: Varje tråd skriver i sina egna dictar (threading.local).
+   Ingen låsning i request-vägen - bara en dict-uppdatering. Först vid
+   skrapning summeras alla trådars räknare.
+2. AVSLUTADE TRÅDAR: När en tråd dör (t.ex. utvecklingsserverns tråd per
+   request) läggs dess räknare ihop med en gemensam summa, så att räknarna
+   aldrig minskar och minnet inte växer med antalet trådar.
+3. REQUESTS: Antal per endpoint/metod/status, latenshistogram med fasta
+   hinkar (METRICS_BUCKETS) och antal pågående requests.
+4. DATABASEN: SQLAlchemy-händelser räknar SQL-satser och deras tid per
+   sorts sats (select/insert/update/delete/other).
+5. ÖVRIGT LÄSES VID SKRAPNING: Anslutningspoolen, sidcachen, budgivar-
+   etiketterna, långsamma satser, begränsarens beslut, hashpoolen och budmotorns räknare
+   (resultat per bud, per shard) hämtas från respektive tjänst först när
+   /metrics anropas - de kostar alltså ingenting per request.
+"""
+import bisect
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+from flask import current_app, g, request
+from sqlalchemy import event
+
+from database import db
+
+# Standardhinkar för latenshistogrammen (sekunder)
+STANDARDHINKAR = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Namn -> (typ, hjälptext, etikettnamn) för räknarna som samlas per tråd
+METRIKER = {
+    'http_requests_total': ('counter', 'HTTP requests per endpoint, metod och status', ('endpoint', 'method', 'status')),
+    'http_request_duration_seconds': ('histogram', 'Svarstid per endpoint', ('endpoint',)),
+    'http_requests_in_flight': ('gauge', 'Pågående HTTP requests', ()),
+    'db_statements_total': ('counter', 'SQL-satser per sort', ('kind',)),
+    'db_statement_seconds_total': ('counter', 'Tid i SQL-satser per sort', ('kind',)),
+}
+
+
+class _TradData:
+    """En tråds räknare (ägs av tråden, läses vid skrapning)"""
+    __slots__ = ('raknare', 'histogram', '__weakref__')
+
+    def __init__(self):
+        self.raknare = defaultdict(float)  # (namn, etiketter) -> värde
+        self.histogram = {}                # (namn, etiketter) -> [antal per hink..., +Inf, summa]
+
+
+class Matvarden:
+    """Räknare och histogram per tråd som summeras vid skrapning"""
+
+    def __init__(self, hinkar=STANDARDHINKAR):
+        self.hinkar = tuple(sorted(hinkar))
+        self._lokal = threading.local()
+        self._lock = threading.Lock()
+        self._levande = {}  # id -> (raknare, histogram) för levande trådar
+        self._avslutade = _TradData()
+
+    def _data(self):
+        try:
+            return self._lokal.data
+        except AttributeError:
+            data = _TradData()
+            nyckel = id(data)
+            with self._lock:
+                self._levande[nyckel] = (data.raknare, data.histogram)
+            # Objektet försvinner när tråden dör - då flyttas räknarna till summan
+            weakref.finalize(data, self._avsluta, nyckel)
+            self._lokal.data = data
+            return data
+
+    def _avsluta(self, nyckel):
+        with self._lock:
+            raknare, histogram = self._levande.pop(nyckel)
+            self._sla_ihop(self._avslutade, raknare, histogram)
+
+    def _sla_ihop(self, mal, raknare, histogram):
+        for nyckel, varde in list(raknare.items()):
+            mal.raknare[nyckel] += varde
+        for nyckel, hinkar in list(histogram.items()):
+            summa = mal.histogram.get(nyckel)
+            if summa is None:
+                mal.histogram[nyckel] = list(hinkar)
+            else:
+                for i, varde in enumerate(hinkar):
+                    summa[i] += varde
+
+    def rakna(self, namn, etiketter=(), antal=1):
+        """Ökar (eller minskar) en räknare i den egna tråden"""
+        self._data().raknare[(namn, etiketter)] += antal
+
+    def observera(self, namn, etiketter, varde):
+        """Lägger ett värde i ett histogram i den egna tråden"""
+        histogram = self._data().histogram
+        hinkar = histogram.get((namn, etiketter))
+        if hinkar is None:
+            hinkar = histogram[(namn, etiketter)] = [0] * (len(self.hinkar) + 2)
+        hinkar[bisect.bisect_left(self.hinkar, varde)] += 1
+        hinkar[-1] += varde
+
+    def summera(self):
+        """Returnerar (räknare, histogram) summerade över alla trådar"""
+        total = _TradData()
+        with self._lock:
+            self._sla_ihop(total, self._avslutade.raknare, self._avslutade.histogram)
+            for raknare, histogram in list(self._levande.values()):
+                self._sla_ihop(total, raknare, histogram)
+        return total.raknare, total.histogram
+
+
+def _fore_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_pagaende = True
+    current_app.extensions['metrics'].rakna('http_requests_in_flight', (), 1)
+
+
+def _efter_request(svar):
+    _registrera(svar.status_code)
+    return svar
+
+
+def _efter_teardown(exc=None):
+    # Ett undantag hoppar över after_request - räkna det som 500
+    _registrera(500)
+    if g.pop('metrics_pagaende', False):
+        current_app.extensions['metrics'].rakna('http_requests_in_flight', (), -1)
+
+
+def _registrera(status):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    matvarden = current_app.extensions['metrics']
+    endpoint = request.endpoint or 'unmatched'
+    matvarden.rakna('http_requests_total', (endpoint, request.method, str(status)))
+    matvarden.observera('http_request_duration_seconds', (endpoint,), time.perf_counter() - start)
+
+
+def _koppla_databasen(engine, matvarden):
+    """Räknar SQL-satser och deras tid via SQLAlchemy-händelser"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def fore(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def efter(conn, cursor, statement, parameters, context, executemany):
+        tid = time.perf_counter() - conn.info['metrics_start'].pop()
+        sort = statement.lstrip()[:6].lower()
+        if sort not in ('select', 'insert', 'update', 'delete'):
+            sort = 'other'
+        matvarden.rakna('db_statements_total', (sort,))
+        matvarden.rakna('db_statement_seconds_total', (sort,), tid)
+
+
+def _etiketter(namn, varden):
+    if not namn:
+        return ''
+    par = []
+    for n, v in zip(namn, varden):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        par.append(f'{n}="{v}"')
+    return '{' + ','.join(par) + '}'
+
+
+def _tal(varde):
+    if isinstance(varde, float) and varde.is_integer():
+        return str(int(varde))
+    return repr(varde) if isinstance(varde, float) else str(varde)
+
+
+def _ovriga(app):
+    """(namn, typ, hjälptext, etikettnamn, [(etiketter, värde)]) från tjänsterna"""
+    ovriga = []
+
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        ovriga.append(('db_pool_connections_in_use', 'gauge', 'Utlånade anslutningar', (),
+                       [((), pool.checkedout())]))
+        ovriga.append(('db_pool_size', 'gauge', 'Anslutningspoolens storlek', (), [((), pool.size())]))
+        ovriga.append(('db_pool_overflow', 'gauge', 'Anslutningar utöver poolens storlek', (),
+                       [((), max(0, pool.overflow()))]))
+
+    cacheutfall = []
+    cache = app.extensions.get('page_cache')
+    if cache is not None:
+        cacheutfall += [(('page', 'hit'), cache.hits), (('page', 'stale'), cache.stale_hits),
+                        (('page', 'miss'), cache.misses)]
+    etiketter = app.extensions.get('bidder_labels')
+    if etiketter is not None:
+        cacheutfall += [(('bidder_labels', 'hit'), etiketter.hits), (('bidder_labels', 'miss'), etiketter.misses)]
+    if cacheutfall:
+        ovriga.append(('cache_requests_total', 'counter', 'Cacheuppslagningar per cache och utfall',
+                       ('cache', 'result'), cacheutfall))
+
+    motor = app.extensions.get('bid_engine')
+    if motor is not None:
+        bud = {}
+        for shard in motor.shards:
+            for kod, antal in list(shard.bud.items()):
+                bud[kod] = bud.get(kod, 0) + antal
+        ovriga.append(('bids_total', 'counter', 'Lagda bud per resultat (ok = godkänt)', ('result',),
+                       sorted(((kod,), antal) for kod, antal in bud.items())))
+        ovriga.append(('bid_engine_batches_total', 'counter', 'Skrivna batchar (group commit)', (),
+                       [((), sum(s.batchar for s in motor.shards))]))
+        ovriga.append(('bid_engine_queue_depth', 'gauge', 'Väntande kommandon per shard', ('shard',),
+                       [((str(s.nummer),), s.ko.qsize()) for s in motor.shards]))
+
+    begransare = app.extensions.get('rate_limiter')
+    if begransare is not None:
+        ovriga.append(('rate_limit_decisions_total', 'counter', 'Begränsarens beslut per klass',
+                       ('class', 'decision'), sorted(list(begransare.beslut.items()))))
+
+    langsamma = app.extensions.get('slow_queries')
+    if langsamma is not None:
+        ovriga.append(('db_slow_statements_total', 'counter', 'SQL-satser över SLOW_QUERY_THRESHOLD_MS', (),
+                       [((), langsamma.antal)]))
+
+    hashpool = app.extensions.get('password_pool')
+    if hashpool is not None:
+        ovriga.append(('password_checks_total', 'counter', 'Lösenordskontroller', (),
+                       [((), hashpool.kontroller)]))
+        ovriga.append(('password_hash_rejected_total', 'counter', 'Avvisade pga full hashkö', (),
+                       [((), hashpool.avvisade)]))
+    return ovriga
+
+
+def exportera(app=None):
+    """Returnerar alla mätvärden i Prometheus textformat (version 0.0.4)"""
+    app = app or current_app._get_current_object()
+    matvarden = app.extensions['metrics']
+    raknare, histogram = matvarden.summera()
+    rader = []
+
+    for namn, (typ, hjalp, etikettnamn) in METRIKER.items():
+        rader.append(f'# HELP {namn} {hjalp}')
+        rader.append(f'# TYPE {namn} {typ}')
+        if typ == 'histogram':
+            for (n, etiketter), hinkar in sorted(histogram.items()):
+                if n != namn:
+                    continue
+                kumulativ = 0
+                for grans, antal in zip((*matvarden.hinkar, '+Inf'), hinkar[:-1]):
+                    kumulativ += antal
+                    le = grans if grans == '+Inf' else _tal(float(grans))
+                    rader.append(f'{namn}_bucket{_etiketter((*etikettnamn, "le"), (*etiketter, le))} {kumulativ}')
+                rader.append(f'{namn}_count{_etiketter(etikettnamn, etiketter)} {kumulativ}')
+                rader.append(f'{namn}_sum{_etiketter(etikettnamn, etiketter)} {_tal(hinkar[-1])}')
+        else:
+            varden = sorted((e, v) for (n, e), v in raknare.items() if n == namn)
+            if not varden and not etikettnamn:
+                varden = [((), 0)]
+            for etiketter, varde in varden:
+                rader.append(f'{namn}{_etiketter(etikettnamn, etiketter)} {_tal(varde)}')
+
+    for namn, typ, hjalp, etikettnamn, varden in _ovriga(app):
+        rader.append(f'# HELP {namn} {hjalp}')
+        rader.append(f'# TYPE {namn} {typ}')
+        for etiketter, varde in varden:
+            rader.append(f'{namn}{_etiketter(etikettnamn, etiketter)} {_tal(varde)}')
+    return '\n'.join(rader) + '\n'
+
+
+def init_metrics(app):
+    """
+    Kopplar mätningen till Flask-appen. Anropas före övriga tjänster, så att
+    latensen även omfattar deras before_request (begränsaren, sidcachen).
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    matvarden = Matvarden(app.config.get('METRICS_BUCKETS') or STANDARDHINKAR)
+    app.extensions['metrics'] = matvarden
+    with app.app_context():
+        _koppla_databasen(db.engine, matvarden)
+    app.before_request(_fore_request)
+    app.after_request(_efter_request)
+    app.teardown_request(_efter_teardown)
+
+
+def hamta_matvarden():
+    """Returnerar appens Matvarden"""
+    return current_app.extensions['metrics']
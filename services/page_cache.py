@@ -0,0 +1,324 @@
+# services/page_cache.py
+"""
+⚡ PAGE CACHE - Helsidescache för anonyma besökare
+
+SYFTE: De flesta besök på /, /auctions/ och /auctions/<id> kommer från
+anonyma besökare som alla får exakt samma HTML. Istället för att köra hela
+fråge- och renderingskedjan för varje besök sparas det färdiga svaret en kort
+stund och delas mellan alla anonyma besökare.
+
+HUR DET FUNGERAR:
+1. Nyckeln är sökvägen + normaliserad query string (sorterad, tomma värden borttagna).
+2. Färska poster (yngre än PAGE_CACHE_TTL) serveras direkt (X-Cache: HIT).
+3. Inaktuella poster (inom PAGE_CACHE_STALE_TTL) serveras direkt medan EN
+   bakgrundstråd renderar om sidan (stale-while-revalidate, X-Cache: STALE).
+4. Samtidiga missar på samma nyckel slås ihop (single-flight): en förfrågan
+   renderar, de andra väntar på resultatet.
+5. Inloggade användare, POST-anrop och förfrågningar med flash-meddelanden
+   går förbi cachen helt.
+6. Bud, likes och admin-ändringar invaliderar posterna för berörd auktion
+   via invalidera_auktion(). Varje invalidering får ett generationsnummer; en
+   rendering som började före invalideringen av någon av sidans taggar sparas
+   inte (den kan innehålla data från före ändringen).
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+# Taggen som alla listsidor (startsida, bläddring) får
+TAGG_LISTA = 'auction-list'
+
+
+def tagg_auktion(auction_id):
+    """Returnerar taggen för en enskild auktions detaljsida"""
+    return f'auction:{auction_id}'
+
+
+class _CachePost:
+    """Ett sparat svar (body, status och headers)"""
+    __slots__ = ('body', 'status', 'headers', 'skapad', 'taggar', 'komprimerade')
+
+    def __init__(self, body, status, headers, taggar):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.skapad = time.monotonic()
+        self.taggar = taggar
+        # Komprimerade varianter (kodning -> bytes), fylls av services/compression.py
+        self.komprimerade = {}
+
+    def som_svar(self, status_text):
+        """Bygger ett nytt Response-objekt från posten"""
+        svar = current_app.response_class(self.body, status=self.status, headers=self.headers)
+        svar.headers['X-Cache'] = status_text
+        svar.komprimerade_varianter = self.komprimerade
+        return svar
+
+
+class PageCache:
+    """
+    Trådsäker LRU-cache för färdiga svar med taggbaserad invalidering
+    och single-flight för samtidiga missar.
+    """
+
+    def __init__(self, ttl=5.0, stale_ttl=30.0, max_poster=2000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_poster = max_poster
+        self._lock = threading.Lock()
+        self._poster = OrderedDict()   # nyckel -> _CachePost
+        self._taggar = {}              # tagg -> set(nycklar)
+        self._pagaende = {}            # nyckel -> threading.Event (single-flight)
+        self._generation = 0           # räknas upp vid varje invalidering
+        self._invaliderad = {}         # tagg -> generation då taggen senast invaliderades
+        self._rensad = 0               # generation då hela cachen senast tömdes
+        # Statistik (läses av t.ex. metrics, uppdateras under låset)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def hamta(self, nyckel, rakna=True):
+        """
+        Hämtar en post. Returnerar (post, farsk) där post är None vid miss
+        och farsk anger om posten fortfarande är inom TTL.
+        Med rakna=True räknas utfallet i hits/stale_hits/misses.
+        """
+        with self._lock:
+            post = self._poster.get(nyckel)
+            if post is not None:
+                alder = time.monotonic() - post.skapad
+                if alder > self.ttl + self.stale_ttl:
+                    self._ta_bort(nyckel)
+                    post = None
+            if post is None:
+                if rakna:
+                    self.misses += 1
+                return None, False
+            self._poster.move_to_end(nyckel)
+            farsk = alder <= self.ttl
+            if rakna:
+                if farsk:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+            return post, farsk
+
+    def generation(self):
+        """Aktuell invalideringsgeneration - hämtas innan en sida renderas och skickas till spara()"""
+        with self._lock:
+            return self._generation
+
+    def spara(self, nyckel, post, generation=None):
+        """
+        Sparar en post och indexerar dess taggar. Om generation anges och någon av
+        postens taggar har invaliderats sedan dess sparas inget. Returnerar True om sparad.
+        """
+        with self._lock:
+            if generation is not None and (
+                self._rensad > generation
+                or any(self._invaliderad.get(tagg, 0) > generation for tagg in post.taggar)
+            ):
+                return False
+            if nyckel in self._poster:
+                self._ta_bort(nyckel)
+            self._poster[nyckel] = post
+            for tagg in post.taggar:
+                self._taggar.setdefault(tagg, set()).add(nyckel)
+            while len(self._poster) > self.max_poster:
+                aldsta = next(iter(self._poster))
+                self._ta_bort(aldsta)
+            return True
+
+    def invalidera_tagg(self, *taggar):
+        """Tar bort alla poster som har någon av taggarna"""
+        with self._lock:
+            self._generation += 1
+            for tagg in taggar:
+                # En post per auktion och listtaggen - växer inte fortare än auktionstabellen
+                self._invaliderad[tagg] = self._generation
+                for nyckel in list(self._taggar.get(tagg, ())):
+                    self._ta_bort(nyckel)
+
+    def rensa(self):
+        """Tömmer hela cachen"""
+        with self._lock:
+            self._generation += 1
+            self._rensad = self._generation
+            self._invaliderad.clear()
+            self._poster.clear()
+            self._taggar.clear()
+
+    def borja_hamtning(self, nyckel):
+        """
+        Single-flight: returnerar (ledare, event). Den som blir ledare ska
+        rendera sidan och anropa avsluta_hamtning(); övriga väntar på event.
+        """
+        with self._lock:
+            event = self._pagaende.get(nyckel)
+            if event is not None:
+                return False, event
+            event = threading.Event()
+            self._pagaende[nyckel] = event
+            return True, event
+
+    def avsluta_hamtning(self, nyckel):
+        """Släpper väntande förfrågningar för nyckeln"""
+        with self._lock:
+            event = self._pagaende.pop(nyckel, None)
+        if event is not None:
+            event.set()
+
+    def __len__(self):
+        return len(self._poster)
+
+    def _ta_bort(self, nyckel):
+        """Tar bort en post (anropas med låset taget)"""
+        post = self._poster.pop(nyckel, None)
+        if post is None:
+            return
+        for tagg in post.taggar:
+            nycklar = self._taggar.get(tagg)
+            if nycklar is not None:
+                nycklar.discard(nyckel)
+                if not nycklar:
+                    del self._taggar[tagg]
+
+
+def init_page_cache(app):
+    """
+    Kopplar sidcachen till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    if not app.config.get('PAGE_CACHE_ENABLED', True):
+        return
+    app.extensions['page_cache'] = PageCache(
+        ttl=app.config.get('PAGE_CACHE_TTL', 5.0),
+        stale_ttl=app.config.get('PAGE_CACHE_STALE_TTL', 30.0),
+        max_poster=app.config.get('PAGE_CACHE_MAX_ENTRIES', 2000),
+    )
+
+
+def hamta_cache():
+    """Returnerar appens PageCache, eller None om cachen är avstängd"""
+    return current_app.extensions.get('page_cache')
+
+
+def invalidera_auktion(auction_id):
+    """
+    Invaliderar detaljsidan för en auktion samt alla listsidor.
+    Anropas efter bud, likes och admin-ändringar.
+    """
+    cache = hamta_cache()
+    if cache is not None:
+        cache.invalidera_tagg(tagg_auktion(auction_id), TAGG_LISTA)
+
+
+def normalisera_nyckel():
+    """Bygger cachenyckeln: metod-oberoende sökväg + sorterad query string"""
+    par = sorted((k, v) for k, v in request.args.items(multi=True) if v != '')
+    if not par:
+        return request.path
+    return f'{request.path}?{urlencode(par)}'
+
+
+def _kan_cachas():
+    """Endast anonyma GET/HEAD utan väntande flash-meddelanden cachas"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if '_flashes' in session:
+        return False
+    return not current_user.is_authenticated
+
+
+def _kan_sparas(svar):
+    """Endast vanliga 200-svar som inte sätter cookies sparas"""
+    return (
+        svar.status_code == 200
+        and not svar.is_streamed
+        and not session.modified
+        and 'Set-Cookie' not in svar.headers
+    )
+
+
+def _bygg_post(svar, taggar):
+    headers = [(k, v) for k, v in svar.headers.items() if k.lower() != 'set-cookie']
+    return _CachePost(svar.get_data(), svar.status_code, headers, taggar)
+
+
+def cachad_sida(taggar):
+    """
+    Decorator som cachar en vy för anonyma besökare.
+
+    Args:
+        taggar: Funktion som får vyns kwargs och returnerar en lista med taggar,
+                t.ex. lambda auction_id: [tagg_auktion(auction_id)]
+    """
+    def decorator(vy):
+        @wraps(vy)
+        def wrapper(*args, **kwargs):
+            cache = hamta_cache()
+            if cache is None or not _kan_cachas():
+                return vy(*args, **kwargs)
+
+            nyckel = normalisera_nyckel()
+            post, farsk = cache.hamta(nyckel)
+            if post is not None:
+                if farsk:
+                    return post.som_svar('HIT')
+                # Inaktuell: servera direkt och låt en bakgrundstråd rendera om
+                ledare, _ = cache.borja_hamtning(nyckel)
+                if ledare:
+                    _starta_omrendering(cache, nyckel, vy, args, kwargs, taggar(**kwargs))
+                return post.som_svar('STALE')
+
+            ledare, event = cache.borja_hamtning(nyckel)
+            if not ledare:
+                # Någon annan renderar redan samma sida - vänta på resultatet
+                event.wait(current_app.config.get('PAGE_CACHE_WAIT_TIMEOUT', 5.0))
+                post, _ = cache.hamta(nyckel, rakna=False)
+                if post is not None:
+                    return post.som_svar('HIT')
+                return vy(*args, **kwargs)
+
+            try:
+                generation = cache.generation()
+                svar = make_response(vy(*args, **kwargs))
+                if _kan_sparas(svar):
+                    post = _bygg_post(svar, taggar(**kwargs))
+                    if cache.spara(nyckel, post, generation):
+                        svar.komprimerade_varianter = post.komprimerade
+                svar.headers['X-Cache'] = 'MISS'
+                return svar
+            finally:
+                cache.avsluta_hamtning(nyckel)
+        return wrapper
+    return decorator
+
+
+def _starta_omrendering(cache, nyckel, vy, args, kwargs, taggar):
+    """Renderar om en inaktuell sida i en bakgrundstråd som anonym besökare"""
+    app = current_app._get_current_object()
+    sokvag = request.path
+    query_string = request.query_string
+    bas_url = request.host_url
+
+    def omrendera():
+        try:
+            generation = cache.generation()
+            with app.test_request_context(sokvag, base_url=bas_url, query_string=query_string):
+                svar = make_response(vy(*args, **kwargs))
+                if _kan_sparas(svar):
+                    cache.spara(nyckel, _bygg_post(svar, taggar), generation)
+        except Exception:
+            app.logger.exception('Kunde inte rendera om cachad sida %s', nyckel)
+        finally:
+            cache.avsluta_hamtning(nyckel)
+
+    threading.Thread(target=omrendera, name='page-cache-refresh', daemon=True).start()
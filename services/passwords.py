@@ -0,0 +1,260 @@
+# services/passwords.py
+"""
+🔑 PASSWORDS - Lösenordshashning i en begränsad arbetspool + inloggningsspärr
+
+SYFTE: login körde check_password_hash (scrypt) direkt i request-tråden.
+En skur av inloggningar - eller credential stuffing - höll alla workers
+upptagna med hashning och budgivare fick vänta.
+
+HUR DET FUNGERAR:
+1. HashPool: Hashning och kontroll körs i en trådpool med PASSWORD_HASH_WORKERS
+   trådar (scrypt/pbkdf2 släpper GIL:en, så trådarna använder flera kärnor).
+   Högst PASSWORD_HASH_QUEUE jobb får vänta - är kön full svarar login
+   direkt med 503 istället för att bygga upp en kö som aldrig hinns ikapp.
+2. InloggningsSparr: Misslyckade försök räknas i ett glidande fönster per
+   e-post och per IP. Över gränsen avvisas försöket med 429 INNAN någon
+   hashning görs, så spärrade angripare kostar ingen CPU.
+3. Omhashning: Ändras PASSWORD_HASH_METHOD (t.ex. högre kostnad) hashas
+   lösenordet om med den nya metoden vid nästa lyckade inloggning.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Werkzeugs standardmetod
+STANDARDMETOD = 'scrypt:32768:8:1'
+
+
+class HashKoFull(Exception):
+    """Hashpoolens kö är full (eller jobbet hann inte köras klart) - försök igen senare"""
+
+
+class InloggningSparrad(Exception):
+    """För många misslyckade försök för e-postadressen eller IP:n"""
+
+    def __init__(self, vantetid):
+        super().__init__(f'Spärrad i {vantetid:.0f} s')
+        self.vantetid = vantetid
+
+
+def metodparametrar(metod):
+    """
+    Algoritm och kostnad ur en hashmetod, med werkzeugs standardvärden ifyllda:
+    'pbkdf2', 'pbkdf2:sha256' och 'pbkdf2:sha256:<standard>' ger samma resultat.
+    """
+    namn, *parametrar = metod.split(':')
+    if namn == 'scrypt':
+        standard = ['32768', '8', '1']
+    elif namn == 'pbkdf2':
+        standard = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        standard = []
+    parametrar += standard[len(parametrar):]
+    return (namn, *(int(p) if p.isdigit() else p for p in parametrar))
+
+
+class HashPool:
+    """Begränsad trådpool för lösenordshashning"""
+
+    def __init__(self, max_workers=None, max_ko=None, metod=STANDARDMETOD, timeout=10.0):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_ko = max_ko if max_ko is not None else 4 * self.max_workers
+        self.metod = metod
+        self.timeout = timeout
+        self._platser = threading.BoundedSemaphore(self.max_workers + self.max_ko)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+        self._attrapp = None
+        # Statistik
+        self.kontroller = 0
+        self.avvisade = 0
+
+    def _kor(self, funktion, *args):
+        """
+        Kör funktion i poolen och väntar på svaret. Raises HashKoFull om kön
+        är full eller om svaret inte kommer inom timeout (poolen är överbelastad).
+        """
+        if not self._platser.acquire(blocking=False):
+            self.avvisade += 1
+            raise HashKoFull()
+        try:
+            future = self._pool.submit(funktion, *args)
+        except BaseException:
+            self._platser.release()
+            raise
+        future.add_done_callback(lambda _: self._platser.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # Jobbet behåller sin plats tills det är klart (eller struket ur kön)
+            future.cancel()
+            self.avvisade += 1
+            raise HashKoFull() from None
+
+    def kontrollera(self, losenordshash, losenord):
+        """Kontrollerar ett lösenord mot en hash"""
+        self.kontroller += 1
+        return self._kor(check_password_hash, losenordshash, losenord)
+
+    def skapa(self, losenord):
+        """Hashar ett lösenord med den konfigurerade metoden"""
+        return self._kor(generate_password_hash, losenord, self.metod)
+
+    @property
+    def attrapp(self):
+        """
+        Hash att kontrollera mot när e-postadressen inte finns, så att svaret
+        tar lika lång tid oavsett om kontot finns (ingen användaruppräkning)
+        """
+        if self._attrapp is None:
+            self._attrapp = generate_password_hash(os.urandom(16).hex(), self.metod)
+        return self._attrapp
+
+    def behover_omhashning(self, losenordshash):
+        """Är hashen skapad med en annan algoritm/kostnad än den konfigurerade?"""
+        return metodparametrar(losenordshash.split('$', 1)[0]) != metodparametrar(self.metod)
+
+    def stang(self):
+        self._pool.shutdown(wait=False)
+
+
+class InloggningsSparr:
+    """Glidande fönster över misslyckade inloggningar per e-post och per IP"""
+
+    # Var RENSA_VAR:e misslyckade försök rensas nycklar vars fönster har gått ut -
+    # annars växer _forsok utan gräns när någon provar många olika adresser
+    RENSA_VAR = 256
+
+    def __init__(self, max_per_epost=5, max_per_ip=20, fonster=900.0):
+        self.granser = {'email': max_per_epost, 'ip': max_per_ip}
+        self.fonster = fonster
+        self._lock = threading.Lock()
+        self._forsok = {}  # (typ, nyckel) -> deque med tidpunkter (högst gränsen många)
+        self._sedan_rensning = 0
+
+    @staticmethod
+    def _nycklar(epost, ip):
+        """'User@Example.com ' och 'user@example.com' är samma konto och räknas ihop"""
+        return (('email', (epost or '').strip().lower()), ('ip', ip))
+
+    def vantetid(self, epost, ip, nu=None):
+        """Returnerar 0 om ett försök får göras, annars sekunder tills det får det"""
+        nu = time.monotonic() if nu is None else nu
+        vanta = 0.0
+        with self._lock:
+            for typ, nyckel in self._nycklar(epost, ip):
+                tider = self._forsok.get((typ, nyckel))
+                if not tider:
+                    continue
+                while tider and tider[0] <= nu - self.fonster:
+                    tider.popleft()
+                if not tider:
+                    del self._forsok[(typ, nyckel)]
+                elif len(tider) >= self.granser[typ]:
+                    vanta = max(vanta, tider[0] + self.fonster - nu)
+        return vanta
+
+    def misslyckades(self, epost, ip, nu=None):
+        nu = time.monotonic() if nu is None else nu
+        with self._lock:
+            for typ, nyckel in self._nycklar(epost, ip):
+                tider = self._forsok.get((typ, nyckel))
+                if tider is None:
+                    tider = self._forsok[(typ, nyckel)] = deque(maxlen=self.granser[typ])
+                tider.append(nu)
+            self._sedan_rensning += 1
+            if self._sedan_rensning >= self.RENSA_VAR:
+                self._rensa(nu)
+
+    def _rensa(self, nu):
+        """Tar bort nycklar utan försök inom fönstret. Kräver låset."""
+        self._sedan_rensning = 0
+        gamla = [nyckel for nyckel, tider in self._forsok.items() if tider[-1] <= nu - self.fonster]
+        for nyckel in gamla:
+            del self._forsok[nyckel]
+
+    def lyckades(self, epost):
+        """En lyckad inloggning nollställer e-postadressens räknare (men inte IP:ns)"""
+        with self._lock:
+            self._forsok.pop(self._nycklar(epost, None)[0], None)
+
+    def __len__(self):
+        return len(self._forsok)
+
+
+def init_passwords(app):
+    """
+    Kopplar hashpoolen och inloggningsspärren till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    pool = HashPool(
+        max_workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        max_ko=app.config.get('PASSWORD_HASH_QUEUE'),
+        metod=app.config.get('PASSWORD_HASH_METHOD') or STANDARDMETOD,
+    )
+    app.extensions['password_pool'] = pool
+    app.extensions['login_throttle'] = InloggningsSparr(
+        max_per_epost=app.config.get('LOGIN_MAX_FAILURES_EMAIL', 5),
+        max_per_ip=app.config.get('LOGIN_MAX_FAILURES_IP', 20),
+        fonster=app.config.get('LOGIN_THROTTLE_WINDOW', 900.0),
+    )
+
+
+def hamta_hashpool():
+    """Returnerar appens HashPool"""
+    return current_app.extensions['password_pool']
+
+
+def hamta_sparr():
+    """Returnerar appens InloggningsSparr"""
+    return current_app.extensions['login_throttle']
+
+
+def autentisera(epost, losenord, ip):
+    """
+    Kontrollerar inloggningsuppgifter via spärren och hashpoolen.
+    Hashar om lösenordet om PASSWORD_HASH_METHOD har ändrats.
+
+    Returns:
+        User eller None om uppgifterna är fel
+
+    Raises:
+        InloggningSparrad: För många misslyckade försök (svara 429)
+        HashKoFull: Hashpoolen är överbelastad (svara 503)
+    """
+    from database import db
+    from models.user import User
+
+    sparr = hamta_sparr()
+    vanta = sparr.vantetid(epost, ip)
+    if vanta:
+        raise InloggningSparrad(vanta)
+
+    pool = hamta_hashpool()
+    user = User.query.filter_by(email=epost).first()
+    if user is None:
+        pool.kontrollera(pool.attrapp, losenord)
+        sparr.misslyckades(epost, ip)
+        return None
+    if not pool.kontrollera(user.password_hash, losenord):
+        sparr.misslyckades(epost, ip)
+        return None
+
+    sparr.lyckades(epost)
+    if pool.behover_omhashning(user.password_hash):
+        user.password_hash = pool.skapa(losenord)
+        db.session.commit()
+    return user
+
+
+def hasha_losenord(losenord):
+    """Hashar ett lösenord med appens metod (används av User.set_password)"""
+    if has_app_context() and 'password_pool' in current_app.extensions:
+        return hamta_hashpool().skapa(losenord)
+    return generate_password_hash(losenord, STANDARDMETOD)
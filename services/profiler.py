@@ -0,0 +1,291 @@
+# services/profiler.py
+"""
+🔬 PROFILER - Profilering av enskilda requests i drift
+
+SYFTE: Vissa regressioner syns bara med produktionsdata. Admin ska kunna
+profilera riktiga requests utan att starta om appen eller köra en profilerare
+för all trafik.
+
+HUR DET FUNGERAR:
+1. AV SOM STANDARD: Med PROFILER_ENABLED=0 registreras inga hooks alls, så
+   profileraren kostar ingenting.
+2. VAL AV REQUESTS: En inloggad admin skickar headern X-Profile (värdet
+   'cprofile' eller 'sample'), eller så väljs en andel av alla requests
+   slumpvis (PROFILER_SAMPLE_RATE, läge PROFILER_RATE_MODE).
+3. TVÅ LÄGEN:
+   - sample: En gemensam samplartråd läser requestens stack var
+     PROFILER_SAMPLE_INTERVAL ms (sys._current_frames). Låg overhead.
+   - cprofile: cProfile för request-tråden PLUS samplaren. Exakta anrop
+     och tider, men märkbart långsammare.
+4. LAGRING: Varje profil sparas i PROFILER_DIR som <id>.json (metadata),
+   <id>.folded (kollapsade stackar, för flame graphs, t.ex. flamegraph.pl
+   eller speedscope) och <id>.pstats (bara cprofile). Bara de senaste
+   PROFILER_KEEP profilerna behålls. Filerna delas av alla workers.
+5. ADMIN: /admin/profiles listar profilerna per endpoint. Svaret på en
+   profilerad request har headern X-Profile-Id.
+"""
+import cProfile
+import glob
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+HEADER = 'X-Profile'
+LAGEN = ('sample', 'cprofile')
+_GILTIGT_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+def _stack(frame, max_djup=200):
+    """Kollapsad stack (rot först) för en frame"""
+    delar = []
+    while frame is not None and len(delar) < max_djup:
+        kod = frame.f_code
+        delar.append(f'{kod.co_name} ({os.path.basename(kod.co_filename)}:{kod.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(delar))
+
+
+class Samplare:
+    """En gemensam tråd som samplar stackarna för de trådar som profileras"""
+
+    def __init__(self, intervall=0.005):
+        self.intervall = intervall
+        self._lock = threading.Lock()
+        self._aktiva = {}  # tråd-id -> Counter(stack -> antal)
+        self._vaken = threading.Event()
+        self._trad = None
+
+    def starta(self, trad_id):
+        with self._lock:
+            stackar = self._aktiva[trad_id] = Counter()
+            if self._trad is None:
+                self._trad = threading.Thread(target=self._kor, name='profiler-sampler', daemon=True)
+                self._trad.start()
+        self._vaken.set()
+        return stackar
+
+    def stoppa(self, trad_id):
+        with self._lock:
+            return self._aktiva.pop(trad_id, Counter())
+
+    def _kor(self):
+        while True:
+            with self._lock:
+                aktiva = list(self._aktiva.items())
+                if not aktiva:
+                    self._vaken.clear()
+            if not aktiva:
+                self._vaken.wait()
+                continue
+            frames = sys._current_frames()
+            for trad_id, stackar in aktiva:
+                frame = frames.get(trad_id)
+                if frame is not None:
+                    stackar[_stack(frame)] += 1
+            del frames
+            time.sleep(self.intervall)
+
+
+class _Profilering:
+    """En pågående profilering av en request"""
+
+    def __init__(self, profiler, lage, utlosare):
+        self.id = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.lage = lage
+        self.utlosare = utlosare
+        self.status = None
+        self._samplare = profiler.samplare
+        self._trad_id = threading.get_ident()
+        self._cprofile = cProfile.Profile() if lage == 'cprofile' else None
+        self._start = time.perf_counter()
+        self.stackar = self._samplare.starta(self._trad_id)
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stoppa(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.ms = (time.perf_counter() - self._start) * 1000
+        self.stackar = self._samplare.stoppa(self._trad_id)
+        return self._cprofile
+
+
+class Profiler:
+    """Väljer requests, profilerar dem och sparar profilerna på disk"""
+
+    def __init__(self, katalog, sample_rate=0.0, rate_lage='sample', intervall=0.005, behall=200):
+        self.katalog = katalog
+        self.sample_rate = sample_rate
+        self.rate_lage = rate_lage
+        self.behall = behall
+        self.samplare = Samplare(intervall)
+        os.makedirs(katalog, exist_ok=True)
+
+    def valj(self, header, ar_admin):
+        """Returnerar (läge, utlösare) om requesten ska profileras, annars None"""
+        if header is not None and ar_admin():
+            return (header if header in LAGEN else 'cprofile'), 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.rate_lage, 'rate'
+        return None
+
+    def spara(self, profilering, metadata):
+        """Skriver profilens filer och rensar bort de äldsta"""
+        bas = os.path.join(self.katalog, profilering.id)
+        cprof = profilering.stoppa()
+        if cprof is not None:
+            cprof.dump_stats(bas + '.pstats')
+        with open(bas + '.folded', 'w', encoding='utf-8') as f:
+            for stack, antal in profilering.stackar.most_common():
+                f.write(f'{stack} {antal}\n')
+        metadata.update({
+            'id': profilering.id,
+            'mode': profilering.lage,
+            'trigger': profilering.utlosare,
+            'status': profilering.status,
+            'ms': round(profilering.ms, 2),
+            'samples': sum(profilering.stackar.values()),
+            'pstats': cprof is not None,
+        })
+        with open(bas + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(bas + '.json.tmp', bas + '.json')
+        self._rensa()
+
+    def _rensa(self):
+        filer = sorted(glob.glob(os.path.join(self.katalog, '*.json')))
+        for gammal in filer[:max(0, len(filer) - self.behall)]:
+            for andelse in ('.json', '.folded', '.pstats'):
+                try:
+                    os.remove(gammal[:-len('.json')] + andelse)
+                except FileNotFoundError:
+                    pass
+
+    def lista(self, endpoint=None, antal=200):
+        """Metadata för de senaste profilerna (nyast först)"""
+        profiler = []
+        for sokvag in sorted(glob.glob(os.path.join(self.katalog, '*.json')), reverse=True):
+            try:
+                with open(sokvag, encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if endpoint is None or metadata.get('endpoint') == endpoint:
+                profiler.append(metadata)
+                if len(profiler) >= antal:
+                    break
+        return profiler
+
+    def sokvag(self, profil_id, andelse):
+        """Sökväg till en profils fil, eller None om id:t är ogiltigt eller filen saknas"""
+        if not _GILTIGT_ID.match(profil_id or '') or andelse not in ('json', 'folded', 'pstats'):
+            return None
+        sokvag = os.path.join(self.katalog, f'{profil_id}.{andelse}')
+        return sokvag if os.path.exists(sokvag) else None
+
+    def sammanfattning(self, profil_id, antal=30):
+        """Metadata, de dyraste funktionerna (cprofile) och de vanligaste stackarna"""
+        sokvag = self.sokvag(profil_id, 'json')
+        if sokvag is None:
+            return None
+        with open(sokvag, encoding='utf-8') as f:
+            metadata = json.load(f)
+
+        funktioner = []
+        pstats_fil = self.sokvag(profil_id, 'pstats')
+        if pstats_fil:
+            statistik = pstats.Stats(pstats_fil).stats
+            for (fil, rad, namn), (_, anrop, egen, total, _) in sorted(
+                    statistik.items(), key=lambda p: p[1][3], reverse=True)[:antal]:
+                funktioner.append({
+                    'function': f'{namn} ({os.path.basename(fil)}:{rad})',
+                    'calls': anrop,
+                    'own_ms': round(egen * 1000, 2),
+                    'total_ms': round(total * 1000, 2),
+                })
+
+        stackar = []
+        folded = self.sokvag(profil_id, 'folded')
+        if folded:
+            with open(folded, encoding='utf-8') as f:
+                for rad in f:
+                    stack, _, antal_ = rad.rstrip('\n').rpartition(' ')
+                    stackar.append({'stack': stack.split(';'), 'samples': int(antal_)})
+                    if len(stackar) >= antal:
+                        break
+        return {'meta': metadata, 'functions': funktioner, 'stacks': stackar}
+
+
+def _ar_admin():
+    from myblueprints.auth import ar_admin
+    return ar_admin()
+
+
+def _fore_request():
+    profiler = current_app.extensions['profiler']
+    val = profiler.valj(request.headers.get(HEADER), _ar_admin)
+    if val is not None:
+        g.profilering = _Profilering(profiler, *val)
+
+
+def _efter_request(svar):
+    profilering = g.get('profilering')
+    if profilering is not None:
+        profilering.status = svar.status_code
+        svar.headers['X-Profile-Id'] = profilering.id
+    return svar
+
+
+def _efter_teardown(exc=None):
+    profilering = g.pop('profilering', None)
+    if profilering is None:
+        return
+    try:
+        current_app.extensions['profiler'].spara(profilering, {
+            'endpoint': request.endpoint or 'unmatched',
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'user_id': current_user.get_id() if current_user else None,
+            'time': datetime.utcnow().isoformat(timespec='seconds'),
+            'error': exc.__class__.__name__ if exc is not None else None,
+        })
+    except Exception:
+        current_app.logger.exception('Kunde inte spara profilen %s', profilering.id)
+
+
+def init_profiler(app):
+    """
+    Kopplar profileraren till Flask-appen om PROFILER_ENABLED är satt.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+    rate_lage = app.config.get('PROFILER_RATE_MODE', 'sample')
+    app.extensions['profiler'] = Profiler(
+        app.config.get('PROFILER_DIR') or os.path.join(app.instance_path, 'profiles'),
+        sample_rate=app.config.get('PROFILER_SAMPLE_RATE', 0.0),
+        rate_lage=rate_lage if rate_lage in LAGEN else 'sample',
+        intervall=app.config.get('PROFILER_SAMPLE_INTERVAL', 5) / 1000,
+        behall=app.config.get('PROFILER_KEEP', 200),
+    )
+    app.before_request(_fore_request)
+    app.after_request(_efter_request)
+    app.teardown_request(_efter_teardown)
+
+
+def hamta_profiler():
+    """Returnerar appens Profiler, eller None om profileraren är avstängd"""
+    return current_app.extensions.get('profiler')
@@ -0,0 +1,192 @@
+# services/rate_limit.py
+"""
+🚦 RATE LIMIT - Token buckets och prioriterad avlastning
+
+SYFTE: Inget skyddade place_bid, /bidding/validate eller /auctions/search mot
+skurar. En enda klient kunde hålla SQLite:s skrivlås eller köra LIKE-sökningar
+i en loop.
+
+HUR DET FUNGERAR:
+1. TOKEN BUCKETS: Varje endpoint-klass (bud, validering, sök) har regler per
+   användare, per IP och (för bud) per auktion: (tokens per sekund, max skur).
+   Ett anrop måste få en token ur ALLA sina buckets, annars svarar vi
+   429 Too Many Requests med Retry-After.
+2. KOMPAKT LAGRING: En bucket är bara [tokens, senast] i en dict. Buckets som
+   hunnit fyllas på helt är likvärdiga med att inte finnas och tas bort
+   lat vid en periodisk genomgång.
+3. PRIORITERING: Antalet pågående requests räknas. Vid överlast avvisas
+   lägst prioriterad trafik först (503 + Retry-After): bläddring/sök vid 50 %
+   av RATE_LIMIT_MAX_INFLIGHT, validering vid 75 % och bud först vid 100 %.
+4. STATISTIK: Varje beslut räknas per klass (tillåten/begränsad/avlastad)
+   och exporteras av /metrics.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, jsonify, request
+from flask_login import current_user
+
+# Endpoint -> klass
+ENDPOINT_KLASSER = {
+    'bidding.place_bid': 'bid',
+    'bidding.validate_bid': 'validate',
+    'auctions_bp.search_auctions': 'search',
+    'auctions_bp.browse_auctions': 'browse',
+    'auctions_bp.auction_detail': 'browse',
+    'auctions_bp.auction_summary': 'browse',
+    'index': 'browse',
+}
+
+# Klass -> andel av RATE_LIMIT_MAX_INFLIGHT då klassen börjar avvisas
+AVLASTNINGSGRANS = {
+    'browse': 0.5,
+    'search': 0.5,
+    'validate': 0.75,
+    'bid': 1.0,
+}
+
+# Klass -> {nyckeltyp: (tokens per sekund, max skur)}
+STANDARDREGLER = {
+    'bid': {'user': (1.0, 5), 'ip': (3.0, 20), 'auction': (20.0, 50)},
+    'validate': {'user': (5.0, 20), 'ip': (10.0, 40)},
+    'search': {'user': (3.0, 15), 'ip': (5.0, 30)},
+}
+
+
+class Begransare:
+    """Trådsäker token bucket-begränsare med lat utgång"""
+
+    def __init__(self, regler=None, max_inflight=64, aktiv=True, stadintervall=1000):
+        self.regler = regler if regler is not None else STANDARDREGLER
+        self.max_inflight = max_inflight
+        self.aktiv = aktiv
+        self.stadintervall = stadintervall
+        self._lock = threading.Lock()
+        self._buckets = {}        # (klass, typ, nyckel) -> [tokens, senast]
+        self._anrop = 0
+        self.pagaende = 0
+        self.beslut = Counter()   # (klass, beslut) -> antal
+
+    def forsok(self, klass, nycklar, nu=None):
+        """
+        Tar en token ur alla buckets för anropet.
+
+        Args:
+            klass: 'bid', 'validate' eller 'search'
+            nycklar: {nyckeltyp: värde}, t.ex. {'user': 3, 'ip': '1.2.3.4'}
+
+        Returns:
+            float: 0 om anropet tillåts, annars antal sekunder till nästa token
+        """
+        regler = self.regler.get(klass)
+        if not regler:
+            return 0.0
+        nu = time.monotonic() if nu is None else nu
+        with self._lock:
+            self._anrop += 1
+            if self._anrop % self.stadintervall == 0:
+                self._stada(nu)
+
+            aktuella = []
+            vanta = 0.0
+            for typ, (takt, skur) in regler.items():
+                nyckel = nycklar.get(typ)
+                if nyckel is None:
+                    continue
+                bucket = self._buckets.get((klass, typ, nyckel))
+                tokens = skur if bucket is None else min(skur, bucket[0] + (nu - bucket[1]) * takt)
+                if tokens < 1:
+                    vanta = max(vanta, (1 - tokens) / takt)
+                aktuella.append(((klass, typ, nyckel), tokens))
+
+            if vanta:
+                return vanta
+            # Alla buckets har en token - dra först nu, så att ett nekat anrop inte kostar något
+            for nyckel, tokens in aktuella:
+                self._buckets[nyckel] = [tokens - 1, nu]
+            return 0.0
+
+    def _stada(self, nu):
+        """Tar bort buckets som hunnit fyllas på helt (anropas med låset taget)"""
+        for nyckel, (tokens, senast) in list(self._buckets.items()):
+            regel = self.regler.get(nyckel[0], {}).get(nyckel[1])
+            if regel is None or tokens + (nu - senast) * regel[0] >= regel[1]:
+                del self._buckets[nyckel]
+
+    def ska_avlastas(self, klass):
+        """Är servern så belastad att denna klass ska avvisas?"""
+        grans = AVLASTNINGSGRANS.get(klass)
+        return grans is not None and self.pagaende > self.max_inflight * grans
+
+    def rakna(self, klass, beslut):
+        with self._lock:
+            self.beslut[(klass, beslut)] += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _vill_ha_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+
+def _avvisa(status, meddelande, vanta):
+    if _vill_ha_json():
+        svar = jsonify({'success': False, 'message': meddelande})
+    else:
+        svar = current_app.response_class(meddelande, mimetype='text/plain')
+    svar.status_code = status
+    svar.headers['Retry-After'] = str(max(1, math.ceil(vanta)))
+    return svar
+
+
+def _fore_request():
+    begransare = current_app.extensions['rate_limiter']
+    klass = ENDPOINT_KLASSER.get(request.endpoint)
+    if not begransare.aktiv or klass is None:
+        return None
+
+    with begransare._lock:
+        begransare.pagaende += 1
+    g.rate_limit_raknad = True
+
+    if begransare.ska_avlastas(klass):
+        begransare.rakna(klass, 'shed')
+        return _avvisa(503, 'The server is busy. Please try again shortly.', 1)
+
+    nycklar = {'ip': request.remote_addr}
+    if current_user.is_authenticated:
+        nycklar['user'] = current_user.id
+    if klass == 'bid' and request.view_args:
+        nycklar['auction'] = request.view_args.get('auction_id')
+    vanta = begransare.forsok(klass, nycklar)
+    if vanta:
+        begransare.rakna(klass, 'limited')
+        return _avvisa(429, 'Too many requests. Please slow down.', vanta)
+    begransare.rakna(klass, 'allowed')
+    return None
+
+
+def _efter_request(exc=None):
+    if g.pop('rate_limit_raknad', False):
+        begransare = current_app.extensions['rate_limiter']
+        with begransare._lock:
+            begransare.pagaende -= 1
+
+
+def init_rate_limit(app):
+    """
+    Kopplar begränsaren till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.extensions['rate_limiter'] = Begransare(
+        regler=app.config.get('RATE_LIMIT_RULES'),
+        max_inflight=app.config.get('RATE_LIMIT_MAX_INFLIGHT', 64),
+        aktiv=app.config.get('RATE_LIMIT_ENABLED', True),
+    )
+    app.before_request(_fore_request)
+    app.teardown_request(_efter_request)
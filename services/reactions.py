@@ -0,0 +1,315 @@
+# services/reactions.py
+"""
+👍 REACTIONS - Write-behind-buffring av like/dislike
+
+SYFTE: Varje klick i toggle_like/toggle_dislike gjorde en SELECT, en skrivning
+med commit och laddade sedan om auction.likes två gånger för att räkna.
+En populär auktion blev en skrivstorm mot en enda SQLite-databas.
+
+HUR DET FUNGERAR:
+1. Reaktionerna för en auktion laddas in i minnet första gången de behövs
+   (en SELECT). Därefter sker växlingen helt i minnet och antalet likes/dislikes
+   returneras direkt.
+2. Ändringarna samlas per (auktion, användare) - klickar någon tio gånger
+   skrivs bara slutresultatet.
+3. En bakgrundstråd skriver ändringarna var REACTIONS_FLUSH_INTERVAL sekund
+   i EN transaktion: INSERT ... ON CONFLICT DO UPDATE för likes/dislikes och
+   DELETE för borttagna reaktioner.
+4. Vid normal avstängning (atexit) skrivs allt som återstår. Går det inte att
+   skriva till databasen sparas ändringarna i en journalfil som läses in och
+   skrivs vid nästa start - inget går förlorat.
+
+Tillståndet i minnet laddas om efter REACTIONS_STATE_TTL sekunder (om inga
+ändringar väntar), så att flera workers inte divergerar för länge.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select
+
+from database import db, dialekt_insert
+from services.change_feed import registrera_andringar
+
+# Markerar "reaktionen ska tas bort" i väntande ändringar
+_TA_BORT = None
+
+
+class _AuktionsReaktioner:
+    """Alla reaktioner för en auktion: användare -> True (like) / False (dislike)"""
+    __slots__ = ('per_anvandare', 'likes', 'dislikes', 'laddad', 'vantande')
+
+    def __init__(self, per_anvandare):
+        self.per_anvandare = per_anvandare
+        self.likes = sum(1 for v in per_anvandare.values() if v)
+        self.dislikes = len(per_anvandare) - self.likes
+        self.laddad = time.monotonic()
+        self.vantande = 0  # antal ändringar som inte skrivits än
+
+
+class ReaktionsTjanst:
+    """Håller reaktioner i minnet och skriver dem till databasen i batchar"""
+
+    def __init__(self, app, intervall=0.5, state_ttl=30.0, journal=None):
+        self.app = app
+        self.intervall = intervall
+        self.state_ttl = state_ttl
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._auktioner = {}   # auction_id -> _AuktionsReaktioner
+        self._vantande = {}    # (auction_id, user_id) -> True/False/_TA_BORT
+        self._stopp = threading.Event()
+        self._trad = None
+
+    # ------------------------------------------------------------
+    # Läsning och växling (anropas från requests)
+    # ------------------------------------------------------------
+    def vaxla(self, user_id, auction_id, is_like):
+        """
+        Växlar like/dislike på samma sätt som Like.toggle_like, men i minnet.
+
+        Returns:
+            tuple: (action, like_count, dislike_count) där action är
+                   'created', 'updated' eller 'deleted'
+        """
+        self._starta_trad()
+        while True:
+            tillstand = self._hamta_tillstand(auction_id)
+            with self._lock:
+                if self._auktioner.get(auction_id) is not tillstand:
+                    # En annan tråd hann läsa om (eller glom släppte) tillståndet efter
+                    # att det hämtades - en ändring här skulle hamna i ett bortkastat objekt
+                    continue
+                tidigare = tillstand.per_anvandare.get(user_id)
+                if tidigare is None:
+                    action, nytt = 'created', is_like
+                elif tidigare == is_like:
+                    action, nytt = 'deleted', _TA_BORT
+                else:
+                    action, nytt = 'updated', is_like
+
+                if tidigare is not None:
+                    if tidigare:
+                        tillstand.likes -= 1
+                    else:
+                        tillstand.dislikes -= 1
+                if nytt is _TA_BORT:
+                    del tillstand.per_anvandare[user_id]
+                else:
+                    tillstand.per_anvandare[user_id] = nytt
+                    if nytt:
+                        tillstand.likes += 1
+                    else:
+                        tillstand.dislikes += 1
+
+                nyckel = (auction_id, user_id)
+                if nyckel not in self._vantande:
+                    tillstand.vantande += 1
+                self._vantande[nyckel] = nytt
+                return action, tillstand.likes, tillstand.dislikes
+
+    def antal(self, auction):
+        """Returnerar (likes, dislikes) - från minnet om auktionen är laddad, annars från databasen"""
+        tillstand = self._auktioner.get(auction.id)
+        if tillstand is not None:
+            return tillstand.likes, tillstand.dislikes
+        return auction.like_count, auction.dislike_count
+
+    def antal_i_minnet(self, auction_id):
+        """Returnerar (likes, dislikes) om auktionen är laddad i minnet, annars None"""
+        tillstand = self._auktioner.get(auction_id)
+        if tillstand is None:
+            return None
+        return tillstand.likes, tillstand.dislikes
+
+    def anvandarreaktion(self, user_id, auction_id):
+        """Returnerar 'like', 'dislike' eller None för en användare"""
+        tillstand = self._auktioner.get(auction_id)
+        if tillstand is not None:
+            varde = tillstand.per_anvandare.get(user_id)
+        else:
+            from models.like import Like
+            like = Like.query.filter_by(user_id=user_id, auction_id=auction_id).first()
+            varde = like.is_like if like else None
+        if varde is None:
+            return None
+        return 'like' if varde else 'dislike'
+
+    def glom(self, auction_id):
+        """Släpper tillståndet för en auktion (om inget väntar) så att det läses om"""
+        with self._lock:
+            tillstand = self._auktioner.get(auction_id)
+            if tillstand is not None and not tillstand.vantande:
+                del self._auktioner[auction_id]
+
+    def _hamta_tillstand(self, auction_id):
+        tillstand = self._auktioner.get(auction_id)
+        if tillstand is not None and (
+            tillstand.vantande or time.monotonic() - tillstand.laddad < self.state_ttl
+        ):
+            return tillstand
+
+        from models.like import Like
+        rader = db.session.execute(
+            select(Like.user_id, Like.is_like).where(Like.auction_id == auction_id)
+        ).all()
+        nytt = _AuktionsReaktioner({user_id: is_like for user_id, is_like in rader})
+
+        with self._lock:
+            aktuellt = self._auktioner.get(auction_id)
+            if aktuellt is not None and aktuellt.vantande:
+                # En annan tråd hann ändra under tiden - behåll dess tillstånd
+                return aktuellt
+            self._auktioner[auction_id] = nytt
+            return nytt
+
+    # ------------------------------------------------------------
+    # Skrivning (bakgrundstråd)
+    # ------------------------------------------------------------
+    def flush(self):
+        """Skriver alla väntande ändringar i en transaktion. Returnerar antal skrivna."""
+        with self._flush_lock:
+            with self._lock:
+                andringar = self._vantande
+                self._vantande = {}
+            if not andringar:
+                return 0
+            try:
+                with self.app.app_context():
+                    skriv_andringar(andringar)
+            except Exception:
+                self.app.logger.exception('Kunde inte skriva %d reaktioner', len(andringar))
+                with self._lock:
+                    # Lägg tillbaka - nyare ändringar för samma nyckel vinner.
+                    # En nyckel som hann köas igen räknades två gånger i vantande
+                    # men blir nu en enda väntande ändring.
+                    for nyckel, varde in andringar.items():
+                        if nyckel in self._vantande:
+                            self._minska_vantande(nyckel[0])
+                        else:
+                            self._vantande[nyckel] = varde
+                return 0
+
+            with self._lock:
+                # Varje skriven nyckel räknas av en gång, även om den hann köas
+                # igen under skrivningen (den nya ändringen räknades för sig)
+                for auction_id, _ in andringar:
+                    self._minska_vantande(auction_id)
+            return len(andringar)
+
+    def _minska_vantande(self, auction_id):
+        """Kräver låset"""
+        tillstand = self._auktioner.get(auction_id)
+        if tillstand is not None and tillstand.vantande:
+            tillstand.vantande -= 1
+
+    def _starta_trad(self):
+        if self._trad is not None:
+            return
+        with self._lock:
+            if self._trad is None:
+                self._trad = threading.Thread(target=self._kor, name='reactions-flush', daemon=True)
+                self._trad.start()
+
+    def _kor(self):
+        while not self._stopp.wait(self.intervall):
+            self.flush()
+
+    def stang(self):
+        """Stoppar tråden och skriver det som återstår (anropas vid avstängning)"""
+        self._stopp.set()
+        self.flush()
+        with self._lock:
+            kvar = self._vantande
+            self._vantande = {}
+        if kvar and self.journal:
+            skriv_journal(self.journal, kvar)
+
+    def las_journal(self):
+        """Läser in ändringar som sparades i journalen vid förra avstängningen"""
+        if not self.journal or not os.path.exists(self.journal):
+            return 0
+        with open(self.journal, encoding='utf-8') as f:
+            for rad in f:
+                if rad.strip():
+                    post = json.loads(rad)
+                    self._vantande[(post['auction_id'], post['user_id'])] = post['is_like']
+        antal = len(self._vantande)
+        if self.flush() == antal:
+            os.remove(self.journal)
+        return antal
+
+
+def skriv_andringar(andringar):
+    """
+    Skriver sammanslagna ändringar till tabellen likes i EN transaktion.
+
+    Args:
+        andringar: dict (auction_id, user_id) -> True/False (upsert) eller None (delete)
+    """
+    from models.like import Like
+
+    nu = datetime.utcnow()
+    upserts = [
+        {'auction_id': a, 'user_id': u, 'is_like': v, 'created_at': nu}
+        for (a, u), v in andringar.items() if v is not _TA_BORT
+    ]
+    borttagna = [(a, u) for (a, u), v in andringar.items() if v is _TA_BORT]
+
+    with db.engine.begin() as conn:
+        if upserts:
+            insert = dialekt_insert(conn.dialect.name)
+            stmt = insert(Like.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['auction_id', 'user_id'],
+                set_={'is_like': stmt.excluded.is_like, 'created_at': stmt.excluded.created_at},
+            )
+            conn.execute(stmt, upserts)
+        # DELETE i block för att hålla antalet parametrar nere
+        for i in range(0, len(borttagna), 200):
+            block = borttagna[i:i + 200]
+            conn.execute(delete(Like.__table__).where(or_(*[
+                and_(Like.auction_id == a, Like.user_id == u) for a, u in block
+            ])))
+        # En ändringsrad per auktion räcker för att andra processer ska läsa om
+        registrera_andringar(conn, [
+            ('likes', None, 'update', auction_id) for auction_id in sorted({a for a, _ in andringar})
+        ])
+
+
+def skriv_journal(sokvag, andringar):
+    """Sparar ändringar som inte kunde skrivas till databasen (en JSON-rad per ändring)"""
+    os.makedirs(os.path.dirname(sokvag) or '.', exist_ok=True)
+    with open(sokvag, 'a', encoding='utf-8') as f:
+        for (auction_id, user_id), is_like in andringar.items():
+            f.write(json.dumps({'auction_id': auction_id, 'user_id': user_id, 'is_like': is_like}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def init_reactions(app):
+    """
+    Kopplar reaktionstjänsten till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    tjanst = ReaktionsTjanst(
+        app,
+        intervall=app.config.get('REACTIONS_FLUSH_INTERVAL', 0.5),
+        state_ttl=app.config.get('REACTIONS_STATE_TTL', 30.0),
+        journal=app.config.get('REACTIONS_JOURNAL') or os.path.join(app.instance_path, 'reactions.journal'),
+    )
+    app.extensions['reactions'] = tjanst
+    tjanst.las_journal()
+    atexit.register(tjanst.stang)
+
+
+def hamta_reaktioner():
+    """Returnerar appens ReaktionsTjanst"""
+    return current_app.extensions['reactions']
@@ -0,0 +1,364 @@
+# services/saved_searches.py
+"""
+🔎 SAVED SEARCHES - Sparade sökningar som matchas mot nya auktioner
+
+SYFTE: Användare kör samma sökning om och om igen i väntan på nya
+auktioner. Istället sparar de sökningen (nyckelord, kategori, prisintervall)
+och varje ny auktion matchas mot alla sparade sökningar - utan att köra om
+någon av dem.
+
+HUR DET FUNGERAR:
+1. OMVÄNT INDEX: Sökningarna hålls i minnet, indexerade på det de kräver:
+   - sökningar med nyckelord ligger under ETT av sina ord (det längsta, som
+     oftast är det ovanligaste),
+   - sökningar med bara kategori ligger under kategorin,
+   - sökningar med bara prisintervall ligger i ett intervallträd (PrisIndex).
+   En ny auktion slår upp sina egna ord och sin kategori, och sitt pris i
+   intervallträdet. Bara de kandidater som hittas kontrolleras mot alla
+   villkor, så kostnaden beror på auktionens storlek och antalet
+   kandidater - inte på hur många sökningar som finns.
+   Intervallträdet har fasta noder: priset görs om till ett 64-bitars tal
+   med samma ordning (float-bitarna), och varje intervall ligger i den nod
+   där min- och maxpriset först skiljer sig åt. En uppslagning går igenom
+   högst 64 noder och läser bara intervall som faktiskt innehåller priset.
+2. NYCKELORD: Orden jämförs som hela ord utan skiftlägeskänslighet, och ALLA
+   ord måste finnas i auktionens titel eller beskrivning.
+3. NYA AUKTIONER: Sökningarna är en varaktig konsument av ändringsflödet
+   (position 'saved_searches' i change_consumers). Varje insert i auctions
+   matchas, och efter en omstart fortsätter konsumenten där den slutade.
+   Importer som skriver förbi ORM:en anropar matcha_auktioner() själva.
+4. NOTIFIERINGSKÖ: Varje träff blir en rad i saved_search_matches. Rader
+   utan notified_at är kön; hamta_ko() och markera_skickade() är till för
+   den som skickar notifieringarna. Samma auktion köas bara en gång per
+   sökning, även om flera workers bearbetar samma ändring.
+5. FLERA WORKERS: Nya och borttagna sökningar sprids via ändringsflödet, så
+   att alla workers index är aktuella.
+"""
+import re
+import struct
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from database import db, dialekt_insert
+from services.change_feed import hamta_position, las_andringar, spara_position
+
+# Konsumentens namn i change_consumers
+KONSUMENT = 'saved_searches'
+
+_ORD = re.compile(r'\w+')
+
+
+def termer(text):
+    """Mängden ord (gemener) i en text"""
+    return set(_ORD.findall((text or '').lower()))
+
+
+class Sokning:
+    """En sparad sökning i minnet"""
+    __slots__ = ('id', 'user_id', 'termer', 'category', 'min_price', 'max_price')
+
+    def __init__(self, id, user_id, keywords, category, min_price, max_price):
+        self.id = id
+        self.user_id = user_id
+        self.termer = frozenset(termer(keywords))
+        self.category = category or None
+        self.min_price = min_price
+        self.max_price = max_price
+
+    @property
+    def ankare(self):
+        """Ordet som sökningen indexeras under"""
+        return max(self.termer, key=lambda t: (len(t), t)) if self.termer else None
+
+    def matchar(self, auktionstermer, category, pris):
+        return (
+            self.termer <= auktionstermer
+            and (self.category is None or self.category == category)
+            and (self.min_price is None or pris >= self.min_price)
+            and (self.max_price is None or pris <= self.max_price)
+        )
+
+
+def _nyckel(pris):
+    """Pris (>= 0, None = obegränsat) -> heltal med samma ordning, 0 .. +inf"""
+    if pris is None or pris <= 0:
+        return 0
+    return struct.unpack('>Q', struct.pack('>d', pris))[0]
+
+
+_OBEGRANSAT = _nyckel(float('inf'))
+
+
+class PrisIndex:
+    """
+    Intervallträd över prisintervall (min_price, max_price). Noderna är fasta:
+    nod (niva, prefix) täcker nycklarna med de niva första bitarna = prefix och
+    har mitten (2 * prefix + 1) << (63 - niva). Ett intervall ligger i den nod
+    vars mitt det innehåller högst upp i trädet, sorterat både på min och max.
+    Kräver anroparens lås.
+    """
+
+    def __init__(self):
+        self._noder = {}     # (niva, prefix) -> ([(min, id)] stigande, [(-max, id)] stigande)
+        self._punkter = {}   # nyckel -> set(id), intervall där min == max
+
+    @staticmethod
+    def _nod(fran, till):
+        niva = 64 - (fran ^ till).bit_length()
+        return niva, fran >> (64 - niva)
+
+    def lagg_till(self, sokning_id, min_price, max_price):
+        fran, till = _nyckel(min_price), _OBEGRANSAT if max_price is None else _nyckel(max_price)
+        if fran == till:
+            self._punkter.setdefault(fran, set()).add(sokning_id)
+            return
+        efter_min, efter_max = self._noder.setdefault(self._nod(fran, till), ([], []))
+        insort(efter_min, (fran, sokning_id))
+        insort(efter_max, (-till, sokning_id))
+
+    def ta_bort(self, sokning_id, min_price, max_price):
+        fran, till = _nyckel(min_price), _OBEGRANSAT if max_price is None else _nyckel(max_price)
+        if fran == till:
+            hink = self._punkter[fran]
+            hink.discard(sokning_id)
+            if not hink:
+                del self._punkter[fran]
+            return
+        nod = self._nod(fran, till)
+        efter_min, efter_max = self._noder[nod]
+        del efter_min[bisect_left(efter_min, (fran, sokning_id))]
+        del efter_max[bisect_left(efter_max, (-till, sokning_id))]
+        if not efter_min:
+            del self._noder[nod]
+
+    def traffar(self, pris):
+        """Id för alla intervall som innehåller priset"""
+        nyckel = _nyckel(pris)
+        yield from self._punkter.get(nyckel, ())
+        for niva in range(64):
+            prefix = nyckel >> (64 - niva)
+            nod = self._noder.get((niva, prefix))
+            if nod is None:
+                continue
+            # Alla intervall i noden innehåller mitten, så bara den sida
+            # av mitten som priset ligger på behöver jämföras
+            if nyckel < (2 * prefix + 1) << (63 - niva):
+                for fran, sokning_id in nod[0]:
+                    if fran > nyckel:
+                        break
+                    yield sokning_id
+            else:
+                for minus_till, sokning_id in nod[1]:
+                    if -minus_till < nyckel:
+                        break
+                    yield sokning_id
+
+
+class SokIndex:
+    """Omvänt index från ord, kategori och pris till sparade sökningar"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sokningar = {}    # id -> Sokning
+        self._per_term = {}     # ankarord -> set(id)
+        self._per_kategori = {}  # kategori -> set(id), sökningar utan ord
+        self._per_pris = PrisIndex()  # sökningar med bara pris
+
+    def __len__(self):
+        return len(self._sokningar)
+
+    def lagg_till(self, sokning):
+        with self._lock:
+            self._ta_bort(sokning.id)
+            self._sokningar[sokning.id] = sokning
+            if sokning.termer:
+                self._per_term.setdefault(sokning.ankare, set()).add(sokning.id)
+            elif sokning.category is not None:
+                self._per_kategori.setdefault(sokning.category, set()).add(sokning.id)
+            else:
+                self._per_pris.lagg_till(sokning.id, sokning.min_price, sokning.max_price)
+
+    def ta_bort(self, sokning_id):
+        with self._lock:
+            self._ta_bort(sokning_id)
+
+    def _ta_bort(self, sokning_id):
+        """Kräver låset"""
+        sokning = self._sokningar.pop(sokning_id, None)
+        if sokning is None:
+            return
+        if sokning.termer:
+            hink = self._per_term[sokning.ankare]
+            hink.discard(sokning_id)
+            if not hink:
+                del self._per_term[sokning.ankare]
+        elif sokning.category is not None:
+            hink = self._per_kategori[sokning.category]
+            hink.discard(sokning_id)
+            if not hink:
+                del self._per_kategori[sokning.category]
+        else:
+            self._per_pris.ta_bort(sokning_id, sokning.min_price, sokning.max_price)
+
+    def matcha(self, title, description, category, pris):
+        """De sparade sökningar som en auktion matchar"""
+        auktionstermer = termer(f'{title} {description}')
+        with self._lock:
+            kandidater = set()
+            for term in auktionstermer:
+                kandidater.update(self._per_term.get(term, ()))
+            kandidater.update(self._per_kategori.get(category, ()))
+            kandidater.update(self._per_pris.traffar(pris))
+            return [
+                self._sokningar[sokning_id] for sokning_id in sorted(kandidater)
+                if self._sokningar[sokning_id].matchar(auktionstermer, category, pris)
+            ]
+
+
+def _fran_rad(sparad):
+    return Sokning(sparad.id, sparad.user_id, sparad.keywords, sparad.category, sparad.min_price, sparad.max_price)
+
+
+class SparadeSokningar:
+    """Indexet plus den varaktiga konsumenten som matchar nya auktioner"""
+
+    def __init__(self, app, batch=500):
+        self.app = app
+        self.batch = batch
+        self.index = SokIndex()
+        self._lock = threading.Lock()
+
+    def bygg(self):
+        """Läser alla sparade sökningar. Kräver app context."""
+        from models.saved_search import SavedSearch
+        for sparad in db.session.execute(select(SavedSearch)).scalars():
+            self.index.lagg_till(_fran_rad(sparad))
+        db.session.rollback()
+
+    def ladda_om(self, sokning_id):
+        """Läser om en sökning (ny, ändrad eller borttagen). Kräver app context."""
+        from models.saved_search import SavedSearch
+        sparad = db.session.get(SavedSearch, sokning_id)
+        if sparad is None:
+            self.index.ta_bort(sokning_id)
+        else:
+            self.index.lagg_till(_fran_rad(sparad))
+
+    def matcha_auktioner(self, auction_ids):
+        """
+        Matchar auktioner mot alla sparade sökningar och köar träffarna.
+        Kräver app context.
+
+        Returns:
+            int: Antal nya träffar
+        """
+        from models.auction import Auction
+        from models.saved_search import SavedSearchMatch
+
+        if not auction_ids:
+            return 0
+        rader = db.session.execute(
+            select(Auction.id, Auction.title, Auction.description, Auction.category,
+                   Auction.starting_bid, Auction.current_bid)
+            .where(Auction.id.in_(auction_ids), Auction.is_active.is_(True))
+        ).all()
+        nu = datetime.utcnow()
+        traffar = [
+            {'saved_search_id': sokning.id, 'auction_id': rad.id, 'user_id': sokning.user_id, 'created_at': nu}
+            for rad in rader
+            for sokning in self.index.matcha(rad.title, rad.description, rad.category,
+                                             rad.current_bid if rad.current_bid is not None else rad.starting_bid)
+        ]
+        if not traffar:
+            db.session.rollback()
+            return 0
+        with db.engine.begin() as conn:
+            insert = dialekt_insert(conn.dialect.name)
+            resultat = conn.execute(insert(SavedSearchMatch.__table__).on_conflict_do_nothing(
+                index_elements=['saved_search_id', 'auction_id']), traffar)
+        db.session.rollback()
+        return resultat.rowcount
+
+    def borja_vid_slutet(self):
+        """En ny konsument matchar bara auktioner som skapas från och med nu. Kräver app context."""
+        from models.change import Change, ChangeConsumer
+        if db.session.get(ChangeConsumer, KONSUMENT) is None:
+            spara_position(KONSUMENT, db.session.execute(select(func.max(Change.seq))).scalar() or 0)
+
+    def bearbeta(self):
+        """
+        Läser ändringsflödet från konsumentens position och matchar nya
+        auktioner. Kräver app context.
+
+        Returns:
+            int: Antal bearbetade ändringar
+        """
+        totalt = 0
+        with self._lock:
+            while True:
+                andringar = las_andringar(hamta_position(KONSUMENT), self.batch)
+                if not andringar:
+                    return totalt
+                self.matcha_auktioner([
+                    a.row_id for a in andringar
+                    if a.table_name == 'auctions' and a.operation == 'insert' and a.row_id is not None
+                ])
+                spara_position(KONSUMENT, andringar[-1].seq)
+                totalt += len(andringar)
+                if len(andringar) < self.batch:
+                    return totalt
+
+    def hamta_ko(self, max_antal=100):
+        """Träffar som väntar på notifiering (äldst först). Kräver app context."""
+        from models.saved_search import SavedSearchMatch
+        return db.session.execute(
+            select(SavedSearchMatch).where(SavedSearchMatch.notified_at.is_(None))
+            .order_by(SavedSearchMatch.id).limit(max_antal)
+        ).scalars().all()
+
+    def markera_skickade(self, match_ids):
+        """Tar bort träffar ur kön när deras notifiering har skickats. Kräver app context."""
+        from models.saved_search import SavedSearchMatch
+        if not match_ids:
+            return
+        db.session.execute(
+            update(SavedSearchMatch).where(SavedSearchMatch.id.in_(match_ids))
+            .values(notified_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+
+def _folj_andring(andring):
+    """Prenumerant på ändringsflödet: håller indexet aktuellt och matchar nya auktioner"""
+    tjanst = current_app.extensions['saved_searches']
+    if andring.table_name == 'saved_searches' and andring.row_id is not None:
+        tjanst.ladda_om(andring.row_id)
+    elif andring.table_name == 'auctions' and andring.operation == 'insert':
+        tjanst.bearbeta()
+
+
+def init_saved_searches(app):
+    """
+    Bygger indexet över sparade sökningar och kopplar det till ändringsflödet.
+    Måste anropas efter init_change_feed.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    tjanst = SparadeSokningar(app)
+    app.extensions['saved_searches'] = tjanst
+    with app.app_context():
+        tjanst.bygg()
+        tjanst.borja_vid_slutet()
+        # Ikapp med det som hann skrivas medan appen var nere
+        tjanst.bearbeta()
+    app.extensions['change_feed'].prenumerera(_folj_andring)
+
+
+def hamta_sparade_sokningar():
+    """Returnerar appens SparadeSokningar"""
+    return current_app.extensions['saved_searches']
@@ -0,0 +1,233 @@
+# services/slow_queries.py
+"""
+🐢 SLOW QUERIES - Logg över långsamma SQL-satser med EXPLAIN QUERY PLAN
+
+SYFTE: När browse eller my_bids blev långsamma visste vi inte vilken sats
+som var boven. /metrics visar bara total tid per sorts sats.
+
+HUR DET FUNGERAR:
+1. MÄTNING: SQLAlchemy-händelserna before/after_cursor_execute mäter varje
+   sats. BaseRepository.execute_query/execute_non_query (rå sqlite3)
+   rapporterar sina satser till samma logg.
+2. TRÖSKEL: Satser över SLOW_QUERY_THRESHOLD_MS loggas (logger
+   'slow_queries') med route, tid och parametrar. Parametrarna maskeras:
+   text ersätts av sin längd och värden för kolumner som password/email/
+   token visas aldrig.
+3. FORM: Satsen normaliseras till en "form" (literaler och IN-listor blir ?),
+   så att samma fråga med olika värden räknas ihop.
+4. EXPLAIN EN GÅNG: Första gången en form är långsam körs EXPLAIN QUERY PLAN
+   på samma anslutning och planen sparas med formen.
+5. TOPPLISTA: Antal, total tid och max per form (högst SLOW_QUERY_MAX_SHAPES
+   former, de med minst total tid trängs undan). Admin ser listan sorterad
+   på total tid på /admin/slow-queries.
+"""
+import logging
+import re
+import threading
+import time
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from database import db
+
+logger = logging.getLogger('slow_queries')
+
+# Parametrar vars värde aldrig visas (namn innehåller något av orden)
+KANSLIGA = ('password', 'hash', 'token', 'secret', 'email')
+
+_STRANG = re.compile(r"'(?:[^']|'')*'")
+_TAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTA = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_BLANKSTEG = re.compile(r'\s+')
+_NAMNGIVEN = re.compile(r':\w+|%\(\w+\)s')
+
+
+def normalisera(statement):
+    """Satsens form: literaler, namngivna parametrar och IN-listor blir ?"""
+    form = _STRANG.sub('?', statement)
+    form = _NAMNGIVEN.sub('?', form)
+    form = _TAL.sub('?', form)
+    form = _IN_LISTA.sub('IN (?)', form)
+    return _BLANKSTEG.sub(' ', form).strip()
+
+
+def _maska_varde(varde):
+    if varde is None or isinstance(varde, (bool, int, float)):
+        return varde
+    if isinstance(varde, str):
+        return f'<str {len(varde)}>'
+    if isinstance(varde, (bytes, bytearray, memoryview)):
+        return f'<bytes {len(varde)}>'
+    return f'<{type(varde).__name__}>'
+
+
+def maska(parametrar):
+    """Maskerade parametrar (dict, tuple eller lista av sådana vid executemany)"""
+    if isinstance(parametrar, dict):
+        return {
+            nyckel: '<dolt>' if any(ord_ in nyckel.lower() for ord_ in KANSLIGA) else _maska_varde(varde)
+            for nyckel, varde in parametrar.items()
+        }
+    if isinstance(parametrar, list) and parametrar and isinstance(parametrar[0], (dict, tuple, list)):
+        return [maska(p) for p in parametrar[:3]] + ([f'... ({len(parametrar)} rader)'] if len(parametrar) > 3 else [])
+    if isinstance(parametrar, (tuple, list)):
+        return [_maska_varde(v) for v in parametrar]
+    return _maska_varde(parametrar)
+
+
+def _kallare():
+    """Routen som körde satsen, eller trådens namn utanför requests (t.ex. bid-shard-0)"""
+    if has_request_context():
+        return request.endpoint or request.path
+    return threading.current_thread().name
+
+
+class _Form:
+    __slots__ = ('form', 'exempel', 'antal', 'total', 'max', 'routes', 'parametrar', 'plan')
+
+    def __init__(self, form, exempel):
+        self.form = form
+        self.exempel = exempel
+        self.antal = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.routes = {}  # route -> antal
+        self.parametrar = None
+        self.plan = None
+
+
+class LangsamLogg:
+    """Trådsäker topplista över långsamma satsformer"""
+
+    def __init__(self, troskel_ms=100.0, max_former=500, explain=True):
+        self.troskel = troskel_ms / 1000
+        self.max_former = max_former
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._former = {}  # form -> _Form
+        self.antal = 0
+
+    def registrera(self, statement, parametrar, sekunder, explain=None):
+        """
+        Registrerar en körd sats om den tog minst tröskeln.
+
+        Args:
+            statement: SQL-satsen
+            parametrar: Satsens parametrar (maskeras innan de sparas)
+            sekunder: Hur lång tid satsen tog
+            explain: Funktion som returnerar planens rader, anropas en gång per form
+        """
+        if sekunder < self.troskel:
+            return
+        form = normalisera(statement)
+        route = _kallare()
+        maskerade = maska(parametrar)
+        with self._lock:
+            self.antal += 1
+            post = self._former.get(form)
+            if post is None:
+                if len(self._former) >= self.max_former:
+                    minst = min(self._former.values(), key=lambda p: p.total)
+                    del self._former[minst.form]
+                post = self._former[form] = _Form(form, statement)
+            post.antal += 1
+            post.total += sekunder
+            post.max = max(post.max, sekunder)
+            post.routes[route] = post.routes.get(route, 0) + 1
+            post.parametrar = maskerade
+            behover_plan = post.plan is None and self.explain and explain is not None
+            if behover_plan:
+                post.plan = []  # markera att planen hämtas, så att den bara körs en gång
+        logger.warning('Långsam SQL (%.1f ms) i %s: %s params=%s', sekunder * 1000, route, form, maskerade)
+
+        if behover_plan:
+            try:
+                plan = [' '.join(str(v) for v in rad) for rad in explain()]
+            except Exception as e:
+                plan = [f'EXPLAIN misslyckades: {e}']
+            with self._lock:
+                post.plan = plan
+
+    def topplista(self, antal=50):
+        """Formerna sorterade på total tid (störst först), som dicts"""
+        with self._lock:
+            former = sorted(self._former.values(), key=lambda p: p.total, reverse=True)[:antal]
+            return [{
+                'form': p.form,
+                'exempel': p.exempel,
+                'antal': p.antal,
+                'total_ms': round(p.total * 1000, 1),
+                'medel_ms': round(p.total / p.antal * 1000, 1),
+                'max_ms': round(p.max * 1000, 1),
+                'routes': sorted(p.routes.items(), key=lambda r: -r[1]),
+                'parametrar': p.parametrar,
+                'plan': p.plan or [],
+            } for p in former]
+
+    def nollstall(self):
+        with self._lock:
+            self._former.clear()
+            self.antal = 0
+
+
+def _explain_sqlite(dbapi_conn, statement, parametrar):
+    """EXPLAIN QUERY PLAN på en rå sqlite3-anslutning"""
+    if isinstance(parametrar, list) and parametrar and isinstance(parametrar[0], (dict, tuple, list)):
+        parametrar = parametrar[0]  # executemany - första raden räcker för planen
+    cursor = dbapi_conn.cursor()
+    try:
+        return cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parametrar or ()).fetchall()
+    finally:
+        cursor.close()
+
+
+def _koppla_databasen(engine, logg):
+    """Mäter alla satser som går genom SQLAlchemy"""
+    sqlite = engine.dialect.name == 'sqlite'
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def fore(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def efter(conn, cursor, statement, parameters, context, executemany):
+        sekunder = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if sekunder < logg.troskel:
+            return
+        explain = None
+        if sqlite and statement.lstrip()[:6].upper() not in ('PRAGMA', 'BEGIN', 'COMMIT'):
+            dbapi_conn = conn.connection.dbapi_connection
+            explain = lambda: _explain_sqlite(dbapi_conn, statement, parameters)  # noqa: E731
+        logg.registrera(statement, parameters, sekunder, explain)
+
+
+def registrera_sats(statement, parametrar, sekunder, explain=None):
+    """Rapporterar en sats som körts utanför SQLAlchemy (t.ex. BaseRepository)"""
+    if not has_app_context():
+        return
+    logg = current_app.extensions.get('slow_queries')
+    if logg is not None:
+        logg.registrera(statement, parametrar, sekunder, explain)
+
+
+def init_slow_queries(app):
+    """
+    Kopplar loggen för långsamma satser till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    logg = LangsamLogg(
+        troskel_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS', 100.0),
+        max_former=app.config.get('SLOW_QUERY_MAX_SHAPES', 500),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True),
+    )
+    app.extensions['slow_queries'] = logg
+    with app.app_context():
+        _koppla_databasen(db.engine, logg)
+
+
+def hamta_langsamma():
+    """Returnerar appens LangsamLogg"""
+    return current_app.extensions['slow_queries']
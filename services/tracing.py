@@ -0,0 +1,440 @@
+# services/tracing.py
+"""
+🧵 TRACING - Spans för var tiden går inom en request
+
+SYFTE: /metrics och slow-query-loggen visar summor. För EN långsam request
+behöver vi se ordningen: routing, inloggad användare, varje SQL-fråga,
+mallrendering och JSON-serialisering.
+
+HUR DET FUNGERAR:
+1. AV SOM STANDARD: Med TRACING_ENABLED=0 registreras ingenting.
+2. SAMPLING: TRACING_SAMPLE_RATE (0-1) väljer slumpvis requests. En
+   inkommande W3C-header traceparent med sampled-flaggan följs alltid, och
+   trace-id:t och förälder-spannet tas därifrån.
+3. SPANS: Aktivt spann hålls i en contextvar. ID:n följer W3C/OpenTelemetry
+   (trace_id 32 hex, span_id 16 hex, parent_span_id). Spannen:
+   - HTTP <metod> <route>: roten, från WSGI-anropet tills svaret är skickat
+   - flask.setup: routing och session innan före-hooks körs
+   - before_request: alla before_request-hooks (begränsare, sidcache ...)
+   - view <endpoint>: själva vyn, med barnen user.load, db.query (SQLAlchemy-
+     händelser), template.render (Jinja-signaler) och json.serialize
+   - after_request: after_request-hooks (komprimering m.m.)
+   SQL som körs i andra trådar (t.ex. budmotorns shards) syns inte.
+4. EXPORT: Färdiga traces läggs i en ringbuffert (TRACING_BUFFER senaste) och,
+   om TRACING_FILE är satt, som en JSONL-rad per span i en roterande fil.
+5. WATERFALL: Svaret har headern X-Trace-Id (och W3C traceresponse).
+   Admin ser trace:n som ett vattenfall på /admin/traces/<trace_id>.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+from flask import before_render_template, current_app, request, template_rendered
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+from database import db
+from services.slow_queries import normalisera
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_aktivt_spann = contextvars.ContextVar('aktivt_spann', default=None)
+
+
+class Spann:
+    """Ett spann (OpenTelemetry-liknande fält)"""
+    __slots__ = ('trace', 'span_id', 'parent', 'parent_span_id', 'name', 'start_ns', 'end_ns',
+                 'attributes', 'status')
+
+    def __init__(self, trace, name, parent=None, parent_span_id=None, **attributes):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.parent_span_id = parent.span_id if parent is not None else parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = 'OK'
+
+    def som_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'attributes': self.attributes,
+            'status': self.status,
+        }
+
+
+class Trace:
+    """Alla spann för en request"""
+
+    def __init__(self, trace_id=None, max_spann=500):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.max_spann = max_spann
+        self.spann = []
+        self.tappade = 0
+        self.fas = {}  # fasnamn -> öppet Spann (setup, before_request, after_request)
+
+
+def starta_spann(namn, **attributes):
+    """Startar ett barn till det aktiva spannet. Returnerar None om requesten inte spåras."""
+    foralder = _aktivt_spann.get()
+    if foralder is None:
+        return None
+    trace = foralder.trace
+    if len(trace.spann) >= trace.max_spann:
+        trace.tappade += 1
+        return None
+    spann = Spann(trace, namn, foralder, **attributes)
+    trace.spann.append(spann)
+    _aktivt_spann.set(spann)
+    return spann
+
+
+def avsluta_spann(spann, fel=None):
+    """Avslutar spannet och gör föräldern aktiv igen"""
+    if spann is None or spann.end_ns is not None:
+        return
+    spann.end_ns = time.time_ns()
+    if fel is not None:
+        spann.status = 'ERROR'
+        spann.attributes['error'] = fel.__class__.__name__
+    if _aktivt_spann.get() is spann:
+        _aktivt_spann.set(spann.parent)
+
+
+@contextmanager
+def spann(namn, **attributes):
+    """Kontexthanterare för egna spann: with spann('bygg_lista'): ..."""
+    s = starta_spann(namn, **attributes)
+    try:
+        yield s
+    except BaseException as e:
+        avsluta_spann(s, e)
+        raise
+    avsluta_spann(s)
+
+
+def aktivt_trace_id():
+    """Trace-id för den spårade requesten, annars None"""
+    s = _aktivt_spann.get()
+    return s.trace.trace_id if s is not None else None
+
+
+class Insamlare:
+    """Ringbuffert med färdiga traces och (valfritt) JSONL-fil"""
+
+    def __init__(self, max_traces=1000, fil=None):
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()  # trace_id -> [span-dict]
+        self.max_traces = max_traces
+        self.fil = fil
+        self._logger = None
+        if fil:
+            os.makedirs(os.path.dirname(os.path.abspath(fil)), exist_ok=True)
+            self._logger = logging.getLogger(f'tracing.{id(self)}')
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._hanterare = RotatingFileHandler(fil, maxBytes=50 * 1024 * 1024, backupCount=3, encoding='utf-8')
+            self._hanterare.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(self._hanterare)
+
+    def exportera(self, trace):
+        rader = [s.som_dict() for s in trace.spann if s.end_ns is not None]
+        with self._lock:
+            befintliga = self._traces.pop(trace.trace_id, [])
+            self._traces[trace.trace_id] = befintliga + rader
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        if self._logger is not None:
+            for rad in rader:
+                self._logger.info(json.dumps(rad, ensure_ascii=False, separators=(',', ':')))
+
+    def senaste(self, antal=50):
+        """Sammanfattning av de senaste traces (nyast först)"""
+        with self._lock:
+            traces = list(self._traces.items())[-antal:]
+        resultat = []
+        for trace_id, rader in reversed(traces):
+            rot = rader[0]
+            resultat.append({
+                'trace_id': trace_id,
+                'name': rot['name'],
+                'status': rot['attributes'].get('http.status_code'),
+                'ms': round((rot['end_time_unix_nano'] - rot['start_time_unix_nano']) / 1e6, 2),
+                'spans': len(rader),
+                'start': rot['start_time_unix_nano'],
+            })
+        return resultat
+
+    def hamta(self, trace_id):
+        """Alla spann för en trace: ur bufferten, annars ur JSONL-filerna"""
+        with self._lock:
+            rader = self._traces.get(trace_id)
+        if rader is not None:
+            return list(rader)
+        if not self.fil:
+            return []
+        rader = []
+        for sokvag in (self.fil, *(f'{self.fil}.{i}' for i in range(1, 4))):
+            try:
+                with open(sokvag, encoding='utf-8') as f:
+                    for rad in f:
+                        if trace_id in rad:
+                            rader.append(json.loads(rad))
+            except FileNotFoundError:
+                continue
+        return rader
+
+    def stang(self):
+        if self._logger is not None:
+            self._logger.removeHandler(self._hanterare)
+            self._hanterare.close()
+
+
+def vattenfall(rader):
+    """Spannen i trädordning med djup och position (procent av roten) för vattenfallsvyn"""
+    if not rader:
+        return []
+    ids = {r['span_id'] for r in rader}
+    barn = {}
+    for r in rader:
+        barn.setdefault(r['parent_span_id'] if r['parent_span_id'] in ids else None, []).append(r)
+    start = min(r['start_time_unix_nano'] for r in rader)
+    slut = max(r['end_time_unix_nano'] for r in rader)
+    total = max(slut - start, 1)
+
+    resultat = []
+
+    def besok(foralder, djup):
+        for r in sorted(barn.get(foralder, []), key=lambda r: r['start_time_unix_nano']):
+            langd = r['end_time_unix_nano'] - r['start_time_unix_nano']
+            resultat.append({
+                **r,
+                'depth': djup,
+                'offset_ms': round((r['start_time_unix_nano'] - start) / 1e6, 3),
+                'ms': round(langd / 1e6, 3),
+                'left_pct': round((r['start_time_unix_nano'] - start) / total * 100, 2),
+                'width_pct': max(round(langd / total * 100, 2), 0.2),
+            })
+            besok(r['span_id'], djup + 1)
+
+    besok(None, 0)
+    return resultat
+
+
+class SparningsMiddleware:
+    """WSGI-lagret som väljer requests och äger rotspannet"""
+
+    def __init__(self, wsgi_app, insamlare, sample_rate=1.0, max_spann=500):
+        self.wsgi_app = wsgi_app
+        self.insamlare = insamlare
+        self.sample_rate = sample_rate
+        self.max_spann = max_spann
+
+    def _valj(self, environ):
+        """(trace_id, förälder-span_id) om requesten ska spåras, annars None"""
+        match = _TRACEPARENT.match(environ.get('HTTP_TRACEPARENT', ''))
+        if match and int(match.group(3), 16) & 1:
+            return match.group(1), match.group(2)
+        if self.sample_rate and random.random() < self.sample_rate:
+            return None, None
+        return None
+
+    def __call__(self, environ, start_response):
+        val = None if environ.get('PATH_INFO', '').startswith('/static/') else self._valj(environ)
+        if val is None:
+            _aktivt_spann.set(None)
+            return self.wsgi_app(environ, start_response)
+
+        trace = Trace(val[0], self.max_spann)
+        metod = environ.get('REQUEST_METHOD')
+        rot = Spann(trace, f'HTTP {metod}', parent_span_id=val[1], **{
+            'http.method': metod,
+            'http.target': environ.get('PATH_INFO', ''),
+        })
+        trace.spann.append(rot)
+        _aktivt_spann.set(rot)
+        trace.fas['setup'] = starta_spann('flask.setup')
+
+        def med_headers(status, headers, exc_info=None):
+            rot.attributes['http.status_code'] = int(status[:3])
+            headers = list(headers) + [
+                ('X-Trace-Id', trace.trace_id),
+                ('traceresponse', f'00-{trace.trace_id}-{rot.span_id}-01'),
+            ]
+            return start_response(status, headers, exc_info)
+
+        def avsluta():
+            for oppet in reversed(trace.spann):
+                avsluta_spann(oppet)
+            _aktivt_spann.set(None)
+            self.insamlare.exportera(trace)
+
+        try:
+            svar = self.wsgi_app(environ, med_headers)
+        except BaseException as e:
+            rot.status = 'ERROR'
+            rot.attributes['error'] = e.__class__.__name__
+            avsluta()
+            raise
+        return ClosingIterator(svar, [avsluta])
+
+
+# ---------- Flask-hooks ----------
+
+def _fore_request():
+    rot = _aktivt_spann.get()
+    if rot is None:
+        return
+    trace = rot.trace
+    avsluta_spann(trace.fas.pop('setup', None))
+    trace.fas['before_request'] = starta_spann('before_request')
+
+
+def _efter_request(svar):
+    s = _aktivt_spann.get()
+    if s is None:
+        return svar
+    trace = s.trace
+    # Avbröt en before_request-hook (t.ex. sidcachen) requesten? Då kördes ingen vy.
+    avsluta_spann(trace.fas.pop('before_request', None))
+    avsluta_spann(trace.fas.pop('after_request', None))
+    rot = trace.spann[0]
+    if request.url_rule is not None:
+        rot.name = f'HTTP {request.method} {request.url_rule.rule}'
+        rot.attributes['http.route'] = request.url_rule.rule
+    return svar
+
+
+def _efter_teardown(exc=None):
+    s = _aktivt_spann.get()
+    if s is None or exc is None:
+        return
+    # Ett undantag: avsluta alla öppna barnspann som fel
+    while s is not None and s.parent is not None:
+        foralder = s.parent
+        avsluta_spann(s, exc)
+        s = foralder
+
+
+def _spara_vy(vy, endpoint):
+    @wraps(vy)
+    def sparad(*args, **kwargs):
+        s = _aktivt_spann.get()
+        if s is None:
+            return vy(*args, **kwargs)
+        trace = s.trace
+        avsluta_spann(trace.fas.pop('before_request', None))
+        vyspann = starta_spann(f'view {endpoint}', endpoint=endpoint)
+        try:
+            svar = vy(*args, **kwargs)
+        except BaseException as e:
+            avsluta_spann(vyspann, e)
+            raise
+        avsluta_spann(vyspann)
+        trace.fas['after_request'] = starta_spann('after_request')
+        return svar
+    return sparad
+
+
+def _fore_mall(sender, template, context, **extra):
+    starta_spann('template.render', template=template.name)
+
+
+def _efter_mall(sender, template, context, **extra):
+    s = _aktivt_spann.get()
+    if s is not None and s.name == 'template.render':
+        avsluta_spann(s)
+
+
+def _koppla_databasen(engine):
+    system = engine.dialect.name
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def fore(conn, cursor, statement, parameters, context, executemany):
+        if _aktivt_spann.get() is not None:
+            conn.info.setdefault('trace_spann', []).append(
+                starta_spann('db.query', **{'db.system': system, 'db.statement': normalisera(statement)}))
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def efter(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('trace_spann')
+        if stack:
+            avsluta_spann(stack.pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def fel(kontext):
+        stack = kontext.connection.info.get('trace_spann') if kontext.connection is not None else None
+        if stack:
+            avsluta_spann(stack.pop(), kontext.original_exception)
+
+
+def _spara_funktion(funktion, namn):
+    @wraps(funktion)
+    def sparad(*args, **kwargs):
+        if _aktivt_spann.get() is None:
+            return funktion(*args, **kwargs)
+        with spann(namn):
+            return funktion(*args, **kwargs)
+    return sparad
+
+
+def init_tracing(app):
+    """
+    Kopplar spårningen till Flask-appen om TRACING_ENABLED är satt. Anropas
+    sist i skapa_app, när alla vyer och Flask-Login finns.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    if not app.config.get('TRACING_ENABLED'):
+        return
+    insamlare = Insamlare(
+        max_traces=app.config.get('TRACING_BUFFER', 1000),
+        fil=app.config.get('TRACING_FILE'),
+    )
+    app.extensions['tracing'] = insamlare
+    app.wsgi_app = SparningsMiddleware(
+        app.wsgi_app,
+        insamlare,
+        sample_rate=app.config.get('TRACING_SAMPLE_RATE', 1.0),
+        max_spann=app.config.get('TRACING_MAX_SPANS', 500),
+    )
+
+    # Först av före-hooks (så att övriga hooks mäts), sist av efter-hooks
+    app.before_request_funcs.setdefault(None, []).insert(0, _fore_request)
+    app.after_request_funcs.setdefault(None, []).insert(0, _efter_request)
+    app.teardown_request(_efter_teardown)
+
+    for endpoint, vy in list(app.view_functions.items()):
+        app.view_functions[endpoint] = _spara_vy(vy, endpoint)
+
+    login_manager = getattr(app, 'login_manager', None)
+    if login_manager is not None and login_manager._user_callback is not None:
+        login_manager._user_callback = _spara_funktion(login_manager._user_callback, 'user.load')
+    app.json.response = _spara_funktion(app.json.response, 'json.serialize')
+
+    before_render_template.connect(_fore_mall, app)
+    template_rendered.connect(_efter_mall, app)
+    with app.app_context():
+        _koppla_databasen(db.engine)
+
+
+def hamta_insamlare():
+    """Returnerar appens Insamlare, eller None om spårningen är avstängd"""
+    return current_app.extensions.get('tracing')
@@ -0,0 +1,152 @@
+# services/traffic_recorder.py
+"""
+🎙️ TRAFFIC RECORDER - Spelar in verklig trafik för uppspelning (replay_traffic.py)
+
+SYFTE: Syntetiska benchmarks (benchmarks/run_benchmarks.py) missar den
+verkliga blandningen av trafik: vilka sidor, i vilken takt, hur många
+samtidigt och av vem.
+
+HUR DET FUNGERAR:
+1. AV SOM STANDARD: Aktiveras bara om TRAFFIC_RECORD_DIR är satt.
+2. WSGI-MIDDLEWARE: Lindas runt app.wsgi_app och mäter hela anropet, inklusive
+   tiden det tar att skicka svaret, och fångar statuskoden.
+3. IDENTITET: En after_request-hook lägger identitetsklass (anon/user/admin),
+   användar-id och matchad route (t.ex. /auctions/<int:auction_id>) i
+   environ, där middlewaren hämtar dem.
+4. KROPPAR: Formulär- och JSON-kroppar på högst TRAFFIC_RECORD_MAX_BODY byte
+   sparas så att t.ex. bud kan spelas upp. Aldrig för /auth/ (lösenord).
+5. ROTERANDE JSONL: En rad per request i traffic-<pid>.jsonl (en fil per
+   process, så att flera workers inte skriver i samma fil). Filen roteras vid
+   TRAFFIC_RECORD_MAX_BYTES och TRAFFIC_RECORD_BACKUPS gamla filer sparas.
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import request
+from flask_login import current_user
+from werkzeug.wsgi import ClosingIterator
+
+# Sökvägar som aldrig spelas in, och sökvägar vars kropp aldrig sparas
+UNDANTAGNA = ('/static/',)
+UTAN_KROPP = ('/auth/',)
+KROPPSTYPER = ('application/x-www-form-urlencoded', 'application/json')
+
+
+class TrafikInspelare:
+    """WSGI-middleware som skriver en JSONL-rad per request"""
+
+    def __init__(self, wsgi_app, katalog, max_bytes=50 * 1024 * 1024, backups=5, max_kropp=4096):
+        self.wsgi_app = wsgi_app
+        self.max_kropp = max_kropp
+        os.makedirs(katalog, exist_ok=True)
+        self.sokvag = os.path.join(katalog, f'traffic-{os.getpid()}.jsonl')
+        self._logger = logging.getLogger(f'traffic_recorder.{id(self)}')
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._hanterare = RotatingFileHandler(self.sokvag, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        self._hanterare.setFormatter(logging.Formatter('%(message)s'))
+        self._logger.addHandler(self._hanterare)
+        self.antal = 0
+        self._lock = threading.Lock()
+
+    def _las_kropp(self, environ):
+        """Läser och sparar en liten formulär-/JSON-kropp och lägger tillbaka den i environ"""
+        if environ.get('REQUEST_METHOD') not in ('POST', 'PUT', 'PATCH'):
+            return None
+        if environ.get('PATH_INFO', '').startswith(UTAN_KROPP):
+            return None
+        if not environ.get('CONTENT_TYPE', '').startswith(KROPPSTYPER):
+            return None
+        try:
+            langd = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        if not 0 < langd <= self.max_kropp:
+            return None
+        data = environ['wsgi.input'].read(langd)
+        environ['wsgi.input'] = io.BytesIO(data)
+        return data.decode('utf-8', errors='replace')
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(UNDANTAGNA):
+            return self.wsgi_app(environ, start_response)
+
+        start = time.time()
+        t0 = time.perf_counter()
+        kropp = self._las_kropp(environ)
+        status = []
+
+        def fanga_status(status_rad, headers, exc_info=None):
+            status.append(int(status_rad[:3]))
+            return start_response(status_rad, headers, exc_info)
+
+        def skriv():
+            identitet, user_id = environ.get('traffic.identity', ('anon', None))
+            post = {
+                't': round(start, 6),
+                'ms': round((time.perf_counter() - t0) * 1000, 3),
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'query': environ.get('QUERY_STRING', ''),
+                'route': environ.get('traffic.route'),
+                'identity': identitet,
+                'user_id': user_id,
+                'status': status[0] if status else None,
+            }
+            if kropp is not None:
+                post['content_type'] = environ.get('CONTENT_TYPE')
+                post['body'] = kropp
+            self._logger.info(json.dumps(post, ensure_ascii=False, separators=(',', ':')))
+            with self._lock:
+                self.antal += 1
+
+        try:
+            svar = self.wsgi_app(environ, fanga_status)
+        except BaseException:
+            status.append(500)
+            skriv()
+            raise
+        # Posten skrivs när servern stänger svaret, så tiden inkluderar hela svaret
+        return ClosingIterator(svar, [skriv])
+
+    def stang(self):
+        self._logger.removeHandler(self._hanterare)
+        self._hanterare.close()
+
+
+def _markera_identitet(svar):
+    """after_request: lägger identitet och route i environ åt middlewaren"""
+    if current_user.is_authenticated:
+        identitet = ('admin' if current_user.is_admin else 'user', current_user.id)
+    else:
+        identitet = ('anon', None)
+    request.environ['traffic.identity'] = identitet
+    request.environ['traffic.route'] = request.url_rule.rule if request.url_rule else None
+    return svar
+
+
+def init_traffic_recorder(app):
+    """
+    Lindar in appen i inspelaren om TRAFFIC_RECORD_DIR är satt.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    katalog = app.config.get('TRAFFIC_RECORD_DIR')
+    if not katalog:
+        return
+    inspelare = TrafikInspelare(
+        app.wsgi_app,
+        katalog,
+        max_bytes=app.config.get('TRAFFIC_RECORD_MAX_BYTES', 50 * 1024 * 1024),
+        backups=app.config.get('TRAFFIC_RECORD_BACKUPS', 5),
+        max_kropp=app.config.get('TRAFFIC_RECORD_MAX_BODY', 4096),
+    )
+    app.wsgi_app = inspelare
+    app.extensions['traffic_recorder'] = inspelare
+    app.after_request(_markera_identitet)
@@ -0,0 +1,174 @@
+# services/uploads.py
+"""
+📤 UPLOADS - Strömmande bilduppladdning
+
+SYFTE: Bilder till auktioner laddas upp direkt i admin (skapa/redigera/bulk)
+istället för att kopieras till disken för hand.
+
+HUR DET FUNGERAR:
+1. UppladdningsRequest ersätter Flasks Request-klass. När Werkzeug tolkar en
+   multipart-request skrivs varje fil i block direkt till en temporär fil på
+   disk (aldrig hela filen i minnet). Samtidigt räknas sha256 och storlek ut,
+   och överskrids UPLOAD_MAX_BYTES avbryts uppladdningen med 413.
+2. ta_emot_bild() kontrollerar filtypen mot filens första byte (inte filnamnet),
+   deduplicerar på innehållshash och flyttar filen till
+   static/images/cas/<ab>/<hash>/original.<ext>.
+3. Bildvarianterna skapas sedan i bakgrunden av services/images.py.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from flask import Request, current_app, g
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from services.images import cas_katalog
+
+BLOCKSTORLEK = 64 * 1024
+
+# Filsignaturer (magiska byte) för tillåtna bildformat -> filändelse
+_SIGNATURER = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class UppladdningsFel(ValueError):
+    """Uppladdningen kunde inte tas emot (fel filtyp, tom fil eller för stor)"""
+
+
+def identifiera_bildtyp(borjan):
+    """
+    Returnerar filändelsen för en bild utifrån dess första byte, eller None.
+
+    Args:
+        borjan: Minst de 12 första byten av filen
+    """
+    for signatur, andelse in _SIGNATURER:
+        if borjan.startswith(signatur):
+            return andelse
+    if borjan[:4] == b'RIFF' and borjan[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class HashandeTempfil:
+    """
+    Filobjekt som Werkzeug skriver uppladdningen till. Varje block skrivs
+    till disk och hashas direkt, så filen behöver aldrig läsas om.
+    """
+
+    def __init__(self, katalog, max_bytes):
+        self._fil = tempfile.NamedTemporaryFile(dir=katalog, suffix='.upload', delete=False)
+        self.name = self._fil.name
+        self.max_bytes = max_bytes
+        self.storlek = 0
+        self.borjan = b''
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self.storlek += len(data)
+        if self.max_bytes and self.storlek > self.max_bytes:
+            raise RequestEntityTooLarge(f'Filen är större än {self.max_bytes // (1024 * 1024)} MB.')
+        if len(self.borjan) < 16:
+            self.borjan += bytes(data[:16 - len(self.borjan)])
+        self._hash.update(data)
+        return self._fil.write(data)
+
+    @property
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, namn):
+        return getattr(self._fil, namn)
+
+
+def _uppladdningskatalog():
+    katalog = current_app.config.get('UPLOAD_TMP_DIR') or os.path.join(current_app.instance_path, 'uploads')
+    os.makedirs(katalog, exist_ok=True)
+    return katalog
+
+
+class UppladdningsRequest(Request):
+    """Request-klass som strömmar filuppladdningar till HashandeTempfil"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        fil = HashandeTempfil(_uppladdningskatalog(), current_app.config.get('UPLOAD_MAX_BYTES'))
+        # Städas bort i teardown om ingen vy tog hand om filen
+        g.setdefault('uppladdade_tempfiler', []).append(fil.name)
+        return fil
+
+
+def _kopiera_strom(strom, max_bytes):
+    """Reserv för filobjekt som inte är HashandeTempfil: kopiera i block till en tempfil"""
+    mal = HashandeTempfil(_uppladdningskatalog(), max_bytes)
+    g.setdefault('uppladdade_tempfiler', []).append(mal.name)
+    try:
+        for block in iter(lambda: strom.read(BLOCKSTORLEK), b''):
+            mal.write(block)
+    except RequestEntityTooLarge as e:
+        raise UppladdningsFel(e.description) from e
+    mal.flush()
+    return mal
+
+
+def ta_emot_bild(filstorage):
+    """
+    Tar emot en uppladdad bild och skickar den vidare till bildpipelinen.
+
+    Args:
+        filstorage: werkzeug FileStorage från request.files
+
+    Returns:
+        str: Bildens innehållshash (sparas i Auction.image)
+
+    Raises:
+        UppladdningsFel: Om filen är tom, för stor eller inte är en bild
+    """
+    strom = filstorage.stream
+    if not isinstance(strom, HashandeTempfil):
+        strom = _kopiera_strom(strom, current_app.config.get('UPLOAD_MAX_BYTES'))
+    strom.flush()
+
+    if strom.storlek == 0:
+        raise UppladdningsFel('Filen är tom.')
+    andelse = identifiera_bildtyp(strom.borjan)
+    if andelse is None:
+        raise UppladdningsFel(f'{filstorage.filename or "Filen"} är inte en JPEG-, PNG-, GIF- eller WebP-bild.')
+
+    bild_hash = strom.hexdigest
+    pipeline = current_app.extensions['images']
+    if pipeline.ar_klar(bild_hash) or pipeline.hitta_original(bild_hash):
+        # Samma bild finns redan - tempfilen städas bort i teardown
+        return bild_hash
+
+    katalog = os.path.join(pipeline.static_mapp, *cas_katalog(bild_hash).split('/'))
+    os.makedirs(katalog, exist_ok=True)
+    original = os.path.join(katalog, f'original.{andelse}')
+    strom.close()
+    shutil.move(strom.name, original)
+    pipeline.skicka(original, bild_hash)
+    return bild_hash
+
+
+def _stada_tempfiler(exc=None):
+    """Tar bort temporära uppladdningsfiler som inte flyttades till bildlagringen"""
+    for namn in g.pop('uppladdade_tempfiler', ()):
+        try:
+            os.unlink(namn)
+        except OSError:
+            pass
+
+
+def init_uploads(app):
+    """
+    Kopplar strömmande uppladdning till Flask-appen.
+
+    Args:
+        app (Flask): Flask-applikationen
+    """
+    app.request_class = UppladdningsRequest
+    app.teardown_request(_stada_tempfiler)
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initiera funktioner
     initCountdownTimers();
+    initLiveRefresh();
     initLikeButtons();
     initBidForm();
     initFlashMessages();
@@ -14,37 +15,238 @@ document.addEventListener('DOMContentLoaded', function() {
 
 /* ===========================================
    COUNTDOWN TIMER
+   -------------------------------------------
+   En enda gemensam ticker (requestAnimationFrame) driver alla
+   .countdown-timer på sidan istället för en setInterval per timer:
+   - Endast timers som syns (IntersectionObserver) uppdateras.
+   - Endast textnoder vars värde ändrats skrivs om (ingen innerHTML per tick).
+   - Tickern pausas när fliken är dold (visibilitychange).
+   - Tiden korrigeras mot serverns klocka via /api/time, så att
+     nedräkningen stämmer vid avslut även om klientens klocka går fel.
    =========================================== */
-function initCountdownTimers() {
-    const timers = document.querySelectorAll('.countdown-timer');
-    
-    timers.forEach(timer => {
-        const endTime = new Date(timer.dataset.endTime).getTime();
-        
-        const updateTimer = () => {
-            const now = new Date().getTime();
-            const distance = endTime - now;
-            
-            if (distance < 0) {
-                timer.innerHTML = '<span class="ended">Auktionen har avslutats</span>';
-                return;
+const Serverklocka = {
+    offset: 0,  // serverns tid - klientens tid (ms)
+
+    now() {
+        return Date.now() + this.offset;
+    },
+
+    async synka(antalProv = 3) {
+        // Flera prov - det med kortast svarstid ger bäst uppskattning
+        let bastaRtt = Infinity;
+        for (let i = 0; i < antalProv; i++) {
+            try {
+                const skickad = Date.now();
+                const response = await fetch('/api/time', { cache: 'no-store' });
+                const mottagen = Date.now();
+                if (!response.ok) continue;
+                const data = await response.json();
+                const rtt = mottagen - skickad;
+                if (rtt < bastaRtt) {
+                    bastaRtt = rtt;
+                    this.offset = data.now + rtt / 2 - mottagen;
+                }
+            } catch (error) {
+                console.error('Kunde inte synka servertid:', error);
             }
-            
-            const days = Math.floor(distance / (1000 * 60 * 60 * 24));
-            const hours = Math.floor((distance % (1000 * 60 * 60 * 24)) / (1000 * 60 * 60));
-            const minutes = Math.floor((distance % (1000 * 60 * 60)) / (1000 * 60));
-            const seconds = Math.floor((distance % (1000 * 60)) / 1000);
-            
-            timer.innerHTML = `
-                <span class="time-unit">${days}d</span>
-                <span class="time-unit">${hours}h</span>
-                <span class="time-unit">${minutes}m</span>
-                <span class="time-unit">${seconds}s</span>
-            `;
-        };
-        
-        updateTimer();
-        setInterval(updateTimer, 1000);
+        }
+    }
+};
+
+function initCountdownTimers() {
+    const element = document.querySelectorAll('.countdown-timer');
+    if (!element.length) return;
+
+    const timers = [];
+    const synliga = new Set();
+
+    element.forEach(el => {
+        // data-end-time är UTC (ISO 8601 med 'Z')
+        const timer = { el, endTime: Date.parse(el.dataset.endTime), noder: null, senast: [], avslutad: false };
+        timers.push(timer);
+        synliga.add(timer);
+    });
+
+    if ('IntersectionObserver' in window) {
+        synliga.clear();
+        const perElement = new Map(timers.map(t => [t.el, t]));
+        const observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                const timer = perElement.get(entry.target);
+                if (entry.isIntersecting) {
+                    synliga.add(timer);
+                    uppdateraTimer(timer, Serverklocka.now());
+                } else {
+                    synliga.delete(timer);
+                }
+            });
+        }, { rootMargin: '100px' });
+        timers.forEach(t => observer.observe(t.el));
+    }
+
+    let senasteSekund = -1;
+    let rafId = null;
+
+    const tick = () => {
+        const nu = Serverklocka.now();
+        const sekund = Math.floor(nu / 1000);
+        if (sekund !== senasteSekund) {
+            senasteSekund = sekund;
+            synliga.forEach(timer => uppdateraTimer(timer, nu));
+        }
+        rafId = requestAnimationFrame(tick);
+    };
+
+    const starta = () => {
+        if (rafId === null && !document.hidden) {
+            senasteSekund = -1;
+            rafId = requestAnimationFrame(tick);
+        }
+    };
+    const stoppa = () => {
+        if (rafId !== null) {
+            cancelAnimationFrame(rafId);
+            rafId = null;
+        }
+    };
+
+    document.addEventListener('visibilitychange', () => {
+        if (document.hidden) {
+            stoppa();
+        } else {
+            // Synka om efter att fliken varit dold - datorn kan ha sovit
+            Serverklocka.synka(1).then(starta);
+        }
+    });
+
+    timers.forEach(t => uppdateraTimer(t, Serverklocka.now()));
+    Serverklocka.synka().then(() => {
+        timers.forEach(t => uppdateraTimer(t, Serverklocka.now()));
+        starta();
+    });
+}
+
+function skapaTimerNoder(timer) {
+    // Bygg DOM-strukturen en gång; därefter ändras bara textnodernas värden
+    timer.el.textContent = '';
+    timer.noder = ['d', 'h', 'm', 's'].map(enhet => {
+        const span = document.createElement('span');
+        span.className = 'time-unit';
+        const text = document.createTextNode('');
+        span.appendChild(text);
+        span.appendChild(document.createTextNode(enhet));
+        timer.el.appendChild(span);
+        timer.el.appendChild(document.createTextNode(' '));
+        return text;
+    });
+}
+
+function uppdateraTimer(timer, nu) {
+    if (timer.avslutad) return;
+    const distance = timer.endTime - nu;
+
+    if (distance < 0) {
+        timer.avslutad = true;
+        timer.el.innerHTML = '<span class="ended">Auktionen har avslutats</span>';
+        return;
+    }
+
+    const varden = [
+        Math.floor(distance / (1000 * 60 * 60 * 24)),
+        Math.floor((distance % (1000 * 60 * 60 * 24)) / (1000 * 60 * 60)),
+        Math.floor((distance % (1000 * 60 * 60)) / (1000 * 60)),
+        Math.floor((distance % (1000 * 60)) / 1000)
+    ];
+
+    if (!timer.noder) skapaTimerNoder(timer);
+    varden.forEach((varde, i) => {
+        if (timer.senast[i] !== varde) {
+            timer.senast[i] = varde;
+            timer.noder[i].nodeValue = varde;
+        }
+    });
+}
+
+/* ===========================================
+   LIVEUPPDATERING AV AUKTIONSKORT
+   -------------------------------------------
+   Alla synliga kort (.card[data-auction-id]) uppdateras med ETT anrop till
+   /auctions/summary?ids=... istället för ett anrop per kort.
+   - Bara kort som syns (IntersectionObserver) tas med.
+   - If-None-Match skickas med, så oförändrade svar blir 304 utan kropp.
+   - Ingen uppdatering medan fliken är dold.
+   =========================================== */
+const LIVE_INTERVALL_MS = 15000;
+const STATUSTEXT = { active: 'Active', upcoming: 'Upcoming', ended: 'Ended' };
+const STATUSKLASS = { active: 'badge-success', upcoming: 'badge-info', ended: 'badge-dark' };
+
+function initLiveRefresh() {
+    const kort = document.querySelectorAll('.card[data-auction-id]');
+    if (!kort.length) return;
+
+    const perId = new Map();
+    kort.forEach(el => perId.set(el.dataset.auctionId, el));
+    const synliga = new Set(perId.keys());
+
+    if ('IntersectionObserver' in window) {
+        synliga.clear();
+        const observer = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                const id = entry.target.dataset.auctionId;
+                if (entry.isIntersecting) {
+                    synliga.add(id);
+                } else {
+                    synliga.delete(id);
+                }
+            });
+        }, { rootMargin: '200px' });
+        kort.forEach(el => observer.observe(el));
+    }
+
+    let etag = null;
+    let senasteIds = '';
+
+    const uppdatera = async () => {
+        if (document.hidden || !synliga.size) return;
+        const ids = [...synliga].sort((a, b) => a - b).join(',');
+        if (ids !== senasteIds) {
+            etag = null;  // ETag gäller bara samma uppsättning kort
+            senasteIds = ids;
+        }
+        try {
+            const headers = etag ? { 'If-None-Match': etag } : {};
+            const response = await fetch(`/auctions/summary?ids=${ids}`, { headers, cache: 'no-store' });
+            if (response.status === 304 || !response.ok) return;
+            etag = response.headers.get('ETag');
+            const data = await response.json();
+            Object.entries(data.auctions).forEach(([id, sammanfattning]) => {
+                const el = perId.get(id);
+                if (el) uppdateraKort(el, sammanfattning);
+            });
+        } catch (error) {
+            console.error('Kunde inte uppdatera auktionskort:', error);
+        }
+    };
+
+    setInterval(uppdatera, LIVE_INTERVALL_MS);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) uppdatera();
+    });
+}
+
+function uppdateraKort(el, sammanfattning) {
+    const satt = (falt, text) => {
+        el.querySelectorAll(`[data-summary="${falt}"]`).forEach(nod => {
+            if (nod.textContent !== text) nod.textContent = text;
+        });
+    };
+    satt('current_bid', Math.round(sammanfattning.current_bid).toString());
+    satt('like_count', String(sammanfattning.like_count));
+    satt('dislike_count', String(sammanfattning.dislike_count));
+    satt('status', STATUSTEXT[sammanfattning.status]);
+    el.querySelectorAll('[data-summary="status"]').forEach(nod => {
+        Object.values(STATUSKLASS).forEach(klass => nod.classList.remove(klass));
+        nod.classList.add(STATUSKLASS[sammanfattning.status]);
     });
 }
 
@@ -105,6 +307,13 @@ function initBidForm() {
     const bidForm = document.querySelector('#bid-form');
     
     if (bidForm) {
+        // En idempotensnyckel per laddat formulär: dubbelklick och omsändningar
+        // av samma bud känns igen av servern och läggs bara en gång
+        const nyckelfalt = bidForm.querySelector('input[name="idempotency_key"]');
+        if (nyckelfalt && !nyckelfalt.value) {
+            nyckelfalt.value = skapaIdempotensnyckel();
+        }
+        
         bidForm.addEventListener('submit', function(e) {
             const bidInput = this.querySelector('input[name="amount"]');
             const currentBid = parseFloat(this.dataset.currentBid || 0);
@@ -126,6 +335,13 @@ function initBidForm() {
     }
 }
 
+function skapaIdempotensnyckel() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
 /* ===========================================
    FLASH MESSAGES
    =========================================== */
@@ -0,0 +1,41 @@
+"""
+Gemensamma fixtures för testerna.
+
+Appen skapas med skapa_app() mot en SQLite-databas i minnet, så att varje
+test får en egen, nyseedad databas (startdata från models/*.py).
+"""
+import os
+import tempfile
+
+# Måste sättas innan flask_app importeras (flask_app skapar en app vid import)
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+# Händelseloggen för testdatabasen får inte hamna i instance/
+os.environ.setdefault('EVENT_LOG_DIR', tempfile.mkdtemp(prefix='events-'))
+# Ingen läsartråd för ändringsflödet - testerna anropar las_nya() själva
+os.environ.setdefault('CHANGE_FEED_POLL_INTERVAL', '0')
+# Begränsaren slås på i de tester som gäller den
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from flask_app import skapa_app
+    # Varje test har en egen databas och därmed en egen händelselogg
+    monkeypatch.setenv('EVENT_LOG_DIR', str(tmp_path / 'events'))
+    app = skapa_app()
+    app.config['TESTING'] = True
+    yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def logga_in(client, user_id):
+    """Loggar in en användare i testklienten via Flask-Login-sessionen"""
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+from conftest import logga_in
+
+from database import db
+from models.auction import Auction
+from services.auction_index import AuktionsIndex, AuktionsPost
+from services.change_feed import registrera_andringar
+
+
+def _post(auction_id, slutar_om, category='Konst', startade_for=60):
+    nu = datetime.utcnow()
+    return AuktionsPost(auction_id, f'Auktion {auction_id}', category, 100.0, None,
+                        nu - timedelta(seconds=startade_for), nu + timedelta(seconds=slutar_om), True, None)
+
+
+def _ids(poster):
+    return [post.id for post in poster]
+
+
+def test_ending_soon_is_ordered_and_skips_ended_and_upcoming():
+    index = AuktionsIndex()
+    for auction_id, slutar_om in [(1, 300), (2, 60), (3, 3600), (4, 120)]:
+        index.satt(_post(auction_id, slutar_om))
+    index.satt(_post(5, 30, startade_for=-600))   # kommande
+    index.satt(_post(6, -10))                     # redan slut - läggs inte in
+
+    assert _ids(index.slutar_snart(3)) == [2, 4, 1]
+    assert _ids(index.slutar_snart(10, category='Möbler')) == []
+    assert 6 not in _ids(index.slutar_snart(10))
+
+    # Ändrad sluttid sorteras om, avslutade klipps bort vid läsning
+    index.satt(_post(3, 10))
+    assert _ids(index.slutar_snart(2)) == [3, 2]
+    assert _ids(index.slutar_snart(10, nu=datetime.utcnow() + timedelta(seconds=90))) == [4, 1]
+    assert len(index) == 2
+
+
+def test_trending_decays_with_half_life():
+    index = AuktionsIndex(halveringstid=60.0, budvikt=3.0, likevikt=1.0)
+    for auction_id in (1, 2, 3):
+        index.satt(_post(auction_id, 3600))
+    nu = index._t0
+
+    # Två gamla bud (6 poäng, två halveringstider sedan = 1.5) mot en färsk like och ett färskt bud
+    index.bud(1, nu - 120)
+    index.bud(1, nu - 120)
+    index.like(2, nu)
+    index.bud(3, nu)
+    assert _ids(index.trendar(3)) == [3, 1, 2]
+    assert abs(index.poang(1, nu) - 1.5) < 1e-9
+
+    index.like(2, nu)
+    assert _ids(index.trendar(3)) == [3, 2, 1]
+
+    # Händelser för okända auktioner ignoreras
+    index.bud(99, nu)
+    assert index.poang(99, nu) == 0.0
+
+
+def test_trending_rescales_without_changing_order():
+    index = AuktionsIndex(halveringstid=1.0)
+    index.satt(_post(1, 3600))
+    index.satt(_post(2, 3600))
+    t0 = index._t0
+    index.bud(1, t0 + 10)
+    index.like(2, t0 + 10)
+    index.like(2, t0 + 10_000)  # exponenten blir för stor - poängen skalas om
+    assert index._t0 == t0 + 10_000
+    assert _ids(index.trendar(2)) == [2, 1]
+    assert abs(index.poang(2, t0 + 10_000) - 1.0) < 1e-9
+
+
+def test_index_is_built_and_follows_the_change_feed(app, client):
+    index = app.extensions['auction_index']
+    lasare = app.extensions['change_feed']
+    pagaende = _ids(index.slutar_snart(100))
+    assert pagaende
+    # Auktion 1 har två bud i startdatan och trendar därför
+    assert index.poang(1) > 0
+
+    logga_in(client, 1)
+    client.post('/bidding/place/2', data={'amount': '5000'})
+    lasare.las_nya()
+    assert index.hamta(2).current_bid == 5000
+    assert index.poang(2) > 0
+
+    # Bud från en annan process räknas via ändringsflödet
+    fore = index.poang(3)
+    with app.app_context(), db.engine.begin() as conn:
+        registrera_andringar(conn, [('bids', 999, 'insert', 3)], origin='annan-worker')
+    lasare.las_nya()
+    assert index.poang(3) > fore
+
+    # En avslutad auktion försvinner ur indexet
+    with app.app_context():
+        db.session.get(Auction, 2).end_time = datetime.utcnow() - timedelta(minutes=1)
+        db.session.commit()
+    lasare.las_nya()
+    assert index.hamta(2) is None
+
+
+def test_build_matches_incremental_updates(app):
+    index = app.extensions['auction_index']
+    with app.app_context():
+        index.bygg()
+    stegvis = AuktionsIndex(index.halveringstid, index.budvikt, index.likevikt)
+    stegvis._t0 = index._t0
+    for post in index._poster.values():
+        stegvis.satt(post)
+    for auction_id, poang in index._poang.items():
+        stegvis.handelse(auction_id, poang, stegvis._t0)
+    assert index._slutar == stegvis._slutar
+    assert [a for _, a in index._trendar] == [a for _, a in stegvis._trendar]
+
+    # Inkrementella uppdateringar efter bygget håller listorna sorterade
+    forsta = index._slutar[-1][1]
+    index.satt(_post(forsta, 5))
+    assert index._slutar[0][1] == forsta and index._slutar == sorted(index._slutar)
+
+
+def test_own_likes_count_at_once(app, client):
+    index = app.extensions['auction_index']
+    fore = index.poang(4)
+    logga_in(client, 2)
+    client.post('/auctions/4/like', headers={'Content-Type': 'application/json'})
+    assert index.poang(4) > fore
+
+
+def test_browse_and_home_use_the_index(app, client):
+    index = app.extensions['auction_index']
+    forvantat = _ids(index.slutar_snart(app.config['AUCTION_INDEX_PAGE_SIZE']))
+
+    svar = client.get('/auctions/?sort=ending_soon')
+    assert svar.status_code == 200
+    html = svar.get_data(as_text=True)
+    positioner = [html.index(f'href="/auctions/{auction_id}"') for auction_id in forvantat]
+    assert positioner == sorted(positioner)
+
+    assert client.get('/auctions/?sort=trending&search=a').status_code == 200
+
+    html = client.get('/').get_data(as_text=True)
+    assert 'Slutar snart' in html and 'Trendar just nu' in html
+    assert f'/auctions/{forvantat[0]}' in html
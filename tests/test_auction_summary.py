@@ -0,0 +1,35 @@
+from conftest import logga_in
+
+
+def test_summary_returns_requested_auctions(client):
+    svar = client.get('/auctions/summary?ids=1,2,999,1')
+    assert svar.status_code == 200
+    auktioner = svar.json['auctions']
+    assert set(auktioner) == {'1', '2'}
+    assert auktioner['1']['current_bid'] == 750
+    assert auktioner['1']['bid_count'] == 2
+    assert auktioner['2']['current_bid'] == 1200
+    assert auktioner['2']['bid_count'] == 0
+    assert set(auktioner['1']) == {'current_bid', 'bid_count', 'like_count', 'dislike_count', 'status', 'end_time'}
+
+
+def test_if_none_match_gives_304_until_something_changes(app, client):
+    forsta = client.get('/auctions/summary?ids=1,2,3', headers={'Accept-Encoding': 'gzip'})
+    etag = forsta.headers['ETag']
+
+    samma = client.get('/auctions/summary?ids=1,2,3', headers={'If-None-Match': etag})
+    assert samma.status_code == 304 and samma.data == b''
+
+    anvandare = app.test_client()
+    logga_in(anvandare, 2)
+    anvandare.post('/auctions/3/like')  # buffrad i minnet, inte skriven än
+
+    andrad = client.get('/auctions/summary?ids=1,2,3', headers={'If-None-Match': etag})
+    assert andrad.status_code == 200
+    assert andrad.json['auctions']['3']['like_count'] == 1
+
+
+def test_too_many_ids_is_rejected(app, client):
+    app.config['AUCTION_SUMMARY_MAX_IDS'] = 3
+    assert client.get('/auctions/summary?ids=1,2,3,4').status_code == 400
+    assert client.get('/auctions/summary?ids=1,x').status_code == 400
@@ -0,0 +1,159 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import logga_in
+
+from database import db
+from models.auction import Auction
+from models.bid import Bid
+from services.bid_engine import EJ_AKTIV, FOR_LAGT, OK, REDAN_HOGST, AuktionsLage, HashRing, Shard
+
+
+def _motor(app):
+    return app.extensions['bid_engine']
+
+
+def db_auction(auction_id):
+    return db.session.get(Auction, auction_id)
+
+
+def test_state_is_rebuilt_from_bids(app):
+    motor = _motor(app)
+    with app.app_context():
+        auction = db_auction(1)
+        hogsta = Bid.query.filter_by(auction_id=1).order_by(Bid.amount.desc()).first()
+    lage = motor.shard_for(1).lagen[1]
+    assert lage.pris == auction.current_bid == hogsta.amount
+    assert lage.ledare == hogsta.user_id
+    assert lage.antal_bud == 2
+
+
+def test_place_bid_persists_and_updates_state(app, client):
+    logga_in(client, 1)
+    response = client.post('/bidding/place/2', data={'amount': '5000'})
+    assert response.status_code == 302
+    assert '/auctions/2' in response.headers['Location']
+
+    with app.app_context():
+        assert db_auction(2).current_bid == 5000
+        assert Bid.query.filter_by(auction_id=2, user_id=1).count() == 1
+
+    motor = _motor(app)
+    with app.app_context():
+        assert motor.validera(2, 1, 6000).kod == REDAN_HOGST
+        assert motor.validera(2, 2, 5000).kod == FOR_LAGT
+        assert motor.validera(2, 2, 5001).kod == OK
+
+
+def test_validate_endpoint_uses_engine(client):
+    logga_in(client, 1)
+    response = client.post('/bidding/validate', json={'auction_id': 3, 'amount': 10})
+    assert response.json == {'valid': False, 'message': 'Bid must be higher than 800 SEK'}
+    response = client.post('/bidding/validate', json={'auction_id': 999, 'amount': 10})
+    assert response.json['message'] == 'Auction not found'
+
+
+def test_concurrent_bids_only_accept_increasing_amounts(app):
+    motor = _motor(app)
+    resultat = []
+
+    def buda(user_id, belopp):
+        resultat.append((belopp, motor.lagg_bud(4, user_id, belopp).kod))
+
+    tradar = [
+        threading.Thread(target=buda, args=(1 + i % 2, 400 + i * 10))
+        for i in range(20)
+    ]
+    for t in tradar:
+        t.start()
+    for t in tradar:
+        t.join()
+
+    godkanda = sorted(belopp for belopp, kod in resultat if kod == OK)
+    with app.app_context():
+        sparade = sorted(b.amount for b in Bid.query.filter_by(auction_id=4).all())
+        assert db_auction(4).current_bid == max(godkanda)
+    assert sparade == godkanda
+    assert motor.shard_for(4).lagen[4].pris == max(godkanda)
+
+
+def test_ended_auction_is_rejected(app):
+    motor = _motor(app)
+    with app.app_context():
+        auction = db.session.get(Auction, 3)
+        auction.is_active = False
+        db.session.commit()
+        motor.glom(3)
+        assert motor.lagg_bud(3, 1, 10_000).kod == EJ_AKTIV
+
+
+def test_hash_ring_is_stable_and_spreads_keys():
+    ring = HashRing(4)
+    assert [ring.shard_for(i) for i in range(100)] == [HashRing(4).shard_for(i) for i in range(100)]
+    assert len({ring.shard_for(i) for i in range(100)}) == 4
+    # Med en shard till flyttas bara en del av nycklarna
+    storre = HashRing(5)
+    flyttade = sum(ring.shard_for(i) != storre.shard_for(i) for i in range(1000))
+    assert flyttade < 400
+
+
+def test_timed_out_bid_is_cancelled_but_a_started_one_is_awaited(app, monkeypatch):
+    motor = _motor(app)
+    motor.timeout = 0.05
+    behandla = Shard._behandla
+    startad, slapp = threading.Event(), threading.Event()
+
+    def langsam(shard, kommandon):
+        if not startad.is_set():
+            startad.set()
+            slapp.wait(5)
+        behandla(shard, kommandon)
+    monkeypatch.setattr(Shard, '_behandla', langsam)
+
+    forsta = []
+    trad = threading.Thread(target=lambda: forsta.append(motor.lagg_bud(2, 1, 5000).kod))
+    trad.start()
+    assert startad.wait(5)
+    # Samma shard är upptagen - budet avbryts innan det behandlas
+    with pytest.raises(FutureTimeout):
+        motor.lagg_bud(2, 2, 6000)
+    slapp.set()
+    trad.join()
+
+    # Det första budet hann börja behandlas: anroparen väntade och fick det skrivna resultatet
+    assert forsta == [OK]
+    with app.app_context():
+        assert [b.amount for b in Bid.query.filter_by(auction_id=2)] == [5000]
+    assert motor.shard_for(2).lagen[2].pris == 5000
+
+
+def test_non_finite_amounts_are_rejected(app, client):
+    motor = _motor(app)
+    with app.app_context():
+        for belopp in (float('inf'), float('nan')):
+            assert motor.validera(2, 1, belopp).kod == FOR_LAGT
+            assert motor.lagg_bud(2, 1, belopp).kod == FOR_LAGT
+
+    logga_in(client, 1)
+    assert client.post('/bidding/place/2', json={'amount': 'inf'}).status_code == 400
+    assert client.post('/bidding/place/2', data={'amount': 'nan'}).status_code == 302
+    assert client.post('/bidding/validate', json={'auction_id': 2, 'amount': '1e999'}).json['valid'] is False
+    with app.app_context():
+        assert Bid.query.filter_by(auction_id=2).count() == 0
+
+
+def test_ended_auctions_are_pruned_from_memory(app):
+    motor = _motor(app)
+    shard = motor.shard_for(4)
+    nu = datetime.utcnow()
+    shard.lagen[999] = AuktionsLage(999, 10.0, None, 0, nu - timedelta(days=2), nu - timedelta(days=1), True)
+    shard.lagen[998] = AuktionsLage(998, 10.0, None, 0, nu - timedelta(days=2), nu + timedelta(days=1), False)
+
+    # Rensningen körs i shardens tråd efter nästa batch när intervallet har gått
+    shard._nasta_rensning = 0
+    assert motor.lagg_bud(4, 1, 10_000).kod == OK
+    assert motor.lagg_bud(4, 2, 11_000).kod == OK   # behandlas efter rensningen
+    assert 999 not in shard.lagen and 998 not in shard.lagen
+    assert 4 in shard.lagen
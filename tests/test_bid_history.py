@@ -0,0 +1,62 @@
+from conftest import logga_in
+
+from database import db
+from models.bid import Bid
+from models.user import User
+
+
+def _lagg_bud(app, antal):
+    with app.app_context():
+        for i in range(antal):
+            db.session.add(Bid(amount=1000 + i, auction_id=3, user_id=2))
+        db.session.commit()
+        return [b.id for b in Bid.query.filter_by(auction_id=3).order_by(Bid.id)]
+
+
+def test_cursors_page_backwards_and_poll_forwards(app, client):
+    ids = _lagg_bud(app, 45)
+
+    forsta = client.get('/bidding/history/3').json
+    assert set(forsta) == {'auction_id', 'bids', 'latest_id', 'oldest_id', 'has_more'}
+    assert [b['id'] for b in forsta['bids']] == ids[::-1][:20]
+    assert forsta['has_more']
+
+    sidor = [forsta]
+    while sidor[-1]['has_more']:
+        sidor.append(client.get(f"/bidding/history/3?before_id={sidor[-1]['oldest_id']}").json)
+    assert [b['id'] for s in sidor for b in s['bids']] == ids[::-1]
+
+    # Polling utan nya bud ger en tom sida med samma markör
+    tom = client.get(f"/bidding/history/3?after_id={forsta['latest_id']}").json
+    assert tom['bids'] == [] and tom['latest_id'] == forsta['latest_id']
+
+    nya = _lagg_bud(app, 3)[-3:]
+    svar = client.get(f"/bidding/history/3?after_id={forsta['latest_id']}").json
+    assert [b['id'] for b in svar['bids']] == nya[::-1]
+    assert svar['latest_id'] == nya[-1] and not svar['has_more']
+
+
+def test_labels_are_masked_cached_and_invalidated(app, client):
+    _lagg_bud(app, 2)
+    assert client.get('/bidding/history/3').json['bids'][0]['bidder'] == 'u***@example.com'
+
+    etiketter = app.extensions['bidder_labels']
+    client.get('/bidding/history/3')
+    assert etiketter.hits >= 1
+
+    admin = app.test_client()
+    logga_in(admin, 1)
+    assert '(user@example.com)' in admin.get('/bidding/history/3').json['bids'][0]['bidder']
+
+    with app.app_context():
+        db.session.get(User, 2).email = 'ny@example.com'
+        db.session.commit()
+        app.extensions['change_feed'].las_nya()
+    assert client.get('/bidding/history/3').json['bids'][0]['bidder'] == 'n***@example.com'
+
+
+def test_missing_auction_and_page_limit(app, client):
+    assert client.get('/bidding/history/999').status_code == 404
+    _lagg_bud(app, 30)
+    app.config['BID_HISTORY_MAX_PAGE'] = 5
+    assert len(client.get('/bidding/history/3?limit=50').json['bids']) == 5
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from conftest import logga_in
+
+from database import db
+from models.auction import Auction
+from models.change import Change
+from services.change_feed import hamta_position, las_andringar, registrera_andringar, spara_position
+
+
+def _andringar(app):
+    with app.app_context():
+        return [(c.table_name, c.row_id, c.operation, c.auction_id)
+                for c in Change.query.order_by(Change.seq).all()]
+
+
+def test_orm_writes_are_recorded_in_same_transaction(app):
+    with app.app_context():
+        auction = db.session.get(Auction, 2)
+        auction.title = 'Ny titel'
+        db.session.commit()
+
+        auction.title = 'Rullas tillbaka'
+        db.session.flush()
+        db.session.rollback()
+
+    assert _andringar(app) == [('auctions', 2, 'update', 2)]
+
+
+def test_engine_bids_and_reactions_are_recorded(app, client):
+    logga_in(client, 1)
+    client.post('/bidding/place/2', data={'amount': '2000'})
+    client.post('/auctions/3/like', headers={'Content-Type': 'application/json'})
+    app.extensions['reactions'].flush()
+
+    andringar = _andringar(app)
+    assert ('auctions', 2, 'update', 2) in andringar
+    assert any(t == 'bids' and o == 'insert' and a == 2 for t, _, o, a in andringar)
+    assert ('likes', None, 'update', 3) in andringar
+
+
+def test_changes_from_other_processes_invalidate_local_state(app, client):
+    lasare = app.extensions['change_feed']
+    motor = app.extensions['bid_engine']
+    cache = app.extensions['page_cache']
+
+    client.get('/auctions/1')
+    assert len(cache) == 1
+    assert 1 in motor.shard_for(1).lagen
+
+    with app.app_context(), db.engine.begin() as conn:
+        registrera_andringar(conn, [('bids', 99, 'insert', 1)], origin='annan-worker')
+
+    assert lasare.las_nya() == 1
+    assert len(cache) == 0
+    assert 1 not in motor.shard_for(1).lagen
+    assert lasare.las_nya() == 0
+
+
+def test_own_changes_are_skipped_and_consumers_resume(app):
+    lasare = app.extensions['change_feed']
+    with app.app_context():
+        auction = db.session.get(Auction, 4)
+        auction.title = 'Egen ändring'
+        db.session.commit()
+
+        andringar = las_andringar(0, origin=lasare.origin)
+        assert [a.egen for a in andringar] == [True]
+
+        assert hamta_position('sokindex') == 0
+        spara_position('sokindex', andringar[-1].seq)
+        assert hamta_position('sokindex') == andringar[-1].seq
+        assert las_andringar(hamta_position('sokindex')) == []
+
+
+def test_reader_waits_for_gaps_left_by_uncommitted_transactions(app):
+    lasare = app.extensions['change_feed']
+    seen = []
+    lasare.prenumerera(lambda andring: seen.append(andring.seq))
+
+    def skriv(seq, skapad=None):
+        with app.app_context(), db.engine.begin() as conn:
+            conn.execute(Change.__table__.insert(), [{
+                'seq': seq, 'table_name': 'bids', 'row_id': seq, 'operation': 'insert', 'auction_id': 1,
+                'origin': 'annan-worker', 'created_at': skapad or datetime.utcnow(),
+            }])
+
+    start = lasare.senaste_seq
+    # seq start+2 committas före start+1 (som på PostgreSQL) - läsaren stannar före luckan
+    skriv(start + 2)
+    assert lasare.las_nya() == 0
+    skriv(start + 1)
+    assert lasare.las_nya() == 2
+    assert seen == [start + 1, start + 2]
+
+    # En gammal lucka är en tillbakarullad transaktion och hoppas över
+    skriv(start + 4, datetime.utcnow() - timedelta(seconds=60))
+    assert lasare.las_nya() == 1
+    assert seen[-1] == start + 4 and lasare.senaste_seq == start + 4
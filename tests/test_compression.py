@@ -0,0 +1,54 @@
+import gzip
+
+from services.assets import bygg_assets
+from services.compression import valj_kodning
+
+
+def test_html_is_gzipped_when_accepted(client):
+    response = client.get('/auctions/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'Browse Auctions' in gzip.decompress(response.data)
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_cached_page_is_compressed_once(app, client):
+    client.get('/auctions/', headers={'Accept-Encoding': 'gzip'})
+    hit = client.get('/auctions/', headers={'Accept-Encoding': 'gzip'})
+    assert hit.headers['X-Cache'] == 'HIT'
+    assert hit.headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(client):
+    assert 'Content-Encoding' not in client.get('/hello', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/auctions/').headers
+
+
+def test_accept_encoding_respects_q_values():
+    assert valj_kodning('gzip, br;q=0', ('br', 'gzip')) == 'gzip'
+    assert valj_kodning('*', ('br', 'gzip')) == 'br'
+    assert valj_kodning('identity', ('br', 'gzip')) is None
+
+
+def test_hashed_asset_url_is_immutable(app, client):
+    with app.test_request_context():
+        url = app.jinja_env.globals['asset_url']('js/script.js')
+    assert '?v=' in url
+    response = client.get(url)
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    response.close()
+
+
+def test_precompressed_sibling_is_served(app, client, tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body { color: red; }\n' * 100)
+    bygg_assets(str(tmp_path), med_brotli=False)
+    assert (tmp_path / 'css' / 'site.css.gz').exists()
+
+    app.static_folder = str(tmp_path)
+    app.extensions['assets'].static_mapp = str(tmp_path)
+    response = client.get('/static/css/site.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert gzip.decompress(response.get_data()).startswith(b'body')
+    response.close()
@@ -0,0 +1,162 @@
+import fcntl
+import threading
+import time
+
+from conftest import logga_in
+
+from database import db
+from models.auction import Auction
+from models.bid import Bid
+from services.event_log import (
+    AUKTION_FORLANGD, AUKTION_STANGD, BUD_LAGT, BUD_TILLBAKA, POSTSTORLEK, HandelseLogg, _koda, aterspela,
+    tillamp_pa_databasen,
+)
+
+
+def test_log_is_seeded_from_existing_bids(app):
+    logg = app.extensions['event_log']
+    handelser = list(logg.las())
+    assert [h.seq for h in handelser] == [1, 2]
+    assert all(h.typ == BUD_LAGT and h.auction_id == 1 for h in handelser)
+    with app.app_context():
+        assert logg.projektion(1).current_bid == db.session.get(Auction, 1).current_bid
+
+
+def test_bids_from_engine_are_logged(app, client):
+    logga_in(client, 1)
+    client.post('/bidding/place/2', data={'amount': '2000'})
+    senaste = list(app.extensions['event_log'].las())[-1]
+    assert (senaste.typ, senaste.auction_id, senaste.user_id, senaste.varde) == (BUD_LAGT, 2, 1, 2000)
+    assert senaste.bid_id > 0
+
+
+def test_replay_from_any_point_and_retraction(tmp_path):
+    logg = HandelseLogg(str(tmp_path), snapshot_var=1000)
+    logg.lagg_till(BUD_LAGT, 7, user_id=1, bid_id=1, varde=100)
+    seq = logg.lagg_till(BUD_LAGT, 7, user_id=2, bid_id=2, varde=150)
+    logg.lagg_till(BUD_TILLBAKA, 7, bid_id=2)
+    logg.lagg_till(AUKTION_FORLANGD, 7, varde=1_900_000_000)
+
+    nu = aterspela(logg)[7]
+    assert (nu.current_bid, nu.ledare, nu.antal_bud, nu.sluttid) == (100, 1, 1, 1_900_000_000)
+    da = aterspela(logg, till_seq=seq)[7]
+    assert (da.current_bid, da.ledare, da.antal_bud) == (150, 2, 2)
+
+
+def test_snapshots_bound_replay_and_match_full_replay(tmp_path):
+    logg = HandelseLogg(str(tmp_path), snapshot_var=10)
+    for i in range(1, 26):
+        logg.lagg_till(BUD_LAGT, 1 + i % 2, user_id=i, bid_id=i, varde=i * 10)
+
+    snapshot, position = logg.las_snapshot(1)
+    assert snapshot is not None and position == snapshot.seq * POSTSTORLEK
+    fran_snapshot = logg.projektion(1)
+    fullt = aterspela(logg)[1]
+    assert fran_snapshot.bud == fullt.bud
+    assert fran_snapshot.current_bid == 240
+
+
+def test_projection_reads_only_the_auctions_own_records(tmp_path, monkeypatch):
+    logg = HandelseLogg(str(tmp_path), snapshot_var=1000)
+    for i in range(1, 201):
+        logg.lagg_till(BUD_LAGT, 2, user_id=i, bid_id=i, varde=i)
+    logg.lagg_till(BUD_LAGT, 1, user_id=1, bid_id=1000, varde=50)
+    logg.lagg_till(BUD_LAGT, 1, user_id=2, bid_id=1001, varde=70)
+
+    lasta = []
+
+    def rakna(las):
+        def las_och_rakna(*args, **kwargs):
+            for h in las(*args, **kwargs):
+                lasta.append(h.seq)
+                yield h
+        return las_och_rakna
+
+    monkeypatch.setattr(logg, 'las', rakna(logg.las))
+    assert logg.projektion(1).current_bid == 70
+    assert logg.projektion(3).current_bid is None
+    assert lasta == []
+    monkeypatch.undo()
+
+    # En ny instans (som efter omstart) indexerar auktioner med snapshot vid första replay
+    logg.skriv_snapshot(logg.projektion(1))
+    logg.lagg_till(BUD_LAGT, 1, user_id=3, bid_id=1002, varde=90)
+    igen = HandelseLogg(str(tmp_path), snapshot_var=1000)
+    assert igen.projektion(1).current_bid == 90
+    igen.lagg_till(BUD_LAGT, 1, user_id=4, bid_id=1003, varde=95)
+    monkeypatch.setattr(igen, 'las', rakna(igen.las))
+    projektion = igen.projektion(1)
+    assert lasta == []
+    assert projektion.current_bid == 95 and projektion.bud == aterspela(logg)[1].bud
+
+
+def test_torn_tail_is_truncated_and_sequence_continues(tmp_path):
+    logg = HandelseLogg(str(tmp_path))
+    logg.lagg_till(BUD_LAGT, 1, user_id=1, bid_id=1, varde=10)
+    with open(logg.sokvag, 'ab') as f:
+        f.write(b'\x00' * (POSTSTORLEK // 2))
+
+    igen = HandelseLogg(str(tmp_path))
+    assert igen.senaste_seq == 1
+    assert igen.lagg_till(BUD_LAGT, 1, user_id=2, bid_id=2, varde=20) == 2
+    assert [h.seq for h in igen.las()] == [1, 2]
+
+
+def test_admin_retraction_close_and_extension_are_replayed(app, client):
+    logg = app.extensions['event_log']
+    with app.app_context():
+        hogsta = Bid.query.filter_by(auction_id=1).order_by(Bid.amount.desc()).first().id
+    logga_in(client, 1)
+    assert client.get('/admin/bids').status_code == 200
+
+    client.post(f'/admin/bids/{hogsta}/delete')
+    with app.app_context():
+        assert db.session.get(Auction, 1).current_bid == 600
+    assert logg.projektion(1).current_bid == 600
+
+    client.post('/admin/auctions/1/edit', data={
+        'title': 'Stängd', 'description': 'Beskrivning', 'category': 'Konst', 'extend_hours': '2', 'close': '1',
+    })
+    client.post('/admin/auctions/2/delete')
+    typer = [(h.typ, h.auction_id) for h in logg.las()][2:]
+    assert typer == [(BUD_TILLBAKA, 1), (AUKTION_FORLANGD, 1), (AUKTION_STANGD, 1), (AUKTION_STANGD, 2)]
+
+    projektion = aterspela(logg, auction_ids=[1])[1]
+    assert (projektion.current_bid, projektion.antal_bud, projektion.stangd) == (600, 1, True)
+    with app.app_context():
+        auction = db.session.get(Auction, 1)
+        forvantad_sluttid = auction.end_time
+        assert not auction.is_active
+        assert db.session.get(Auction, 2) is None
+
+        # Återspelningen återskapar samma läge i databasen
+        auction.is_active = True
+        auction.current_bid = 750
+        db.session.commit()
+        tillamp_pa_databasen({1: projektion})
+        auction = db.session.get(Auction, 1)
+        assert (auction.current_bid, auction.is_active) == (600, False)
+        assert abs((auction.end_time - forvantad_sluttid).total_seconds()) < 1e-3
+
+
+
+def test_opening_during_another_write_keeps_the_finished_record(tmp_path):
+    HandelseLogg(str(tmp_path)).lagg_till(BUD_LAGT, 1, user_id=1, bid_id=1, varde=10)
+    post = _koda(2, time.time(), BUD_LAGT, 1, 2, 2, 20.0)
+
+    # En annan process håller fillåset och har hunnit skriva halva posten
+    with open(tmp_path / 'events.log', 'ab') as annan:
+        fcntl.flock(annan.fileno(), fcntl.LOCK_EX)
+        annan.write(post[:20])
+        annan.flush()
+        oppnade = []
+        trad = threading.Thread(target=lambda: oppnade.append(HandelseLogg(str(tmp_path))))
+        trad.start()
+        time.sleep(0.1)  # den nya loggen har läst slutet och väntar på låset
+        annan.write(post[20:])
+        annan.flush()
+        fcntl.flock(annan.fileno(), fcntl.LOCK_UN)
+        trad.join()
+
+    assert oppnade[0].senaste_seq == 2
+    assert [h.seq for h in oppnade[0].las()] == [1, 2]
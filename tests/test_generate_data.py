@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+
+from generate_data import generera
+
+PROFIL = {'users': 50, 'auctions': 200, 'bids': 2000, 'likes': 400}
+NU = datetime(2025, 6, 1)
+
+
+def _innehall(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        data = {
+            tabell: conn.execute(text(f'SELECT * FROM {tabell} ORDER BY id')).all()
+            for tabell in ('auctions', 'bids', 'likes')
+        }
+        data['users'] = conn.execute(text('SELECT id, email, first_name, last_name FROM users ORDER BY id')).all()
+        index = {i['name'] for i in inspect(conn).get_indexes('bids')}
+    engine.dispose()
+    return data, index
+
+
+def test_same_seed_gives_same_database(tmp_path):
+    for namn in ('a', 'b'):
+        generera(f'sqlite:///{tmp_path / namn}.db', PROFIL, seed=7, nu=NU, batch=300, utskrift=lambda *_: None)
+    a, index = _innehall(f"sqlite:///{tmp_path / 'a'}.db")
+    b, _ = _innehall(f"sqlite:///{tmp_path / 'b'}.db")
+    assert a == b
+    assert {'idx_auction_amount', 'idx_auction_bid_id'} <= index
+
+
+def test_generated_data_is_consistent_and_skewed(tmp_path):
+    url = f'sqlite:///{tmp_path}/data.db'
+    antal = generera(url, PROFIL, seed=1, nu=NU, utskrift=lambda *_: None)
+    assert antal['auctions'] == 200 and abs(antal['bids'] - 2000) < 100
+
+    data, _ = _innehall(url)
+    per_auktion = {}
+    for bud in data['bids']:
+        per_auktion.setdefault(bud.auction_id, []).append(bud)
+    for auktion in data['auctions']:
+        bud = per_auktion.get(auktion.id, [])
+        # Budens belopp stiger och current_bid är det sista budet
+        assert [b.amount for b in bud] == sorted(b.amount for b in bud)
+        assert auktion.current_bid == (bud[-1].amount if bud else None)
+
+    storst = sorted((len(b) for b in per_auktion.values()), reverse=True)
+    assert sum(storst[:20]) > 0.3 * sum(storst)  # 10 % av auktionerna har en stor del av buden
@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+from conftest import logga_in
+
+from models.bid import Bid
+from services.idempotency import IdempotensKonflikt, IdempotensLager, IdempotensPagar
+
+
+def test_same_key_replayed_concurrently_places_one_bid(app):
+    klienter = []
+    for _ in range(16):
+        klient = app.test_client()
+        logga_in(klient, 1)
+        klienter.append(klient)
+
+    start = threading.Barrier(len(klienter))
+    svar = []
+
+    def skicka(klient):
+        start.wait()
+        svar.append(klient.post(
+            '/bidding/place/2',
+            json={'amount': 3000},
+            headers={'Idempotency-Key': 'dubbelklick-1'},
+        ))
+
+    tradar = [threading.Thread(target=skicka, args=(k,)) for k in klienter]
+    for t in tradar:
+        t.start()
+    for t in tradar:
+        t.join()
+
+    assert all(s.json['success'] and s.json['new_current_bid'] == 3000 for s in svar)
+    assert sum(s.headers.get('Idempotent-Replayed') == 'true' for s in svar) == len(svar) - 1
+    with app.app_context():
+        assert Bid.query.filter_by(auction_id=2).count() == 1
+
+
+def test_keys_are_scoped_per_user_and_failures_are_not_stored(app):
+    lager = IdempotensLager()
+    anrop = []
+
+    def misslyckas():
+        anrop.append('fel')
+        raise RuntimeError('budmotorn svarar inte')
+
+    for _ in range(2):
+        try:
+            lager.utfor('1:k', misslyckas)
+        except RuntimeError:
+            pass
+    assert anrop == ['fel', 'fel']
+
+    assert lager.utfor('1:k', lambda: 'första') == ('första', False)
+    assert lager.utfor('1:k', lambda: 'andra') == ('första', True)
+    assert lager.utfor('2:k', lambda: 'annan användare') == ('annan användare', False)
+
+
+def test_expired_keys_are_dropped():
+    lager = IdempotensLager(ttl=0, max_poster=10)
+    lager.utfor('1:a', lambda: 1)
+    assert lager.utfor('1:a', lambda: 2) == (2, False)
+    assert len(lager) == 1
+
+
+def test_reused_key_with_other_request_is_rejected(app, client):
+    logga_in(client, 1)
+    nyckel = {'Idempotency-Key': 'formular-1'}
+    assert client.post('/bidding/place/2', json={'amount': 3000}, headers=nyckel).status_code == 200
+
+    svar = client.post('/bidding/place/2', json={'amount': 4000}, headers=nyckel)
+    assert svar.status_code == 422 and svar.json['success'] is False
+    assert client.post('/bidding/place/3', json={'amount': 3000}, headers=nyckel).status_code == 422
+
+    lager = IdempotensLager()
+    lager.utfor('1:k', lambda: 1, ('place_bid', 2, 3000.0))
+    assert lager.utfor('1:k', lambda: 2, ('place_bid', 2, 3000.0)) == (1, True)
+    with pytest.raises(IdempotensKonflikt):
+        lager.utfor('1:k', lambda: 2, ('place_bid', 2, 4000.0))
+
+
+def test_failed_bid_is_json_with_status_and_replayed_header(app, client):
+    logga_in(client, 1)
+    nyckel = {'Idempotency-Key': 'for-lagt-1'}
+    forsta = client.post('/bidding/place/1', json={'amount': 10}, headers=nyckel)
+    assert forsta.status_code == 422
+    assert forsta.json['success'] is False and 'Idempotent-Replayed' not in forsta.headers
+
+    igen = client.post('/bidding/place/1', json={'amount': 10}, headers=nyckel)
+    assert (igen.status_code, igen.json) == (422, forsta.json)
+    assert igen.headers['Idempotent-Replayed'] == 'true'
+    # Inget flash-meddelande väntar för JSON-anrop
+    with client.session_transaction() as sess:
+        assert not sess.get('_flashes')
+
+
+def test_one_waiter_takes_over_when_the_leader_fails():
+    lager = IdempotensLager()
+    start = threading.Event()
+    anrop = []
+    resultat = []
+
+    def funktion():
+        anrop.append(1)
+        if len(anrop) == 1:
+            start.wait()
+            time.sleep(0.05)
+            raise RuntimeError('första försöket misslyckas')
+        time.sleep(0.05)
+        return 'klart'
+
+    def skicka():
+        try:
+            resultat.append(lager.utfor('1:k', funktion))
+        except RuntimeError:
+            resultat.append('fel')
+
+    tradar = [threading.Thread(target=skicka) for _ in range(8)]
+    for t in tradar:
+        t.start()
+    time.sleep(0.05)
+    start.set()
+    for t in tradar:
+        t.join()
+
+    assert len(anrop) == 2
+    assert sorted(resultat, key=str) == sorted(['fel', ('klart', False)] + [('klart', True)] * 6, key=str)
+
+
+def test_waiter_gives_up_instead_of_running_alongside_a_hung_leader():
+    lager = IdempotensLager(vantetid=0.01)
+    sluta = threading.Event()
+    ledare = threading.Thread(target=lager.utfor, args=('1:k', lambda: sluta.wait(1) and 'klart'))
+    ledare.start()
+    time.sleep(0.02)
+    with pytest.raises(IdempotensPagar):
+        lager.utfor('1:k', lambda: 'dubbel')
+    sluta.set()
+    ledare.join()
@@ -0,0 +1,57 @@
+import time
+
+from PIL import Image
+
+from models.auction import Auction
+from services.images import BildPipeline, generera_varianter, hasha_fil, variant_filnamn
+
+
+def _skapa_bild(path, size=(2400, 1200)):
+    Image.new('RGB', size, (200, 30, 30)).save(path, 'JPEG')
+    return path
+
+
+def test_variants_are_generated_and_deduplicated(tmp_path):
+    original = _skapa_bild(tmp_path / 'foto.jpg')
+    static = tmp_path / 'static'
+
+    bild_hash = generera_varianter(str(original), str(static))
+    assert bild_hash == hasha_fil(original)
+    with Image.open(static / variant_filnamn(bild_hash, 'thumb')) as thumb:
+        assert thumb.size == (320, 160)
+        assert thumb.format == 'WEBP'
+
+    full = static / variant_filnamn(bild_hash, 'full')
+    mtime = full.stat().st_mtime_ns
+    time.sleep(0.01)
+    generera_varianter(str(original), str(static))
+    assert full.stat().st_mtime_ns == mtime
+
+
+def test_pipeline_runs_in_process_pool(tmp_path):
+    original = _skapa_bild(tmp_path / 'foto.jpg')
+    pipeline = BildPipeline(str(tmp_path / 'static'), max_workers=1)
+    try:
+        bild_hash = hasha_fil(original)
+        future = pipeline.skicka(str(original), bild_hash)
+        assert pipeline.skicka(str(original), bild_hash) is future
+        assert future.result(timeout=60) == bild_hash
+        assert pipeline.ar_klar(bild_hash)
+    finally:
+        pipeline.stang()
+
+
+def test_auction_image_urls_use_variants(app, tmp_path):
+    original = _skapa_bild(tmp_path / 'foto.jpg')
+    app.extensions['images'].static_mapp = str(tmp_path)
+    bild_hash = generera_varianter(str(original), str(tmp_path))
+
+    with app.test_request_context():
+        auction = Auction(image=bild_hash)
+        assert auction.image_url_for('thumb').endswith(f'{bild_hash}/thumb.webp')
+        assert auction.image_url.endswith('full.webp')
+        assert '320w' in auction.image_srcset and '1600w' in auction.image_srcset
+
+        legacy = Auction(image='vintage_klocka.jpg')
+        assert legacy.image_url_for('thumb') == '/static/images/vintage_klocka.jpg'
+        assert legacy.image_srcset == ''
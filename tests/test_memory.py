@@ -0,0 +1,57 @@
+import logging
+import tracemalloc
+
+import pytest
+from conftest import logga_in
+
+from services.memory import MinnesDiagnostik
+
+
+@pytest.fixture
+def utan_tracemalloc():
+    yield
+    tracemalloc.stop()
+
+
+def test_snapshot_diff_shows_allocating_line(utan_tracemalloc):
+    diagnostik = MinnesDiagnostik(ramar=1)
+    diagnostik.ta_snapshot()
+    behall = [bytearray(1024) for _ in range(500)]  # noqa: F841
+    diagnostik.ta_snapshot()
+
+    (forsta, *_) = diagnostik.jamfor()
+    assert 'test_memory.py' in forsta['site'] and 'bytearray(1024)' in forsta['site']
+    assert forsta['size_diff_kb'] >= 500
+    assert diagnostik.jamfor(1, 99) is None
+
+
+def test_request_over_threshold_is_logged_with_sites(tmp_path, monkeypatch, caplog, utan_tracemalloc):
+    from flask_app import skapa_app
+    monkeypatch.setenv('MEMORY_TRACKING', '1')
+    monkeypatch.setenv('MEMORY_REQUEST_THRESHOLD_KB', '1')
+    app = skapa_app()
+    app.config['TESTING'] = True
+    diagnostik = app.extensions['memory']
+    klient = app.test_client()
+
+    with caplog.at_level(logging.WARNING, logger='memory'):
+        klient.get('/auctions/?status=all&sort=created_at&q=vas')
+        klient.get('/auctions/?status=all&sort=created_at&q=lampa')
+    (route,) = [r for r in diagnostik.routes() if r['endpoint'] == 'auctions_bp.browse_auctions']
+    assert route['requests'] == 2 and route['max_kb'] > 1 and route['sites']
+    meddelanden = [r.getMessage() for r in caplog.records if 'browse_auctions' in r.getMessage()]
+    assert 'nästa request' in meddelanden[0]
+    assert '.py:' in meddelanden[1] and 'KB)' in meddelanden[1]
+
+
+def test_admin_memory_page(app, utan_tracemalloc):
+    admin = app.test_client()
+    logga_in(admin, 1)
+    assert 'tracemalloc off' in admin.get('/admin/memory').get_data(as_text=True)
+    admin.post('/admin/memory/snapshot')
+    admin.post('/admin/memory/snapshot')
+    html = admin.get('/admin/memory').get_data(as_text=True)
+    assert '#2' in html and 'Allocation site' in html
+    admin.post('/admin/memory/stop')
+    assert not tracemalloc.is_tracing()
+    assert admin.post('/admin/memory/explode').status_code == 404
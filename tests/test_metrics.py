@@ -0,0 +1,63 @@
+import threading
+
+from conftest import logga_in
+
+from services.metrics import Matvarden
+
+
+def _varde(text, rad):
+    for r in text.splitlines():
+        if r.startswith(rad + ' '):
+            return float(r.rsplit(' ', 1)[1])
+    return None
+
+
+def test_thread_counters_are_merged_and_survive_thread_exit():
+    matvarden = Matvarden(hinkar=(0.1, 1.0))
+
+    def arbeta():
+        for _ in range(1000):
+            matvarden.rakna('x', ('a',))
+        matvarden.observera('h', (), 0.5)
+
+    tradar = [threading.Thread(target=arbeta) for _ in range(8)]
+    for t in tradar:
+        t.start()
+    for t in tradar:
+        t.join()
+    del tradar, t
+    matvarden.rakna('x', ('a',))
+
+    raknare, histogram = matvarden.summera()
+    assert raknare[('x', ('a',))] == 8001
+    assert histogram[('h', ())][:3] == [0, 8, 0]
+    assert histogram[('h', ())][-1] == 4.0
+    # Avslutade trådars räknare har flyttats till summan
+    assert len(matvarden._levande) <= 2
+
+
+def test_metrics_endpoint_exposes_requests_db_and_bids(client):
+    logga_in(client, 1)
+    client.get('/auctions/1')
+    client.get('/auctions/1')
+    assert client.post('/bidding/place/1', json={'amount': 5000}).status_code == 200
+    client.post('/bidding/place/1', json={'amount': 10})
+
+    svar = client.get('/metrics')
+    assert svar.status_code == 200 and svar.mimetype == 'text/plain'
+    text = svar.get_data(as_text=True)
+    assert _varde(text, 'http_requests_total{endpoint="auctions_bp.auction_detail",method="GET",status="200"}') == 2
+    assert _varde(text, 'http_request_duration_seconds_count{endpoint="auctions_bp.auction_detail"}') == 2
+    assert _varde(text, 'http_request_duration_seconds_bucket{endpoint="auctions_bp.auction_detail",le="+Inf"}') == 2
+    assert _varde(text, 'bids_total{result="ok"}') == 1
+    assert _varde(text, 'bids_total{result="for_lagt"}') == 1
+    assert _varde(text, 'db_statements_total{kind="insert"}') >= 1
+    # Bara /metrics själv pågår
+    assert _varde(text, 'http_requests_in_flight') == 1
+    assert '# TYPE http_request_duration_seconds histogram' in text
+
+
+def test_allowed_ips(app, client):
+    app.config['METRICS_ALLOWED_IPS'] = ['10.0.0.1']
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code == 200
@@ -0,0 +1,144 @@
+import threading
+import time
+
+from conftest import logga_in
+from models.bid import Bid
+from models.user import User
+from services.page_cache import PageCache, _CachePost
+
+
+def test_anonymous_browse_is_cached(client):
+    first = client.get('/auctions/')
+    second = client.get('/auctions/')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert first.data == second.data
+
+
+def test_query_string_is_normalized(client):
+    client.get('/auctions/?status=active&sort=end_time')
+    response = client.get('/auctions/?sort=end_time&search=&status=active')
+    assert response.headers['X-Cache'] == 'HIT'
+
+
+def test_logged_in_user_bypasses_cache(app, client):
+    client.get('/auctions/1')
+    with app.app_context():
+        user = User.query.filter_by(is_admin=False).first()
+    logga_in(client, user.id)
+    response = client.get('/auctions/1')
+    assert 'X-Cache' not in response.headers
+
+
+def test_like_invalidates_auction_detail(app, client):
+    client.get('/auctions/1')
+    assert client.get('/auctions/1').headers['X-Cache'] == 'HIT'
+    with app.app_context():
+        user = User.query.filter_by(is_admin=False).first()
+    user_client = app.test_client()
+    logga_in(user_client, user.id)
+    user_client.post('/auctions/1/like')
+    assert client.get('/auctions/1').headers['X-Cache'] == 'MISS'
+
+
+def test_admin_writes_invalidate_cached_pages(app, client):
+    admin = app.test_client()
+    logga_in(admin, 1)
+
+    def cachad(sokvag):
+        client.get(sokvag)
+        return client.get(sokvag).headers['X-Cache'] == 'HIT'
+
+    assert cachad('/auctions/') and cachad('/auctions/1')
+    admin.post('/admin/auctions/1/edit', data={'title': 'Ny titel', 'description': 'Ny', 'category': 'Konst'})
+    assert client.get('/auctions/1').headers['X-Cache'] == 'MISS'
+    assert client.get('/auctions/').headers['X-Cache'] == 'MISS'
+
+    assert cachad('/auctions/')
+    admin.post('/admin/auctions/new', data={
+        'title': 'Ny', 'description': 'Ny', 'category': 'Konst', 'starting_bid': '10', 'duration_hours': '24',
+    })
+    assert client.get('/auctions/').headers['X-Cache'] == 'MISS'
+
+    assert cachad('/auctions/1')
+    with app.app_context():
+        bid_id = Bid.query.filter_by(auction_id=1).first().id
+    admin.post(f'/admin/bids/{bid_id}/delete')
+    assert client.get('/auctions/1').headers['X-Cache'] == 'MISS'
+
+    assert cachad('/auctions/2') and cachad('/auctions/')
+    admin.post('/admin/auctions/2/delete')
+    assert client.get('/auctions/2').status_code == 404
+    assert client.get('/auctions/').headers['X-Cache'] == 'MISS'
+
+
+def test_stale_entry_is_served_while_revalidating(app, client):
+    app.extensions['page_cache'].ttl = 0
+    client.get('/auctions/2')
+    response = client.get('/auctions/2')
+    assert response.headers['X-Cache'] == 'STALE'
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = PageCache()
+    renders = []
+    results = []
+
+    def request_page():
+        leader, event = cache.borja_hamtning('/auctions/')
+        if leader:
+            time.sleep(0.05)
+            renders.append(1)
+            cache.spara('/auctions/', _CachePost(b'page', 200, [], ['auction-list']))
+            cache.avsluta_hamtning('/auctions/')
+        else:
+            event.wait(1)
+        post, _ = cache.hamta('/auctions/')
+        results.append(post.body)
+
+    threads = [threading.Thread(target=request_page) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(renders) == 1
+    assert results == [b'page'] * 10
+
+
+def test_tag_invalidation_only_drops_affected_entries():
+    cache = PageCache()
+    cache.spara('/auctions/1', _CachePost(b'1', 200, [], ['auction:1']))
+    cache.spara('/auctions/2', _CachePost(b'2', 200, [], ['auction:2']))
+    cache.invalidera_tagg('auction:1')
+    assert cache.hamta('/auctions/1')[0] is None
+    assert cache.hamta('/auctions/2')[0] is not None
+
+
+def test_render_started_before_invalidation_is_not_stored():
+    cache = PageCache()
+    generation = cache.generation()
+    # Ett bud på auktion 1 invaliderar medan sidan renderas
+    cache.invalidera_tagg('auction:1', 'auction-list')
+    assert not cache.spara('/auctions/1', _CachePost(b'gammal', 200, [], ['auction:1']), generation)
+    assert cache.hamta('/auctions/1')[0] is None
+    # Andra taggar påverkas inte, och en rendering som började efteråt sparas
+    assert cache.spara('/auctions/2', _CachePost(b'2', 200, [], ['auction:2']), generation)
+    assert cache.spara('/auctions/1', _CachePost(b'ny', 200, [], ['auction:1']), cache.generation())
+    assert cache.hamta('/auctions/1')[0].body == b'ny'
+
+
+def test_hit_and_miss_counters_are_exact_under_threads():
+    cache = PageCache()
+    cache.spara('/', _CachePost(b'home', 200, [], ['auction-list']))
+
+    def read():
+        for _ in range(2000):
+            cache.hamta('/')
+            cache.hamta('/saknas')
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.hits, cache.misses, cache.stale_hits) == (16000, 16000, 0)
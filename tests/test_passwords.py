@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from models.user import User
+from services.passwords import HashKoFull, HashPool, InloggningsSparr, metodparametrar
+
+
+def _logga_in(client, email, password):
+    return client.post('/auth/login', data={'email': email, 'password': password})
+
+
+def test_login_redirects_to_browse(client):
+    svar = _logga_in(client, 'user@example.com', 'user123')
+    assert svar.status_code == 302
+    assert svar.headers['Location'].endswith('/auctions/')
+
+
+def test_password_is_rehashed_when_method_changes(app, client):
+    app.extensions['password_pool'].metod = 'pbkdf2:sha256:1000'
+    assert _logga_in(client, 'user@example.com', 'user123').status_code == 302
+    with app.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+        assert user.check_password('user123')
+
+
+def test_failed_attempts_are_throttled_before_hashing(app, client):
+    pool = app.extensions['password_pool']
+    for _ in range(5):
+        assert _logga_in(client, 'user@example.com', 'fel').status_code == 200
+    kontroller = pool.kontroller
+
+    svar = _logga_in(client, 'user@example.com', 'user123')
+    assert svar.status_code == 429
+    assert int(svar.headers['Retry-After']) > 0
+    assert pool.kontroller == kontroller
+
+
+def test_unknown_email_counts_as_failure(app, client):
+    sparr = app.extensions['login_throttle']
+    _logga_in(client, 'finns-inte@example.com', 'x')
+    assert sparr.vantetid('finns-inte@example.com', '127.0.0.1') == 0
+    assert len(sparr) == 2  # e-post och IP
+
+
+def test_sliding_window_forgets_old_failures():
+    sparr = InloggningsSparr(max_per_epost=2, max_per_ip=100, fonster=60)
+    sparr.misslyckades('a@b.se', 'ip', nu=0)
+    sparr.misslyckades('a@b.se', 'ip', nu=30)
+    assert sparr.vantetid('a@b.se', 'ip', nu=31) == pytest.approx(29)
+    assert sparr.vantetid('a@b.se', 'ip', nu=61) == 0
+
+
+def test_email_key_is_normalized():
+    sparr = InloggningsSparr(max_per_epost=2, max_per_ip=100, fonster=60)
+    sparr.misslyckades('A@B.se', 'ip1', nu=0)
+    sparr.misslyckades(' a@b.se ', 'ip2', nu=1)
+    assert sparr.vantetid('a@b.SE', 'ip3', nu=2) > 0
+    sparr.lyckades('A@b.se')
+    assert sparr.vantetid('a@b.se', 'ip3', nu=2) == 0
+
+
+def test_expired_keys_are_pruned():
+    sparr = InloggningsSparr(fonster=60)
+    for i in range(InloggningsSparr.RENSA_VAR - 1):
+        sparr.misslyckades(f'{i}@b.se', f'ip{i}', nu=0)
+    assert len(sparr) == 2 * (InloggningsSparr.RENSA_VAR - 1)
+    sparr.misslyckades('ny@b.se', 'ip-ny', nu=61)
+    assert len(sparr) == 2
+
+
+def test_full_queue_is_rejected_immediately():
+    pool = HashPool(max_workers=1, max_ko=0)
+    slapp = threading.Event()
+    upptagen = threading.Thread(target=pool._kor, args=(slapp.wait,))
+    upptagen.start()
+    try:
+        with pytest.raises(HashKoFull):
+            for _ in range(50):  # vänta tills jobbet har tagit platsen
+                pool.kontrollera('pbkdf2:sha256:1$salt$x', 'x')
+    finally:
+        slapp.set()
+        upptagen.join()
+    assert pool.avvisade == 1
+
+
+def test_rehash_compares_parsed_algorithm_and_cost():
+    pool = HashPool(max_workers=1, metod='pbkdf2:sha256')
+    hash_ = pool.skapa('hemligt')
+    assert hash_.startswith('pbkdf2:sha256:')
+    assert not pool.behover_omhashning(hash_)
+    assert metodparametrar('pbkdf2') == metodparametrar(hash_.split('$', 1)[0])
+    assert metodparametrar('scrypt') == ('scrypt', 32768, 8, 1)
+
+    pool.metod = 'pbkdf2:sha256:1000'
+    assert pool.behover_omhashning(hash_)
+    pool.metod = 'scrypt'
+    assert pool.behover_omhashning(hash_)
+    assert not pool.behover_omhashning('scrypt:32768:8:1$salt$x')
+
+
+def test_slow_hash_times_out_as_overload(app, client):
+    pool = HashPool(max_workers=1, max_ko=4, timeout=0.01)
+    slapp = threading.Event()
+    upptagen = pool._pool.submit(slapp.wait)  # arbetaren är upptagen
+    try:
+        with pytest.raises(HashKoFull):
+            pool.kontrollera('pbkdf2:sha256:1$salt$x', 'x')
+
+        # login svarar 503 som när kön är full
+        app.extensions['password_pool'] = pool
+        svar = client.post('/auth/login', data={'email': 'user@example.com', 'password': 'user123'})
+        assert svar.status_code == 503 and svar.headers['Retry-After'] == '1'
+    finally:
+        slapp.set()
+        upptagen.result()
@@ -0,0 +1,64 @@
+import pstats
+
+from conftest import logga_in
+
+
+def _profilerande_app(tmp_path, monkeypatch, **miljo):
+    from flask_app import skapa_app
+    monkeypatch.setenv('PROFILER_ENABLED', '1')
+    monkeypatch.setenv('PROFILER_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('PROFILER_SAMPLE_INTERVAL', '1')
+    for namn, varde in miljo.items():
+        monkeypatch.setenv(namn, varde)
+    app = skapa_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def test_disabled_by_default_registers_nothing(app):
+    assert 'profiler' not in app.extensions
+    admin = app.test_client()
+    logga_in(admin, 1)
+    assert 'X-Profile-Id' not in admin.get('/auctions/1', headers={'X-Profile': 'cprofile'}).headers
+    assert admin.get('/admin/profiles').status_code == 404
+
+
+def test_admin_header_profiles_request(tmp_path, monkeypatch):
+    app = _profilerande_app(tmp_path, monkeypatch)
+    profiler = app.extensions['profiler']
+
+    anon = app.test_client()
+    assert 'X-Profile-Id' not in anon.get('/auctions/1', headers={'X-Profile': 'cprofile'}).headers
+    user = app.test_client()
+    logga_in(user, 2)
+    assert 'X-Profile-Id' not in user.get('/auctions/1', headers={'X-Profile': 'cprofile'}).headers
+
+    admin = app.test_client()
+    logga_in(admin, 1)
+    svar = admin.get('/auctions/1', headers={'X-Profile': 'cprofile'})
+    profil_id = svar.headers['X-Profile-Id']
+    (meta,) = profiler.lista()
+    assert meta['id'] == profil_id and meta['endpoint'] == 'auctions_bp.auction_detail'
+    assert meta['mode'] == 'cprofile' and meta['trigger'] == 'header' and meta['status'] == 200
+    assert pstats.Stats(profiler.sokvag(profil_id, 'pstats')).total_calls > 0
+
+    assert 'auctions_bp.auction_detail' in admin.get('/admin/profiles').get_data(as_text=True)
+    detalj = admin.get(f'/admin/profiles/{profil_id}')
+    assert detalj.status_code == 200 and 'auction_detail' in detalj.get_data(as_text=True)
+    assert admin.get(f'/admin/profiles/{profil_id}.pstats').status_code == 200
+    assert admin.get(f'/admin/profiles/{profil_id}.folded').status_code == 200
+    assert admin.get('/admin/profiles/..%2F..%2Fetc.folded').status_code == 404
+    assert user.get('/admin/profiles').status_code == 302
+
+
+def test_sample_rate_uses_sampler_and_keeps_newest(tmp_path, monkeypatch):
+    app = _profilerande_app(tmp_path, monkeypatch, PROFILER_SAMPLE_RATE='1', PROFILER_KEEP='3')
+    profiler = app.extensions['profiler']
+    klient = app.test_client()
+    for _ in range(5):
+        klient.get('/auctions/?status=all&sort=end_time')
+
+    profiler_ = profiler.lista()
+    assert len(profiler_) == 3
+    assert {p['mode'] for p in profiler_} == {'sample'} and not any(p['pstats'] for p in profiler_)
+    assert profiler.sokvag(profiler_[0]['id'], 'folded') is not None
@@ -0,0 +1,61 @@
+from conftest import logga_in
+
+from services.rate_limit import Begransare
+
+
+def _begransare(app, regler):
+    begransare = app.extensions['rate_limiter']
+    begransare.aktiv = True
+    begransare.regler = regler
+    return begransare
+
+
+def test_search_is_limited_per_ip_with_retry_after(app, client):
+    begransare = _begransare(app, {'search': {'ip': (0.5, 2)}})
+    assert client.get('/auctions/search?q=vas').status_code == 200
+    assert client.get('/auctions/search?q=vas').status_code == 200
+
+    svar = client.get('/auctions/search?q=vas', headers={'Accept': 'application/json'})
+    assert svar.status_code == 429
+    assert svar.headers['Retry-After'] == '2'
+    assert svar.json['success'] is False
+    assert begransare.beslut[('search', 'allowed')] == 2
+    assert begransare.beslut[('search', 'limited')] == 1
+    assert begransare.pagaende == 0
+
+
+def test_bid_buckets_are_per_user_and_per_auction(app):
+    begransare = Begransare({'bid': {'user': (1.0, 2), 'auction': (1.0, 3)}})
+    assert begransare.forsok('bid', {'user': 1, 'auction': 5}, nu=0) == 0
+    assert begransare.forsok('bid', {'user': 1, 'auction': 5}, nu=0) == 0
+    # Användarens bucket är tom - auktionens token dras inte
+    assert begransare.forsok('bid', {'user': 1, 'auction': 5}, nu=0) == 1.0
+    assert begransare.forsok('bid', {'user': 2, 'auction': 5}, nu=0) == 0
+    assert begransare.forsok('bid', {'user': 3, 'auction': 5}, nu=0) > 0
+    # Efter en sekund har användaren fått en ny token
+    assert begransare.forsok('bid', {'user': 1, 'auction': 6}, nu=1.0) == 0
+
+
+def test_full_buckets_expire_lazily():
+    begransare = Begransare({'search': {'ip': (10.0, 5)}}, stadintervall=2)
+    begransare.forsok('search', {'ip': 'a'}, nu=0)
+    assert len(begransare) == 1
+    begransare.forsok('search', {'ip': 'b'}, nu=10)
+    assert len(begransare) == 1  # 'a' är påfylld och borttagen, 'b' finns kvar
+
+
+def test_overload_sheds_browse_before_bids(app, client):
+    begransare = _begransare(app, {})
+    begransare.max_inflight = 4
+    begransare.pagaende = 2  # två andra requests pågår redan
+
+    svar = client.get('/auctions/')
+    assert svar.status_code == 503
+    assert 'Retry-After' in svar.headers
+
+    logga_in(client, 1)
+    svar = client.post('/bidding/place/2', json={'amount': 5000})
+    assert svar.status_code == 200
+    assert svar.json['success'] is True
+    assert begransare.beslut[('browse', 'shed')] == 1
+    assert begransare.beslut[('bid', 'allowed')] == 1
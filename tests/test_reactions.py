@@ -0,0 +1,145 @@
+from conftest import logga_in
+
+from models.like import Like
+
+
+def _reaktioner(app):
+    reaktioner = app.extensions['reactions']
+    # Ingen automatisk flush under testet - testerna anropar flush() själva
+    reaktioner.intervall = 3600
+    return reaktioner
+
+
+def _likes_i_db(app, auction_id):
+    with app.app_context():
+        return {
+            (like.user_id, like.is_like)
+            for like in Like.query.filter_by(auction_id=auction_id).all()
+        }
+
+
+def test_toggle_returns_counts_before_flush(app, client):
+    _reaktioner(app)
+    logga_in(client, 1)
+    response = client.post('/auctions/2/like', headers={'Content-Type': 'application/json'})
+    assert response.json['action'] == 'created'
+    assert response.json['like_count'] == 1
+    assert response.json['dislike_count'] == 0
+
+    response = client.post('/auctions/2/dislike', headers={'Content-Type': 'application/json'})
+    assert response.json['action'] == 'updated'
+    assert (response.json['like_count'], response.json['dislike_count']) == (0, 1)
+
+
+def test_flush_coalesces_and_writes_final_state(app, client):
+    reaktioner = _reaktioner(app)
+    logga_in(client, 1)
+    # like -> ta bort -> like: bara slutresultatet ska skrivas
+    for _ in range(3):
+        client.post('/auctions/2/like', headers={'Content-Type': 'application/json'})
+    client.post('/auctions/1/like', headers={'Content-Type': 'application/json'})
+
+    assert reaktioner.flush() == 2
+    assert _likes_i_db(app, 2) == {(1, True)}
+
+    client.post('/auctions/2/like', headers={'Content-Type': 'application/json'})
+    reaktioner.flush()
+    assert _likes_i_db(app, 2) == set()
+
+
+def test_existing_likes_are_loaded_and_updated(app, client):
+    reaktioner = _reaktioner(app)
+    with app.app_context():
+        like = Like.query.first()
+        auction_id, user_id = like.auction_id, like.user_id
+
+    logga_in(client, user_id)
+    response = client.post(f'/auctions/{auction_id}/dislike', headers={'Content-Type': 'application/json'})
+    assert response.json['action'] == 'updated'
+    reaktioner.flush()
+    assert (user_id, False) in _likes_i_db(app, auction_id)
+
+    html = client.get(f'/auctions/{auction_id}').get_data(as_text=True)
+    assert 'Dislike (1)' in html
+
+
+def test_unwritten_changes_go_to_journal_and_are_replayed(app, tmp_path, monkeypatch):
+    import services.reactions as reactions
+
+    reaktioner = _reaktioner(app)
+    reaktioner.journal = str(tmp_path / 'reactions.journal')
+    with app.test_request_context():
+        reaktioner.vaxla(1, 3, True)
+
+    def trasig(andringar):
+        raise RuntimeError('databasen är låst')
+    monkeypatch.setattr(reactions, 'skriv_andringar', trasig)
+    reaktioner.stang()
+    monkeypatch.undo()
+    assert _likes_i_db(app, 3) == set()
+
+    ny = reactions.ReaktionsTjanst(app, journal=reaktioner.journal)
+    assert ny.las_journal() == 1
+    assert _likes_i_db(app, 3) == {(1, True)}
+    assert not (tmp_path / 'reactions.journal').exists()
+
+
+def test_toggle_during_flush_leaves_no_pending_count(app, monkeypatch):
+    import services.reactions as reactions
+
+    reaktioner = _reaktioner(app)
+    skriv = reactions.skriv_andringar
+    with app.test_request_context():
+        reaktioner.vaxla(1, 3, True)
+
+        def vaxla_under_skrivning(andringar):
+            reaktioner.vaxla(1, 3, True)   # köas igen medan den förra skrivs
+            skriv(andringar)
+        monkeypatch.setattr(reactions, 'skriv_andringar', vaxla_under_skrivning)
+        assert reaktioner.flush() == 1
+        assert reaktioner._auktioner[3].vantande == 1
+
+        monkeypatch.setattr(reactions, 'skriv_andringar', skriv)
+        reaktioner.flush()
+        assert reaktioner._auktioner[3].vantande == 0
+        assert _likes_i_db(app, 3) == set()
+
+        # Misslyckad skrivning: nyckeln som köades igen räknas bara en gång
+        reaktioner.vaxla(1, 3, False)
+
+        def trasig(andringar):
+            reaktioner.vaxla(1, 3, False)
+            raise RuntimeError('databasen är låst')
+        monkeypatch.setattr(reactions, 'skriv_andringar', trasig)
+        assert reaktioner.flush() == 0
+        assert reaktioner._auktioner[3].vantande == 1
+
+        monkeypatch.setattr(reactions, 'skriv_andringar', skriv)
+        assert reaktioner.flush() == 1
+        assert reaktioner._auktioner[3].vantande == 0
+        reaktioner.glom(3)
+        assert 3 not in reaktioner._auktioner
+
+
+def test_toggle_applies_to_state_reloaded_by_another_thread(app, monkeypatch):
+    from services.reactions import _AuktionsReaktioner
+
+    reaktioner = _reaktioner(app)
+    hamta = reaktioner._hamta_tillstand
+    omladdat = []
+
+    def hamta_medan_annan_trad_laser_om(auction_id):
+        tillstand = hamta(auction_id)
+        if not omladdat:
+            # En annan tråd läser om efter TTL:en medan den här väntar på låset
+            omladdat.append(_AuktionsReaktioner(dict(tillstand.per_anvandare)))
+            reaktioner._auktioner[auction_id] = omladdat[0]
+        return tillstand
+
+    monkeypatch.setattr(reaktioner, '_hamta_tillstand', hamta_medan_annan_trad_laser_om)
+    with app.test_request_context():
+        action, likes, _ = reaktioner.vaxla(2, 4, True)
+    assert action == 'created'
+    assert reaktioner._auktioner[4] is omladdat[0]
+    assert (omladdat[0].likes, omladdat[0].vantande) == (likes, 1)
+    assert omladdat[0].per_anvandare[2] is True
@@ -0,0 +1,132 @@
+import random
+from datetime import datetime, timedelta
+
+from conftest import logga_in
+
+from database import db
+from models.auction import Auction
+from models.saved_search import SavedSearch, SavedSearchMatch
+from services.change_feed import hamta_position
+from services.saved_searches import KONSUMENT, PrisIndex, SokIndex, Sokning
+
+
+def _traffar(index, title, description='', category='Konst', pris=100.0):
+    return [s.id for s in index.matcha(title, description, category, pris)]
+
+
+def test_reverse_index_matches_terms_category_and_price():
+    index = SokIndex()
+    index.lagg_till(Sokning(1, 1, 'Vintage lampa', None, None, None))
+    index.lagg_till(Sokning(2, 1, 'lampa', 'Möbler', None, 500))
+    index.lagg_till(Sokning(3, 2, '', 'Konst', None, None))
+    index.lagg_till(Sokning(4, 2, '', None, 50, 150))
+    index.lagg_till(Sokning(5, 2, '', None, 200, None))
+
+    assert _traffar(index, 'Lampa, vintage!', category='Konst') == [1, 3, 4]
+    assert _traffar(index, 'Lampa', category='Möbler', pris=400) == [2, 5]
+    assert _traffar(index, 'Lampa', category='Möbler', pris=600) == [5]
+    assert _traffar(index, 'Vintagelampa', category='Möbler', pris=10) == []
+
+    index.ta_bort(1)
+    index.ta_bort(4)
+    assert _traffar(index, 'vintage lampa', category='Konst') == [3]
+    assert len(index) == 3
+
+
+def test_price_index_returns_exactly_the_containing_intervals():
+    slump = random.Random(50)
+    index = PrisIndex()
+    intervall = {}
+    for sokning_id in range(2000):
+        min_price = slump.choice([None, 0.0, slump.uniform(0, 1000), float(slump.randint(0, 20) * 50)])
+        max_price = slump.choice([None, slump.uniform(0, 5000), float(slump.randint(0, 20) * 50)])
+        if min_price is not None and max_price is not None and min_price > max_price:
+            min_price, max_price = max_price, min_price
+        intervall[sokning_id] = (min_price, max_price)
+        index.lagg_till(sokning_id, min_price, max_price)
+    for sokning_id in range(0, 2000, 3):
+        index.ta_bort(sokning_id, *intervall.pop(sokning_id))
+
+    for pris in [0.0, 0.5, 50.0, 100.0, 999.99, 1000.0, 4999.0, 1e9] + [slump.uniform(0, 6000) for _ in range(200)]:
+        traffar = list(index.traffar(pris))
+        # Varje id som läses är en träff - inga kandidater som sedan sorteras bort
+        assert len(traffar) == len(set(traffar))
+        assert set(traffar) == {
+            sokning_id for sokning_id, (lagst, hogst) in intervall.items()
+            if (lagst is None or pris >= lagst) and (hogst is None or pris <= hogst)
+        }
+
+
+def _skapa_auktion(app, title, category='Elektronik', starting_bid=100.0):
+    with app.app_context():
+        auction = Auction(title=title, description='Ny auktion', category=category,
+                          starting_bid=starting_bid, end_time=datetime.utcnow() + timedelta(days=1))
+        db.session.add(auction)
+        db.session.commit()
+        return auction.id
+
+
+def test_new_auctions_are_matched_and_queued(app, client):
+    logga_in(client, 2)
+    svar = client.post('/auctions/saved-searches', data={'keywords': 'retro kamera', 'max_price': '300'})
+    assert svar.status_code == 302
+    client.post('/auctions/saved-searches', data={'category': 'Elektronik', 'min_price': '1000'})
+
+    traff = _skapa_auktion(app, 'Retro kamera från 70-talet')
+    _skapa_auktion(app, 'Retro kamera', starting_bid=500)   # för dyr för båda sökningarna
+    _skapa_auktion(app, 'Modern kamera')
+    assert app.extensions['change_feed'].las_nya() > 0
+
+    tjanst = app.extensions['saved_searches']
+    with app.app_context():
+        ko = tjanst.hamta_ko()
+        assert [(m.auction_id, m.user_id) for m in ko] == [(traff, 2)]
+
+        # Samma ändringar igen ger inga dubbletter
+        assert tjanst.matcha_auktioner([traff]) == 0
+        assert SavedSearchMatch.query.count() == 1
+
+        tjanst.markera_skickade([m.id for m in ko])
+        assert tjanst.hamta_ko() == []
+
+    html = client.get('/auctions/saved-searches').get_data(as_text=True)
+    assert 'retro kamera' in html and 'Retro kamera från 70-talet' in html
+
+
+def test_consumer_resumes_from_its_position(app):
+    tjanst = app.extensions['saved_searches']
+    with app.app_context():
+        db.session.add(SavedSearch(user_id=2, keywords='', category='Elektronik'))
+        db.session.commit()
+        tjanst.bygg()
+        start = hamta_position(KONSUMENT)
+
+    # Läsartråden är avstängd i testerna - auktionen matchas när konsumenten kör ikapp
+    auction_id = _skapa_auktion(app, 'Skrivare')
+    with app.app_context():
+        assert tjanst.bearbeta() >= 1
+        assert hamta_position(KONSUMENT) > start
+        assert [m.auction_id for m in tjanst.hamta_ko()] == [auction_id]
+        assert tjanst.bearbeta() == 0
+
+
+def test_saved_searches_are_validated_and_deletable(app, client):
+    logga_in(client, 2)
+    client.post('/auctions/saved-searches', data={'keywords': '  '})
+    client.post('/auctions/saved-searches', data={'min_price': '500', 'max_price': '100'})
+    client.post('/auctions/saved-searches', data={'min_price': 'abc'})
+    with app.app_context():
+        assert SavedSearch.query.count() == 0
+
+    client.post('/auctions/saved-searches', data={'keywords': 'klocka'})
+    with app.app_context():
+        search_id = SavedSearch.query.one().id
+    assert len(app.extensions['saved_searches'].index) == 1
+
+    logga_in(client, 1)
+    assert client.post(f'/auctions/saved-searches/{search_id}/delete').status_code == 404
+    logga_in(client, 2)
+    client.post(f'/auctions/saved-searches/{search_id}/delete')
+    with app.app_context():
+        assert SavedSearch.query.count() == 0
+    assert len(app.extensions['saved_searches'].index) == 0
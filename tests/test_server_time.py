@@ -0,0 +1,13 @@
+import time
+
+
+def test_server_time_endpoint_is_not_cached(client):
+    response = client.get('/api/time')
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert abs(response.json['now'] / 1000 - time.time()) < 5
+
+
+def test_countdowns_render_utc_end_times(client):
+    html = client.get('/auctions/1').get_data(as_text=True)
+    assert 'class="h6 text-warning countdown-timer"' in html
+    assert 'Z">' in html
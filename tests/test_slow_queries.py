@@ -0,0 +1,75 @@
+import sqlite3
+
+from conftest import logga_in
+
+from dbrepositories.base_repository import BaseRepository
+from services.slow_queries import LangsamLogg, maska, normalisera
+
+
+def test_statement_shapes_and_redaction():
+    a = normalisera("SELECT * FROM bids WHERE auction_id IN (?, ?, ?) AND amount > 500\n  AND note = 'x'")
+    b = normalisera("SELECT * FROM bids WHERE auction_id IN (?) AND amount > 10 AND note = 'yy'")
+    assert a == b == 'SELECT * FROM bids WHERE auction_id IN (?) AND amount > ? AND note = ?'
+    assert maska((3, 'user@example.com', None)) == [3, '<str 16>', None]
+    assert maska({'password_hash': 'scrypt:...', 'id': 7}) == {'password_hash': '<dolt>', 'id': 7}
+
+
+def test_plan_is_captured_once_per_shape():
+    logg = LangsamLogg(troskel_ms=10)
+    anrop = []
+
+    def explain():
+        anrop.append(1)
+        return [(2, 0, 0, 'SCAN bids')]
+
+    logg.registrera('SELECT 1', (), 0.001, explain)
+    for sekunder in (0.05, 0.02):
+        logg.registrera('SELECT * FROM bids WHERE id = ?', (1,), sekunder, explain)
+    logg.registrera('SELECT * FROM bids WHERE id = 2', (), 0.03, explain)
+
+    (post,) = logg.topplista()
+    assert post['antal'] == 3 and post['total_ms'] == 100.0 and post['max_ms'] == 50.0
+    assert post['plan'] == ['2 0 0 SCAN bids'] and len(anrop) == 1
+    assert logg.antal == 3
+
+
+def test_admin_page_lists_orm_statements(app):
+    app.extensions['slow_queries'].troskel = 0
+    admin = app.test_client()
+    logga_in(admin, 1)
+    admin.get('/auctions/1')
+
+    svar = admin.get('/admin/slow-queries')
+    assert svar.status_code == 200
+    html = svar.get_data(as_text=True)
+    assert 'FROM auctions' in html and 'auctions_bp.auction_detail' in html
+    assert 'SEARCH auctions USING INTEGER PRIMARY KEY' in html
+
+    assert admin.post('/admin/slow-queries').status_code == 302
+    assert app.extensions['slow_queries'].topplista() == []
+
+    user = app.test_client()
+    logga_in(user, 2)
+    assert user.get('/admin/slow-queries').status_code in (302, 403)
+
+
+class _Repo(BaseRepository):
+    get_all = get_by_id = create = update = delete = None
+
+
+def test_base_repository_reports_to_the_log(app, tmp_path):
+    databas = str(tmp_path / 'raw.db')
+    with sqlite3.connect(databas) as conn:
+        conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, namn TEXT)')
+    logg = app.extensions['slow_queries']
+    logg.troskel = 0
+
+    with app.app_context():
+        repo = _Repo(databas)
+        repo.execute_non_query('INSERT INTO t (namn) VALUES (?)', ('hemlig',))
+        repo.execute_query('SELECT * FROM t WHERE namn = ?', ('hemlig',))
+
+    former = {p['form']: p for p in logg.topplista()}
+    post = former['SELECT * FROM t WHERE namn = ?']
+    assert post['parametrar'] == ['<str 6>']
+    assert any('SCAN t' in rad for rad in post['plan'])
@@ -0,0 +1,75 @@
+import json
+
+from conftest import logga_in
+
+from services.tracing import vattenfall
+
+
+def _sparande_app(tmp_path, monkeypatch, **miljo):
+    from flask_app import skapa_app
+    monkeypatch.setenv('TRACING_ENABLED', '1')
+    monkeypatch.setenv('TRACING_FILE', str(tmp_path / 'traces' / 'spans.jsonl'))
+    for namn, varde in miljo.items():
+        monkeypatch.setenv(namn, varde)
+    app = skapa_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def _hamta(klient, url, **kwargs):
+    svar = klient.get(url, **kwargs)
+    svar.close()  # rotspannet avslutas när servern stänger svaret
+    return svar
+
+
+def test_disabled_by_default(app):
+    admin = app.test_client()
+    logga_in(admin, 1)
+    assert 'X-Trace-Id' not in _hamta(admin, '/auctions/1').headers
+    assert admin.get('/admin/traces').status_code == 404
+
+
+def test_request_spans_form_a_tree(tmp_path, monkeypatch):
+    app = _sparande_app(tmp_path, monkeypatch)
+    admin = app.test_client()
+    logga_in(admin, 1)
+    svar = _hamta(admin, '/auctions/1')
+    trace_id = svar.headers['X-Trace-Id']
+    assert svar.headers['traceresponse'].startswith(f'00-{trace_id}-')
+
+    spann = vattenfall(app.extensions['tracing'].hamta(trace_id))
+    rot = spann[0]
+    assert rot['name'] == 'HTTP GET /auctions/<int:auction_id>' and rot['depth'] == 0
+    assert rot['attributes']['http.status_code'] == 200
+    namn = [s['name'] for s in spann]
+    for vantat in ('flask.setup', 'before_request', 'user.load', 'view auctions_bp.auction_detail',
+                   'db.query', 'template.render', 'after_request'):
+        assert vantat in namn
+    ids = {s['span_id'] for s in spann}
+    assert all(s['parent_span_id'] in ids for s in spann[1:])
+    vy = next(s for s in spann if s['name'].startswith('view '))
+    assert any(s['name'] == 'db.query' and s['parent_span_id'] == vy['span_id'] for s in spann)
+
+    # Samma spann finns i JSONL-filen, en rad per spann
+    with open(tmp_path / 'traces' / 'spans.jsonl', encoding='utf-8') as f:
+        rader = [json.loads(rad) for rad in f]
+    assert {r['span_id'] for r in rader if r['trace_id'] == trace_id} == ids
+
+    sida = admin.get(f'/admin/traces/{trace_id}')
+    assert sida.status_code == 200 and 'template.render' in sida.get_data(as_text=True)
+    assert admin.get('/admin/traces/' + '0' * 32).status_code == 404
+
+
+def test_sampling_and_traceparent(tmp_path, monkeypatch):
+    app = _sparande_app(tmp_path, monkeypatch, TRACING_SAMPLE_RATE='0')
+    klient = app.test_client()
+    assert 'X-Trace-Id' not in _hamta(klient, '/api/time').headers
+
+    trace_id, foralder = 'ab' * 16, 'cd' * 8
+    svar = _hamta(klient, '/api/time', headers={'traceparent': f'00-{trace_id}-{foralder}-01'})
+    assert svar.headers['X-Trace-Id'] == trace_id
+    spann = app.extensions['tracing'].hamta(trace_id)
+    assert spann[0]['parent_span_id'] == foralder
+    assert 'json.serialize' in [s['name'] for s in spann]
+    # Ej samplad förälder (flagga 00) följs inte
+    assert 'X-Trace-Id' not in _hamta(klient, '/api/time', headers={'traceparent': f'00-{trace_id}-{foralder}-00'}).headers
@@ -0,0 +1,61 @@
+import json
+
+from conftest import logga_in
+
+from replay_traffic import AppMal, las_inspelning, sammanfatta, spela_upp
+
+
+def _inspelande_app(tmp_path, monkeypatch):
+    from flask_app import skapa_app
+    monkeypatch.setenv('TRAFFIC_RECORD_DIR', str(tmp_path / 'traffic'))
+    monkeypatch.setenv('EVENT_LOG_DIR', str(tmp_path / 'events-rec'))
+    app = skapa_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def test_records_identity_route_and_body(tmp_path, monkeypatch):
+    app = _inspelande_app(tmp_path, monkeypatch)
+    inspelare = app.extensions['traffic_recorder']
+
+    anon = app.test_client()
+    anon.get('/auctions/?status=active').close()
+    anon.get('/static/css/style.css').close()
+    anon.post('/auth/login', data={'email': 'user@example.com', 'password': 'hemligt'}).close()
+    user = app.test_client()
+    logga_in(user, 2)
+    user.get('/auctions/1').close()
+    user.post('/bidding/place/1', json={'amount': 900}).close()
+    inspelare.stang()
+
+    poster = las_inspelning([str(tmp_path / 'traffic' / '*.jsonl')])
+    assert [p['path'] for p in poster] == ['/auctions/', '/auth/login', '/auctions/1', '/bidding/place/1']
+    browse, login, detalj, bud = poster
+    assert browse['query'] == 'status=active' and browse['identity'] == 'anon' and browse['status'] == 200
+    assert 'body' not in login
+    assert detalj['route'] == '/auctions/<int:auction_id>'
+    assert (detalj['identity'], detalj['user_id']) == ('user', 2)
+    assert json.loads(bud['body']) == {'amount': 900}
+    assert bud['content_type'] == 'application/json'
+    assert all(p['ms'] >= 0 and p['t'] > 0 for p in poster)
+
+
+def test_not_installed_without_directory(app):
+    assert 'traffic_recorder' not in app.extensions
+
+
+def test_replay_against_fresh_database(tmp_path, monkeypatch, app):
+    inspelad = _inspelande_app(tmp_path, monkeypatch)
+    user = inspelad.test_client()
+    logga_in(user, 2)
+    for _ in range(3):
+        user.get('/auctions/1').close()
+    user.post('/bidding/place/1', json={'amount': 900}).close()
+    inspelad.extensions['traffic_recorder'].stang()
+    poster = las_inspelning([str(tmp_path / 'traffic' / '*.jsonl')])
+
+    resultat = spela_upp(poster, AppMal(app), hastighet=100)
+    sammanfattning = sammanfatta(resultat)
+    assert sammanfattning['GET /auctions/<int:auction_id>']['antal'] == 3
+    assert sammanfattning['POST /bidding/place/<int:auction_id>']['ny_status'] == 0
+    assert all(s['fel'] == 0 for s in sammanfattning.values())
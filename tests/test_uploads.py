@@ -0,0 +1,103 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import logga_in
+from database import db
+from models.auction import Auction
+from models.user import User
+from services.images import cas_katalog
+
+
+def _jpeg_bytes(color=(10, 120, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (900, 600), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def admin_client(app, client, tmp_path):
+    app.config['UPLOAD_TMP_DIR'] = str(tmp_path / 'uploads')
+    app.extensions['images'].static_mapp = str(tmp_path / 'static')
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first()
+    logga_in(client, admin.id)
+    yield client
+    app.extensions['images'].stang()
+
+
+def test_bulk_upload_maps_files_to_auctions_by_id(app, admin_client, tmp_path):
+    data = {'images': [
+        (io.BytesIO(_jpeg_bytes()), '1_front.jpg'),
+        (io.BytesIO(_jpeg_bytes((1, 2, 3))), '2.jpg'),
+    ]}
+    response = admin_client.post('/admin/auctions/images', data=data, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    with app.app_context():
+        first, second = db.session.get(Auction, 1), db.session.get(Auction, 2)
+        assert len(first.image) == 64 and len(second.image) == 64
+        assert first.image != second.image
+        original = tmp_path / 'static' / cas_katalog(first.image) / 'original.jpg'
+        assert original.exists()
+    # Inga kvarlämnade tempfiler
+    assert os.listdir(tmp_path / 'uploads') == []
+
+
+def test_duplicate_upload_is_deduplicated(app, admin_client, tmp_path):
+    image = _jpeg_bytes()
+    data = {'images': [(io.BytesIO(image), '1.jpg'), (io.BytesIO(image), '2.jpg')]}
+    admin_client.post('/admin/auctions/images', data=data, content_type='multipart/form-data')
+    with app.app_context():
+        assert db.session.get(Auction, 1).image == db.session.get(Auction, 2).image
+    assert len(list((tmp_path / 'static').rglob('original.*'))) == 1
+
+
+def test_non_image_is_rejected_by_content(app, admin_client):
+    data = {'images': [(io.BytesIO(b'<?php echo 1; ?>'), '3.jpg')]}
+    admin_client.post('/admin/auctions/images', data=data, content_type='multipart/form-data')
+    with app.app_context():
+        assert db.session.get(Auction, 3).image == 'bok_forsta_tryckning.jpg'
+
+
+def test_upload_over_size_cap_is_refused(app, admin_client):
+    app.config['UPLOAD_MAX_BYTES'] = 1024
+    data = {'images': [(io.BytesIO(_jpeg_bytes()), '1.jpg')]}
+    response = admin_client.post('/admin/auctions/images', data=data, content_type='multipart/form-data')
+    assert response.status_code == 413
+
+
+def test_create_and_edit_forms_accept_an_image(app, admin_client):
+    data = {
+        'title': 'Ny tavla', 'description': 'Olja på duk', 'category': 'Konst',
+        'starting_bid': '250', 'duration_hours': '48',
+        'image': (io.BytesIO(_jpeg_bytes()), 'tavla.jpg'),
+    }
+    response = admin_client.post('/admin/auctions/new', data=data, content_type='multipart/form-data')
+    assert response.status_code == 302
+    with app.app_context():
+        auction = Auction.query.filter_by(title='Ny tavla').one()
+        assert len(auction.image) == 64 and auction.is_ongoing
+        auction_id, first_image = auction.id, auction.image
+
+    data = {
+        'title': 'Ny tavla (ram)', 'description': 'Olja på duk', 'category': 'Konst',
+        'starting_bid': '300', 'image': (io.BytesIO(_jpeg_bytes((200, 0, 0))), 'ram.jpg'),
+    }
+    admin_client.post(f'/admin/auctions/{auction_id}/edit', data=data, content_type='multipart/form-data')
+    with app.app_context():
+        auction = db.session.get(Auction, auction_id)
+        assert auction.title == 'Ny tavla (ram)' and auction.starting_bid == 300
+        assert len(auction.image) == 64 and auction.image != first_image
+
+    # En fil som inte är en bild avvisas och auktionen lämnas orörd
+    data['image'] = (io.BytesIO(b'not an image'), 'x.jpg')
+    data['title'] = 'Ändras inte'
+    admin_client.post(f'/admin/auctions/{auction_id}/edit', data=data, content_type='multipart/form-data')
+    with app.app_context():
+        assert db.session.get(Auction, auction_id).title == 'Ny tavla (ram)'
+    assert admin_client.get('/admin/auctions').status_code == 200
+    assert admin_client.get('/admin/auctions/new').status_code == 200
+    assert admin_client.get(f'/admin/auctions/{auction_id}/edit').status_code == 200